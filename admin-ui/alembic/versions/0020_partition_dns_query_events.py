@@ -0,0 +1,247 @@
+"""Range-partition dns_query_events by day
+
+Converts dns_query_events into a table partitioned by RANGE (ts) so
+retention can drop whole days instead of running one huge DELETE (see
+app/services/partitions.py).
+
+The conversion does not copy any event rows, and ingest keeps running
+through the slow part:
+
+- First, outside any transaction, the unique keys the partitioned parent
+  needs are built on the live table with CREATE UNIQUE INDEX
+  CONCURRENTLY: (id, ts) for the new primary key and (event_id, ts) for
+  the dedup key. Partition keys must be part of every unique constraint.
+  A CHECK constraint proving the partition bound is added NOT VALID and
+  then validated, which does not block writes. ATTACH PARTITION can then
+  skip its own full-table scan.
+- Then, in one short transaction, the table is renamed to
+  dns_query_events_legacy, the prebuilt indexes become its constraints
+  (ADD CONSTRAINT ... USING INDEX, a catalog change), the partitioned
+  parent is created and the legacy table is attached as a single
+  partition. That partition covers everything before the end of
+  tomorrow (FROM MINVALUE), or later if a node already sent future
+  timestamps. The legacy table's ts/client_ip/is_internal/client_ts
+  indexes are reused by the parent's matching indexes on attach. This
+  transaction is committed straight away rather than held open while the
+  later revisions of the same upgrade run.
+- The id sequence is handed over to the new parent, so ids keep
+  increasing across the conversion.
+- A DEFAULT partition and daily partitions for tomorrow through seven
+  days out are created; the event_partitions scheduler job keeps creating
+  new days from then on.
+
+The CHECK constraint applies to new rows as soon as it is added. The
+legacy bound therefore leaves a day of headroom: the concurrent phase
+must finish before the end of tomorrow (UTC), or ingest of later
+timestamps fails until the conversion completes.
+
+The legacy partition ages out through normal retention: expired rows are
+purged from it in chunks until it expires as a whole and is dropped.
+
+Downgrade rebuilds a plain table and copies every row back, which is slow
+on large installations.
+
+Revision ID: 0020_partition_dns_query_events
+Revises: 0019_precache_warming_dnsdist
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0020_partition_dns_query_events"
+down_revision = "0019_precache_warming_dnsdist"
+branch_labels = None
+depends_on = None
+
+PREMAKE_DAYS = 7
+
+# (old index name, legacy name) -- index names are schema-global, so the
+# legacy table's indexes must move aside before the parent's are created.
+_LEGACY_INDEXES = [
+    ("ix_dns_query_events_ts", "dns_query_events_legacy_ts_idx"),
+    ("ix_dns_query_events_client_ip", "dns_query_events_legacy_client_ip_idx"),
+    ("ix_dns_query_events_client_ts", "dns_query_events_legacy_client_ts_idx"),
+    ("ix_dns_query_events_is_internal", "dns_query_events_legacy_is_internal_idx"),
+]
+
+# (name, columns) on the partitioned parent.
+_PARENT_INDEXES = [
+    ("ix_dns_query_events_ts", ["ts"]),
+    ("ix_dns_query_events_client_ip", ["client_ip"]),
+    ("ix_dns_query_events_client_ts", ["client_ip", "ts"]),
+    ("ix_dns_query_events_is_internal", ["is_internal"]),
+]
+
+
+def _event_columns() -> list[sa.Column]:
+    return [
+        sa.Column(
+            "id",
+            sa.BigInteger(),
+            nullable=False,
+            server_default=sa.text("nextval('dns_query_events_id_seq'::regclass)"),
+        ),
+        sa.Column("event_id", sa.String(length=64), nullable=True),
+        sa.Column("ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column(
+            "node_id", sa.Integer(), sa.ForeignKey("nodes.id", ondelete="SET NULL"), nullable=True
+        ),
+        sa.Column("client_ip", sa.String(length=64), nullable=False),
+        sa.Column(
+            "client_id",
+            sa.BigInteger(),
+            sa.ForeignKey("clients.id", ondelete="SET NULL"),
+            nullable=True,
+        ),
+        sa.Column("qname", sa.Text(), nullable=False),
+        sa.Column("qtype", sa.Integer(), nullable=False),
+        sa.Column("rcode", sa.Integer(), nullable=False),
+        sa.Column("blocked", sa.Boolean(), nullable=False),
+        sa.Column("block_reason", sa.String(length=50), nullable=True),
+        sa.Column("blocklist_name", sa.String(length=255), nullable=True),
+        sa.Column("latency_ms", sa.Integer(), nullable=True),
+        sa.Column("event_seq", sa.BigInteger(), nullable=True),
+        sa.Column("is_internal", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+    ]
+
+
+def _build_unique_index_concurrently(name: str, columns: str) -> None:
+    """CREATE UNIQUE INDEX CONCURRENTLY, replacing an invalid leftover.
+
+    A failed concurrent build leaves an INVALID index behind; a rerun
+    rebuilds it instead of mistaking it for a finished one.
+    """
+    valid = (
+        op.get_bind()
+        .execute(
+            sa.text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+            {"name": name},
+        )
+        .scalar()
+    )
+    if valid:
+        return
+    if valid is not None:
+        op.execute(f"DROP INDEX CONCURRENTLY {name}")
+    op.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON dns_query_events ({columns})")
+
+
+def upgrade() -> None:
+    tomorrow = datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) + timedelta(days=1)
+    # The legacy partition must also cover rows a clock-skewed node sent
+    # with future timestamps (ts is indexed, so max() is cheap), and rows
+    # ingested while the indexes below are built.
+    legacy_end = tomorrow + timedelta(days=1)
+    max_ts = op.get_bind().execute(sa.text("SELECT max(ts) FROM dns_query_events")).scalar()
+    if max_ts is not None and max_ts >= legacy_end:
+        legacy_end = max_ts.astimezone(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) + timedelta(days=1)
+
+    # 1. Without blocking ingest: build the unique keys the parent
+    # requires and prove the partition bound, so ATTACH does not rescan.
+    with op.get_context().autocommit_block():
+        _build_unique_index_concurrently("dns_query_events_legacy_pkey_new", "id, ts")
+        _build_unique_index_concurrently("dns_query_events_legacy_event_id_ts_key", "event_id, ts")
+        op.execute(
+            "ALTER TABLE dns_query_events DROP CONSTRAINT IF EXISTS dns_query_events_legacy_bound"
+        )
+        op.execute(
+            "ALTER TABLE dns_query_events ADD CONSTRAINT dns_query_events_legacy_bound "
+            f"CHECK (ts IS NOT NULL AND ts < '{legacy_end.isoformat()}') NOT VALID"
+        )
+        op.execute("ALTER TABLE dns_query_events VALIDATE CONSTRAINT dns_query_events_legacy_bound")
+
+    # 2. Move the existing table aside. Everything from here to the commit
+    # below is catalog work under the rename's lock.
+    op.rename_table("dns_query_events", "dns_query_events_legacy")
+    for old, new in _LEGACY_INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {old} RENAME TO {new}")
+    op.execute("ALTER TABLE dns_query_events_legacy ALTER COLUMN id DROP DEFAULT")
+    # event_id alone can no longer be unique once the table is partitioned;
+    # leaving it on the legacy partition would turn a retried batch into a
+    # unique violation instead of an ON CONFLICT skip.
+    op.execute(
+        "ALTER TABLE dns_query_events_legacy "
+        "DROP CONSTRAINT IF EXISTS dns_query_events_event_id_key"
+    )
+    op.execute("ALTER TABLE dns_query_events_legacy DROP CONSTRAINT dns_query_events_pkey")
+    op.execute(
+        "ALTER TABLE dns_query_events_legacy ADD CONSTRAINT dns_query_events_legacy_pkey "
+        "PRIMARY KEY USING INDEX dns_query_events_legacy_pkey_new"
+    )
+    op.execute(
+        "ALTER TABLE dns_query_events_legacy ADD CONSTRAINT "
+        "dns_query_events_legacy_event_id_ts_key UNIQUE "
+        "USING INDEX dns_query_events_legacy_event_id_ts_key"
+    )
+
+    # 3. Partitioned parent, same column order as the legacy table.
+    op.create_table(
+        "dns_query_events",
+        *_event_columns(),
+        sa.PrimaryKeyConstraint("id", "ts", name="dns_query_events_pkey"),
+        sa.UniqueConstraint("event_id", "ts", name="uq_dns_query_events_event_id_ts"),
+        postgresql_partition_by="RANGE (ts)",
+    )
+    op.execute("ALTER SEQUENCE dns_query_events_id_seq OWNED BY dns_query_events.id")
+    for name, columns in _PARENT_INDEXES:
+        op.create_index(name, "dns_query_events", columns)
+
+    # 4. Attach the legacy rows, then add DEFAULT and upcoming days.
+    op.execute(
+        "ALTER TABLE dns_query_events ATTACH PARTITION dns_query_events_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{legacy_end.isoformat()}')"
+    )
+    op.execute("ALTER TABLE dns_query_events_legacy DROP CONSTRAINT dns_query_events_legacy_bound")
+    op.execute("CREATE TABLE dns_query_events_default PARTITION OF dns_query_events DEFAULT")
+    for offset in range(PREMAKE_DAYS):
+        day = tomorrow + timedelta(days=offset)
+        if day < legacy_end:
+            continue
+        op.execute(
+            f"CREATE TABLE dns_query_events_p{day:%Y%m%d} PARTITION OF dns_query_events "
+            f"FOR VALUES FROM ('{day.isoformat()}') "
+            f"TO ('{(day + timedelta(days=1)).isoformat()}')"
+        )
+
+    # Commit now: alembic would otherwise hold the rename's lock until the
+    # remaining revisions of this upgrade have run.
+    with op.get_context().autocommit_block():
+        pass
+
+
+def downgrade() -> None:
+    op.rename_table("dns_query_events", "dns_query_events_partitioned")
+    op.execute(
+        "ALTER TABLE dns_query_events_partitioned "
+        "RENAME CONSTRAINT dns_query_events_pkey TO dns_query_events_partitioned_pkey"
+    )
+    for name, _columns in _PARENT_INDEXES:
+        op.drop_index(name, table_name="dns_query_events_partitioned")
+    op.execute(
+        "ALTER TABLE dns_query_events_partitioned DROP CONSTRAINT uq_dns_query_events_event_id_ts"
+    )
+
+    op.create_table(
+        "dns_query_events",
+        *_event_columns(),
+        sa.PrimaryKeyConstraint("id", name="dns_query_events_pkey"),
+        sa.UniqueConstraint("event_id", name="dns_query_events_event_id_key"),
+    )
+    op.execute(
+        "INSERT INTO dns_query_events SELECT * FROM dns_query_events_partitioned "
+        "ON CONFLICT DO NOTHING"
+    )
+    op.execute("ALTER SEQUENCE dns_query_events_id_seq OWNED BY dns_query_events.id")
+    op.drop_table("dns_query_events_partitioned")
+    for name, columns in _PARENT_INDEXES:
+        op.create_index(name, "dns_query_events", columns)
@@ -0,0 +1,49 @@
+"""Make uq_rollup_bucket NULLS NOT DISTINCT
+
+compute_hourly_rollup and compute_daily_rollup now write each bucket with
+a single INSERT ... ON CONFLICT ON CONSTRAINT uq_rollup_bucket. Rollup rows
+for events without a client or node have NULL client_id/node_id, which a
+plain unique constraint never treats as conflicting, so the constraint is
+recreated as NULLS NOT DISTINCT (PostgreSQL 15+). Duplicate buckets left
+behind by earlier concurrent rollup runs are removed first, keeping the
+newest row.
+
+Revision ID: 0021_rollup_nulls_not_distinct
+Revises: 0020_partition_dns_query_events
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+revision = "0021_rollup_nulls_not_distinct"
+down_revision = "0020_partition_dns_query_events"
+branch_labels = None
+depends_on = None
+
+_COLUMNS = "bucket_start, granularity, client_id, node_id"
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        DELETE FROM query_rollups a
+        USING query_rollups b
+        WHERE a.bucket_start = b.bucket_start
+          AND a.granularity = b.granularity
+          AND a.client_id IS NOT DISTINCT FROM b.client_id
+          AND a.node_id IS NOT DISTINCT FROM b.node_id
+          AND a.id < b.id
+        """
+    )
+    op.drop_constraint("uq_rollup_bucket", "query_rollups", type_="unique")
+    op.execute(
+        f"ALTER TABLE query_rollups ADD CONSTRAINT uq_rollup_bucket "
+        f"UNIQUE NULLS NOT DISTINCT ({_COLUMNS})"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_rollup_bucket", "query_rollups", type_="unique")
+    op.execute(f"ALTER TABLE query_rollups ADD CONSTRAINT uq_rollup_bucket UNIQUE ({_COLUMNS})")
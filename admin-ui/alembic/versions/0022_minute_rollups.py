@@ -0,0 +1,53 @@
+"""Add per-minute rollup tier and rollup watermarks
+
+query_rollups_minute holds one row per (minute, is_internal), maintained
+incrementally by the minute rollup job from the watermark stored in
+rollup_watermarks. The history charts and dashboard edges read from it
+instead of grouping raw dns_query_events. The tier starts empty; the
+first job run backfills the last seven days.
+
+Revision ID: 0022_minute_rollups
+Revises: 0021_rollup_nulls_not_distinct
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0022_minute_rollups"
+down_revision = "0021_rollup_nulls_not_distinct"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "query_rollups_minute",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("is_internal", sa.Boolean(), nullable=False),
+        sa.Column("total_queries", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("blocked_queries", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("nxdomain_count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("servfail_count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("cache_hits", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("allowed_cache_hits", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("latency_sum_ms", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("unique_domains", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.UniqueConstraint("bucket_start", "is_internal", name="uq_rollup_minute_bucket"),
+    )
+
+    op.create_table(
+        "rollup_watermarks",
+        sa.Column("name", sa.String(length=32), primary_key=True),
+        sa.Column("watermark", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rollup_watermarks")
+    op.drop_table("query_rollups_minute")
@@ -0,0 +1,38 @@
+"""Add HyperLogLog domain sketches to rollups
+
+query_rollups and query_rollups_minute gain a nullable domains_sketch
+bytea column (see app/services/hll.py) so daily rollups and dashboard
+windows can merge distinct-domain counts instead of summing them.
+
+Existing hourly and daily rows keep a NULL sketch and are summed as
+before until they age out. The minute tier's watermark is cleared so the
+next minute rollup run rebuilds the last seven days with sketches.
+
+Revision ID: 0023_rollup_domain_sketches
+Revises: 0022_minute_rollups
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0023_rollup_domain_sketches"
+down_revision = "0022_minute_rollups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("query_rollups", sa.Column("domains_sketch", sa.LargeBinary(), nullable=True))
+    op.add_column(
+        "query_rollups_minute", sa.Column("domains_sketch", sa.LargeBinary(), nullable=True)
+    )
+    op.execute("DELETE FROM rollup_watermarks WHERE name = 'minute'")
+
+
+def downgrade() -> None:
+    op.drop_column("query_rollups_minute", "domains_sketch")
+    op.drop_column("query_rollups", "domains_sketch")
@@ -0,0 +1,44 @@
+"""Add latency histograms to rollups
+
+query_rollups and query_rollups_minute gain a nullable latency_histogram
+bigint[] column holding counts per fixed log bucket (see
+app/services/latency_histogram.py), so p50/p95/p99 can be computed for
+any window by adding histograms instead of scanning raw events.
+
+Existing rows keep a NULL histogram and simply contribute nothing to
+percentiles until they age out. The minute tier's watermark is cleared
+so the next minute rollup run rebuilds the last seven days.
+
+Revision ID: 0024_rollup_latency_histograms
+Revises: 0023_rollup_domain_sketches
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from alembic import op
+
+revision = "0024_rollup_latency_histograms"
+down_revision = "0023_rollup_domain_sketches"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "query_rollups",
+        sa.Column("latency_histogram", ARRAY(sa.BigInteger()), nullable=True),
+    )
+    op.add_column(
+        "query_rollups_minute",
+        sa.Column("latency_histogram", ARRAY(sa.BigInteger()), nullable=True),
+    )
+    op.execute("DELETE FROM rollup_watermarks WHERE name = 'minute'")
+
+
+def downgrade() -> None:
+    op.drop_column("query_rollups_minute", "latency_histogram")
+    op.drop_column("query_rollups", "latency_histogram")
@@ -0,0 +1,45 @@
+"""Add hourly top-K table for top-domain lists
+
+query_topk_hourly keeps, per hour, the busiest (qname, qtype) pairs for
+each (blocked, is_internal) combination with their total, NOERROR and
+cache-hit counts. /domains, the /logs top view, the precache page and
+precache pair selection merge these hours instead of grouping 24 hours
+of raw events. The table starts empty; the rollup job backfills the
+last seven days on its first run.
+
+Revision ID: 0025_query_topk_hourly
+Revises: 0024_rollup_latency_histograms
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0025_query_topk_hourly"
+down_revision = "0024_rollup_latency_histograms"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "query_topk_hourly",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("qname", sa.Text(), nullable=False),
+        sa.Column("qtype", sa.Integer(), nullable=False),
+        sa.Column("blocked", sa.Boolean(), nullable=False),
+        sa.Column("is_internal", sa.Boolean(), nullable=False),
+        sa.Column("query_count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("noerror_count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("cache_hits", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_query_topk_hourly_bucket_start", "query_topk_hourly", ["bucket_start"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_query_topk_hourly_bucket_start", table_name="query_topk_hourly")
+    op.drop_table("query_topk_hourly")
@@ -0,0 +1,32 @@
+"""Track the last seen event id on rollup watermarks
+
+The hourly and daily rollups are now driven by rows in rollup_watermarks
+(see run_rollup_job). last_event_id records the highest
+dns_query_events.id seen by the previous run, so events that arrive late
+for already rolled-up hours can be found by id and their hours
+recomputed. On the first run the hourly watermark starts after the
+newest existing hourly rollup.
+
+Revision ID: 0026_rollup_watermark_event_id
+Revises: 0025_query_topk_hourly
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0026_rollup_watermark_event_id"
+down_revision = "0025_query_topk_hourly"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("rollup_watermarks", sa.Column("last_event_id", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("rollup_watermarks", "last_event_id")
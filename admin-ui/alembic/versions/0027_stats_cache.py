@@ -0,0 +1,37 @@
+"""Add unlogged shared dashboard stats cache
+
+stats_cache lets every admin-ui process share one computation of each
+dashboard stats window (see app/services/stats_cache.py). It is UNLOGGED:
+no WAL is written for it and it is emptied after a crash, which is fine
+for a cache with a one-minute TTL.
+
+Revision ID: 0027_stats_cache
+Revises: 0026_rollup_watermark_event_id
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+from alembic import op
+
+revision = "0027_stats_cache"
+down_revision = "0026_rollup_watermark_event_id"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "stats_cache",
+        sa.Column("key", sa.String(length=128), primary_key=True),
+        sa.Column("computed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("payload", JSONB(), nullable=False),
+        prefixes=["UNLOGGED"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("stats_cache")
@@ -0,0 +1,96 @@
+"""Index qname for suffix, exact and substring search
+
+- ix_dns_query_events_qname_reversed: btree on reverse(qname) with
+  text_pattern_ops, so "ends with example.com" and exact searches are a
+  range scan instead of a scan of the whole window.
+- ix_dns_query_events_qname_trgm: pg_trgm GIN index for "contains"
+  searches. It is only created when the pg_trgm extension is available
+  and this role may install it; otherwise substring search stays
+  unindexed and the migration carries on.
+
+CREATE INDEX CONCURRENTLY is not supported on a partitioned table, and a
+plain build on the parent holds a SHARE lock on every partition until it
+commits, blocking ingest. So each index is created ON ONLY the parent
+(instant, and inherited by partitions created later), then built
+CONCURRENTLY on every existing partition and attached; the parent index
+turns valid once the last partition is attached.
+
+Revision ID: 0028_qname_search_indexes
+Revises: 0027_stats_cache
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0028_qname_search_indexes"
+down_revision = "0027_stats_cache"
+branch_labels = None
+depends_on = None
+
+
+def _create_partitioned_index(name: str, definition: str) -> None:
+    """Index every partition of dns_query_events without blocking writes.
+
+    Reruns pick up where a failed run stopped: an INVALID leftover from an
+    interrupted concurrent build is rebuilt, and partitions that already
+    have an index attached (including ones created meanwhile) are skipped.
+    """
+    op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY dns_query_events {definition}")
+    suffix = name.removeprefix("ix_dns_query_events_")
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        partitions = (
+            bind.execute(
+                sa.text(
+                    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = to_regclass('dns_query_events') "
+                    "AND NOT EXISTS (SELECT 1 FROM pg_inherits ii "
+                    "JOIN pg_index x ON x.indexrelid = ii.inhrelid "
+                    "WHERE ii.inhparent = to_regclass(:name) AND x.indrelid = c.oid) "
+                    "ORDER BY c.relname"
+                ),
+                {"name": name},
+            )
+            .scalars()
+            .all()
+        )
+        for partition in partitions:
+            child = f"{partition}_{suffix}"
+            valid = bind.execute(
+                sa.text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                {"name": child},
+            ).scalar()
+            if valid is False:
+                op.execute(f'DROP INDEX CONCURRENTLY "{child}"')
+            if not valid:
+                op.execute(f'CREATE INDEX CONCURRENTLY "{child}" ON "{partition}" {definition}')
+            op.execute(f'ALTER INDEX {name} ATTACH PARTITION "{child}"')
+
+
+def upgrade() -> None:
+    _create_partitioned_index(
+        "ix_dns_query_events_qname_reversed", "(reverse(qname) text_pattern_ops)"
+    )
+
+    bind = op.get_bind()
+    available = bind.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).scalar()
+    if not available:
+        return
+    # A savepoint keeps a permission error from aborting the migration.
+    try:
+        with bind.begin_nested():
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except sa.exc.DBAPIError:
+        return
+    _create_partitioned_index("ix_dns_query_events_qname_trgm", "USING gin (qname gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_dns_query_events_qname_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_dns_query_events_qname_reversed")
@@ -0,0 +1,137 @@
+"""Partial and covering indexes for the analytics views
+
+Nearly every analytics query filters on ``is_internal IS false`` and a
+time window, often with blocked, rcode, client_ip or blocklist_name, and
+pages newest first by (ts, id). The index set now follows those shapes:
+
+- ix_dns_query_events_external_ts_id: (ts, id) INCLUDE (qname, qtype,
+  rcode, blocked, latency_ms) WHERE is_internal IS false. Serves the
+  /logs "all" view and lets the top-domain raw edges run as index-only
+  scans.
+- ix_dns_query_events_external_blocked_ts_id and
+  ix_dns_query_events_external_failures_ts_id: (ts, id) partial on the
+  blocked and failures views' predicates, so those pages never walk past
+  unrelated rows.
+- ix_dns_query_events_external_client_ts: (client_ip, ts) partial on
+  external traffic. It replaces the unfiltered client_ts composite.
+- ix_dns_query_events_blocklist_ts: (blocklist_name, ts) over rows with a
+  blocklist only. A rarely hit blocklist no longer scans the whole window.
+- ix_dns_query_events_ts_brin: BRIN on ts for range scans over whole
+  days; a few pages per partition.
+
+ix_dns_query_events_is_internal is dropped. A boolean that is false for
+almost every row is never selective, and the partial indexes cover it.
+
+As in 0028_qname_search_indexes, each index is created ON ONLY the
+partitioned parent and then built CONCURRENTLY on every partition and
+attached, so ingest keeps running throughout. The two indexes being
+replaced are dropped only once every new index is valid. Expect this
+migration to take a while on large installations.
+
+Revision ID: 0029_event_view_indexes
+Revises: 0028_qname_search_indexes
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0029_event_view_indexes"
+down_revision = "0028_qname_search_indexes"
+branch_labels = None
+depends_on = None
+
+_INDEXES = {
+    "ix_dns_query_events_ts_brin": "USING brin (ts)",
+    "ix_dns_query_events_external_ts_id": (
+        "(ts, id) INCLUDE (qname, qtype, rcode, blocked, latency_ms) WHERE is_internal IS false"
+    ),
+    "ix_dns_query_events_external_blocked_ts_id": (
+        "(ts, id) WHERE blocked IS true AND is_internal IS false"
+    ),
+    "ix_dns_query_events_external_failures_ts_id": (
+        "(ts, id) WHERE rcode IN (2, 3) AND blocked IS false AND is_internal IS false"
+    ),
+    "ix_dns_query_events_external_client_ts": "(client_ip, ts) WHERE is_internal IS false",
+    "ix_dns_query_events_blocklist_ts": "(blocklist_name, ts) WHERE blocklist_name IS NOT NULL",
+}
+
+_DROPPED = {
+    "ix_dns_query_events_is_internal": "(is_internal)",
+    "ix_dns_query_events_client_ts": "(client_ip, ts)",
+}
+
+
+def _create_partitioned_index(name: str, definition: str) -> None:
+    """ON ONLY the parent, then CONCURRENTLY per partition and ATTACH.
+
+    Safe to rerun: INVALID leftovers are rebuilt and partitions that
+    already have an index attached are skipped.
+    """
+    op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY dns_query_events {definition}")
+    suffix = name.removeprefix("ix_dns_query_events_")
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        partitions = (
+            bind.execute(
+                sa.text(
+                    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = to_regclass('dns_query_events') "
+                    "AND NOT EXISTS (SELECT 1 FROM pg_inherits ii "
+                    "JOIN pg_index x ON x.indexrelid = ii.inhrelid "
+                    "WHERE ii.inhparent = to_regclass(:name) AND x.indrelid = c.oid) "
+                    "ORDER BY c.relname"
+                ),
+                {"name": name},
+            )
+            .scalars()
+            .all()
+        )
+        for partition in partitions:
+            child = f"{partition}_{suffix}"
+            valid = bind.execute(
+                sa.text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                {"name": child},
+            ).scalar()
+            if valid is False:
+                op.execute(f'DROP INDEX CONCURRENTLY "{child}"')
+            if not valid:
+                op.execute(f'CREATE INDEX CONCURRENTLY "{child}" ON "{partition}" {definition}')
+            op.execute(f'ALTER INDEX {name} ATTACH PARTITION "{child}"')
+
+
+def upgrade() -> None:
+    for name, definition in _INDEXES.items():
+        _create_partitioned_index(name, definition)
+
+    invalid = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT c.relname FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid "
+                "WHERE c.relname IN :names AND NOT x.indisvalid"
+            ).bindparams(sa.bindparam("names", expanding=True)),
+            {"names": list(_INDEXES)},
+        )
+        .scalars()
+        .all()
+    )
+    if invalid:
+        raise RuntimeError(
+            f"Replacement indexes not valid, keeping the old ones: {', '.join(invalid)}"
+        )
+    # Committed one by one: a dropped parent index briefly locks every
+    # partition, and must not stay locked for the rest of the upgrade.
+    with op.get_context().autocommit_block():
+        for name in _DROPPED:
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def downgrade() -> None:
+    for name, definition in _DROPPED.items():
+        _create_partitioned_index(name, definition)
+    for name in _INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
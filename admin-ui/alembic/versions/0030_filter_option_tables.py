@@ -0,0 +1,66 @@
+"""Maintain analytics filter options at ingest
+
+Adds clients.has_external_traffic and the event_blocklist_names table,
+which ingest keeps up to date (see app/services/filter_options.py), so
+the /logs client and blocklist dropdowns no longer run a DISTINCT over
+dns_query_events on every render.
+
+Both are backfilled from the retained events once: a probe per client on
+ix_dns_query_events_external_client_ts, and one grouped read of
+ix_dns_query_events_blocklist_ts.
+
+Revision ID: 0030_filter_option_tables
+Revises: 0029_event_view_indexes
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0030_filter_option_tables"
+down_revision = "0029_event_view_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "clients",
+        sa.Column(
+            "has_external_traffic",
+            sa.Boolean(),
+            nullable=False,
+            server_default=sa.text("false"),
+        ),
+    )
+    op.create_table(
+        "event_blocklist_names",
+        sa.Column("name", sa.String(length=255), primary_key=True),
+        sa.Column(
+            "has_external_traffic",
+            sa.Boolean(),
+            nullable=False,
+            server_default=sa.text("false"),
+        ),
+        sa.Column("last_seen", sa.DateTime(timezone=True), nullable=True),
+    )
+
+    op.execute(
+        "UPDATE clients SET has_external_traffic = true WHERE EXISTS ("
+        "SELECT 1 FROM dns_query_events e "
+        "WHERE e.client_ip = clients.ip AND e.is_internal IS false)"
+    )
+    op.execute(
+        "INSERT INTO event_blocklist_names (name, has_external_traffic, last_seen) "
+        "SELECT blocklist_name, bool_or(is_internal IS false), max(ts) "
+        "FROM dns_query_events WHERE blocklist_name IS NOT NULL "
+        "GROUP BY blocklist_name"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("event_blocklist_names")
+    op.drop_column("clients", "has_external_traffic")
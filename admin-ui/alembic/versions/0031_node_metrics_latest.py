@@ -0,0 +1,73 @@
+"""Keep the newest node_metrics row per node in node_metrics_latest
+
+The dashboard, /system, /nodes and /metrics all need only the latest
+metrics of each node, and found them by searching node_metrics (a
+per-node ORDER BY ts LIMIT 1, or max(id) grouped over the whole table).
+Every metrics insert now also upserts one row per node here (see
+app/services/node_metrics.py), and those views read this table instead.
+
+Backfilled from the newest node_metrics row of each node.
+
+Revision ID: 0031_node_metrics_latest
+Revises: 0030_filter_option_tables
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0031_node_metrics_latest"
+down_revision = "0030_filter_option_tables"
+branch_labels = None
+depends_on = None
+
+_METRIC_COLUMNS = [
+    "cache_hits",
+    "cache_misses",
+    "cache_entries",
+    "packetcache_hits",
+    "packetcache_misses",
+    "answers_0_1",
+    "answers_1_10",
+    "answers_10_100",
+    "answers_100_1000",
+    "answers_slow",
+    "concurrent_queries",
+    "outgoing_timeouts",
+    "servfail_answers",
+    "nxdomain_answers",
+    "questions",
+    "all_outqueries",
+    "uptime_seconds",
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "node_metrics_latest",
+        sa.Column(
+            "node_id",
+            sa.BigInteger(),
+            sa.ForeignKey("nodes.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("ts", sa.DateTime(timezone=True), nullable=False),
+        *[
+            sa.Column(name, sa.BigInteger(), server_default="0", nullable=False)
+            for name in _METRIC_COLUMNS
+        ],
+    )
+
+    columns = ", ".join(_METRIC_COLUMNS)
+    op.execute(
+        f"INSERT INTO node_metrics_latest (node_id, ts, {columns}) "
+        f"SELECT DISTINCT ON (node_id) node_id, ts, {columns} FROM node_metrics "
+        "ORDER BY node_id, ts DESC, id DESC"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("node_metrics_latest")
@@ -0,0 +1,82 @@
+"""Downsampled node_metrics tiers
+
+Adds node_metrics_5m and node_metrics_1h: per node and bucket, each
+recursor counter's increase (with counter resets detected), the seconds
+it covers, and the gauges' maximum. The node metrics rollup job fills
+them (see app/services/node_metrics.py); its first run starts at the
+oldest node_metrics sample, so the existing history is downsampled
+without a backfill here.
+
+Once covered by the tiers, raw node_metrics samples are only kept for
+two days, the 5m tier for 30 days and the 1h tier for
+retention_node_metrics_days.
+
+Revision ID: 0032_node_metrics_tiers
+Revises: 0031_node_metrics_latest
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0032_node_metrics_tiers"
+down_revision = "0031_node_metrics_latest"
+branch_labels = None
+depends_on = None
+
+_VALUE_COLUMNS = [
+    "cache_hits",
+    "cache_misses",
+    "packetcache_hits",
+    "packetcache_misses",
+    "answers_0_1",
+    "answers_1_10",
+    "answers_10_100",
+    "answers_100_1000",
+    "answers_slow",
+    "outgoing_timeouts",
+    "servfail_answers",
+    "nxdomain_answers",
+    "questions",
+    "all_outqueries",
+    "cache_entries",
+    "concurrent_queries",
+    "uptime_seconds",
+]
+
+
+def _create_tier(name: str) -> None:
+    op.create_table(
+        name,
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column(
+            "node_id",
+            sa.BigInteger(),
+            sa.ForeignKey("nodes.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("samples", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("seconds", sa.Float(), server_default="0", nullable=False),
+        sa.Column("resets", sa.Integer(), server_default="0", nullable=False),
+        *[
+            sa.Column(column, sa.BigInteger(), server_default="0", nullable=False)
+            for column in _VALUE_COLUMNS
+        ],
+        sa.UniqueConstraint("node_id", "bucket_start", name=f"uq_{name}_bucket"),
+    )
+    op.create_index(f"ix_{name}_bucket_start", name, ["bucket_start"])
+
+
+def upgrade() -> None:
+    _create_tier("node_metrics_5m")
+    _create_tier("node_metrics_1h")
+
+
+def downgrade() -> None:
+    op.drop_table("node_metrics_1h")
+    op.drop_table("node_metrics_5m")
+    op.execute("DELETE FROM rollup_watermarks WHERE name = 'node_metrics_5m'")
@@ -0,0 +1,55 @@
+"""Add monotonic per-node ingest counters for /metrics
+
+/metrics exported 24-hour windowed totals as gauges named *_total, which
+Prometheus cannot rate(). ingest_counters holds running per-node totals
+and a latency histogram, bumped by every ingest batch for the events it
+inserted (see app/services/ingest_counters.py), so the exporter can
+publish real counters and a histogram.
+
+Counters start at zero; Prometheus treats the first scrape as a reset.
+
+Revision ID: 0033_ingest_counters
+Revises: 0032_node_metrics_tiers
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from alembic import op
+
+revision = "0033_ingest_counters"
+down_revision = "0032_node_metrics_tiers"
+branch_labels = None
+depends_on = None
+
+_COUNTER_COLUMNS = ["queries", "blocked", "cache_hits", "nxdomain", "servfail", "latency_sum_ms"]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingest_counters",
+        sa.Column(
+            "node_id",
+            sa.BigInteger(),
+            sa.ForeignKey("nodes.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        *[
+            sa.Column(name, sa.BigInteger(), server_default="0", nullable=False)
+            for name in _COUNTER_COLUMNS
+        ],
+        sa.Column("latency_histogram", ARRAY(sa.BigInteger()), nullable=True),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("NOW()"),
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ingest_counters")
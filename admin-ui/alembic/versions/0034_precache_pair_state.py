@@ -0,0 +1,37 @@
+"""Persist precache per-pair TTL state
+
+The per-(qname, qtype) TTL and last-warmed state lived in a per-process
+dict, lost on restart and different in every worker, so after a restart
+every pair looked due and was re-warmed at once. precache_pair_state is
+the shared copy that warm passes load and checkpoint into (see
+app/services/precache.py).
+
+Revision ID: 0034_precache_pair_state
+Revises: 0033_ingest_counters
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0034_precache_pair_state"
+down_revision = "0033_ingest_counters"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "precache_pair_state",
+        sa.Column("qname", sa.Text(), primary_key=True),
+        sa.Column("qtype", sa.Integer(), primary_key=True),
+        sa.Column("ttl", sa.Integer(), nullable=False),
+        sa.Column("last_warmed", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("precache_pair_state")
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 import sys
@@ -15,6 +16,7 @@ from fastapi import FastAPI, HTTPException, Request
 from starlette.middleware.sessions import SessionMiddleware
 
 from app.csrf import CSRFMiddleware
+from app.request_metrics import RequestMetricsMiddleware
 from app.routers.analytics import router as analytics_router
 from app.routers.audit import router as audit_router
 from app.routers.auth import router as auth_router
@@ -38,6 +40,7 @@ from app.routers.streaming import router as streaming_router
 from app.routers.system import router as system_router
 from app.security import hash_password
 from app.settings import get_settings
+from app.sql_profiler import SqlProfilerMiddleware, configure_sql_profiler
 
 settings = get_settings()
 log = logging.getLogger(__name__)
@@ -155,6 +158,7 @@ def bootstrap_primary_node() -> None:
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     from app.services.boot_burst import start_boot_burst
+    from app.services.precache import precache_state_checkpoint_job
     from app.services.scheduler import start_scheduler, stop_scheduler
 
     if os.environ.get("POWERBLOCKADE_TESTING", "").lower() == "true":
@@ -170,6 +174,9 @@ async def lifespan(_: FastAPI):
     start_boot_burst()
     yield
     stop_scheduler()
+    # Keep pairs warmed since the last checkpoint across the restart; the
+    # job does blocking database I/O, so run it off the event loop.
+    await asyncio.to_thread(precache_state_checkpoint_job)
 
 
 app = FastAPI(title="PowerBlockade Admin UI", lifespan=lifespan)
@@ -191,6 +198,11 @@ app.add_middleware(
     cookie_secure=False,  # Set True when using HTTPS
     cookie_samesite="lax",
 )
+sql_profiler = configure_sql_profiler(settings)
+if sql_profiler is not None:
+    app.add_middleware(SqlProfilerMiddleware, profiler=sql_profiler)
+# Outermost, so the timing covers the session and CSRF middleware too.
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(node_sync_router)
 app.include_router(blocking_router)
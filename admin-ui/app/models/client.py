@@ -27,3 +27,8 @@ class Client(Base):
         sa.DateTime(timezone=True), server_default=sa.text("NOW()")
     )
     last_seen: Mapped[datetime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+    # Set by ingest once the client sends a non-internal query; cleared by
+    # retention when none is left. Drives the analytics client dropdowns.
+    has_external_traffic: Mapped[bool] = mapped_column(
+        sa.Boolean(), nullable=False, default=False, server_default=sa.text("false")
+    )
@@ -13,14 +13,73 @@ if TYPE_CHECKING:
 
 
 class DNSQueryEvent(Base):
+    """One DNS query observed at a node's edge.
+
+    On PostgreSQL the table is range-partitioned by day on ``ts`` (see
+    app/services/partitions.py), so every unique constraint has to carry
+    the partition key: the primary key is (id, ts) and ingest dedup keys
+    on (event_id, ts).
+
+    Analytics filter on ``is_internal IS false`` almost everywhere, so the
+    PostgreSQL-only indexes below are mostly partial on it and match the views'
+    predicates and (ts, id) order exactly; see migration 0029 and
+    tests/integration/test_query_plans.py.
+    """
+
     __tablename__ = "dns_query_events"
-    __table_args__ = (sa.UniqueConstraint("node_id", "event_seq", name="uq_node_event_seq"),)
+    __table_args__ = (
+        sa.UniqueConstraint("event_id", "ts", name="uq_dns_query_events_event_id_ts"),
+        # Time-range scans over whole days of old partitions.
+        sa.Index("ix_dns_query_events_ts_brin", "ts", postgresql_using="brin").ddl_if(
+            dialect="postgresql"
+        ),
+        # /logs views newest first, and index-only scans for the raw edge
+        # of the top-domain lists.
+        sa.Index(
+            "ix_dns_query_events_external_ts_id",
+            "ts",
+            "id",
+            postgresql_include=["qname", "qtype", "rcode", "blocked", "latency_ms"],
+            postgresql_where=sa.text("is_internal IS false"),
+        ).ddl_if(dialect="postgresql"),
+        sa.Index(
+            "ix_dns_query_events_external_blocked_ts_id",
+            "ts",
+            "id",
+            postgresql_where=sa.text("blocked IS true AND is_internal IS false"),
+        ).ddl_if(dialect="postgresql"),
+        sa.Index(
+            "ix_dns_query_events_external_failures_ts_id",
+            "ts",
+            "id",
+            postgresql_where=sa.text(
+                "rcode IN (2, 3) AND blocked IS false AND is_internal IS false"
+            ),
+        ).ddl_if(dialect="postgresql"),
+        # Client and blocklist filters.
+        sa.Index(
+            "ix_dns_query_events_external_client_ts",
+            "client_ip",
+            "ts",
+            postgresql_where=sa.text("is_internal IS false"),
+        ).ddl_if(dialect="postgresql"),
+        sa.Index(
+            "ix_dns_query_events_blocklist_ts",
+            "blocklist_name",
+            "ts",
+            postgresql_where=sa.text("blocklist_name IS NOT NULL"),
+        ).ddl_if(dialect="postgresql"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
 
-    id: Mapped[int] = mapped_column(sa.BigInteger(), primary_key=True)
-    event_id: Mapped[str | None] = mapped_column(sa.String(64), unique=True)
+    # Explicit sequence: a composite primary key gets no implicit BIGSERIAL.
+    id: Mapped[int] = mapped_column(
+        sa.BigInteger(), sa.Sequence("dns_query_events_id_seq"), primary_key=True
+    )
+    event_id: Mapped[str | None] = mapped_column(sa.String(64))
     event_seq: Mapped[int | None] = mapped_column(sa.BigInteger(), nullable=True)
 
-    ts: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), index=True)
+    ts: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), primary_key=True, index=True)
     node_id: Mapped[int | None] = mapped_column(
         sa.Integer(), sa.ForeignKey("nodes.id", ondelete="SET NULL")
     )
@@ -33,7 +92,7 @@ class DNSQueryEvent(Base):
     # True when the querying client is inside an internal subnet (docker
     # network, VPN ranges); excluded from user-facing analytics by default.
     is_internal: Mapped[bool] = mapped_column(
-        sa.Boolean(), nullable=False, default=False, server_default=sa.text("false"), index=True
+        sa.Boolean(), nullable=False, default=False, server_default=sa.text("false")
     )
 
     qname: Mapped[str] = mapped_column(sa.Text())
@@ -44,3 +103,46 @@ class DNSQueryEvent(Base):
     block_reason: Mapped[str | None] = mapped_column(sa.String(50), nullable=True)
     blocklist_name: Mapped[str | None] = mapped_column(sa.String(255), nullable=True)
     latency_ms: Mapped[int | None] = mapped_column(sa.Integer(), nullable=True)
+
+
+# Rows outside every daily partition (clock skew, far-future timestamps, or
+# a fresh create_all() before the partition job has run) land in the DEFAULT
+# partition instead of failing the insert.
+sa.event.listen(
+    DNSQueryEvent.__table__,
+    "after_create",
+    sa.DDL(
+        "CREATE TABLE IF NOT EXISTS dns_query_events_default PARTITION OF dns_query_events DEFAULT"
+    ).execute_if(dialect="postgresql"),
+)
+
+# Suffix and exact qname search (app/services/query_log.py) compare
+# reverse(qname) with a reversed search term: "ends with example.com"
+# becomes a prefix range on this index.
+sa.Index(
+    "ix_dns_query_events_qname_reversed",
+    sa.func.reverse(DNSQueryEvent.qname).label("qname_reversed"),
+    postgresql_ops={"qname_reversed": "text_pattern_ops"},
+).ddl_if(dialect="postgresql")
+
+# Substring search uses a pg_trgm GIN index when the extension can be
+# installed; without it "contains" searches scan the selected window.
+sa.event.listen(
+    DNSQueryEvent.__table__,
+    "after_create",
+    sa.DDL(
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                EXECUTE 'CREATE INDEX IF NOT EXISTS ix_dns_query_events_qname_trgm '
+                        'ON dns_query_events USING gin (qname gin_trgm_ops)';
+            END IF;
+        EXCEPTION WHEN insufficient_privilege THEN
+            RAISE NOTICE 'pg_trgm unavailable, qname substring search is unindexed';
+        END
+        $$
+        """
+    ).execute_if(dialect="postgresql"),
+)
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class EventBlocklistName(Base):
+    """
+    Every blocklist_name that appears on a retained dns_query_event.
+    Maintained by ingest and pruned by retention so the /logs blocklist
+    filter reads this table instead of a DISTINCT over the events (see
+    app/services/filter_options.py).
+    """
+
+    __tablename__ = "event_blocklist_names"
+
+    name: Mapped[str] = mapped_column(sa.String(255), primary_key=True)
+    # Seen on at least one non-internal event.
+    has_external_traffic: Mapped[bool] = mapped_column(
+        sa.Boolean(), nullable=False, default=False, server_default=sa.text("false")
+    )
+    last_seen: Mapped[datetime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
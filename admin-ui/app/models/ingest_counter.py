@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+from app.models.query_rollup import LatencyHistogramType
+
+
+def _counter() -> Mapped[int]:
+    return mapped_column(sa.BigInteger(), server_default="0", nullable=False)
+
+
+class IngestCounter(Base):
+    """Monotonic per-node totals of ingested (non-internal) query events.
+
+    Incremented by /api/node-sync/ingest for the rows it actually inserts
+    and never decremented, not even by retention, so /metrics can expose
+    them as real Prometheus counters and histograms. Written by
+    app/services/ingest_counters.py.
+    """
+
+    __tablename__ = "ingest_counters"
+
+    node_id: Mapped[int] = mapped_column(
+        sa.BigInteger(), sa.ForeignKey("nodes.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    queries: Mapped[int] = _counter()
+    blocked: Mapped[int] = _counter()
+    cache_hits: Mapped[int] = _counter()
+    nxdomain: Mapped[int] = _counter()
+    servfail: Mapped[int] = _counter()
+
+    # Counts per INGEST_LATENCY_BOUNDS_MS bucket, upper bound inclusive
+    # (Prometheus ``le`` semantics, unlike the rollup histograms), plus the
+    # latency sum for the histogram's ``_sum`` series.
+    latency_histogram: Mapped[list[int] | None] = mapped_column(LatencyHistogramType, nullable=True)
+    latency_sum_ms: Mapped[int] = _counter()
+
+    updated_at: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True), server_default=sa.text("NOW()"), nullable=False
+    )
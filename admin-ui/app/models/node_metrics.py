@@ -6,30 +6,8 @@ from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base import Base
 
 
-class NodeMetrics(Base):
-    """Stores performance metrics pushed from nodes (sync-agent).
-
-    Each row represents a snapshot of recursor metrics from a node.
-    Prometheus scrapes admin-ui /metrics which aggregates the latest
-    metrics from all nodes.
-    """
-
-    __tablename__ = "node_metrics"
-
-    id: Mapped[int] = mapped_column(sa.BigInteger(), primary_key=True)
-    node_id: Mapped[int] = mapped_column(
-        sa.BigInteger(),
-        sa.ForeignKey("nodes.id", ondelete="CASCADE"),
-        nullable=False,
-        index=True,
-    )
-
-    ts: Mapped[object] = mapped_column(
-        sa.DateTime(timezone=True),
-        server_default=sa.text("NOW()"),
-        nullable=False,
-        index=True,
-    )
+class RecursorMetricsMixin:
+    """Recursor counters and gauges shared by the history and snapshot tables."""
 
     cache_hits: Mapped[int] = mapped_column(sa.BigInteger(), server_default="0", nullable=False)
     cache_misses: Mapped[int] = mapped_column(sa.BigInteger(), server_default="0", nullable=False)
@@ -67,3 +45,30 @@ class NodeMetrics(Base):
     all_outqueries: Mapped[int] = mapped_column(sa.BigInteger(), server_default="0", nullable=False)
 
     uptime_seconds: Mapped[int] = mapped_column(sa.BigInteger(), server_default="0", nullable=False)
+
+
+class NodeMetrics(RecursorMetricsMixin, Base):
+    """Stores performance metrics pushed from nodes (sync-agent).
+
+    Each row represents a snapshot of recursor metrics from a node. The
+    newest row per node is also kept in node_metrics_latest (see
+    app/services/node_metrics.py), which is what the pages and /metrics
+    read.
+    """
+
+    __tablename__ = "node_metrics"
+
+    id: Mapped[int] = mapped_column(sa.BigInteger(), primary_key=True)
+    node_id: Mapped[int] = mapped_column(
+        sa.BigInteger(),
+        sa.ForeignKey("nodes.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+
+    ts: Mapped[object] = mapped_column(
+        sa.DateTime(timezone=True),
+        server_default=sa.text("NOW()"),
+        nullable=False,
+        index=True,
+    )
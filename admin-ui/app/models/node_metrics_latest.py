@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+from app.models.node_metrics import RecursorMetricsMixin
+
+
+class NodeMetricsLatest(RecursorMetricsMixin, Base):
+    """The most recent node_metrics values for each node, one row per node.
+
+    Upserted alongside every node_metrics insert, so "latest metrics per
+    node" is a primary-key read instead of a search of the history.
+    """
+
+    __tablename__ = "node_metrics_latest"
+
+    node_id: Mapped[int] = mapped_column(
+        sa.BigInteger(), sa.ForeignKey("nodes.id", ondelete="CASCADE"), primary_key=True
+    )
+    ts: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
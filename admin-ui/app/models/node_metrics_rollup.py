@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, declared_attr, mapped_column
+
+from app.db.base import Base
+
+
+def _counter() -> Mapped[int]:
+    return mapped_column(sa.BigInteger(), server_default="0", nullable=False)
+
+
+class NodeMetricsRollupMixin:
+    """One node's recursor activity over one bucket.
+
+    Counter columns hold the increase over the bucket (summed sample to
+    sample deltas, restarting from the new value when a counter reset is
+    detected), so ``delta / seconds`` is the average rate. Gauge columns
+    (cache_entries, concurrent_queries, uptime_seconds) hold the bucket's
+    maximum. Written by app/services/node_metrics.py.
+    """
+
+    @declared_attr.directive
+    def __table_args__(cls) -> tuple:
+        return (
+            sa.UniqueConstraint("node_id", "bucket_start", name=f"uq_{cls.__tablename__}_bucket"),
+        )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger(), primary_key=True, autoincrement=True)
+    node_id: Mapped[int] = mapped_column(
+        sa.BigInteger(), sa.ForeignKey("nodes.id", ondelete="CASCADE"), nullable=False
+    )
+    bucket_start: Mapped[datetime] = mapped_column(
+        sa.DateTime(timezone=True), nullable=False, index=True
+    )
+
+    # Sample-to-sample intervals folded into the bucket and the seconds
+    # they cover (the rate denominator), and how many were counter resets.
+    samples: Mapped[int] = mapped_column(sa.Integer(), server_default="0", nullable=False)
+    seconds: Mapped[float] = mapped_column(sa.Float(), server_default="0", nullable=False)
+    resets: Mapped[int] = mapped_column(sa.Integer(), server_default="0", nullable=False)
+
+    cache_hits: Mapped[int] = _counter()
+    cache_misses: Mapped[int] = _counter()
+    packetcache_hits: Mapped[int] = _counter()
+    packetcache_misses: Mapped[int] = _counter()
+    answers_0_1: Mapped[int] = _counter()
+    answers_1_10: Mapped[int] = _counter()
+    answers_10_100: Mapped[int] = _counter()
+    answers_100_1000: Mapped[int] = _counter()
+    answers_slow: Mapped[int] = _counter()
+    outgoing_timeouts: Mapped[int] = _counter()
+    servfail_answers: Mapped[int] = _counter()
+    nxdomain_answers: Mapped[int] = _counter()
+    questions: Mapped[int] = _counter()
+    all_outqueries: Mapped[int] = _counter()
+
+    cache_entries: Mapped[int] = _counter()
+    concurrent_queries: Mapped[int] = _counter()
+    uptime_seconds: Mapped[int] = _counter()
+
+    def rate(self, column: str) -> float:
+        """Average per-second rate of a counter column over the bucket."""
+        return getattr(self, column) / self.seconds if self.seconds else 0.0
+
+
+class NodeMetrics5m(NodeMetricsRollupMixin, Base):
+    """Five-minute node metrics tier, built from raw node_metrics samples."""
+
+    __tablename__ = "node_metrics_5m"
+
+
+class NodeMetrics1h(NodeMetricsRollupMixin, Base):
+    """Hourly node metrics tier, built from the five-minute tier."""
+
+    __tablename__ = "node_metrics_1h"
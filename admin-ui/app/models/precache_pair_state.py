@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class PrecachePairState(Base):
+    """Shortest TTL observed and last warm time per (qname, qtype) pair.
+
+    The shared, persistent copy of the precache TTL state: warm passes
+    in any admin-ui process checkpoint into it and load it before
+    deciding which pairs are due, so a restart or a second worker does
+    not see every pair as due. See app/services/precache.py.
+    """
+
+    __tablename__ = "precache_pair_state"
+
+    qname: Mapped[str] = mapped_column(sa.Text(), primary_key=True)
+    qtype: Mapped[int] = mapped_column(sa.Integer(), primary_key=True)
+    ttl: Mapped[int] = mapped_column(sa.Integer(), nullable=False)
+    last_warmed: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
@@ -3,10 +3,14 @@ from __future__ import annotations
 from datetime import datetime
 
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.base import Base
 
+# bigint[] on PostgreSQL, plain JSON on SQLite (for tests)
+LatencyHistogramType = ARRAY(sa.BigInteger()).with_variant(sa.JSON(), "sqlite")
+
 
 class QueryRollup(Base):
     """
@@ -22,6 +26,10 @@ class QueryRollup(Base):
             "client_id",
             "node_id",
             name="uq_rollup_bucket",
+            # Events without a client or node roll up with NULL ids; those
+            # buckets must still conflict so the rollup upserts stay
+            # idempotent.
+            postgresql_nulls_not_distinct=True,
         ),
         sa.Index("ix_rollup_bucket_start", "bucket_start"),
     )
@@ -46,6 +54,12 @@ class QueryRollup(Base):
     avg_latency_ms: Mapped[int | None] = mapped_column(sa.Integer(), nullable=True)
 
     unique_domains: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    # HyperLogLog sketch of the bucket's qnames (app/services/hll.py), so
+    # distinct domains can be merged across buckets instead of summed.
+    domains_sketch: Mapped[bytes | None] = mapped_column(sa.LargeBinary(), nullable=True)
+    # Latency counts per LATENCY_BUCKET_BOUNDS_MS bucket
+    # (app/services/latency_histogram.py), mergeable for percentiles.
+    latency_histogram: Mapped[list[int] | None] = mapped_column(LatencyHistogramType, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         sa.DateTime(timezone=True), server_default=sa.text("NOW()"), nullable=False
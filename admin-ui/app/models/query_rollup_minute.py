@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+from app.models.query_rollup import LatencyHistogramType
+
+
+class QueryRollupMinute(Base):
+    """
+    Per-minute query counts, split by internal vs. client traffic.
+    Maintained incrementally by the minute rollup job (see
+    app/services/rollups.py) and read by the history charts and the
+    partial-hour edges of the dashboard stats.
+    """
+
+    __tablename__ = "query_rollups_minute"
+    __table_args__ = (
+        sa.UniqueConstraint("bucket_start", "is_internal", name="uq_rollup_minute_bucket"),
+    )
+
+    id: Mapped[int] = mapped_column(sa.BigInteger(), primary_key=True, autoincrement=True)
+
+    bucket_start: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+    is_internal: Mapped[bool] = mapped_column(sa.Boolean(), nullable=False)
+
+    total_queries: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    blocked_queries: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    nxdomain_count: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    servfail_count: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    cache_hits: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    # Fast answers that were not blocked -- the history chart's "cached"
+    # series (blocked answers are fast too, but they are not cache hits).
+    allowed_cache_hits: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    latency_sum_ms: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    unique_domains: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    # HyperLogLog sketch of the bucket's qnames (app/services/hll.py), so
+    # distinct domains can be merged across buckets instead of summed.
+    domains_sketch: Mapped[bytes | None] = mapped_column(sa.LargeBinary(), nullable=True)
+    # Latency counts per LATENCY_BUCKET_BOUNDS_MS bucket
+    # (app/services/latency_histogram.py), mergeable for percentiles.
+    latency_histogram: Mapped[list[int] | None] = mapped_column(LatencyHistogramType, nullable=True)
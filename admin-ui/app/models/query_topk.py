@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class QueryTopK(Base):
+    """
+    Per-hour query counts for the busiest (qname, qtype) pairs, split by
+    blocked and internal traffic. Each hour keeps only its top
+    TOPK_PER_HOUR pairs per (blocked, is_internal); the top-domain views
+    merge the hours of their window (see app/services/top_domains.py).
+    """
+
+    __tablename__ = "query_topk_hourly"
+    __table_args__ = (sa.Index("ix_query_topk_hourly_bucket_start", "bucket_start"),)
+
+    id: Mapped[int] = mapped_column(sa.BigInteger(), primary_key=True, autoincrement=True)
+
+    bucket_start: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+    qname: Mapped[str] = mapped_column(sa.Text(), nullable=False)
+    qtype: Mapped[int] = mapped_column(sa.Integer(), nullable=False)
+    blocked: Mapped[bool] = mapped_column(sa.Boolean(), nullable=False)
+    is_internal: Mapped[bool] = mapped_column(sa.Boolean(), nullable=False)
+
+    query_count: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    # rcode NOERROR answers -- what precache warming ranks by.
+    noerror_count: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
+    # Answers faster than CACHE_HIT_LATENCY_THRESHOLD_MS.
+    cache_hits: Mapped[int] = mapped_column(sa.BigInteger(), default=0, nullable=False)
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class RollupWatermark(Base):
+    """
+    High-water mark of an incrementally maintained rollup tier: every
+    bucket before ``watermark`` has been computed.
+    """
+
+    __tablename__ = "rollup_watermarks"
+
+    name: Mapped[str] = mapped_column(sa.String(32), primary_key=True)
+    watermark: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+    # Highest dns_query_events.id the tier has seen; later ids with older
+    # timestamps are late events (see run_rollup_job).
+    last_event_id: Mapped[int | None] = mapped_column(sa.BigInteger(), nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(
+        sa.DateTime(timezone=True), onupdate=sa.text("NOW()"), nullable=True
+    )
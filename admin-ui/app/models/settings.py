@@ -23,6 +23,15 @@ DEFAULTS = {
     "retention_events_days": "15",
     "retention_rollups_days": "365",
     "retention_node_metrics_days": "365",
+    "retention_config_changes_days": "365",
+    # Non-partitioned tables are purged in primary-key chunks of
+    # retention_batch_size rows, one transaction each, sleeping
+    # retention_batch_sleep_ms between chunks. A run stops after
+    # retention_max_runtime_seconds and the next run resumes where it left
+    # off. See app/services/retention.py.
+    "retention_batch_size": "5000",
+    "retention_batch_sleep_ms": "100",
+    "retention_max_runtime_seconds": "900",
     "rollup_enabled": "true",
     "ptr_resolution_enabled": "true",
     "precache_enabled": "true",
@@ -39,6 +48,10 @@ DEFAULTS = {
     "precache_dns_server": "dnsdist",
     "precache_dns_port": "53",
     "precache_max_queries_per_pass": "2000",
+    # Periodic and manual warm passes: queries in flight at once and a hard
+    # QPS ceiling, over one UDP socket. See app/services/precache_warmer.py.
+    "precache_warm_concurrency": "32",
+    "precache_warm_qps": "200",
     # P9 boot warm burst: readiness-gated burst after stack restart. Paced
     # at precache_boot_burst_qps (a hard ceiling -- jitter only ever adds
     # delay), bounded to precache_boot_burst_concurrency workers, capped at
@@ -90,6 +103,25 @@ def get_retention_node_metrics_days(db) -> int:
     return int(get_setting(db, "retention_node_metrics_days") or "365")
 
 
+def get_retention_config_changes_days(db) -> int:
+    return int(get_setting(db, "retention_config_changes_days") or "365")
+
+
+def get_retention_batch_size(db) -> int:
+    raw = int(get_setting(db, "retention_batch_size") or "5000")
+    return max(100, min(100000, raw))
+
+
+def get_retention_batch_sleep_ms(db) -> int:
+    raw = int(get_setting(db, "retention_batch_sleep_ms") or "100")
+    return max(0, min(10000, raw))
+
+
+def get_retention_max_runtime_seconds(db) -> int:
+    raw = int(get_setting(db, "retention_max_runtime_seconds") or "900")
+    return max(10, raw)
+
+
 def get_precache_enabled(db) -> bool:
     return get_setting(db, "precache_enabled").lower() == "true"
 
@@ -122,6 +154,16 @@ def get_precache_max_queries_per_pass(db) -> int:
     return max(1, int(get_setting(db, "precache_max_queries_per_pass") or "2000"))
 
 
+def get_precache_warm_concurrency(db) -> int:
+    raw = int(get_setting(db, "precache_warm_concurrency") or "32")
+    return max(1, min(256, raw))
+
+
+def get_precache_warm_qps(db) -> float:
+    raw = float(get_setting(db, "precache_warm_qps") or "200")
+    return max(1.0, min(5000.0, raw))
+
+
 def get_precache_boot_burst_enabled(db) -> bool:
     return get_setting(db, "precache_boot_burst_enabled").lower() == "true"
 
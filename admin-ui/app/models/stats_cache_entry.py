@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+# Use JSONB on PostgreSQL, plain JSON on SQLite (for tests)
+JSONVariant = sa.JSON().with_variant(JSONB, "postgresql")
+
+
+class StatsCacheEntry(Base):
+    """
+    Dashboard stats shared between admin-ui processes (see
+    app/services/stats_cache.py). Created UNLOGGED by migration 0027:
+    it is a cache, so losing it on a crash only costs a recomputation.
+    """
+
+    __tablename__ = "stats_cache"
+
+    key: Mapped[str] = mapped_column(sa.String(128), primary_key=True)
+    computed_at: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+    payload: Mapped[dict[str, Any]] = mapped_column(JSONVariant, nullable=False)
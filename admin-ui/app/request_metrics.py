@@ -0,0 +1,74 @@
+"""Per-route latency and SQL statement counts for /metrics.
+
+RequestMetricsMiddleware times every HTTP request and labels it with the
+matched route template (``/api/nodes/{node_id}/metrics``, not the raw
+path), so the label set stays bounded. A SQLAlchemy engine listener
+counts the statements executed while the request is in flight.
+
+The count is carried in a context variable. Sync endpoints and
+dependencies run in a worker thread with a copy of the request's
+context, so the variable holds a mutable counter rather than an int:
+increments made in the thread are seen by the middleware.
+"""
+
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.services.prometheus import Histogram
+
+HTTP_REQUEST_DURATION = Histogram(
+    "powerblockade_http_request_duration_seconds",
+    "HTTP request latency, by method and route template",
+    ["method", "route"],
+)
+HTTP_REQUEST_SQL_STATEMENTS = Histogram(
+    "powerblockade_http_request_sql_statements",
+    "SQL statements executed per HTTP request, by method and route template",
+    ["method", "route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 500),
+)
+
+# Requests that matched no route (404s, probes) share one label value.
+UNMATCHED_ROUTE = "<unmatched>"
+
+_sql_statements: ContextVar[list[int] | None] = ContextVar("sql_statements", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(*_: Any) -> None:
+    counter = _sql_statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware observing request latency and SQL statement count."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0]
+        token = _sql_statements.set(counter)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            _sql_statements.reset(token)
+            # The router records the matched route in the (shared) scope.
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            method = scope.get("method", "GET")
+            HTTP_REQUEST_DURATION.observe(elapsed, method=method, route=route)
+            HTTP_REQUEST_SQL_STATEMENTS.observe(counter[0], method=method, route=route)
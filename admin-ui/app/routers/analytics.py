@@ -1,13 +1,13 @@
 from __future__ import annotations
 
+import json
 from datetime import datetime, timedelta, timezone
-from typing import Literal
+from typing import Any, Literal
 from zoneinfo import ZoneInfo
 
 import sqlalchemy as sa
 from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from sqlalchemy import Row, func
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
@@ -17,11 +17,23 @@ from app.models.client import Client
 from app.models.dns_query_event import DNSQueryEvent
 from app.models.manual_entry import ManualEntry
 from app.models.node import Node
-from app.models.node_metrics import NodeMetrics
 from app.models.settings import get_blocking_state, get_timezone
 from app.routers.auth import get_current_user
 from app.routers.system import compute_health_warnings, load_health_thresholds
-from app.services.rollups import get_dashboard_stats
+from app.services.filter_options import get_blocklist_options, get_client_options
+from app.services.node_metrics import get_latest_node_metrics, get_recent_node_deltas
+from app.services.query_log import (
+    SEARCH_MODES,
+    LogCursor,
+    SearchMode,
+    cached_log_count,
+    estimate_log_events,
+    fetch_log_page,
+    get_log_count,
+    qname_search,
+)
+from app.services.rollups import get_dashboard_stats, get_history_buckets
+from app.services.top_domains import count_top_domains, get_top_domains
 from app.template_utils import get_templates
 
 router = APIRouter()
@@ -66,18 +78,6 @@ def _exclude_internal(query, include_internal: bool = False):
     return query.filter(DNSQueryEvent.is_internal.is_(False))
 
 
-def _get_client_options(db: Session, include_internal: bool = False) -> list[Row]:
-    """Client dropdown rows: clients with at least one non-internal event,
-    unless internal traffic is explicitly included. Returns query rows; callers
-    convert to dicts."""
-    q = db.query(Client.ip, Client.display_name, Client.rdns_name)
-    if not include_internal:
-        q = q.join(DNSQueryEvent, DNSQueryEvent.client_id == Client.id).filter(
-            DNSQueryEvent.is_internal.is_(False)
-        )
-    return q.distinct().order_by(Client.display_name, Client.rdns_name, Client.ip).all()
-
-
 @router.get("/", response_class=HTMLResponse)
 def index_page(request: Request, db: Session = Depends(get_db)):
     user = get_current_user(request, db)
@@ -89,15 +89,12 @@ def index_page(request: Request, db: Session = Depends(get_db)):
     stats = get_dashboard_stats(db, hours=24)
 
     nodes = db.query(Node).filter(Node.status == "active").all()
-    node_data = []
-    for node in nodes:
-        latest = (
-            db.query(NodeMetrics)
-            .filter(NodeMetrics.node_id == node.id)
-            .order_by(NodeMetrics.ts.desc())
-            .first()
-        )
-        node_data.append({"node": node, "metrics": latest})
+    latest_metrics = get_latest_node_metrics(db)
+    recent = get_recent_node_deltas(db)
+    node_data = [
+        {"node": node, "metrics": latest_metrics.get(node.id), "recent": recent.get(node.id)}
+        for node in nodes
+    ]
 
     thresholds = load_health_thresholds(db)
     warnings = compute_health_warnings(node_data, thresholds)
@@ -181,11 +178,95 @@ def _get_blocklist_names(db: Session, domains: set[str]) -> dict[str, str]:
     return result
 
 
+def _log_events_query(
+    db: Session,
+    since: datetime,
+    *,
+    view: str,
+    q: str | None,
+    qmode: SearchMode,
+    client: str | None,
+    rcode: str | None,
+    qtype: str | None,
+    blocked: str | None,
+    blocklist: str | None,
+    include_internal: bool,
+):
+    """Filtered DNSQueryEvent query behind the all/blocked/failures views."""
+    query = db.query(DNSQueryEvent).filter(DNSQueryEvent.ts >= since)
+    query = _exclude_internal(query, include_internal)
+
+    if view == "blocked":
+        blocked = "yes"
+    elif view == "failures":
+        # SERVFAIL and NXDOMAIN; the rcode filter does not apply.
+        query = query.filter(DNSQueryEvent.rcode.in_([2, 3]), DNSQueryEvent.blocked.is_(False))
+        rcode = None
+
+    if q:
+        query = query.filter(qname_search(DNSQueryEvent.qname, q, qmode))
+    if client:
+        query = query.filter(DNSQueryEvent.client_ip == client)
+    if rcode:
+        rcode_val = next((k for k, v in RCODE_NAMES.items() if v == rcode), None)
+        if rcode_val is not None:
+            query = query.filter(DNSQueryEvent.rcode == rcode_val)
+    if qtype:
+        qtype_val = next((k for k, v in QTYPE_NAMES.items() if v == qtype), None)
+        if qtype_val is not None:
+            query = query.filter(DNSQueryEvent.qtype == qtype_val)
+    if blocked == "yes":
+        query = query.filter(DNSQueryEvent.blocked.is_(True))
+    elif blocked == "no":
+        query = query.filter(DNSQueryEvent.blocked.is_(False))
+    if blocklist:
+        query = query.filter(DNSQueryEvent.blocklist_name == blocklist)
+    return query
+
+
+def _log_count_key(
+    *,
+    window: str,
+    view: str,
+    q: str | None,
+    qmode: SearchMode,
+    client: str | None,
+    rcode: str | None,
+    qtype: str | None,
+    blocked: str | None,
+    blocklist: str | None,
+    include_internal: bool,
+) -> str:
+    """Cache key for one /logs filter set; URLs that filter alike share it."""
+    if view == "blocked":
+        blocked = "yes"
+    elif view == "failures":
+        rcode = None
+    q = (q or "").strip()
+    return json.dumps(
+        [
+            window,
+            view if view in ("blocked", "failures") else "all",
+            q,
+            qmode if q else "",
+            client or "",
+            rcode or "",
+            qtype or "",
+            blocked or "",
+            blocklist or "",
+            include_internal,
+        ]
+    )
+
+
 @router.get("/logs", response_class=HTMLResponse)
 def logs_page(
     request: Request,
     page: int = Query(1, ge=1),
+    before: str | None = Query(None),
+    after: str | None = Query(None),
     q: str | None = Query(None),
+    qmode: SearchMode = Query("contains"),
     client: str | None = Query(None),
     window: TimeWindow = Query("24h"),
     rcode: str | None = Query(None),
@@ -212,48 +293,27 @@ def logs_page(
         # Filter to SERVFAIL and NXDOMAIN
         rcode = None  # Clear rcode filter, we'll handle it below
     elif view == "top":
-        query = db.query(
-            DNSQueryEvent.qname,
-            func.count().label("count"),
-            func.sum(func.cast(DNSQueryEvent.blocked, sa.Integer())).label("blocked_count"),
-        ).filter(DNSQueryEvent.ts >= since)
-        query = _exclude_internal(query, include_internal)
-
-        if q:
-            query = query.filter(DNSQueryEvent.qname.ilike(f"%{q}%"))
-        if client:
-            query = query.filter(DNSQueryEvent.client_ip == client)
-        if blocklist:
-            query = query.filter(DNSQueryEvent.blocklist_name == blocklist)
+        top_args: dict[str, Any] = {
+            "include_internal": include_internal,
+            "search": q,
+            "search_mode": qmode,
+            "client_ip": client,
+            "blocklist": blocklist,
+        }
         if top_filter == "blocked":
-            query = query.filter(DNSQueryEvent.blocked.is_(True))
+            top_args["blocked"] = True
         elif top_filter == "allowed":
-            query = query.filter(DNSQueryEvent.blocked.is_(False))
+            top_args["blocked"] = False
 
-        query = query.group_by(DNSQueryEvent.qname).order_by(func.count().desc())
-
-        total = query.count()
+        total = count_top_domains(db, since, **top_args)
         total_pages = (total + DEFAULT_PAGE_SIZE - 1) // DEFAULT_PAGE_SIZE
 
         offset = (page - 1) * DEFAULT_PAGE_SIZE
-        top_domains = query.offset(offset).limit(DEFAULT_PAGE_SIZE).all()
-
-        # Get distinct blocklist names for dropdown (non-internal events only)
-        blocklist_options = [
-            b[0]
-            for b in _exclude_internal(
-                db.query(DNSQueryEvent.blocklist_name).filter(
-                    DNSQueryEvent.blocklist_name.isnot(None)
-                ),
-                include_internal,
-            )
-            .distinct()
-            .order_by(DNSQueryEvent.blocklist_name)
-            .all()
-            if b[0]
-        ]
+        top_domains = get_top_domains(db, since, limit=DEFAULT_PAGE_SIZE, offset=offset, **top_args)
+
+        blocklist_options = get_blocklist_options(db, include_internal)
 
-        all_clients = _get_client_options(db, include_internal)
+        all_clients = get_client_options(db, include_internal)
         client_options = [
             {"ip": c.ip, "label": c.display_name or c.rdns_name or c.ip} for c in all_clients
         ]
@@ -268,6 +328,8 @@ def logs_page(
                 "total_pages": total_pages,
                 "total": total,
                 "q": q or "",
+                "qmode": qmode,
+                "qmode_options": SEARCH_MODES,
                 "client": client or "",
                 "window": window,
                 "blocklist": blocklist or "",
@@ -282,38 +344,45 @@ def logs_page(
         )
 
     # Regular log view (all, blocked, failures)
-    query = db.query(DNSQueryEvent).filter(DNSQueryEvent.ts >= since)
-    query = _exclude_internal(query, include_internal)
-
-    if view == "failures":
-        query = query.filter(DNSQueryEvent.rcode.in_([2, 3]), DNSQueryEvent.blocked.is_(False))
-
-    if q:
-        query = query.filter(DNSQueryEvent.qname.ilike(f"%{q}%"))
-    if client:
-        query = query.filter(DNSQueryEvent.client_ip == client)
-    if rcode:
-        rcode_val = next((k for k, v in RCODE_NAMES.items() if v == rcode), None)
-        if rcode_val is not None:
-            query = query.filter(DNSQueryEvent.rcode == rcode_val)
-    if qtype:
-        qtype_val = next((k for k, v in QTYPE_NAMES.items() if v == qtype), None)
-        if qtype_val is not None:
-            query = query.filter(DNSQueryEvent.qtype == qtype_val)
-    if blocked == "yes":
-        query = query.filter(DNSQueryEvent.blocked.is_(True))
-    elif blocked == "no":
-        query = query.filter(DNSQueryEvent.blocked.is_(False))
-    if blocklist:
-        query = query.filter(DNSQueryEvent.blocklist_name == blocklist)
-
-    total = query.count()
-    total_pages = (total + DEFAULT_PAGE_SIZE - 1) // DEFAULT_PAGE_SIZE
+    query = _log_events_query(
+        db,
+        since,
+        view=view,
+        q=q,
+        qmode=qmode,
+        client=client,
+        rcode=rcode,
+        qtype=qtype,
+        blocked=blocked,
+        blocklist=blocklist,
+        include_internal=include_internal,
+    )
 
-    offset = (page - 1) * DEFAULT_PAGE_SIZE
-    events_raw = (
-        query.order_by(DNSQueryEvent.ts.desc()).offset(offset).limit(DEFAULT_PAGE_SIZE).all()
+    # Keyset pages plus a recently cached exact total or a planner
+    # estimate. The first page of a filter set fetches the exact total from
+    # /api/logs/count after rendering; later pages only on request.
+    count_key = _log_count_key(
+        window=window,
+        view=view,
+        q=q,
+        qmode=qmode,
+        client=client,
+        rcode=rcode,
+        qtype=qtype,
+        blocked=blocked,
+        blocklist=blocklist,
+        include_internal=include_internal,
+    )
+    cached = cached_log_count(count_key)
+    total, total_exact = cached if cached is not None else estimate_log_events(db, query)
+    before_cursor, after_cursor = LogCursor.decode(before), LogCursor.decode(after)
+    log_page = fetch_log_page(
+        query,
+        before=before_cursor,
+        after=after_cursor,
+        page_size=DEFAULT_PAGE_SIZE,
     )
+    events_raw = log_page.events
 
     client_ips = {e.client_ip for e in events_raw}
     labels = _get_client_labels(db, client_ips)
@@ -338,23 +407,12 @@ def logs_page(
             }
         )
 
-    all_clients = _get_client_options(db, include_internal)
+    all_clients = get_client_options(db, include_internal)
     client_options = [
         {"ip": c.ip, "label": c.display_name or c.rdns_name or c.ip} for c in all_clients
     ]
 
-    # Get distinct blocklist names for dropdown (non-internal events only)
-    blocklist_options = [
-        b[0]
-        for b in _exclude_internal(
-            db.query(DNSQueryEvent.blocklist_name).filter(DNSQueryEvent.blocklist_name.isnot(None)),
-            include_internal,
-        )
-        .distinct()
-        .order_by(DNSQueryEvent.blocklist_name)
-        .all()
-        if b[0]
-    ]
+    blocklist_options = get_blocklist_options(db, include_internal)
 
     return templates.TemplateResponse(
         "logs.html",
@@ -362,10 +420,14 @@ def logs_page(
             "request": request,
             "user": user,
             "events": events,
-            "page": page,
-            "total_pages": total_pages,
+            "newer_cursor": log_page.newer.encode() if log_page.newer else "",
+            "older_cursor": log_page.older.encode() if log_page.older else "",
             "total": total,
+            "total_exact": total_exact,
+            "count_on_load": before_cursor is None and after_cursor is None,
             "q": q or "",
+            "qmode": qmode,
+            "qmode_options": SEARCH_MODES,
             "client": client or "",
             "window": window,
             "rcode": rcode or "",
@@ -384,6 +446,59 @@ def logs_page(
     )
 
 
+@router.get("/api/logs/count", response_class=JSONResponse)
+def logs_count(
+    request: Request,
+    q: str | None = Query(None),
+    qmode: SearchMode = Query("contains"),
+    client: str | None = Query(None),
+    window: TimeWindow = Query("24h"),
+    rcode: str | None = Query(None),
+    qtype: str | None = Query(None),
+    blocked: str | None = Query(None),
+    blocklist: str | None = Query(None),
+    view: str = Query("all"),
+    include_internal: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    """Exact total for the /logs filters, loaded after the page renders.
+
+    Cached per filter set for LOG_COUNT_TTL seconds.
+    """
+    user = get_current_user(request, db)
+    if not user:
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+
+    since = datetime.now(timezone.utc) - timedelta(hours=WINDOW_HOURS[window])
+    query = _log_events_query(
+        db,
+        since,
+        view=view,
+        q=q,
+        qmode=qmode,
+        client=client,
+        rcode=rcode,
+        qtype=qtype,
+        blocked=blocked,
+        blocklist=blocklist,
+        include_internal=include_internal,
+    )
+    count_key = _log_count_key(
+        window=window,
+        view=view,
+        q=q,
+        qmode=qmode,
+        client=client,
+        rcode=rcode,
+        qtype=qtype,
+        blocked=blocked,
+        blocklist=blocklist,
+        include_internal=include_internal,
+    )
+    total, exact = get_log_count(db, count_key, query)
+    return JSONResponse({"total": total, "exact": exact})
+
+
 @router.get("/domains", response_class=HTMLResponse)
 def domains_page(
     request: Request,
@@ -398,20 +513,8 @@ def domains_page(
     since = datetime.now(timezone.utc) - timedelta(hours=24)
     offset = (page - 1) * DEFAULT_PAGE_SIZE
 
-    domains = (
-        _exclude_internal(
-            db.query(
-                DNSQueryEvent.qname,
-                func.count().label("count"),
-                func.sum(func.cast(DNSQueryEvent.blocked, sa.Integer())).label("blocked"),
-            ).filter(DNSQueryEvent.ts >= since),
-            include_internal,
-        )
-        .group_by(DNSQueryEvent.qname)
-        .order_by(func.count().desc())
-        .offset(offset)
-        .limit(DEFAULT_PAGE_SIZE)
-        .all()
+    domains = get_top_domains(
+        db, since, include_internal=include_internal, limit=DEFAULT_PAGE_SIZE, offset=offset
     )
 
     return templates.TemplateResponse(
@@ -508,34 +611,11 @@ def analytics_history(
         buckets.append(current)
         current = current + timedelta(minutes=bucket_minutes)
 
-    internal_clause = "" if include_internal else " AND is_internal = false"
-
-    sql = sa.text(f"""
-        SELECT
-            date_trunc('minute', ts) -
-                (EXTRACT(minute FROM ts)::int % :bucket_min) * interval '1 minute' as bucket,
-            COUNT(*) as total,
-            COUNT(*) FILTER (WHERE blocked = true) as blocked,
-            COUNT(*) FILTER (WHERE blocked = false AND latency_ms < 5) as cached
-        FROM dns_query_events
-        WHERE ts >= :since{internal_clause}
-        GROUP BY bucket
-        ORDER BY bucket
-    """)
-
-    result = db.execute(sql, {"bucket_min": bucket_minutes, "since": since})
-    rows = result.fetchall()
-
-    stats_by_bucket: dict[datetime, dict] = {}
-    for row in rows:
-        bucket_ts = row[0]
-        if bucket_ts and bucket_ts.tzinfo is None:
-            bucket_ts = bucket_ts.replace(tzinfo=timezone.utc)
-        stats_by_bucket[bucket_ts] = {
-            "total": row[1] or 0,
-            "blocked": row[2] or 0,
-            "cached": row[3] or 0,
-        }
+    # Whole minutes come from the minute rollup tier; only events newer
+    # than its watermark are grouped from dns_query_events.
+    stats_by_bucket = get_history_buckets(
+        db, buckets[0], bucket_minutes, include_internal=include_internal
+    )
 
     labels: list[str] = []
     total_series: list[int] = []
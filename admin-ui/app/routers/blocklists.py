@@ -107,6 +107,7 @@ def setup_page(request: Request, db: Session = Depends(get_db)):
     from app.models.client_resolver_rule import ClientResolverRule
     from app.models.dns_query_event import DNSQueryEvent
     from app.models.forward_zone import ForwardZone
+    from app.services.recent_events import recent_events
 
     user = get_current_user(request, db)
     if not user:
@@ -116,7 +117,9 @@ def setup_page(request: Request, db: Session = Depends(get_db)):
     has_blocklists = enabled_blocklists > 0
 
     recent_cutoff = datetime.now(timezone.utc) - timedelta(hours=1)
-    recent_queries = db.query(DNSQueryEvent).filter(DNSQueryEvent.ts >= recent_cutoff).count()
+    recent_queries = recent_events.count_since(recent_cutoff)
+    if recent_queries is None:
+        recent_queries = db.query(DNSQueryEvent).filter(DNSQueryEvent.ts >= recent_cutoff).count()
     has_traffic = recent_queries > 0
 
     client_count = db.query(Client).count()
@@ -2,13 +2,12 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import Any, cast
+from typing import Any
 
 from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy.engine import CursorResult
 from sqlalchemy.orm import Session
 
 from app.db.session import SessionLocal, get_db
@@ -17,12 +16,32 @@ from app.models.client import Client
 from app.models.dns_query_event import DNSQueryEvent
 from app.models.forward_zone import ForwardZone
 from app.models.node import Node, NodeStatus
-from app.models.node_metrics import NodeMetrics
 from app.models.settings import get_health_quarantine_threshold_minutes, get_setting
+from app.services.event_stream import broadcaster
+from app.services.filter_options import record_blocklist_names
+from app.services.ingest_counters import record_ingested
+from app.services.node_metrics import record_node_metrics
+from app.services.prometheus import Counter, Histogram
+from app.services.recent_events import recent_events
 from app.settings import get_settings
 
 log = logging.getLogger(__name__)
 
+INGEST_BATCH_EVENTS = Histogram(
+    "powerblockade_ingest_batch_events",
+    "Events per ingest batch as received",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+INGEST_DURATION = Histogram(
+    "powerblockade_ingest_duration_seconds",
+    "Time to validate and store one ingest batch",
+)
+INGEST_EVENTS = Counter(
+    "powerblockade_ingest_events_total",
+    "Ingested events by result (inserted, duplicate, invalid)",
+    ["result"],
+)
+
 
 def get_node_from_api_key(
     x_powerblockade_node_key: str | None = Header(default=None, alias="X-PowerBlockade-Node-Key"),
@@ -362,12 +381,23 @@ def ingest(
     node: Node = Depends(get_node_from_api_key),
     db: Session = Depends(get_db),
 ):
+    # Timed as a whole so empty, all-invalid and failed batches count too.
+    with INGEST_DURATION.time():
+        return _ingest_batch(payload, background_tasks, node, db)
+
+
+def _ingest_batch(
+    payload: IngestRequest, background_tasks: BackgroundTasks, node: Node, db: Session
+) -> dict[str, Any]:
+    INGEST_BATCH_EVENTS.observe(len(payload.events))
     parsed: list[IngestEvent] = []
     for e in payload.events:
         try:
             parsed.append(IngestEvent.model_validate(e))
         except Exception:
             continue
+    if len(parsed) < len(payload.events):
+        INGEST_EVENTS.inc(len(payload.events) - len(parsed), result="invalid")
 
     if not parsed:
         return {"ok": True, "received": 0, "node": node.name}
@@ -399,6 +429,8 @@ def ingest(
 
         client = existing[ev.client_ip]
         client.last_seen = ts
+        if not ev.is_internal:
+            client.has_external_traffic = True
 
         rows_data.append(
             {
@@ -422,12 +454,35 @@ def ingest(
     if rows_data:
         log.info(f"Ingest: node={node.name} (id={node.id}) events={len(rows_data)}")
         stmt = pg_insert(DNSQueryEvent).values(rows_data)
-        stmt = stmt.on_conflict_do_nothing(index_elements=["event_id"])
-        result = cast(CursorResult, db.execute(stmt))
-        inserted = result.rowcount or 0
+        # dns_query_events is partitioned on ts, so the dedup key has to
+        # include it; a retried batch carries the same (event_id, ts).
+        stmt = stmt.on_conflict_do_nothing(index_elements=["event_id", "ts"]).returning(
+            DNSQueryEvent.id,
+            DNSQueryEvent.ts,
+            DNSQueryEvent.client_ip,
+            DNSQueryEvent.qname,
+            DNSQueryEvent.qtype,
+            DNSQueryEvent.blocked,
+            DNSQueryEvent.rcode,
+            DNSQueryEvent.latency_ms,
+            DNSQueryEvent.is_internal,
+        )
+        # RETURNING yields only the inserted rows, so the counters skip
+        # duplicates just like the dedup key does.
+        returned = db.execute(stmt).all()
+        inserted = len(returned)
+        record_ingested(
+            db,
+            node.id,
+            ((r.blocked, r.rcode, r.latency_ms) for r in returned if not r.is_internal),
+        )
+        INGEST_EVENTS.inc(inserted, result="inserted")
+        INGEST_EVENTS.inc(len(rows_data) - inserted, result="duplicate")
         if inserted < len(rows_data):
             log.debug(f"Ingest: {len(rows_data) - inserted} duplicates skipped (event_id conflict)")
+        record_blocklist_names(db, rows_data)
     else:
+        returned = []
         inserted = 0
 
     node.last_seen = datetime.now(timezone.utc)
@@ -435,6 +490,11 @@ def ingest(
     db.add(node)
     db.commit()
 
+    if returned:
+        # Only committed rows go to live viewers.
+        recent_events.extend(returned)
+        broadcaster.notify()
+
     new_ips = [
         ip for ip in unique_ips if ip not in existing or not existing[ip].rdns_last_resolved_at
     ]
@@ -474,27 +534,7 @@ def metrics(
     node.status = "active"
     db.add(node)
 
-    metric = NodeMetrics(
-        node_id=node.id,
-        cache_hits=payload.cache_hits,
-        cache_misses=payload.cache_misses,
-        cache_entries=payload.cache_entries,
-        packetcache_hits=payload.packetcache_hits,
-        packetcache_misses=payload.packetcache_misses,
-        answers_0_1=payload.answers_0_1,
-        answers_1_10=payload.answers_1_10,
-        answers_10_100=payload.answers_10_100,
-        answers_100_1000=payload.answers_100_1000,
-        answers_slow=payload.answers_slow,
-        concurrent_queries=payload.concurrent_queries,
-        outgoing_timeouts=payload.outgoing_timeouts,
-        servfail_answers=payload.servfail_answers,
-        nxdomain_answers=payload.nxdomain_answers,
-        questions=payload.questions,
-        all_outqueries=payload.all_outqueries,
-        uptime_seconds=payload.uptime_seconds,
-    )
-    db.add(metric)
+    record_node_metrics(db, node.id, payload.model_dump())
     db.commit()
 
     return {"ok": True, "node": node.name}
@@ -3,17 +3,18 @@ from __future__ import annotations
 import secrets
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse, Response
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, Form, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
-from app.models.dns_query_event import DNSQueryEvent
 from app.models.node import Node
-from app.models.node_metrics import NodeMetrics
+from app.models.node_metrics_latest import NodeMetricsLatest
+from app.models.settings import get_retention_events_days
 from app.routers.auth import get_current_user
 from app.services.node_generator import generate_secondary_package_zip
+from app.services.node_metrics import get_latest_node_metrics, get_node_metrics_series
+from app.services.rollups import get_node_query_totals
 from app.template_utils import get_templates
 
 router = APIRouter()
@@ -42,16 +43,7 @@ def get_node_status_badge(node: Node) -> tuple[str, str]:
     return ("bg-emerald-900/50 text-emerald-400", "active")
 
 
-def get_latest_metrics(db: Session, node_id: int) -> NodeMetrics | None:
-    return (
-        db.query(NodeMetrics)
-        .filter(NodeMetrics.node_id == node_id)
-        .order_by(NodeMetrics.ts.desc())
-        .first()
-    )
-
-
-def compute_cache_hit_rate(metrics: NodeMetrics | None) -> float | None:
+def compute_cache_hit_rate(metrics: NodeMetricsLatest | None) -> float | None:
     if metrics is None:
         return None
     total = metrics.cache_hits + metrics.cache_misses
@@ -61,22 +53,14 @@ def compute_cache_hit_rate(metrics: NodeMetrics | None) -> float | None:
 
 
 def get_node_query_stats(db: Session) -> dict[int, tuple[int, int]]:
-    stats = (
-        db.query(
-            DNSQueryEvent.node_id,
-            func.count(DNSQueryEvent.id).label("total"),
-            func.count().filter(DNSQueryEvent.blocked.is_(True)).label("blocked"),
-        )
-        .filter(
-            DNSQueryEvent.node_id.isnot(None),
-            # User-facing node stats exclude container-internal traffic
-            # (precache warming etc.), consistent with the analytics views.
-            DNSQueryEvent.is_internal.is_(False),
-        )
-        .group_by(DNSQueryEvent.node_id)
-        .all()
-    )
-    return {row.node_id: (row.total, int(row.blocked or 0)) for row in stats}
+    """(total, blocked) per node over the event retention window.
+
+    Served from query_rollups plus the raw events after the rollup
+    watermark. Like the analytics views, container-internal traffic
+    (precache warming etc.) is excluded.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=get_retention_events_days(db))
+    return get_node_query_totals(db, since)
 
 
 ERROR_MESSAGES = {
@@ -92,10 +76,11 @@ def nodes_page(request: Request, error: str | None = None, db: Session = Depends
 
     nodes = db.query(Node).order_by(Node.created_at.desc()).all()
     query_stats = get_node_query_stats(db)
+    latest_metrics = get_latest_node_metrics(db)
 
     node_data = []
     for node in nodes:
-        metrics = get_latest_metrics(db, node.id)
+        metrics = latest_metrics.get(node.id)
         cache_hit_rate = compute_cache_hit_rate(metrics)
         status_class, status_text = get_node_status_badge(node)
         total, blocked = query_stats.get(node.id, (0, 0))
@@ -125,6 +110,27 @@ def nodes_page(request: Request, error: str | None = None, db: Session = Depends
     )
 
 
+@router.get("/api/nodes/{node_id}/metrics", response_class=JSONResponse)
+def node_metrics_history(
+    request: Request,
+    node_id: int,
+    hours: int = Query(24, ge=1, le=24 * 365),
+    db: Session = Depends(get_db),
+):
+    """Recursor rates and gauges for one node over the last ``hours``.
+
+    Short ranges come from raw samples, longer ones from the 5m and 1h
+    tiers (see get_node_metrics_series).
+    """
+    user = get_current_user(request, db)
+    if not user:
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    tier, points = get_node_metrics_series(db, node_id, since)
+    return JSONResponse({"node_id": node_id, "hours": hours, "tier": tier, "points": points})
+
+
 @router.post("/nodes/generate")
 def nodes_generate(
     request: Request,
@@ -1,15 +1,11 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
-
 import dns.rdatatype
-import sqlalchemy as sa
 from fastapi import APIRouter, BackgroundTasks, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
-from app.models.dns_query_event import DNSQueryEvent
 from app.models.settings import (
     get_precache_boot_burst_concurrency,
     get_precache_boot_burst_enabled,
@@ -22,15 +18,18 @@ from app.models.settings import (
     get_precache_ignore_ttl,
     get_precache_max_queries_per_pass,
     get_precache_refresh_minutes,
+    get_precache_warm_concurrency,
+    get_precache_warm_qps,
     set_setting,
 )
 from app.routers.auth import get_current_user
 from app.services.boot_burst import get_last_boot_burst
 from app.services.precache import (
+    get_precache_page_stats,
     get_precache_stats,
     get_top_pairs_to_warm,
-    warm_cache,
 )
+from app.services.precache_warmer import warm_cache_concurrent
 from app.settings import get_settings
 from app.template_utils import get_templates
 
@@ -44,88 +43,32 @@ def precache_page(request: Request, db: Session = Depends(get_db)):
     if not user:
         return RedirectResponse(url="/login", status_code=302)
 
-    settings = get_settings()
-    threshold = settings.cache_hit_threshold_ms
-    since = datetime.now(timezone.utc) - timedelta(hours=24)
-
-    total = (
-        db.query(sa.func.count(DNSQueryEvent.id))
-        .filter(DNSQueryEvent.ts >= since, DNSQueryEvent.is_internal.is_(False))
-        .scalar()
-        or 0
-    )
-
-    cache_hits = (
-        db.query(sa.func.count(DNSQueryEvent.id))
-        .filter(
-            DNSQueryEvent.ts >= since,
-            DNSQueryEvent.blocked.is_(False),
-            DNSQueryEvent.latency_ms < threshold,
-            DNSQueryEvent.is_internal.is_(False),
-        )
-        .scalar()
-        or 0
+    domain_count = get_precache_domain_count(db)
+    page_stats = get_precache_page_stats(
+        db, get_settings().cache_hit_threshold_ms, domain_count, hours=24
     )
-
+    total = page_stats["total"]
+    cache_hits = page_stats["cache_hits"]
     cache_misses = total - cache_hits
     hit_rate = (cache_hits / total * 100) if total > 0 else 0
-
-    avg_latency_hit = (
-        db.query(sa.func.avg(DNSQueryEvent.latency_ms))
-        .filter(
-            DNSQueryEvent.ts >= since,
-            DNSQueryEvent.blocked.is_(False),
-            DNSQueryEvent.latency_ms < threshold,
-            DNSQueryEvent.is_internal.is_(False),
-        )
-        .scalar()
-        or 0
-    )
-
-    avg_latency_miss = (
-        db.query(sa.func.avg(DNSQueryEvent.latency_ms))
-        .filter(
-            DNSQueryEvent.ts >= since,
-            DNSQueryEvent.blocked.is_(False),
-            DNSQueryEvent.latency_ms >= threshold,
-            DNSQueryEvent.is_internal.is_(False),
-        )
-        .scalar()
-        or 0
-    )
-
-    time_saved_per_query = avg_latency_miss - avg_latency_hit
+    time_saved_per_query = page_stats["avg_latency_miss"] - page_stats["avg_latency_hit"]
     time_saved_total = time_saved_per_query * cache_hits
 
-    top_cached = (
-        db.query(DNSQueryEvent.qname, sa.func.count(DNSQueryEvent.id).label("count"))
-        .filter(
-            DNSQueryEvent.ts >= since,
-            DNSQueryEvent.blocked.is_(False),
-            DNSQueryEvent.latency_ms < threshold,
-            DNSQueryEvent.is_internal.is_(False),
-        )
-        .group_by(DNSQueryEvent.qname)
-        .order_by(sa.desc("count"))
-        .limit(10)
-        .all()
-    )
-
     precache_enabled = get_precache_enabled(db)
-    domain_count = get_precache_domain_count(db)
     refresh_minutes = get_precache_refresh_minutes(db)
     ignore_ttl = get_precache_ignore_ttl(db)
     custom_refresh = get_precache_custom_refresh_minutes(db)
     dns_server = get_precache_dns_server(db)
     dns_port = get_precache_dns_port(db)
     max_queries_per_pass = get_precache_max_queries_per_pass(db)
+    warm_concurrency = get_precache_warm_concurrency(db)
+    warm_qps = get_precache_warm_qps(db)
     boot_burst_enabled = get_precache_boot_burst_enabled(db)
     boot_burst_concurrency = get_precache_boot_burst_concurrency(db)
     boot_burst_qps = get_precache_boot_burst_qps(db)
     boot_burst_summary = get_last_boot_burst()
 
-    warmable_pairs = get_top_pairs_to_warm(db, hours=24, limit=domain_count)
-    precache_stats = get_precache_stats()
+    precache_stats = get_precache_stats(db)
     qtype_counts = sorted(precache_stats.get("by_qtype", {}).items(), key=lambda kv: -kv[1])[:5]
     qtype_counts = [(dns.rdatatype.to_text(qtype), count) for qtype, count in qtype_counts]
 
@@ -140,8 +83,8 @@ def precache_page(request: Request, db: Session = Depends(get_db)):
             "hit_rate": hit_rate,
             "time_saved_total": time_saved_total,
             "time_saved_per_query": time_saved_per_query,
-            "top_cached": top_cached,
-            "warmable_count": len(warmable_pairs),
+            "top_cached": page_stats["top_cached"],
+            "warmable_count": page_stats["warmable_count"],
             "qtype_counts": qtype_counts,
             "warming_message": request.query_params.get("warmed"),
             "precache_enabled": precache_enabled,
@@ -152,6 +95,8 @@ def precache_page(request: Request, db: Session = Depends(get_db)):
             "dns_server": dns_server,
             "dns_port": dns_port,
             "max_queries_per_pass": max_queries_per_pass,
+            "warm_concurrency": warm_concurrency,
+            "warm_qps": warm_qps,
             "precache_stats": precache_stats,
             "boot_burst_enabled": boot_burst_enabled,
             "boot_burst_concurrency": boot_burst_concurrency,
@@ -180,8 +125,10 @@ def boot_burst_status(request: Request, db: Session = Depends(get_db)):
     }
 
 
-def _warm_cache_background(pairs: list[tuple[str, int]], dns_server: str, port: int) -> None:
-    warm_cache(pairs, dns_server, port)
+def _warm_cache_background(
+    pairs: list[tuple[str, int]], dns_server: str, port: int, concurrency: int, qps: float
+) -> None:
+    warm_cache_concurrent(pairs, dns_server, port, concurrency=concurrency, qps=qps)
 
 
 @router.post("/precache/warm")
@@ -201,7 +148,14 @@ def trigger_warm_cache(
     pairs = get_top_pairs_to_warm(db, hours=24, limit=domain_count, max_queries=max_queries)
 
     if pairs:
-        background_tasks.add_task(_warm_cache_background, pairs, dns_host, dns_port)
+        background_tasks.add_task(
+            _warm_cache_background,
+            pairs,
+            dns_host,
+            dns_port,
+            get_precache_warm_concurrency(db),
+            get_precache_warm_qps(db),
+        )
         msg = f"Warming {len(pairs)} (name, type) pairs"
     else:
         msg = "No pairs to warm"
@@ -220,6 +174,8 @@ def update_precache_settings(
     custom_refresh: int = Form(60),
     dns_server: str = Form("dnsdist"),
     max_queries_per_pass: int = Form(2000),
+    warm_concurrency: int = Form(32),
+    warm_qps: float = Form(200.0),
     boot_burst_enabled: str = Form("false"),
     boot_burst_concurrency: int = Form(8),
     boot_burst_qps: float = Form(50.0),
@@ -235,6 +191,8 @@ def update_precache_settings(
     dns_server = dns_server.strip() or "dnsdist"
     # Same clamps as the settings getters, so a saved value can never be
     # read back differently than it was written.
+    warm_concurrency = max(1, min(256, warm_concurrency))
+    warm_qps = max(1.0, min(5000.0, warm_qps))
     boot_burst_concurrency = max(1, min(64, boot_burst_concurrency))
     boot_burst_qps = max(1.0, min(1000.0, boot_burst_qps))
 
@@ -245,6 +203,8 @@ def update_precache_settings(
     set_setting(db, "precache_custom_refresh_minutes", str(custom_refresh))
     set_setting(db, "precache_dns_server", dns_server)
     set_setting(db, "precache_max_queries_per_pass", str(max_queries_per_pass))
+    set_setting(db, "precache_warm_concurrency", str(warm_concurrency))
+    set_setting(db, "precache_warm_qps", str(warm_qps))
     set_setting(
         db, "precache_boot_burst_enabled", "true" if boot_burst_enabled == "true" else "false"
     )
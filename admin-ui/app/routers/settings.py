@@ -84,6 +84,7 @@ def settings_update_retention(
     retention_events_days: int = Form(...),
     retention_rollups_days: int = Form(...),
     retention_node_metrics_days: int = Form(...),
+    retention_config_changes_days: int = Form(...),
     db: Session = Depends(get_db),
 ):
     user = get_current_user(request, db)
@@ -96,6 +97,8 @@ def settings_update_retention(
         set_setting(db, "retention_rollups_days", str(retention_rollups_days))
     if retention_node_metrics_days >= 1:
         set_setting(db, "retention_node_metrics_days", str(retention_node_metrics_days))
+    if retention_config_changes_days >= 1:
+        set_setting(db, "retention_config_changes_days", str(retention_config_changes_days))
 
     return RedirectResponse(url="/settings", status_code=302)
 
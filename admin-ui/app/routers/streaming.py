@@ -6,20 +6,21 @@ import asyncio
 import logging
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from sqlalchemy import select
 
 from app.db.session import SessionLocal
-from app.models.dns_query_event import DNSQueryEvent
 from app.models.user import User
+from app.services.event_stream import (
+    StreamFilter,
+    Subscription,
+    broadcaster,
+    fetch_events_after,
+)
 
 router = APIRouter()
 log = logging.getLogger(__name__)
 
-# Track active connections for metrics
-_active_connections: set[WebSocket] = set()
-
-# Polling interval in seconds
-POLL_INTERVAL = 2.0
+# Most events replayed for a client that rewinds with set_last_id.
+REWIND_LIMIT = 500
 
 
 def _validate_session(session_token: str) -> int | None:
@@ -41,51 +42,6 @@ def _validate_session(session_token: str) -> int | None:
         db.close()
 
 
-def _fetch_recent_events(last_id: int, limit: int = 50) -> list[dict]:
-    """Fetch events newer than last_id from database."""
-    db = SessionLocal()
-    try:
-        stmt = (
-            select(DNSQueryEvent)
-            .where(
-                DNSQueryEvent.id > last_id,
-                # Exclude container-internal traffic (precache warming etc.)
-                # from the live dashboard stream; SQL-side filtering lets the
-                # cursor skip internal rows without stalling.
-                DNSQueryEvent.is_internal.is_(False),
-            )
-            .order_by(DNSQueryEvent.id.asc())
-            .limit(limit)
-        )
-        events = db.execute(stmt).scalars().all()
-        return [
-            {
-                "id": e.id,
-                "ts": e.ts.isoformat() if e.ts else None,
-                "client_ip": e.client_ip,
-                "qname": e.qname,
-                "qtype": e.qtype,
-                "rcode": e.rcode,
-                "blocked": e.blocked,
-                "latency_ms": e.latency_ms,
-            }
-            for e in events
-        ]
-    finally:
-        db.close()
-
-
-def _get_max_event_id() -> int:
-    """Get the current maximum event ID."""
-    db = SessionLocal()
-    try:
-        stmt = select(DNSQueryEvent.id).order_by(DNSQueryEvent.id.desc()).limit(1)
-        result = db.execute(stmt).scalar()
-        return result or 0
-    finally:
-        db.close()
-
-
 @router.websocket("/ws/stream")
 async def stream_queries(websocket: WebSocket):
     """Stream new DNS query events in real-time to authenticated clients.
@@ -94,9 +50,17 @@ async def stream_queries(websocket: WebSocket):
     Protocol:
     - Connect with ?user_id=<id>
     - Server sends {"type": "connected", "last_id": N}
-    - Server polls DB every 2s and sends {"type": "events", "data": [...]}
+    - Server sends {"type": "events", "data": [...], "count": N} as new events
+      arrive, at most one batch per BATCH_INTERVAL (one shared poller per
+      process feeds every connection, see app/services/event_stream.py).
+      A batch carries "dropped": N when events were dropped since the
+      previous one (viewer behind, or over its max_rate).
     - Client can send {"type": "ping"} to keep alive
     - Client can send {"type": "set_last_id", "last_id": N} to rewind/forward
+    - Client can send {"type": "set_filter", "filter": {"client_ip": ...,
+      "blocked": true, "qname": "substring", "rcode": 3}, "max_rate": N}
+      to filter server-side and cap the feed at N events/second; the
+      server replies {"type": "filter_updated", ...} or {"type": "error"}
     """
     user_id_param = websocket.query_params.get("user_id")
     if not user_id_param:
@@ -109,48 +73,47 @@ async def stream_queries(websocket: WebSocket):
         return
 
     await websocket.accept()
-    _active_connections.add(websocket)
-    log.info(f"WebSocket client connected (user_id={user_id}), total: {len(_active_connections)}")
-
-    # Start from current max ID (only stream new events)
-    last_id = _get_max_event_id()
+    sub = await broadcaster.subscribe()
+    log.info(f"WebSocket client connected (user_id={user_id}), total: {len(broadcaster)}")
 
+    receive: asyncio.Task | None = None
+    feed: asyncio.Task | None = None
     try:
         await websocket.send_json(
             {
                 "type": "connected",
                 "message": "Streaming active",
-                "last_id": last_id,
+                "last_id": sub.cursor,
             }
         )
 
+        # One loop owns every send, so replies and event batches are never
+        # interleaved: wait for a client message or the next batch.
+        receive = asyncio.create_task(websocket.receive_json())
+        feed = asyncio.create_task(sub.next_batch())
         while True:
-            # Check for incoming messages (non-blocking)
-            try:
-                # Short timeout to check for client messages
-                message = await asyncio.wait_for(websocket.receive_json(), timeout=POLL_INTERVAL)
+            done, _ = await asyncio.wait({receive, feed}, return_when=asyncio.FIRST_COMPLETED)
+
+            if receive in done:
+                message = receive.result()
+                receive = asyncio.create_task(websocket.receive_json())
                 if message.get("type") == "ping":
                     await websocket.send_json({"type": "pong"})
                 elif message.get("type") == "set_last_id":
                     new_last_id = message.get("last_id")
                     if isinstance(new_last_id, int) and new_last_id >= 0:
-                        last_id = new_last_id
-                        await websocket.send_json({"type": "last_id_updated", "last_id": last_id})
-            except asyncio.TimeoutError:
-                # No message received, proceed to poll DB
-                pass
-
-            # Poll for new events
-            events = await asyncio.to_thread(_fetch_recent_events, last_id)
-            if events:
-                last_id = events[-1]["id"]
-                await websocket.send_json(
-                    {
-                        "type": "events",
-                        "data": events,
-                        "count": len(events),
-                    }
-                )
+                        await _rewind(websocket, sub, new_last_id)
+                elif message.get("type") == "set_filter":
+                    await _set_filter(websocket, sub, message)
+
+            if feed in done:
+                events = feed.result()
+                feed = asyncio.create_task(sub.next_batch())
+                batch: dict = {"type": "events", "data": events, "count": len(events)}
+                dropped = sub.take_dropped()
+                if dropped:
+                    batch["dropped"] = dropped
+                await websocket.send_json(batch)
 
     except WebSocketDisconnect:
         log.info(f"WebSocket client disconnected (user_id={user_id})")
@@ -161,10 +124,49 @@ async def stream_queries(websocket: WebSocket):
         except Exception:
             pass
     finally:
-        _active_connections.discard(websocket)
-        log.info(f"WebSocket cleanup, remaining: {len(_active_connections)}")
+        for task in (receive, feed):
+            if task is not None:
+                task.cancel()
+        broadcaster.unsubscribe(sub)
+        if sub.dropped:
+            log.info(f"WebSocket client (user_id={user_id}) fell behind, {sub.dropped} dropped")
+        log.info(f"WebSocket cleanup, remaining: {len(broadcaster)}")
+
+
+async def _rewind(websocket: WebSocket, sub: Subscription, last_id: int) -> None:
+    """Move a viewer's cursor, replaying up to REWIND_LIMIT missed events.
+
+    Only the rewound range is read, once for this viewer; events after the
+    current cursor still come from the shared feed.
+    """
+    if last_id < sub.cursor:
+        replay = await asyncio.to_thread(fetch_events_after, last_id, REWIND_LIMIT)
+        replay = [e for e in replay if e["id"] <= sub.cursor and sub.filter.matches(e)]
+        if replay:
+            await websocket.send_json({"type": "events", "data": replay, "count": len(replay)})
+    else:
+        sub.cursor = last_id
+    await websocket.send_json({"type": "last_id_updated", "last_id": last_id})
+
+
+async def _set_filter(websocket: WebSocket, sub: Subscription, message: dict) -> None:
+    """Replace a viewer's filter and max rate (events/second, null for none)."""
+    max_rate = message.get("max_rate")
+    try:
+        stream_filter = StreamFilter.from_message(message.get("filter"))
+        if max_rate is not None and (
+            isinstance(max_rate, bool) or not isinstance(max_rate, int | float) or max_rate <= 0
+        ):
+            raise ValueError("max_rate must be a positive number or null")
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "message": str(e)})
+        return
+    sub.configure(stream_filter, max_rate)
+    await websocket.send_json(
+        {"type": "filter_updated", "filter": stream_filter.as_dict(), "max_rate": max_rate}
+    )
 
 
 def get_connection_count() -> int:
     """Return current number of active WebSocket connections."""
-    return len(_active_connections)
+    return len(broadcaster)
@@ -9,7 +9,6 @@ from sqlalchemy.orm import Session
 
 from app.db.session import get_db
 from app.models.node import Node
-from app.models.node_metrics import NodeMetrics
 from app.models.settings import (
     get_health_cache_hit_critical,
     get_health_cache_hit_warning,
@@ -19,7 +18,9 @@ from app.models.settings import (
     get_health_timeout_warning,
 )
 from app.routers.auth import get_current_user
+from app.services.node_metrics import get_latest_node_metrics, get_recent_node_deltas
 from app.settings import get_settings
+from app.sql_profiler import get_sql_profiler
 from app.template_utils import get_templates
 
 router = APIRouter()
@@ -83,6 +84,9 @@ def compute_health_warnings(
     for item in node_data:
         node = item["node"]
         metrics = item["metrics"]
+        # Ratios over the last HEALTH_WINDOW when the node has recent
+        # samples; the cumulative counters since recursor start otherwise.
+        counters = item.get("recent") or metrics
 
         if not metrics:
             warnings.append(
@@ -132,9 +136,9 @@ def compute_health_warnings(
                 )
 
         # Cache hit rate
-        total_queries = metrics.cache_hits + metrics.cache_misses
+        total_queries = counters.cache_hits + counters.cache_misses
         if total_queries > 100:  # Only warn if meaningful sample size
-            hit_rate = (metrics.cache_hits / total_queries) * 100
+            hit_rate = (counters.cache_hits / total_queries) * 100
             if hit_rate < thresholds.cache_hit_critical:
                 warnings.append(
                     HealthWarning(
@@ -160,8 +164,8 @@ def compute_health_warnings(
                 )
 
         # SERVFAIL rate
-        if metrics.questions > 100:
-            servfail_rate = (metrics.servfail_answers / metrics.questions) * 100
+        if counters.questions > 100:
+            servfail_rate = (counters.servfail_answers / counters.questions) * 100
             if servfail_rate > thresholds.servfail_warning:
                 warnings.append(
                     HealthWarning(
@@ -176,8 +180,8 @@ def compute_health_warnings(
                 )
 
         # Timeout rate
-        if metrics.all_outqueries > 100:
-            timeout_rate = (metrics.outgoing_timeouts / metrics.all_outqueries) * 100
+        if counters.all_outqueries > 100:
+            timeout_rate = (counters.outgoing_timeouts / counters.all_outqueries) * 100
             if timeout_rate > thresholds.timeout_warning:
                 warnings.append(
                     HealthWarning(
@@ -193,14 +197,14 @@ def compute_health_warnings(
 
         # Slow answer rate
         total_answers = (
-            metrics.answers_0_1
-            + metrics.answers_1_10
-            + metrics.answers_10_100
-            + metrics.answers_100_1000
-            + metrics.answers_slow
+            counters.answers_0_1
+            + counters.answers_1_10
+            + counters.answers_10_100
+            + counters.answers_100_1000
+            + counters.answers_slow
         )
         if total_answers > 100:
-            slow_rate = (metrics.answers_slow / total_answers) * 100
+            slow_rate = (counters.answers_slow / total_answers) * 100
             if slow_rate > thresholds.slow_warning:
                 warnings.append(
                     HealthWarning(
@@ -224,20 +228,18 @@ def system_health(request: Request, db: Session = Depends(get_db)):
 
     nodes = db.query(Node).filter(Node.status == "active").all()
 
-    node_data = []
-    for node in nodes:
-        latest = (
-            db.query(NodeMetrics)
-            .filter(NodeMetrics.node_id == node.id)
-            .order_by(NodeMetrics.ts.desc())
-            .first()
-        )
-        node_data.append({"node": node, "metrics": latest})
+    latest_metrics = get_latest_node_metrics(db)
+    recent = get_recent_node_deltas(db)
+    node_data = [
+        {"node": node, "metrics": latest_metrics.get(node.id), "recent": recent.get(node.id)}
+        for node in nodes
+    ]
 
     thresholds = load_health_thresholds(db)
     warnings = compute_health_warnings(node_data, thresholds)
 
     settings = get_settings()
+    sql_profiler = get_sql_profiler()
 
     return templates.TemplateResponse(
         "system.html",
@@ -251,5 +253,7 @@ def system_health(request: Request, db: Session = Depends(get_db)):
             if len(settings.pb_git_sha) > 7
             else settings.pb_git_sha,
             "build_date": settings.pb_build_date,
+            "sql_profiling": sql_profiler is not None,
+            "slow_queries": sql_profiler.recent_slow_queries() if sql_profiler else [],
         },
     )
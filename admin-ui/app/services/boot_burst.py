@@ -66,8 +66,10 @@ from app.models.settings import (
 from app.services.precache import (
     PairWarmOutcome,
     build_warm_query,
+    checkpoint_pair_ttl_state,
     get_pairs_needing_refresh,
     get_top_pairs_to_warm,
+    load_pair_ttl_state,
     record_warmed_pair,
     warm_pair_ex,
 )
@@ -129,12 +131,21 @@ class QPSPacer:
         self._lock = threading.Lock()
         self._next_slot = clock()
 
-    def wait(self) -> float:
-        """Reserve a slot and sleep until it; returns the planned send time."""
+    def reserve(self) -> float:
+        """Reserve the next slot without sleeping; returns the planned send time.
+
+        For callers that wait on their own clock, e.g. ``asyncio.sleep`` in
+        the concurrent warmer (app/services/precache_warmer.py).
+        """
         with self._lock:
             slot = max(self._next_slot, self._clock())
             spread = 1.0 + self._rng(0.0, 2.0 * self._jitter_ratio)
             self._next_slot = slot + self._interval * spread
+        return slot
+
+    def wait(self) -> float:
+        """Reserve a slot and sleep until it; returns the planned send time."""
+        slot = self.reserve()
         delay = slot - self._clock()
         if delay > 0:
             self._sleep(delay)
@@ -534,9 +545,11 @@ def _boot_burst_locked(config: BootBurstConfig) -> BootBurstResult:
             _log_summary(_record_result(result))
             return result
 
-        # Respect P7's per-pair TTL cache: pairs warmed recently (e.g. by
-        # another admin-ui instance that held the lock first) are skipped,
-        # then the per-pass ceiling caps how many queries this burst sends.
+        # Respect P7's per-pair TTL cache: pairs warmed recently (before
+        # the restart, or by another admin-ui instance that held the lock
+        # first) are skipped, then the per-pass ceiling caps how many
+        # queries this burst sends.
+        load_pair_ttl_state(db)
         needing = get_pairs_needing_refresh(
             candidates, config.ignore_ttl, config.custom_refresh_minutes
         )
@@ -577,6 +590,11 @@ def _boot_burst_locked(config: BootBurstConfig) -> BootBurstResult:
             log.error(f"Boot warm burst engine error: {e}")
             _record_result(result)
             return result
+        try:
+            checkpoint_pair_ttl_state(db)
+        except Exception as e:
+            # The pairs stay pending for the periodic checkpoint.
+            log.warning(f"Boot warm burst: precache state checkpoint failed: {e}")
         result.status = _status_for(stats, stats.attempted_pairs)
         result.attempted_pairs = stats.attempted_pairs
         result.queries_sent = stats.queries_sent
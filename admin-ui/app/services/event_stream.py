@@ -0,0 +1,344 @@
+"""Fan-out of new DNS query events to live-stream subscribers.
+
+One ``EventBroadcaster`` per process reads events past its cursor and
+publishes each batch to every subscriber, however many /ws/stream
+connections are open. Reads come from the in-memory buffer of recently
+ingested events (app/services/recent_events.py) and only reach
+dns_query_events when the cursor is older than the buffer. Ingest calls
+``notify()`` after each commit so new events go out without waiting for
+the next poll. The producer task starts with the first subscriber and
+stops with the last.
+
+Each subscriber has a bounded queue. A viewer that cannot keep up loses
+its oldest queued events rather than holding memory or stalling the
+producer and the other viewers; ``Subscription.dropped`` counts them.
+
+A subscriber can also narrow its feed with a ``StreamFilter`` and cap it
+at ``max_rate`` events per second. Both apply as events are offered, so
+filtered-out events are never queued or serialized and events over the
+rate are dropped (and counted) rather than sent.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from sqlalchemy import select
+
+from app.db.session import SessionLocal
+from app.models.dns_query_event import DNSQueryEvent
+from app.services.prometheus import Counter
+from app.services.recent_events import recent_events
+
+log = logging.getLogger(__name__)
+
+# Producer polling interval in seconds, and the most rows read per poll.
+# A full batch means the producer is behind, so it polls again at once.
+POLL_INTERVAL = 2.0
+FETCH_LIMIT = 500
+# Events queued per subscriber before the oldest are dropped.
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Seconds between batches sent to one viewer; events arriving in between
+# are coalesced into the next batch.
+BATCH_INTERVAL = 0.25
+
+STREAM_EVENTS_DROPPED = Counter(
+    "powerblockade_stream_events_dropped_total",
+    "Live-stream events dropped because a viewer fell behind or hit its max rate",
+)
+
+
+def fetch_events_after(last_id: int, limit: int = FETCH_LIMIT) -> list[dict]:
+    """Non-internal events with id > ``last_id``, oldest first."""
+    buffered = recent_events.events_after(last_id, limit)
+    if buffered is not None:
+        return [e.as_dict() for e in buffered]
+    db = SessionLocal()
+    try:
+        stmt = (
+            select(DNSQueryEvent)
+            .where(
+                DNSQueryEvent.id > last_id,
+                # Exclude container-internal traffic (precache warming etc.)
+                # from the live dashboard stream; SQL-side filtering lets the
+                # cursor skip internal rows without stalling.
+                DNSQueryEvent.is_internal.is_(False),
+            )
+            .order_by(DNSQueryEvent.id.asc())
+            .limit(limit)
+        )
+        return [
+            {
+                "id": e.id,
+                "ts": e.ts.isoformat() if e.ts else None,
+                "client_ip": e.client_ip,
+                "qname": e.qname,
+                "qtype": e.qtype,
+                "rcode": e.rcode,
+                "blocked": e.blocked,
+                "latency_ms": e.latency_ms,
+            }
+            for e in db.execute(stmt).scalars().all()
+        ]
+    finally:
+        db.close()
+
+
+def get_max_event_id() -> int:
+    """The current maximum event ID."""
+    buffered = recent_events.last_id
+    if buffered is not None:
+        return buffered
+    db = SessionLocal()
+    try:
+        stmt = select(DNSQueryEvent.id).order_by(DNSQueryEvent.id.desc()).limit(1)
+        return db.execute(stmt).scalar() or 0
+    finally:
+        db.close()
+
+
+@dataclass(frozen=True)
+class StreamFilter:
+    """Server-side filter for one viewer's feed; unset fields match anything."""
+
+    client_ip: str | None = None
+    blocked: bool | None = None
+    qname: str | None = None  # case-insensitive substring
+    rcode: int | None = None
+
+    @classmethod
+    def from_message(cls, spec: Any) -> StreamFilter:
+        """Parse a client's filter spec; raises ValueError if it is malformed."""
+        if spec is None:
+            return cls()
+        if not isinstance(spec, dict):
+            raise ValueError("filter must be an object")
+        unknown = set(spec) - {"client_ip", "blocked", "qname", "rcode"}
+        if unknown:
+            raise ValueError(f"unknown filter fields: {', '.join(sorted(unknown))}")
+
+        client_ip = spec.get("client_ip") or None
+        blocked = spec.get("blocked")
+        qname = spec.get("qname") or None
+        rcode = spec.get("rcode")
+        if client_ip is not None and not isinstance(client_ip, str):
+            raise ValueError("client_ip must be a string")
+        if blocked is not None and not isinstance(blocked, bool):
+            raise ValueError("blocked must be true, false or null")
+        if qname is not None and not isinstance(qname, str):
+            raise ValueError("qname must be a string")
+        if rcode is not None and (isinstance(rcode, bool) or not isinstance(rcode, int)):
+            raise ValueError("rcode must be an integer")
+        return cls(
+            client_ip=client_ip.strip() if client_ip else None,
+            blocked=blocked,
+            qname=qname.strip().lower().rstrip(".") if qname else None,
+            rcode=rcode,
+        )
+
+    def matches(self, event: dict) -> bool:
+        if self.client_ip is not None and event.get("client_ip") != self.client_ip:
+            return False
+        if self.blocked is not None and bool(event.get("blocked")) != self.blocked:
+            return False
+        if self.qname is not None and self.qname not in (event.get("qname") or ""):
+            return False
+        if self.rcode is not None and event.get("rcode") != self.rcode:
+            return False
+        return True
+
+    def as_dict(self) -> dict[str, Any]:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+class Subscription:
+    """One viewer's bounded, drop-oldest, optionally filtered event queue."""
+
+    def __init__(
+        self,
+        start_id: int,
+        maxsize: int = SUBSCRIBER_QUEUE_SIZE,
+        batch_interval: float = 0.0,
+    ) -> None:
+        # Events with id <= cursor have been delivered (or skipped).
+        self.cursor = start_id
+        self.dropped = 0
+        self.filter = StreamFilter()
+        self.max_rate: float | None = None
+        self.batch_interval = batch_interval
+        self._events: deque[dict] = deque()
+        self._maxsize = maxsize
+        self._ready = asyncio.Event()
+        self._unreported = 0
+        self._last_batch = 0.0
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def configure(self, stream_filter: StreamFilter, max_rate: float | None) -> None:
+        """Apply a new filter and rate; queued events that no longer match go."""
+        self.filter = stream_filter
+        self.max_rate = max_rate
+        self._tokens = self._capacity()
+        self._refilled = time.monotonic()
+        self._events = deque(e for e in self._events if stream_filter.matches(e))
+
+    def offer(self, events: list[dict]) -> None:
+        for event in events:
+            if not self.filter.matches(event):
+                continue
+            if not self._take_token():
+                self._drop()
+                continue
+            if len(self._events) >= self._maxsize:
+                self._events.popleft()
+                self._drop()
+            self._events.append(event)
+        if self._events or self._unreported:
+            self._ready.set()
+
+    def _capacity(self) -> float:
+        # One second of max_rate, but room for at least one event so rates
+        # below 1/s still let an event through every 1/max_rate seconds.
+        return max(1.0, self.max_rate) if self.max_rate is not None else 0.0
+
+    def _take_token(self) -> bool:
+        if self.max_rate is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self._capacity(), self._tokens + (now - self._refilled) * self.max_rate)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _drop(self) -> None:
+        self.dropped += 1
+        self._unreported += 1
+        STREAM_EVENTS_DROPPED.inc()
+
+    def take_dropped(self) -> int:
+        """Events dropped since the last call, for the next batch's report."""
+        dropped, self._unreported = self._unreported, 0
+        return dropped
+
+    async def next_batch(self, max_events: int = FETCH_LIMIT) -> list[dict]:
+        """Wait for events past the cursor and take up to ``max_events``.
+
+        Returns at most one batch per ``batch_interval``, coalescing what
+        arrives in between. The batch may be empty when only drops are
+        left to report.
+        """
+        while True:
+            await self._ready.wait()
+            wait = self._last_batch + self.batch_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            batch: list[dict] = []
+            while self._events and len(batch) < max_events:
+                event = self._events.popleft()
+                if event["id"] > self.cursor:
+                    batch.append(event)
+            if not self._events:
+                self._ready.clear()
+            if batch or self._unreported:
+                if batch:
+                    self.cursor = batch[-1]["id"]
+                self._last_batch = time.monotonic()
+                return batch
+
+
+class EventBroadcaster:
+    def __init__(
+        self,
+        fetch: Callable[[int, int], list[dict]] = fetch_events_after,
+        max_id: Callable[[], int] = get_max_event_id,
+        poll_interval: float = POLL_INTERVAL,
+        fetch_limit: int = FETCH_LIMIT,
+        queue_size: int = SUBSCRIBER_QUEUE_SIZE,
+        batch_interval: float = BATCH_INTERVAL,
+    ) -> None:
+        self._fetch = fetch
+        self._max_id = max_id
+        self.poll_interval = poll_interval
+        self.fetch_limit = fetch_limit
+        self.queue_size = queue_size
+        self.batch_interval = batch_interval
+        self.last_id: int | None = None
+        self._subscribers: set[Subscription] = set()
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def subscribers(self) -> frozenset[Subscription]:
+        return frozenset(self._subscribers)
+
+    async def subscribe(self) -> Subscription:
+        """Register a viewer; it receives events published from now on."""
+        if self.last_id is None:
+            self.last_id = await asyncio.to_thread(self._max_id)
+        sub = Subscription(self.last_id, self.queue_size, self.batch_interval)
+        self._subscribers.add(sub)
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subscribers.discard(sub)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            # The next viewer starts from the then-current max id.
+            self.last_id = None
+
+    def notify(self) -> None:
+        """Wake the producer for new events; safe to call from any thread."""
+        loop, wakeup = self._loop, self._wakeup
+        if self._task is None or loop is None or wakeup is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # The loop has closed (shutdown, or a test's loop).
+            pass
+
+    def publish(self, events: list[dict]) -> None:
+        for sub in list(self._subscribers):
+            sub.offer(events)
+
+    async def _run(self) -> None:
+        wakeup = self._wakeup or asyncio.Event()
+        while self._subscribers:
+            # Cleared before reading, so a notify() landing mid-read is not lost.
+            wakeup.clear()
+            try:
+                events = await asyncio.to_thread(self._fetch, self.last_id or 0, self.fetch_limit)
+            except Exception as e:
+                log.error(f"Event stream poll failed: {e}")
+                events = []
+            if events:
+                self.last_id = events[-1]["id"]
+                self.publish(events)
+            if len(events) < self.fetch_limit:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+
+
+broadcaster = EventBroadcaster()
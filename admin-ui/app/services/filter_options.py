@@ -0,0 +1,127 @@
+"""Client and blocklist options for the analytics filter dropdowns.
+
+The dropdowns only list clients and blocklists that have (non-internal,
+unless internal traffic is included) events. Instead of deriving that
+from dns_query_events on every render, ingest maintains it:
+
+- ``Client.has_external_traffic`` is set when a client sends a
+  non-internal query.
+- ``event_blocklist_names`` gets a row for every blocklist_name seen,
+  flagged the same way.
+
+Both only ever gain entries during ingest. refresh_filter_options(),
+run by the retention job after events expire, clears flags and removes
+names with no events left. It runs one indexed EXISTS probe per client
+and per name, so the tables stay as small as the dropdowns themselves.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, cast
+
+import sqlalchemy as sa
+from sqlalchemy import Row
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import CursorResult
+from sqlalchemy.orm import Session
+
+from app.models.client import Client
+from app.models.dns_query_event import DNSQueryEvent
+from app.models.event_blocklist_name import EventBlocklistName
+
+
+def record_blocklist_names(db: Session, rows: list[dict[str, Any]]) -> None:
+    """Upsert the blocklist names of an ingest batch (PostgreSQL only).
+
+    ``rows`` are dns_query_events insert dicts; the caller commits.
+    """
+    seen: dict[str, tuple[bool, datetime]] = {}
+    for row in rows:
+        name = row.get("blocklist_name")
+        if not name:
+            continue
+        external, last_seen = seen.get(name, (False, row["ts"]))
+        seen[name] = (external or not row["is_internal"], max(last_seen, row["ts"]))
+    if not seen:
+        return
+
+    stmt = pg_insert(EventBlocklistName).values(
+        [
+            {"name": name, "has_external_traffic": external, "last_seen": last_seen}
+            for name, (external, last_seen) in sorted(seen.items())
+        ]
+    )
+    table = EventBlocklistName.__table__
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_={
+                "has_external_traffic": table.c.has_external_traffic
+                | stmt.excluded.has_external_traffic,
+                "last_seen": sa.func.greatest(table.c.last_seen, stmt.excluded.last_seen),
+            },
+        )
+    )
+
+
+def get_client_options(db: Session, include_internal: bool = False) -> list[Row]:
+    """(ip, display_name, rdns_name) rows for the client dropdown."""
+    q = db.query(Client.ip, Client.display_name, Client.rdns_name)
+    if not include_internal:
+        q = q.filter(Client.has_external_traffic.is_(True))
+    return q.order_by(Client.display_name, Client.rdns_name, Client.ip).all()
+
+
+def get_blocklist_options(db: Session, include_internal: bool = False) -> list[str]:
+    """Blocklist names for the blocklist dropdown, sorted."""
+    q = db.query(EventBlocklistName.name)
+    if not include_internal:
+        q = q.filter(EventBlocklistName.has_external_traffic.is_(True))
+    return [name for (name,) in q.order_by(EventBlocklistName.name).all()]
+
+
+def refresh_filter_options(db: Session) -> dict[str, int]:
+    """Drop options whose events have all expired; returns the changes."""
+    external_event = sa.exists().where(
+        DNSQueryEvent.client_ip == Client.ip, DNSQueryEvent.is_internal.is_(False)
+    )
+    clients = cast(
+        CursorResult,
+        db.execute(
+            sa.update(Client)
+            .where(Client.has_external_traffic.is_(True), ~external_event)
+            .values(has_external_traffic=False)
+            .execution_options(synchronize_session=False)
+        ),
+    )
+
+    names_removed = cast(
+        CursorResult,
+        db.execute(
+            sa.delete(EventBlocklistName)
+            .where(~sa.exists().where(DNSQueryEvent.blocklist_name == EventBlocklistName.name))
+            .execution_options(synchronize_session=False)
+        ),
+    )
+    names_internal = cast(
+        CursorResult,
+        db.execute(
+            sa.update(EventBlocklistName)
+            .where(
+                EventBlocklistName.has_external_traffic.is_(True),
+                ~sa.exists().where(
+                    DNSQueryEvent.blocklist_name == EventBlocklistName.name,
+                    DNSQueryEvent.is_internal.is_(False),
+                ),
+            )
+            .values(has_external_traffic=False)
+            .execution_options(synchronize_session=False)
+        ),
+    )
+    db.commit()
+    return {
+        "clients_cleared": clients.rowcount or 0,
+        "blocklist_names_removed": names_removed.rowcount or 0,
+        "blocklist_names_cleared": names_internal.rowcount or 0,
+    }
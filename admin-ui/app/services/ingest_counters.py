@@ -0,0 +1,92 @@
+"""Monotonic per-node query counters for the Prometheus exporter.
+
+The dashboard numbers are windowed (queries in the last 24 hours), which
+Prometheus can only scrape as gauges that go up and down as the window
+slides. ingest_counters instead keeps running totals per node, bumped by
+every ingest batch for the events it actually inserted (duplicates from a
+retried batch are not counted twice) and untouched by retention, so
+``rate(powerblockade_queries_total[5m])`` works as usual.
+
+The latency histogram uses the rollup bucket bounds, but with inclusive
+upper bounds so each bucket maps to a Prometheus ``le`` label.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Iterable
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.ingest_counter import IngestCounter
+from app.models.node import Node
+from app.services.latency_histogram import LATENCY_BUCKET_BOUNDS_MS, histogram_array
+from app.services.rollups import CACHE_HIT_LATENCY_THRESHOLD_MS
+
+INGEST_LATENCY_BOUNDS_MS = LATENCY_BUCKET_BOUNDS_MS
+INGEST_LATENCY_BUCKETS = len(INGEST_LATENCY_BOUNDS_MS) + 1
+
+_COUNTER_COLUMNS = ("queries", "blocked", "cache_hits", "nxdomain", "servfail", "latency_sum_ms")
+
+
+def latency_bucket(latency_ms: int) -> int:
+    """Index of the first bucket whose upper bound is >= ``latency_ms``."""
+    return bisect_left(INGEST_LATENCY_BOUNDS_MS, latency_ms)
+
+
+def record_ingested(
+    db: Session, node_id: int, events: Iterable[tuple[bool, int | None, int | None]]
+) -> int:
+    """Add ``(blocked, rcode, latency_ms)`` events to the node's counters.
+
+    Call with the rows an ingest batch inserted, excluding internal
+    traffic. Runs in the caller's transaction; returns the events counted.
+    """
+    totals = dict.fromkeys(_COUNTER_COLUMNS, 0)
+    histogram = [0] * INGEST_LATENCY_BUCKETS
+    for blocked, rcode, latency_ms in events:
+        totals["queries"] += 1
+        totals["blocked"] += int(bool(blocked))
+        totals["nxdomain"] += int(rcode == 3)
+        totals["servfail"] += int(rcode == 2)
+        if latency_ms is not None:
+            totals["cache_hits"] += int(latency_ms < CACHE_HIT_LATENCY_THRESHOLD_MS)
+            totals["latency_sum_ms"] += latency_ms
+            histogram[latency_bucket(latency_ms)] += 1
+
+    if not totals["queries"]:
+        return 0
+
+    stmt = pg_insert(IngestCounter).values(node_id=node_id, latency_histogram=histogram, **totals)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IngestCounter.node_id],
+        set_={
+            **{
+                column: getattr(IngestCounter, column) + getattr(stmt.excluded, column)
+                for column in _COUNTER_COLUMNS
+            },
+            "latency_histogram": histogram_array(
+                [
+                    func.coalesce(IngestCounter.latency_histogram[i + 1], 0)
+                    + stmt.excluded.latency_histogram[i + 1]
+                    for i in range(INGEST_LATENCY_BUCKETS)
+                ]
+            ),
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt)
+    return totals["queries"]
+
+
+def get_ingest_counters(db: Session) -> list[tuple[str, IngestCounter]]:
+    """(node name, counters) for every node that has ingested any events."""
+    rows = (
+        db.query(Node.name, IngestCounter)
+        .join(Node, Node.id == IngestCounter.node_id)
+        .order_by(Node.name)
+        .all()
+    )
+    return [(name, c) for name, c in rows]
@@ -0,0 +1,78 @@
+"""Fixed log-bucket latency histograms for rollups.
+
+Rollup rows store ``latency_histogram``: one count per bucket of
+``LATENCY_BUCKET_BOUNDS_MS``. Bucket 0 counts latencies below the first
+bound, bucket i counts [bounds[i-1], bounds[i]), and the last bucket
+counts everything at or above the last bound. The bounds are roughly
+logarithmic, so relative resolution is similar from sub-millisecond cache
+hits to multi-second upstream timeouts.
+
+Histograms merge by element-wise addition across any set of buckets,
+nodes and clients, so percentiles for a window never need raw events.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import array
+
+LATENCY_BUCKET_BOUNDS_MS: tuple[int, ...] = (
+    1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200,
+    300, 400, 500, 750, 1000, 1500, 2000, 3000, 5000,
+)  # fmt: skip
+LATENCY_BUCKETS = len(LATENCY_BUCKET_BOUNDS_MS) + 1
+
+# Percentiles reported by get_dashboard_stats and /metrics.
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+def bucket_counts(latency: Any) -> list[Any]:
+    """One ``count(*) FILTER`` per bucket; NULL latencies are not counted."""
+    index = func.width_bucket(latency, array(LATENCY_BUCKET_BOUNDS_MS))
+    return [func.count().filter(index == i) for i in range(LATENCY_BUCKETS)]
+
+
+def histogram_array(counts: Sequence[Any]) -> Any:
+    """Build the bigint[] histogram column from per-bucket counts."""
+    return array([sa.cast(func.coalesce(c, 0), sa.BigInteger()) for c in counts])
+
+
+def merged_counts(histogram: Any) -> list[Any]:
+    """Per-bucket sums of a histogram column (PostgreSQL arrays are 1-based)."""
+    return [func.sum(histogram[i + 1]) for i in range(LATENCY_BUCKETS)]
+
+
+def merge_histograms(*histograms: Sequence[int] | None) -> list[int]:
+    """Element-wise sum; None (or a row without a histogram) counts as empty."""
+    merged = [0] * LATENCY_BUCKETS
+    for histogram in histograms:
+        for i, count in enumerate(histogram or ()):
+            merged[i] += int(count or 0)
+    return merged
+
+
+def latency_percentile(histogram: Sequence[int], pct: float) -> float | None:
+    """Estimate the ``pct`` percentile, interpolating within its bucket.
+
+    Returns None for an empty histogram. Values in the open-ended last
+    bucket are reported as its lower bound.
+    """
+    total = sum(histogram)
+    if total <= 0:
+        return None
+
+    rank = total * pct / 100.0
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            lower = LATENCY_BUCKET_BOUNDS_MS[i - 1] if i > 0 else 0
+            if i >= len(LATENCY_BUCKET_BOUNDS_MS):
+                return float(lower)
+            upper = LATENCY_BUCKET_BOUNDS_MS[i]
+            return round(lower + (upper - lower) * (rank - seen) / count, 1)
+        seen += count
+    return float(LATENCY_BUCKET_BOUNDS_MS[-1])
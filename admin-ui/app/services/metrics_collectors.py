@@ -0,0 +1,203 @@
+"""Database-backed /metrics collectors, registered in the shared REGISTRY.
+
+Windowed dashboard stats are expensive, so their collector is cached and
+recomputed by the scheduler's metrics refresh job; scrapes serve the last
+result. Counters and per-node recursor metrics are primary-key reads (one
+row per node) and are collected on every scrape, so they are never stale.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from sqlalchemy.orm import Session
+
+from app.models.node import Node
+from app.services.ingest_counters import (
+    INGEST_LATENCY_BOUNDS_MS,
+    INGEST_LATENCY_BUCKETS,
+    get_ingest_counters,
+)
+from app.services.latency_histogram import LATENCY_PERCENTILES
+from app.services.node_metrics import get_latest_node_metrics_by_name
+from app.services.prometheus import REGISTRY, CachedCollector, MetricFamily
+from app.services.rollups import get_dashboard_stats
+
+
+class DashboardStatsCollector:
+    """Windowed (24h) rates, latency percentiles and stats-cache health."""
+
+    hours = 24
+
+    def collect(self, db: Session) -> Iterable[MetricFamily]:
+        stats = get_dashboard_stats(db, hours=self.hours)
+
+        def gauge(name: str, help: str, value: float) -> MetricFamily:
+            return MetricFamily(name, "gauge", help).add(value)
+
+        yield gauge(
+            "powerblockade_block_rate",
+            "Block percentage (24h)",
+            round(float(stats.get("blocked_pct", 0)), 2),
+        )
+        yield gauge(
+            "powerblockade_cache_hit_rate",
+            "Cache hit percentage (24h)",
+            round(float(stats.get("cache_hit_pct", 0)), 2),
+        )
+        yield gauge(
+            "powerblockade_time_saved_seconds",
+            "Time saved by cache (24h)",
+            int(float(stats.get("time_saved_ms", 0)) / 1000),
+        )
+        yield gauge(
+            "powerblockade_qps",
+            "Queries per second (24h avg)",
+            round(float(stats.get("qps", 0)), 2),
+        )
+
+        latency = MetricFamily(
+            "powerblockade_query_latency_ms", "gauge", "Query latency percentiles in 24h"
+        )
+        for pct in LATENCY_PERCENTILES:
+            latency.add(stats.get(f"latency_p{pct}_ms") or 0, {"quantile": str(pct / 100)})
+        yield latency
+
+        yield gauge(
+            "powerblockade_stats_cache_age_seconds",
+            "Age of the cached stats in seconds",
+            round(float(stats.get("cache_age_seconds", 0)), 1),
+        )
+        yield gauge(
+            "powerblockade_rollup_lag_seconds",
+            "Seconds since last included rollup bucket",
+            round(float(stats.get("rollup_lag_seconds", 0)), 1),
+        )
+        yield gauge(
+            "powerblockade_stats_edge_delta_total",
+            "Raw edge events included in this sample",
+            int(stats.get("edge_delta_total", 0)),
+        )
+
+
+class IngestCountersCollector:
+    """Monotonic per-node query counters and the query latency histogram."""
+
+    _COUNTERS = (
+        ("powerblockade_queries_total", "queries", "DNS queries ingested"),
+        ("powerblockade_queries_blocked_total", "blocked", "Blocked DNS queries ingested"),
+        ("powerblockade_cache_hits_total", "cache_hits", "Estimated cache hits ingested"),
+        ("powerblockade_queries_nxdomain_total", "nxdomain", "NXDOMAIN answers ingested"),
+        ("powerblockade_queries_servfail_total", "servfail", "SERVFAIL answers ingested"),
+    )
+
+    def collect(self, db: Session) -> Iterable[MetricFamily]:
+        counters = get_ingest_counters(db)
+        for name, column, help in self._COUNTERS:
+            family = MetricFamily(name, "counter", f"{help}, by node")
+            for node, c in counters:
+                family.add(getattr(c, column), {"node": node})
+            yield family
+
+        latency = MetricFamily(
+            "powerblockade_query_latency_seconds",
+            "histogram",
+            "Latency of ingested DNS queries, by node",
+        )
+        bounds = [bound / 1000 for bound in INGEST_LATENCY_BOUNDS_MS]
+        for node, c in counters:
+            latency.add_histogram(
+                bounds,
+                c.latency_histogram or [0] * INGEST_LATENCY_BUCKETS,
+                c.latency_sum_ms / 1000,
+                {"node": node},
+            )
+        yield latency
+
+
+class NodeMetricsCollector:
+    """Each node's latest recursor metrics and sync timestamps."""
+
+    _METRICS = (
+        ("cache_hits", "counter", "Recursor cache hits by node"),
+        ("cache_misses", "counter", "Recursor cache misses by node"),
+        ("cache_entries", "gauge", "Current cache entries by node"),
+        ("concurrent_queries", "gauge", "Current concurrent queries by node"),
+        ("outgoing_timeouts", "counter", "Outgoing query timeouts by node"),
+        ("servfail_answers", "counter", "SERVFAIL responses by node"),
+        ("nxdomain_answers", "counter", "NXDOMAIN responses by node"),
+        ("questions", "counter", "Total questions received by node"),
+        ("all_outqueries", "counter", "Outgoing queries by node"),
+        ("answers_slow", "counter", "Answers slower than one second by node"),
+        ("uptime_seconds", "counter", "Recursor uptime by node"),
+    )
+    # Recursor answer-time buckets, exported under their upper bound in ms.
+    _LATENCY_BUCKETS = (
+        ("1", "answers_0_1"),
+        ("10", "answers_1_10"),
+        ("100", "answers_10_100"),
+        ("1000", "answers_100_1000"),
+        ("+Inf", "answers_slow"),
+    )
+
+    def collect(self, db: Session) -> Iterable[MetricFamily]:
+        node_metrics = get_latest_node_metrics_by_name(db)
+        if node_metrics:
+            for column, type_, help in self._METRICS:
+                family = MetricFamily(f"powerblockade_recursor_{column}", type_, help)
+                for name, m in node_metrics:
+                    family.add(getattr(m, column), {"node": name})
+                yield family
+
+            latency = MetricFamily(
+                "powerblockade_recursor_answers_latency",
+                "counter",
+                "Answer latency buckets by node",
+            )
+            for name, m in node_metrics:
+                for le, column in self._LATENCY_BUCKETS:
+                    latency.add(getattr(m, column), {"node": name, "le": le})
+            yield latency
+
+            scraped = MetricFamily(
+                "powerblockade_recursor_last_scrape_timestamp",
+                "gauge",
+                "Unix time of the latest recursor metrics sample by node",
+            )
+            for name, m in node_metrics:
+                scraped.add(m.ts.timestamp(), {"node": name})
+            yield scraped
+
+        heartbeats = MetricFamily(
+            "powerblockade_node_last_heartbeat_timestamp",
+            "gauge",
+            "Unix time a node was last seen by the primary",
+        )
+        for name, last_seen in (
+            db.query(Node.name, Node.last_seen)
+            .filter(Node.last_seen.is_not(None))
+            .order_by(Node.name)
+        ):
+            heartbeats.add(last_seen.timestamp(), {"node": name})
+        yield heartbeats
+
+
+dashboard_collector = CachedCollector(DashboardStatsCollector())
+
+REGISTRY.register(IngestCountersCollector())
+REGISTRY.register(dashboard_collector)
+REGISTRY.register(NodeMetricsCollector())
+
+
+def refresh_metrics(db: Session) -> None:
+    """Recompute the cached collectors (the metrics refresh job)."""
+    dashboard_collector.refresh(db)
+
+
+def render_metrics(db: Session) -> bytes:
+    """The /metrics body: these collectors plus every in-process instrument."""
+    return REGISTRY.render(db)
+
+
+def reset_metrics_cache() -> None:
+    dashboard_collector.clear()
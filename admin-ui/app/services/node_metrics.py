@@ -0,0 +1,341 @@
+"""Recording, downsampling and reading recursor metrics per node.
+
+Every metrics sample is appended to node_metrics and upserted into
+node_metrics_latest, one row per node. Pages and /metrics only need the
+newest sample, so they read the snapshot table and never search the
+history.
+
+Samples are cumulative counters, one a minute per node. The node metrics
+rollup job turns them into two downsampled tiers (node_metrics_5m, built
+from the samples, and node_metrics_1h, built from the 5m tier) holding
+each counter's increase per bucket and the seconds it covers, so rates
+are ``delta / seconds``. A counter that goes backwards, or a node whose
+uptime does, is a reset: the new value is the increase since the
+restart. Raw samples are then only kept for a short window (see
+app/services/retention.py).
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, cast
+
+import sqlalchemy as sa
+from sqlalchemy import Row, case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import CursorResult
+from sqlalchemy.orm import Session
+
+from app.models.node import Node
+from app.models.node_metrics import NodeMetrics
+from app.models.node_metrics_latest import NodeMetricsLatest
+from app.models.node_metrics_rollup import NodeMetrics1h, NodeMetrics5m
+from app.services.rollups import get_rollup_watermark, set_rollup_watermark
+
+METRIC_COLUMNS = tuple(
+    c.name for c in NodeMetricsLatest.__table__.columns if c.name not in ("node_id", "ts")
+)
+GAUGE_COLUMNS = ("cache_entries", "concurrent_queries", "uptime_seconds")
+COUNTER_COLUMNS = tuple(c for c in METRIC_COLUMNS if c not in GAUGE_COLUMNS)
+
+# rollup_watermarks row: the 5m tier is complete before it.
+NODE_METRICS_WATERMARK = "node_metrics_5m"
+# A sample further than this from the node's previous one (agent down,
+# node offline) starts a new series instead of being averaged over the gap.
+MAX_SAMPLE_GAP = timedelta(minutes=15)
+# Raw samples are rolled up in chunks of at most a day, committing after
+# each, so the first run over a long history resumes if interrupted.
+_ROLLUP_CHUNK = timedelta(days=1)
+_FIVE_MINUTES = timedelta(minutes=5)
+_ONE_HOUR = timedelta(hours=1)
+_BUCKET_ORIGIN = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+# get_node_metrics_series() reads raw samples for ranges up to
+# RAW_SERIES_MAX, the 5m tier up to FIVE_MINUTE_SERIES_MAX, else the 1h tier.
+RAW_SERIES_MAX = timedelta(hours=6)
+FIVE_MINUTE_SERIES_MAX = timedelta(days=7)
+
+# Window the health warnings compute their ratios over.
+HEALTH_WINDOW = timedelta(hours=1)
+
+_TIER_COLUMNS = ("samples", "seconds", "resets", *COUNTER_COLUMNS, *GAUGE_COLUMNS)
+
+
+def record_node_metrics(db: Session, node_id: int, values: dict[str, int]) -> NodeMetrics:
+    """Append a node_metrics row and refresh the node's snapshot.
+
+    ``values`` maps METRIC_COLUMNS names to values; missing ones are 0.
+    Both rows get the transaction's now(), and a sample older than the
+    current snapshot does not replace it. The caller commits.
+    """
+    values = {name: int(values.get(name, 0)) for name in METRIC_COLUMNS}
+    metric = NodeMetrics(node_id=node_id, **values)
+    db.add(metric)
+
+    stmt = pg_insert(NodeMetricsLatest).values(node_id=node_id, ts=sa.func.now(), **values)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["node_id"],
+            set_={name: stmt.excluded[name] for name in ("ts", *METRIC_COLUMNS)},
+            where=NodeMetricsLatest.ts <= stmt.excluded.ts,
+        )
+    )
+    return metric
+
+
+def get_latest_node_metrics(db: Session) -> dict[int, NodeMetricsLatest]:
+    """Newest metrics per node id."""
+    return {row.node_id: row for row in db.query(NodeMetricsLatest).all()}
+
+
+def get_latest_node_metrics_by_name(db: Session) -> list[tuple[str, NodeMetricsLatest]]:
+    """(node name, newest metrics) for every node that has reported any."""
+    rows = (
+        db.query(Node.name, NodeMetricsLatest)
+        .join(Node, Node.id == NodeMetricsLatest.node_id)
+        .order_by(Node.name)
+        .all()
+    )
+    return [(name, m) for name, m in rows]
+
+
+# ---------------------------------------------------------------------------
+# Sample deltas and the downsampled tiers
+# ---------------------------------------------------------------------------
+
+
+def _sample_deltas(start: datetime, end: datetime) -> sa.Subquery:
+    """One row per sample in [start, end) with its increase over the previous.
+
+    Columns: node_id, ts, seconds since the previous sample, reset (0/1),
+    every counter's increase and the gauges' values. A node's first
+    sample, or one more than MAX_SAMPLE_GAP after the previous, has no
+    baseline and is left out.
+    """
+    window = {
+        "partition_by": NodeMetrics.node_id,
+        "order_by": (NodeMetrics.ts, NodeMetrics.id),
+    }
+    lagged = (
+        sa.select(
+            NodeMetrics.node_id,
+            NodeMetrics.ts,
+            func.lag(NodeMetrics.ts).over(**window).label("prev_ts"),
+            *[getattr(NodeMetrics, c) for c in (*COUNTER_COLUMNS, *GAUGE_COLUMNS)],
+            *[
+                func.lag(getattr(NodeMetrics, c)).over(**window).label(f"prev_{c}")
+                for c in (*COUNTER_COLUMNS, "uptime_seconds")
+            ],
+        )
+        .where(NodeMetrics.ts >= start - MAX_SAMPLE_GAP, NodeMetrics.ts < end)
+        .subquery()
+    )
+    s = lagged.c
+    # A restarted recursor reports a lower uptime; a lower questions count
+    # catches restarts between two samples that the uptime alone misses.
+    reset = sa.or_(s.uptime_seconds < s.prev_uptime_seconds, s.questions < s.prev_questions)
+    return (
+        sa.select(
+            s.node_id,
+            s.ts,
+            func.extract("epoch", s.ts - s.prev_ts).label("seconds"),
+            case((reset, 1), else_=0).label("reset"),
+            *[
+                case(
+                    (sa.or_(reset, s[c] < s[f"prev_{c}"]), s[c]), else_=s[c] - s[f"prev_{c}"]
+                ).label(c)
+                for c in COUNTER_COLUMNS
+            ],
+            *[s[c] for c in GAUGE_COLUMNS],
+        )
+        .where(
+            s.ts >= start,
+            s.prev_ts.is_not(None),
+            s.ts - s.prev_ts <= MAX_SAMPLE_GAP,
+        )
+        .subquery()
+    )
+
+
+def _bucket(stride: timedelta, column: Any) -> Any:
+    return func.date_bin(
+        sa.literal(stride, sa.Interval()),
+        column,
+        sa.literal(_BUCKET_ORIGIN, sa.DateTime(timezone=True)),
+    )
+
+
+def _upsert_tier(db: Session, model: type, select_stmt: sa.Select) -> int:
+    stmt = pg_insert(model.__table__).from_select(
+        ["node_id", "bucket_start", *_TIER_COLUMNS], select_stmt
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint=f"uq_{model.__tablename__}_bucket",
+        set_={col: stmt.excluded[col] for col in _TIER_COLUMNS},
+    )
+    result = cast(CursorResult, db.execute(stmt.execution_options(preserve_rowcount=True)))
+    return result.rowcount or 0
+
+
+def _upsert_5m(db: Session, start: datetime, end: datetime) -> int:
+    d = _sample_deltas(start, end).c
+    bucket = _bucket(_FIVE_MINUTES, d.ts)
+    return _upsert_tier(
+        db,
+        NodeMetrics5m,
+        sa.select(
+            d.node_id,
+            bucket,
+            func.count(),
+            func.sum(d.seconds),
+            func.sum(d.reset),
+            *[func.sum(d[c]) for c in COUNTER_COLUMNS],
+            *[func.max(d[c]) for c in GAUGE_COLUMNS],
+        ).group_by(d.node_id, bucket),
+    )
+
+
+def _upsert_1h(db: Session, start: datetime, end: datetime) -> int:
+    bucket = _bucket(_ONE_HOUR, NodeMetrics5m.bucket_start)
+    return _upsert_tier(
+        db,
+        NodeMetrics1h,
+        sa.select(
+            NodeMetrics5m.node_id,
+            bucket,
+            func.sum(NodeMetrics5m.samples),
+            func.sum(NodeMetrics5m.seconds),
+            func.sum(NodeMetrics5m.resets),
+            *[func.sum(getattr(NodeMetrics5m, c)) for c in COUNTER_COLUMNS],
+            *[func.max(getattr(NodeMetrics5m, c)) for c in GAUGE_COLUMNS],
+        )
+        .where(NodeMetrics5m.bucket_start >= start, NodeMetrics5m.bucket_start < end)
+        .group_by(NodeMetrics5m.node_id, bucket),
+    )
+
+
+def _floor(ts: datetime, stride: timedelta) -> datetime:
+    return ts - (ts - _BUCKET_ORIGIN) % stride
+
+
+def compute_node_metrics_rollups(db: Session, now: datetime | None = None) -> dict[str, int]:
+    """Bring the 5m and 1h tiers up to the last completed five minutes.
+
+    Starts one bucket before the watermark (a sample may have committed
+    late into it) or, on the first run, at the oldest raw sample, and
+    works in chunks of at most a day. The hours a chunk touches are
+    rebuilt from the 5m tier, the current hour included, so the hourly
+    tier trails by at most one run. Returns the rows written per tier.
+    """
+    end = _floor(now or datetime.now(timezone.utc), _FIVE_MINUTES)
+    watermark = get_rollup_watermark(db, NODE_METRICS_WATERMARK)
+    if watermark is not None:
+        start = watermark - _FIVE_MINUTES
+    else:
+        oldest = db.query(func.min(NodeMetrics.ts)).scalar()
+        if oldest is None:
+            return {"5m": 0, "1h": 0}
+        start = _floor(oldest, _FIVE_MINUTES)
+
+    written = {"5m": 0, "1h": 0}
+    while start < end:
+        chunk_end = min(start + _ROLLUP_CHUNK, end)
+        written["5m"] += _upsert_5m(db, start, chunk_end)
+        written["1h"] += _upsert_1h(
+            db, _floor(start, _ONE_HOUR), _floor(chunk_end - _FIVE_MINUTES, _ONE_HOUR) + _ONE_HOUR
+        )
+        set_rollup_watermark(db, NODE_METRICS_WATERMARK, chunk_end)
+        db.commit()
+        start = chunk_end
+
+    return written
+
+
+def raw_node_metrics_cutoff(db: Session, keep: timedelta, fallback: timedelta) -> datetime:
+    """Oldest raw sample time that may be purged after keeping ``keep``.
+
+    Samples the 5m tier has not covered yet (plus the previous sample it
+    needs as a baseline) are kept; before the rollup job has ever run,
+    ``fallback`` applies instead.
+    """
+    now = datetime.now(timezone.utc)
+    watermark = get_rollup_watermark(db, NODE_METRICS_WATERMARK)
+    if watermark is None:
+        return now - fallback
+    return min(now - keep, watermark - _FIVE_MINUTES - MAX_SAMPLE_GAP)
+
+
+# ---------------------------------------------------------------------------
+# Reads
+# ---------------------------------------------------------------------------
+
+
+def get_recent_node_deltas(
+    db: Session, window: timedelta = HEALTH_WINDOW, now: datetime | None = None
+) -> dict[int, Row]:
+    """Counter increases per node over the last ``window``.
+
+    Rows have a ``seconds`` attribute and one per COUNTER_COLUMNS name,
+    so ratios such as cache hits over lookups describe recent behaviour
+    instead of everything since the recursor started.
+    """
+    now = now or datetime.now(timezone.utc)
+    d = _sample_deltas(now - window, now).c
+    rows = db.execute(
+        sa.select(
+            d.node_id,
+            func.sum(d.seconds).label("seconds"),
+            *[sa.cast(func.sum(d[c]), sa.BigInteger()).label(c) for c in COUNTER_COLUMNS],
+        ).group_by(d.node_id)
+    ).all()
+    return {row.node_id: row for row in rows}
+
+
+def _series_point(row: Any) -> dict[str, Any]:
+    seconds = float(row["seconds"] or 0)
+    return {
+        "ts": row["ts"].isoformat(),
+        "seconds": seconds,
+        "resets": int(row["resets"] or 0),
+        "rates": {c: (int(row[c]) / seconds if seconds else 0.0) for c in COUNTER_COLUMNS},
+        **{c: int(row[c]) for c in GAUGE_COLUMNS},
+    }
+
+
+def get_node_metrics_series(
+    db: Session, node_id: int, since: datetime, until: datetime | None = None
+) -> tuple[str, list[dict[str, Any]]]:
+    """Counter rates and gauges for one node, from the tier that fits the range.
+
+    Returns the tier name ("raw", "5m" or "1h") and the points, oldest
+    first. Each point has per-second ``rates`` for every counter plus the
+    gauge values.
+    """
+    until = until or datetime.now(timezone.utc)
+    span = until - since
+    if span <= RAW_SERIES_MAX:
+        tier = "raw"
+        d = _sample_deltas(since, until).c
+        stmt = sa.select(
+            d.ts,
+            d.seconds,
+            d.reset.label("resets"),
+            *[d[c] for c in (*COUNTER_COLUMNS, *GAUGE_COLUMNS)],
+        ).where(d.node_id == node_id)
+        order = d.ts
+    else:
+        model = NodeMetrics5m if span <= FIVE_MINUTE_SERIES_MAX else NodeMetrics1h
+        tier = "5m" if model is NodeMetrics5m else "1h"
+        stmt = sa.select(
+            model.bucket_start.label("ts"),
+            model.seconds,
+            model.resets,
+            *[getattr(model, c) for c in (*COUNTER_COLUMNS, *GAUGE_COLUMNS)],
+        ).where(
+            model.node_id == node_id,
+            model.bucket_start >= since,
+            model.bucket_start < until,
+        )
+        order = model.bucket_start
+    rows = db.execute(stmt.order_by(order)).mappings().all()
+    return tier, [_series_point(row) for row in rows]
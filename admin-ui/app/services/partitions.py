@@ -0,0 +1,240 @@
+"""Daily range partitions for dns_query_events.
+
+dns_query_events is partitioned by RANGE (ts) with one partition per UTC
+day (``dns_query_events_pYYYYMMDD``) plus a DEFAULT partition that catches
+anything outside the pre-created ranges. Installations upgraded by
+migration 0020 also keep a ``dns_query_events_legacy`` partition holding
+every row that existed before the conversion (FROM MINVALUE).
+
+Retention no longer DELETEs day after day of events: whole daily
+partitions whose upper bound is older than the cutoff are dropped, which
+is a catalog operation with no WAL volume and no vacuum debt. Only the
+legacy and DEFAULT partitions, which are not aligned to days, still have
+expired rows deleted in place. That goes through retention's chunked
+purge_expired_rows, since the legacy partition holds every pre-upgrade
+row and stays partly expired for a whole retention window.
+
+Everything here is a no-op on non-PostgreSQL databases (unit tests run on
+SQLite, where the table is a plain table).
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+EVENTS_TABLE = "dns_query_events"
+DEFAULT_PARTITION = f"{EVENTS_TABLE}_default"
+DAILY_PREFIX = f"{EVENTS_TABLE}_p"
+
+# How many days of partitions to keep created ahead of today.
+PARTITION_PREMAKE_DAYS = 7
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+@dataclass
+class EventPartition:
+    """One partition of dns_query_events and its [start, end) range.
+
+    ``start`` is None for a FROM (MINVALUE) bound; both are None for the
+    DEFAULT partition.
+    """
+
+    name: str
+    start: datetime | None
+    end: datetime | None
+    is_default: bool = False
+
+    @property
+    def is_daily(self) -> bool:
+        return self.name.startswith(DAILY_PREFIX) and self.start is not None
+
+
+def is_partitioned(db: Session) -> bool:
+    """True when dns_query_events is a partitioned PostgreSQL table."""
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    relkind = db.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"),
+        {"t": EVENTS_TABLE},
+    ).scalar()
+    return relkind == "p"
+
+
+def day_floor(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def partition_name(day: datetime) -> str:
+    return f"{DAILY_PREFIX}{day:%Y%m%d}"
+
+
+def _parse_bound(value: str) -> datetime | None:
+    value = value.strip()
+    if value.upper() in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def list_event_partitions(db: Session) -> list[EventPartition]:
+    rows = db.execute(
+        sa.text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:t) ORDER BY c.relname"
+        ),
+        {"t": EVENTS_TABLE},
+    ).all()
+
+    partitions: list[EventPartition] = []
+    for name, bound in rows:
+        if bound == "DEFAULT":
+            partitions.append(EventPartition(name=name, start=None, end=None, is_default=True))
+            continue
+        match = _BOUND_RE.search(bound or "")
+        if not match:
+            log.warning(f"Partitions: cannot parse bound of {name}: {bound!r}")
+            continue
+        partitions.append(
+            EventPartition(
+                name=name, start=_parse_bound(match.group(1)), end=_parse_bound(match.group(2))
+            )
+        )
+    return partitions
+
+
+def _create_daily_partition(db: Session, day: datetime, has_default: bool) -> None:
+    name = partition_name(day)
+    start = day.isoformat()
+    end = (day + timedelta(days=1)).isoformat()
+    create_sql = sa.text(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {EVENTS_TABLE} '
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+    try:
+        with db.begin_nested():
+            db.execute(create_sql)
+        return
+    except DBAPIError:
+        if not has_default:
+            raise
+
+    # The DEFAULT partition already holds rows for this day (typically a
+    # fresh create_all() that ingested before this job first ran).
+    # PostgreSQL refuses to carve the range out of DEFAULT while those rows
+    # sit there, so detach DEFAULT, create the day, move its rows across
+    # and re-attach.
+    log.info(f"Partitions: moving rows for {day:%Y-%m-%d} out of {DEFAULT_PARTITION}")
+    params = {"start": day, "end": day + timedelta(days=1)}
+    with db.begin_nested():
+        db.execute(sa.text(f"ALTER TABLE {EVENTS_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+        db.execute(create_sql)
+        db.execute(
+            sa.text(
+                f"INSERT INTO {EVENTS_TABLE} SELECT * FROM {DEFAULT_PARTITION} "
+                "WHERE ts >= :start AND ts < :end"
+            ),
+            params,
+        )
+        db.execute(
+            sa.text(f"DELETE FROM {DEFAULT_PARTITION} WHERE ts >= :start AND ts < :end"),
+            params,
+        )
+        db.execute(
+            sa.text(f"ALTER TABLE {EVENTS_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+        )
+
+
+def _covered(partitions: list[EventPartition], day: datetime) -> bool:
+    end = day + timedelta(days=1)
+    for p in partitions:
+        if p.is_default or p.end is None:
+            continue
+        if (p.start is None or p.start <= day) and end <= p.end:
+            return True
+    return False
+
+
+def ensure_event_partitions(
+    db: Session, days_ahead: int = PARTITION_PREMAKE_DAYS, now: datetime | None = None
+) -> list[str]:
+    """Create daily partitions from today through ``days_ahead`` days out.
+
+    Days already covered by an existing partition (including the legacy
+    partition after migration 0020) are skipped. Returns the names of the
+    partitions created.
+    """
+    if not is_partitioned(db):
+        return []
+
+    today = day_floor(now or datetime.now(timezone.utc))
+    partitions = list_event_partitions(db)
+    has_default = any(p.is_default for p in partitions)
+
+    created: list[str] = []
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        if _covered(partitions, day):
+            continue
+        _create_daily_partition(db, day, has_default)
+        created.append(partition_name(day))
+    db.commit()
+
+    if created:
+        log.info(f"Partitions: created {len(created)} daily partition(s): {', '.join(created)}")
+    return created
+
+
+def partition_table(name: str) -> sa.TableClause:
+    """Lightweight table for querying one partition by name."""
+    return sa.table(name, sa.column("id"), sa.column("ts"))
+
+
+@dataclass
+class PartitionRetentionResult:
+    partitions_dropped: int = 0
+    rows_dropped_estimate: int = 0
+    # Legacy/DEFAULT partitions holding rows older than the cutoff, for
+    # the caller to purge in chunks.
+    partitions_to_purge: list[str] = field(default_factory=list)
+
+
+def drop_expired_event_partitions(db: Session, cutoff: datetime) -> PartitionRetentionResult:
+    """Apply event retention by dropping whole partitions.
+
+    Partitions whose range ends at or before ``cutoff`` are dropped; the
+    row count reported for them is the planner estimate (counting a day of
+    events just to log it would cost more than the drop). A daily
+    partition straddling the cutoff is kept until it is entirely expired,
+    so up to one extra day of events is retained. The legacy and DEFAULT
+    partitions are not day-aligned; until they expire as a whole they are
+    listed in ``partitions_to_purge`` rather than deleted from here, as
+    one unbounded DELETE over them is what partitioning set out to avoid.
+    """
+    result = PartitionRetentionResult()
+
+    for p in list_event_partitions(db):
+        if not p.is_default and p.end is not None and p.end <= cutoff:
+            estimate = db.execute(
+                sa.text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:t)"),
+                {"t": p.name},
+            ).scalar()
+            db.execute(sa.text(f'ALTER TABLE {EVENTS_TABLE} DETACH PARTITION "{p.name}"'))
+            db.execute(sa.text(f'DROP TABLE "{p.name}"'))
+            db.commit()
+            result.partitions_dropped += 1
+            result.rows_dropped_estimate += max(int(estimate or 0), 0)
+            log.info(f"Partitions: dropped expired partition {p.name}")
+        elif not p.is_daily and (p.start is None or p.start < cutoff):
+            result.partitions_to_purge.append(p.name)
+
+    return result
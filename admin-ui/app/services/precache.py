@@ -1,16 +1,19 @@
 from __future__ import annotations
 
 import logging
+import threading
 import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import cast
+from typing import Any, cast
 
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.db.session import SessionLocal
 from app.models.dns_query_event import DNSQueryEvent
+from app.models.precache_pair_state import PrecachePairState
 from app.models.settings import (
     get_precache_custom_refresh_minutes,
     get_precache_dns_port,
@@ -19,8 +22,12 @@ from app.models.settings import (
     get_precache_enabled,
     get_precache_ignore_ttl,
     get_precache_max_queries_per_pass,
+    get_precache_warm_concurrency,
+    get_precache_warm_qps,
 )
 from app.services.scheduler import run_with_advisory_lock
+from app.services.stats_cache import StatsCache
+from app.services.top_domains import get_top_domains
 
 log = logging.getLogger(__name__)
 
@@ -89,7 +96,21 @@ class PairTTL:
     last_warmed: datetime | None = None
 
 
+# This process's view of the per-pair TTL state. The shared copy lives in
+# precache_pair_state (PostgreSQL): warm passes merge it in before
+# choosing due pairs (load_pair_ttl_state) and write back the pairs they
+# warmed (checkpoint_pair_ttl_state), so restarts and other workers see
+# the same state. Off PostgreSQL (unit tests) the local view is all
+# there is.
 _pair_ttl_cache: dict[tuple[str, int], PairTTL] = {}
+# Pairs warmed since the last checkpoint.
+_dirty_pairs: set[tuple[str, int]] = set()
+_pair_state_lock = threading.Lock()
+
+PAIR_STATE_CHECKPOINT_SECONDS = 60
+# Rows for pairs not warmed in this long are pruned by the warming job.
+PAIR_STATE_RETENTION = timedelta(days=7)
+PAIR_STATE_WRITE_BATCH = 1000
 
 
 def get_top_pairs_to_warm(
@@ -114,21 +135,16 @@ def get_top_pairs_to_warm(
     """
     since = datetime.now(timezone.utc) - timedelta(hours=hours)
 
-    results = (
-        db.query(
-            DNSQueryEvent.qname,
-            DNSQueryEvent.qtype,
-            sa.func.count(DNSQueryEvent.id).label("count"),
-        )
-        .filter(
-            DNSQueryEvent.ts >= since,
-            DNSQueryEvent.blocked.is_(False),
-            DNSQueryEvent.rcode == 0,
-        )
-        .group_by(DNSQueryEvent.qname, DNSQueryEvent.qtype)
-        .order_by(sa.desc("count"))
-        .limit(limit)
-        .all()
+    # Ranked from the hourly top-K tier plus the raw events it does not
+    # cover yet (see app/services/top_domains.py).
+    results = get_top_domains(
+        db,
+        since,
+        by_qtype=True,
+        metric="noerror",
+        blocked=False,
+        include_internal=True,
+        limit=limit,
     )
 
     pairs = [(r.qname, r.qtype) for r in results]
@@ -137,6 +153,72 @@ def get_top_pairs_to_warm(
     return pairs
 
 
+# The /precache page's effectiveness panel, cached briefly: one miss costs
+# one FILTER aggregate over the window plus two top-K tier reads.
+PAGE_STATS_TTL = 30.0  # seconds
+_page_stats_cache = StatsCache(ttl=PAGE_STATS_TTL, max_entries=8)
+
+
+def reset_page_stats_cache() -> None:
+    """Clear the in-process /precache stats cache.  Intended for test use."""
+    _page_stats_cache.clear()
+
+
+def get_cache_effectiveness(db: Session, since: datetime, threshold_ms: int) -> dict[str, Any]:
+    """Cache hit counts and latencies for non-internal events since ``since``.
+
+    A hit is an unblocked answer faster than ``threshold_ms``. All four
+    figures come from a single pass using FILTER clauses.
+    """
+    unblocked = DNSQueryEvent.blocked.is_(False)
+    hit = sa.and_(unblocked, DNSQueryEvent.latency_ms < threshold_ms)
+    miss = sa.and_(unblocked, DNSQueryEvent.latency_ms >= threshold_ms)
+    row = db.execute(
+        sa.select(
+            sa.func.count().label("total"),
+            sa.func.count().filter(hit).label("cache_hits"),
+            sa.func.avg(DNSQueryEvent.latency_ms).filter(hit).label("avg_latency_hit"),
+            sa.func.avg(DNSQueryEvent.latency_ms).filter(miss).label("avg_latency_miss"),
+        ).where(DNSQueryEvent.ts >= since, DNSQueryEvent.is_internal.is_(False))
+    ).one()
+    return {
+        "total": int(row.total or 0),
+        "cache_hits": int(row.cache_hits or 0),
+        "avg_latency_hit": float(row.avg_latency_hit or 0),
+        "avg_latency_miss": float(row.avg_latency_miss or 0),
+    }
+
+
+def get_precache_page_stats(
+    db: Session, threshold_ms: int, domain_count: int, hours: int = 24
+) -> dict[str, Any]:
+    """Effectiveness, top cached domains and warmable pair count, cached.
+
+    Cached for PAGE_STATS_TTL seconds per (window, threshold, domain
+    count), shared across workers like the dashboard stats.
+    """
+
+    def compute() -> dict[str, Any]:
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        stats = get_cache_effectiveness(db, since, threshold_ms)
+        stats["top_cached"] = [
+            [r.qname, r.count]
+            for r in get_top_domains(
+                db,
+                since,
+                metric="cache_hits",
+                blocked=False,
+                cache_hit_threshold_ms=threshold_ms,
+                limit=10,
+            )
+        ]
+        stats["warmable_count"] = len(get_top_pairs_to_warm(db, hours=hours, limit=domain_count))
+        return stats
+
+    key = f"precache:{hours}:{threshold_ms}:{domain_count}"
+    return dict(_page_stats_cache.get_or_compute(db, key, compute).value)
+
+
 def get_top_domains_to_warm(db: Session, hours: int = 24, limit: int = 1000) -> list[str]:
     """Unique qnames from the top pairs, in ranked order.
 
@@ -225,20 +307,24 @@ def warm_pair_ex(
         query = build_warm_query(qname, qtype)
         resolved_server = _resolve_dns_server(dns_server)
         response = dns.query.udp(query, resolved_server, port=port, timeout=5)
-
-        if response.rcode() != 0:
-            log.debug(f"Warm query for {qname}/{qtype} returned rcode {response.rcode()}")
-            return PairWarmOutcome(ttl=None, error=f"rcode {response.rcode()}")
-
-        ttl = _min_response_ttl(response)
-        if ttl is None:
-            return PairWarmOutcome(ttl=DEFAULT_FALLBACK_TTL, error=None)
-        return PairWarmOutcome(ttl=ttl, error=None)
+        return warm_outcome(qname, qtype, response)
     except Exception as e:
         log.debug(f"Failed to warm {qname}/{qtype}: {e}")
         return PairWarmOutcome(ttl=None, error=str(e)[:200])
 
 
+def warm_outcome(qname: str, qtype: int, response) -> PairWarmOutcome:
+    """Outcome of a warm query from its response (shared with the async warmer)."""
+    if response.rcode() != 0:
+        log.debug(f"Warm query for {qname}/{qtype} returned rcode {response.rcode()}")
+        return PairWarmOutcome(ttl=None, error=f"rcode {response.rcode()}")
+
+    ttl = _min_response_ttl(response)
+    if ttl is None:
+        return PairWarmOutcome(ttl=DEFAULT_FALLBACK_TTL, error=None)
+    return PairWarmOutcome(ttl=ttl, error=None)
+
+
 def warm_pair(qname: str, qtype: int, dns_server: str = "127.0.0.1", port: int = 53) -> int | None:
     """Warm one observed (qname, qtype) pair through the configured edge.
 
@@ -263,12 +349,138 @@ def record_warmed_pair(qname: str, qtype: int, ttl: int) -> None:
     """
     key = (qname, qtype)
     now = datetime.now(timezone.utc)
-    cached = _pair_ttl_cache.get(key)
-    if cached is None:
-        _pair_ttl_cache[key] = PairTTL(qname=qname, qtype=qtype, ttl=ttl, last_warmed=now)
-    else:
-        cached.ttl = min(cached.ttl, ttl)
-        cached.last_warmed = now
+    with _pair_state_lock:
+        cached = _pair_ttl_cache.get(key)
+        if cached is None:
+            _pair_ttl_cache[key] = PairTTL(qname=qname, qtype=qtype, ttl=ttl, last_warmed=now)
+        else:
+            cached.ttl = min(cached.ttl, ttl)
+            cached.last_warmed = now
+        _dirty_pairs.add(key)
+
+
+def reset_pair_ttl_state() -> None:
+    """Forget this process's pair view and pending checkpoint.  Intended for test use."""
+    with _pair_state_lock:
+        _pair_ttl_cache.clear()
+        _dirty_pairs.clear()
+
+
+def _pair_state_shared(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def load_pair_ttl_state(db: Session) -> int:
+    """Merge the shared pair state into this process's view; returns rows read.
+
+    Same rule as record_warmed_pair(): the shorter TTL and the later warm
+    time win, so merging never makes a pair look fresher than any
+    process has seen it.
+    """
+    if not _pair_state_shared(db):
+        return 0
+    rows = db.execute(
+        sa.select(
+            PrecachePairState.qname,
+            PrecachePairState.qtype,
+            PrecachePairState.ttl,
+            PrecachePairState.last_warmed,
+        )
+    ).all()
+    with _pair_state_lock:
+        for row in rows:
+            cached = _pair_ttl_cache.get((row.qname, row.qtype))
+            if cached is None:
+                _pair_ttl_cache[(row.qname, row.qtype)] = PairTTL(
+                    qname=row.qname, qtype=row.qtype, ttl=row.ttl, last_warmed=row.last_warmed
+                )
+                continue
+            cached.ttl = min(cached.ttl, row.ttl)
+            if cached.last_warmed is None or row.last_warmed > cached.last_warmed:
+                cached.last_warmed = row.last_warmed
+    return len(rows)
+
+
+def checkpoint_pair_ttl_state(db: Session) -> int:
+    """Write pairs warmed since the last checkpoint to the shared table.
+
+    Commits; returns the rows written. On failure the pairs stay dirty
+    for the next checkpoint.
+    """
+    if not _pair_state_shared(db):
+        return 0
+    with _pair_state_lock:
+        keys = sorted(_dirty_pairs)
+        _dirty_pairs.clear()
+        rows = [
+            {
+                "qname": cached.qname,
+                "qtype": cached.qtype,
+                "ttl": cached.ttl,
+                "last_warmed": cached.last_warmed,
+            }
+            for key in keys
+            if (cached := _pair_ttl_cache.get(key)) is not None and cached.last_warmed
+        ]
+    if not rows:
+        return 0
+    try:
+        # Sorted keys keep concurrent checkpoints from deadlocking.
+        for i in range(0, len(rows), PAIR_STATE_WRITE_BATCH):
+            stmt = pg_insert(PrecachePairState).values(rows[i : i + PAIR_STATE_WRITE_BATCH])
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[PrecachePairState.qname, PrecachePairState.qtype],
+                    set_={
+                        "ttl": sa.func.least(PrecachePairState.ttl, stmt.excluded.ttl),
+                        "last_warmed": sa.func.greatest(
+                            PrecachePairState.last_warmed, stmt.excluded.last_warmed
+                        ),
+                    },
+                )
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        with _pair_state_lock:
+            _dirty_pairs.update(keys)
+        raise
+    return len(rows)
+
+
+def prune_pair_ttl_state(db: Session, older_than: timedelta = PAIR_STATE_RETENTION) -> int:
+    """Delete shared rows for pairs not warmed within ``older_than``; commits."""
+    if not _pair_state_shared(db):
+        return 0
+    cutoff = datetime.now(timezone.utc) - older_than
+    deleted = db.execute(
+        sa.delete(PrecachePairState).where(PrecachePairState.last_warmed < cutoff)
+    ).rowcount
+    db.commit()
+    with _pair_state_lock:
+        for key in [
+            k for k, v in _pair_ttl_cache.items() if v.last_warmed and v.last_warmed < cutoff
+        ]:
+            del _pair_ttl_cache[key]
+    return deleted
+
+
+def precache_state_checkpoint_job() -> None:
+    """Checkpoint this process's warmed pairs between and during passes.
+
+    Not advisory-locked: each process flushes its own pending pairs, and
+    the upsert merges them with what other processes wrote.
+    """
+    db = SessionLocal()
+    try:
+        written = checkpoint_pair_ttl_state(db)
+        if written:
+            log.debug(f"Precache state checkpoint: {written} pairs")
+    except Exception as e:
+        log.error(f"Precache state checkpoint failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
 
 
 def warm_cache(
@@ -277,9 +489,12 @@ def warm_cache(
     port: int = 53,
     batch_size: int = BATCH_SIZE,
 ) -> WarmingResult:
-    """Warm the edge cache for a list of (qname, qtype) pairs.
+    """Warm the edge cache for a list of (qname, qtype) pairs, one at a time.
 
-    Queries go through the dnsdist edge (default :53, see warm_pair()).
+    Scheduled and manual passes use the concurrent warmer
+    (app/services/precache_warmer.py); this serial loop remains for small
+    one-off calls. Queries go through the dnsdist edge (default :53, see
+    warm_pair()).
     TTLs are tracked PER PAIR: each (qname, qtype) keeps the shortest TTL
     observed for that pair, so refresh cadence never outlives any TTL the
     pair has actually returned.
@@ -339,6 +554,8 @@ def get_pairs_needing_refresh(
 
 @run_with_advisory_lock("precache_warming")
 def precache_warming_job() -> None:
+    from app.services.precache_warmer import warm_cache_concurrent
+
     db = SessionLocal()
     try:
         if not get_precache_enabled(db):
@@ -351,6 +568,12 @@ def precache_warming_job() -> None:
         ignore_ttl = get_precache_ignore_ttl(db)
         custom_refresh = get_precache_custom_refresh_minutes(db)
         max_queries = get_precache_max_queries_per_pass(db)
+        concurrency = get_precache_warm_concurrency(db)
+        qps = get_precache_warm_qps(db)
+
+        # Pick up what restarts and other processes have warmed.
+        load_pair_ttl_state(db)
+        prune_pair_ttl_state(db)
 
         all_pairs = get_top_pairs_to_warm(db, hours=24, limit=domain_count)
         if not all_pairs:
@@ -371,11 +594,14 @@ def precache_warming_job() -> None:
             f"Warming {len(pairs_to_warm)}/{len(all_pairs)} (qname, qtype) pairs "
             f"(ceiling {max_queries}/pass, TTL-based refresh)"
         )
-        result = warm_cache(pairs_to_warm, dns_server=dns_host, port=dns_port)
+        result = warm_cache_concurrent(
+            pairs_to_warm, dns_server=dns_host, port=dns_port, concurrency=concurrency, qps=qps
+        )
         log.info(
             f"Precache warming completed: {result.success} pairs warmed "
             f"in {result.duration_ms:.0f}ms"
         )
+        checkpoint_pair_ttl_state(db)
 
     except Exception as e:
         log.error(f"Precache warming job failed: {e}")
@@ -383,14 +609,39 @@ def precache_warming_job() -> None:
         db.close()
 
 
-def get_precache_stats() -> dict:
+def get_precache_stats(db: Session) -> dict:
+    """Warmed pair counts, fresh vs expired and by qtype.
+
+    Read from the shared state table, so every process reports the same
+    numbers; off PostgreSQL, from this process's view.
+    """
+    if _pair_state_shared(db):
+        fresh = PrecachePairState.last_warmed > sa.func.now() - sa.func.make_interval(
+            0, 0, 0, 0, 0, 0, PrecachePairState.ttl
+        )
+        rows = db.execute(
+            sa.select(
+                PrecachePairState.qtype,
+                sa.func.count().label("pairs"),
+                sa.func.count().filter(fresh).label("fresh"),
+            ).group_by(PrecachePairState.qtype)
+        ).all()
+        cached_count = sum(r.pairs for r in rows)
+        fresh_count = sum(r.fresh for r in rows)
+        return {
+            "cached_pairs": cached_count,
+            "fresh": fresh_count,
+            "expired": cached_count - fresh_count,
+            "by_qtype": {r.qtype: r.pairs for r in rows},
+        }
+
     now = datetime.now(timezone.utc)
     cached_count = len(_pair_ttl_cache)
     fresh_count = 0
     expired_count = 0
     by_qtype: dict[int, int] = {}
 
-    for info in _pair_ttl_cache.values():
+    for info in list(_pair_ttl_cache.values()):
         by_qtype[info.qtype] = by_qtype.get(info.qtype, 0) + 1
         if info.last_warmed is None:
             expired_count += 1
@@ -0,0 +1,265 @@
+"""Prometheus exposition for /metrics: a registry of collectors.
+
+Modelled on prometheus_client (which is not a dependency): collectors
+return ``MetricFamily`` objects and the registry renders them in the text
+format (0.0.4). A collector that fails is logged and skipped, so one bad
+query does not take the whole scrape down.
+
+Two kinds of collectors are registered in ``REGISTRY``:
+
+- database-backed collectors (app/services/metrics_collectors.py); the
+  expensive ones are wrapped in a ``CachedCollector`` that the scheduler's
+  metrics refresh job recomputes every ``METRICS_REFRESH_SECONDS``;
+- in-process instruments (``Counter``, ``Gauge``, ``Histogram``) that the
+  code paths being measured update directly. They are per process and
+  start from zero on restart, which Prometheus handles as a counter reset.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Protocol
+
+from sqlalchemy.orm import Session
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The refresh job's interval. A cached collector older than
+# METRICS_MAX_AGE (the scheduler is not running, or the job keeps
+# failing) is recomputed by the scrape itself.
+METRICS_REFRESH_SECONDS = 15
+METRICS_MAX_AGE = METRICS_REFRESH_SECONDS * 4
+
+# prometheus_client's default latency buckets, in seconds.
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0,
+)  # fmt: skip
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+@dataclass
+class MetricFamily:
+    """One metric name with its HELP/TYPE header and samples."""
+
+    name: str
+    type: str  # "counter", "gauge" or "histogram"
+    help: str
+    samples: list[tuple[str, dict[str, str], float]] = field(default_factory=list)
+
+    def add(self, value: float, labels: dict[str, str] | None = None) -> MetricFamily:
+        self.samples.append((self.name, labels or {}, value))
+        return self
+
+    def add_histogram(
+        self,
+        bounds: Sequence[float],
+        counts: Sequence[int],
+        total: float,
+        labels: dict[str, str] | None = None,
+    ) -> MetricFamily:
+        """Add one histogram from per-bucket (non-cumulative) counts.
+
+        ``counts`` has one entry per bound plus the overflow bucket.
+        """
+        labels = labels or {}
+        cumulative = 0
+        for bound, count in zip(bounds, counts):
+            cumulative += count
+            self.samples.append(
+                (f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative)
+            )
+        count = sum(counts)
+        self.samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, count))
+        self.samples.append((f"{self.name}_sum", labels, total))
+        self.samples.append((f"{self.name}_count", labels, count))
+        return self
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples:
+            if labels:
+                label_str = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+                name = f"{name}{{{label_str}}}"
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Collector(Protocol):
+    def collect(self, db: Session) -> Iterable[MetricFamily]: ...
+
+
+class CachedCollector:
+    """Serve another collector's last result; ``refresh`` recomputes it."""
+
+    def __init__(self, collector: Collector, max_age: float = METRICS_MAX_AGE) -> None:
+        self.collector = collector
+        self.max_age = max_age
+        self._families: list[MetricFamily] | None = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def age(self) -> float | None:
+        if self._families is None:
+            return None
+        return max(time.monotonic() - self._refreshed_at, 0.0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._families = None
+
+    def refresh(self, db: Session) -> list[MetricFamily]:
+        with self._lock:
+            families = list(self.collector.collect(db))
+            self._families = families
+            self._refreshed_at = time.monotonic()
+            return families
+
+    def collect(self, db: Session) -> list[MetricFamily]:
+        families, age = self._families, self.age()
+        if families is None or age is None or age > self.max_age:
+            return self.refresh(db)
+        return families
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._collectors: list[Collector] = []
+
+    def register(self, collector: Collector) -> Collector:
+        self._collectors.append(collector)
+        return collector
+
+    def collect(self, db: Session) -> list[MetricFamily]:
+        families: list[MetricFamily] = []
+        for collector in self._collectors:
+            try:
+                families.extend(collector.collect(db))
+            except Exception as e:
+                log.warning(f"Metrics collector {type(collector).__name__} failed: {e}")
+                db.rollback()
+        return families
+
+    def render(self, db: Session) -> bytes:
+        text = "\n\n".join(f.render() for f in self.collect(db))
+        return (text + "\n").encode()
+
+
+# ---------------------------------------------------------------------------
+# In-process instruments
+# ---------------------------------------------------------------------------
+
+
+class _Instrument:
+    """Base for instruments: one value per label combination."""
+
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        registry: Registry | None = None,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Instrument):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self, db: Session) -> Iterable[MetricFamily]:
+        family = MetricFamily(self.name, self.type, self.help)
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                family.add(value, self._labels(key))
+        yield family
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Instrument):
+    """Bucketed observations; bucket upper bounds are inclusive (``le``)."""
+
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (per-bucket counts incl. the +Inf overflow, sum)
+        self._values: dict[tuple[str, ...], tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall-clock seconds the ``with`` block takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self, db: Session) -> Iterable[MetricFamily]:
+        family = MetricFamily(self.name, self.type, self.help)
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                family.add_histogram(self.buckets, list(counts), total, self._labels(key))
+        yield family
+
+
+REGISTRY = Registry()
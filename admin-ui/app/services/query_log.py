@@ -0,0 +1,213 @@
+"""Keyset pagination and cheap totals for the query log.
+
+The log is ordered newest first by (ts, id). Instead of ``OFFSET``, pages
+are addressed by a cursor naming the last row shown: "older" continues
+below the oldest row on the page, "newer" continues above the newest one.
+Each page is an index range scan of ``PAGE_SIZE + 1`` rows however deep
+the reader has gone, and the time bound on the cursor lets PostgreSQL
+prune daily partitions.
+
+Searches pick an index through their mode: ``exact`` and ``suffix``
+("example.com" and its subdomains) match ``reverse(qname)`` against the
+reversed-qname btree, ``contains`` is an ILIKE served by the pg_trgm GIN
+index where that extension is installed.
+
+Totals are estimated from the planner's row estimate for the filtered
+query, which costs one EXPLAIN. The exact count is computed separately
+(count_log_events) with a statement timeout, for the page to load after
+it has rendered. get_log_count caches it per filter set for
+LOG_COUNT_TTL seconds, so paging through one result set counts once.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Literal
+
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Query, Session
+
+from app.models.dns_query_event import DNSQueryEvent
+from app.services.stats_cache import StatsCache
+
+log = logging.getLogger(__name__)
+
+# Upper bound on the exact count; on timeout the estimate is returned.
+EXACT_COUNT_TIMEOUT_MS = 5000
+# How long an exact count is reused for the same filter set.
+LOG_COUNT_TTL = 30.0  # seconds
+
+SearchMode = Literal["contains", "suffix", "exact"]
+SEARCH_MODES: tuple[SearchMode, ...] = ("contains", "suffix", "exact")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def qname_search(qname: Any, q: str, mode: SearchMode = "contains") -> Any:
+    """Filter on a qname column for the search box in ``mode``.
+
+    Stored qnames are lowercase without a trailing dot, so the search term
+    is normalised the same way for the index-backed modes.
+    """
+    if mode == "contains":
+        return qname.ilike(f"%{q.strip()}%")
+    reversed_term = q.strip().lower().rstrip(".")[::-1]
+    if mode == "exact":
+        return sa.func.reverse(qname) == reversed_term
+    return sa.or_(
+        sa.func.reverse(qname) == reversed_term,
+        sa.func.reverse(qname).like(f"{_escape_like(reversed_term)}.%", escape="\\"),
+    )
+
+
+@dataclass(frozen=True)
+class LogCursor:
+    """Position of one row in (ts DESC, id DESC) order."""
+
+    ts: datetime
+    id: int
+
+    @classmethod
+    def of(cls, event: DNSQueryEvent) -> LogCursor:
+        ts = event.ts if event.ts.tzinfo is not None else event.ts.replace(tzinfo=timezone.utc)
+        return cls(ts=ts, id=event.id)
+
+    def encode(self) -> str:
+        """``<microseconds since epoch>.<id>``: exact and URL-safe."""
+        return f"{(self.ts - _EPOCH) // timedelta(microseconds=1)}.{self.id}"
+
+    @classmethod
+    def decode(cls, value: str | None) -> LogCursor | None:
+        """Parse an encoded cursor; None for a missing or malformed one."""
+        if not value:
+            return None
+        try:
+            micros, event_id = value.split(".", 1)
+            return cls(ts=_EPOCH + timedelta(microseconds=int(micros)), id=int(event_id))
+        except (ValueError, OverflowError):
+            return None
+
+
+@dataclass
+class LogPage:
+    events: list[DNSQueryEvent]
+    newer: LogCursor | None  # cursor for the "newer" link, None on the first page
+    older: LogCursor | None  # cursor for the "older" link, None on the last page
+
+
+def fetch_log_page(
+    query: Query,
+    *,
+    before: LogCursor | None = None,
+    after: LogCursor | None = None,
+    page_size: int,
+) -> LogPage:
+    """One page of ``query`` (a filtered DNSQueryEvent query), newest first.
+
+    ``before`` pages towards older events, ``after`` towards newer ones;
+    with neither the page starts at the newest event.
+    """
+    key = sa.tuple_(DNSQueryEvent.ts, DNSQueryEvent.id)
+    if after is not None:
+        rows = (
+            query.filter(DNSQueryEvent.ts >= after.ts, key > sa.tuple_(after.ts, after.id))
+            .order_by(DNSQueryEvent.ts.asc(), DNSQueryEvent.id.asc())
+            .limit(page_size + 1)
+            .all()
+        )
+        more_newer = len(rows) > page_size
+        events = rows[:page_size][::-1]
+        # Paging newer always leaves the page that was shown before it.
+        return LogPage(
+            events=events,
+            newer=LogCursor.of(events[0]) if events and more_newer else None,
+            older=LogCursor.of(events[-1]) if events else after,
+        )
+
+    if before is not None:
+        query = query.filter(DNSQueryEvent.ts <= before.ts, key < sa.tuple_(before.ts, before.id))
+    rows = (
+        query.order_by(DNSQueryEvent.ts.desc(), DNSQueryEvent.id.desc()).limit(page_size + 1).all()
+    )
+    events = rows[:page_size]
+    newer = None
+    if before is not None:
+        newer = LogCursor.of(events[0]) if events else before
+    return LogPage(
+        events=events,
+        newer=newer,
+        older=LogCursor.of(events[-1]) if len(rows) > page_size else None,
+    )
+
+
+def estimate_log_events(db: Session, query: Query) -> tuple[int, bool]:
+    """Row count for ``query`` as (count, exact).
+
+    On PostgreSQL this is the planner's estimate; other databases (the
+    SQLite test suite) count exactly.
+    """
+    rows = query.with_entities(DNSQueryEvent.id).order_by(None)
+    if db.get_bind().dialect.name != "postgresql":
+        return rows.count(), True
+
+    compiled = rows.statement.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True}
+    )
+    plan = (
+        db.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+        .scalar()
+    )
+    return int(plan[0]["Plan"]["Plan Rows"]), False
+
+
+def count_log_events(db: Session, query: Query) -> tuple[int, bool]:
+    """Exact row count for ``query`` as (count, exact).
+
+    Gives up after EXACT_COUNT_TIMEOUT_MS on PostgreSQL and falls back to
+    the estimate.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return estimate_log_events(db, query)
+
+    try:
+        db.execute(sa.text(f"SET LOCAL statement_timeout = {EXACT_COUNT_TIMEOUT_MS}"))
+        return query.order_by(None).count(), True
+    except OperationalError as e:
+        log.warning(f"Exact log count timed out, using estimate: {e}")
+        db.rollback()
+        return estimate_log_events(db, query)
+
+
+_log_count_cache = StatsCache(ttl=LOG_COUNT_TTL)
+
+
+def reset_log_count_cache() -> None:
+    """Clear the in-process log count cache.  Intended for test use."""
+    _log_count_cache.clear()
+
+
+def cached_log_count(key: str) -> tuple[int, bool] | None:
+    """The cached count for filter set ``key`` as (count, exact), or None."""
+    entry = _log_count_cache.get(f"logs:{key}")
+    if entry is None:
+        return None
+    return entry.value["total"], entry.value["exact"]
+
+
+def get_log_count(db: Session, key: str, query: Query) -> tuple[int, bool]:
+    """count_log_events for ``query``, cached under its filter set ``key``."""
+
+    def compute() -> dict[str, Any]:
+        total, exact = count_log_events(db, query)
+        return {"total": total, "exact": exact}
+
+    value = _log_count_cache.get_or_compute(db, f"logs:{key}", compute).value
+    return value["total"], value["exact"]
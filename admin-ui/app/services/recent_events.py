@@ -0,0 +1,137 @@
+"""In-memory ring buffer of the most recently ingested query events.
+
+/api/node-sync/ingest appends every inserted event here after its commit,
+so live views (the /ws/stream feed, the setup checklist's "queries in
+the last hour") can answer from memory instead of re-reading rows that
+were just written. The buffer keeps the last
+``recent_events_buffer_size`` events per process as plain tuples, with client IPs and qnames interned
+since a handful of clients and domains dominate any window.
+
+A read is only answered from the buffer when the buffer is known to hold
+every event in the requested range: it has seen everything this process
+ingested since it started, minus what it has since evicted. Reads
+reaching further back (before startup, or past the eviction point)
+return None and the caller falls back to the database.
+
+The buffer is per process and only sees events ingested by this
+process; the admin-ui runs a single uvicorn worker.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+from collections import deque
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+from app.settings import get_settings
+
+
+class RecentEvent(NamedTuple):
+    id: int
+    ts: float  # epoch seconds
+    client_ip: str
+    qname: str
+    qtype: int | None
+    rcode: int | None
+    blocked: bool
+    latency_ms: int | None
+    is_internal: bool
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "ts": datetime.fromtimestamp(self.ts, timezone.utc).isoformat(),
+            "client_ip": self.client_ip,
+            "qname": self.qname,
+            "qtype": self.qtype,
+            "rcode": self.rcode,
+            "blocked": self.blocked,
+            "latency_ms": self.latency_ms,
+        }
+
+
+class RecentEventBuffer:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._events: deque[RecentEvent] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        # Every event with id > _floor_id, and every event ingested after
+        # _floor_ts, is in the buffer. None until the first append.
+        self._floor_id: int | None = None
+        self._floor_ts: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._events.clear()
+            self._floor_id = None
+            self._floor_ts = None
+
+    @property
+    def last_id(self) -> int | None:
+        with self._lock:
+            return max((e.id for e in self._events), default=None)
+
+    def extend(self, rows: Iterable[Any]) -> None:
+        """Append inserted events (rows with the DNSQueryEvent columns)."""
+        events = [
+            RecentEvent(
+                id=r.id,
+                ts=r.ts.timestamp(),
+                client_ip=sys.intern(r.client_ip),
+                qname=sys.intern(r.qname),
+                qtype=r.qtype,
+                rcode=r.rcode,
+                blocked=bool(r.blocked),
+                latency_ms=r.latency_ms,
+                is_internal=bool(r.is_internal),
+            )
+            for r in rows
+        ]
+        if not events:
+            return
+        with self._lock:
+            if self._floor_id is None:
+                # Events before the first batch predate this process.
+                self._floor_id = min(e.id for e in events) - 1
+                self._floor_ts = datetime.now(timezone.utc).timestamp()
+            for event in events:
+                if len(self._events) == self.size:
+                    evicted = self._events[0]
+                    self._floor_id = max(self._floor_id, evicted.id)
+                    self._floor_ts = max(self._floor_ts or 0.0, evicted.ts)
+                self._events.append(event)
+
+    def events_after(
+        self, last_id: int, limit: int, include_internal: bool = False
+    ) -> list[RecentEvent] | None:
+        """Up to ``limit`` events with id > ``last_id``, oldest first.
+
+        None when the buffer cannot vouch for the whole range.
+        """
+        with self._lock:
+            if self._floor_id is None or last_id < self._floor_id:
+                return None
+            events = [
+                e
+                for e in self._events
+                if e.id > last_id and (include_internal or not e.is_internal)
+            ]
+        events.sort(key=lambda e: e.id)
+        return events[:limit]
+
+    def count_since(self, since: datetime) -> int | None:
+        """Events with ts >= ``since``; None when the buffer may miss some."""
+        cutoff = since.timestamp()
+        with self._lock:
+            if self._floor_ts is None or cutoff < self._floor_ts:
+                return None
+            return sum(1 for e in self._events if e.ts >= cutoff)
+
+
+recent_events = RecentEventBuffer(get_settings().recent_events_buffer_size)
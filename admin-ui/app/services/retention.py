@@ -1,76 +1,361 @@
+"""Retention cleanup for events, rollups, node metrics and the audit log.
+
+dns_query_events is partitioned by day and expires by dropping partitions
+(app/services/partitions.py); its legacy and DEFAULT partitions, and the
+other tables, are purged by
+purge_expired_rows(): bounded primary-key chunks, one short transaction
+each, throttled and capped by a per-run time budget, so a large backlog
+is worked off over several nights instead of in one unbounded DELETE
+that blocks ingest and floods the WAL.
+"""
+
 from __future__ import annotations
 
 import logging
+import time
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta, timezone
-from typing import cast
+from typing import Any, cast
 
+import sqlalchemy as sa
 from sqlalchemy import delete
 from sqlalchemy.engine import CursorResult
 from sqlalchemy.orm import Session
 
+from app.db.base import Base
+from app.models.config_change import ConfigChange
 from app.models.dns_query_event import DNSQueryEvent
 from app.models.node_metrics import NodeMetrics
+from app.models.node_metrics_rollup import NodeMetrics1h, NodeMetrics5m
 from app.models.query_rollup import QueryRollup
+from app.models.query_rollup_minute import QueryRollupMinute
+from app.models.query_topk import QueryTopK
 from app.models.settings import (
+    get_retention_batch_size,
+    get_retention_batch_sleep_ms,
+    get_retention_config_changes_days,
     get_retention_events_days,
+    get_retention_max_runtime_seconds,
     get_retention_node_metrics_days,
     get_retention_rollups_days,
+    get_setting,
+    set_setting,
+)
+from app.services.filter_options import refresh_filter_options
+from app.services.node_metrics import raw_node_metrics_cutoff
+from app.services.partitions import (
+    drop_expired_event_partitions,
+    is_partitioned,
+    partition_table,
 )
 
 log = logging.getLogger(__name__)
 
+# Settings key prefix holding an interrupted purge's resume position.
+RETENTION_CURSOR_PREFIX = "retention_cursor_"
 
-def cleanup_old_events(db: Session, days: int | None = None) -> int:
+# The minute rollup tier only backs the history charts (7 days at most);
+# keep one extra day of margin.
+MINUTE_ROLLUP_RETENTION_DAYS = 8
+# Likewise the hourly top-K tier only backs top lists of up to 7 days.
+TOPK_RETENTION_DAYS = 8
+# Raw node_metrics samples are downsampled into node_metrics_5m and
+# node_metrics_1h (app/services/node_metrics.py); the raw samples and the
+# 5m tier back short ranges only. The hourly tier is kept for
+# retention_node_metrics_days.
+NODE_METRICS_RAW_RETENTION_DAYS = 2
+NODE_METRICS_5M_RETENTION_DAYS = 30
+
+
+@dataclass
+class PurgeProgress:
+    """Outcome of one chunked purge of a table.
+
+    ``complete`` is False when the run budget ran out mid-sweep; ``cursor``
+    is then the primary key the next run resumes from.
+    """
+
+    table: str
+    deleted: int = 0
+    batches: int = 0
+    complete: bool = True
+    cursor: int | None = None
+
+
+def _load_cursor(db: Session, table: str) -> int | None:
+    raw = get_setting(db, f"{RETENTION_CURSOR_PREFIX}{table}")
+    return int(raw) if raw else None
+
+
+def purge_expired_rows(
+    db: Session,
+    model: type[Base] | sa.TableClause,
+    ts_column: Any,
+    cutoff: datetime,
+    *,
+    batch_size: int,
+    sleep_seconds: float = 0.0,
+    deadline: float | None = None,
+) -> PurgeProgress:
+    """Delete rows with ``ts_column < cutoff`` in primary-key chunks.
+
+    The id range holding expired rows is swept in slices of ``batch_size``
+    consecutive ids, each deleted and committed in its own transaction, so
+    no single statement holds locks on (or writes WAL for) more than one
+    slice and ingest keeps flowing in between. ``sleep_seconds`` is paused
+    after every slice. When ``deadline`` (a time.monotonic() value) passes,
+    the sweep stops and its position is saved in settings; the next call
+    resumes from there instead of rescanning ids it already cleared.
+
+    ``model`` may also be a table clause (an event partition by name), in
+    which case its ``id`` column is the key.
+    """
+    if isinstance(model, sa.TableClause):
+        table, pk = model.name, model.c.id
+    else:
+        table, pk = model.__tablename__, model.id  # type: ignore[attr-defined]
+    expired = ts_column < cutoff
+    progress = PurgeProgress(table=table)
+    saved = _load_cursor(db, table)
+
+    end_id = db.query(sa.func.max(pk)).filter(expired).scalar()
+    if end_id is None:
+        if saved is not None:
+            set_setting(db, f"{RETENTION_CURSOR_PREFIX}{table}", "")
+        return progress
+
+    lo = db.query(sa.func.min(pk)).filter(expired).scalar()
+    if saved is not None and lo < saved <= end_id:
+        lo = saved
+
+    while lo <= end_id:
+        if deadline is not None and time.monotonic() >= deadline:
+            progress.complete = False
+            progress.cursor = lo
+            set_setting(db, f"{RETENTION_CURSOR_PREFIX}{table}", str(lo))
+            return progress
+
+        # Upper id of the next slice: the batch_size-th id at or after lo,
+        # read from the primary key index.
+        hi = db.query(pk).filter(pk >= lo).order_by(pk).offset(batch_size - 1).limit(1).scalar()
+        if hi is None or hi > end_id:
+            hi = end_id
+
+        result = cast(
+            CursorResult,
+            db.execute(delete(model).where(pk >= lo, pk <= hi, expired)),
+        )
+        db.commit()
+        progress.deleted += result.rowcount or 0
+        progress.batches += 1
+
+        lo = hi + 1
+        if sleep_seconds > 0 and lo <= end_id:
+            time.sleep(sleep_seconds)
+
+    if saved is not None:
+        set_setting(db, f"{RETENTION_CURSOR_PREFIX}{table}", "")
+    return progress
+
+
+def _purge(
+    db: Session,
+    model: type[Base],
+    ts_column: Any,
+    days: int,
+    label: str,
+    deadline: float | None = None,
+    *,
+    not_after: datetime | None = None,
+) -> PurgeProgress:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    if not_after is not None:
+        cutoff = min(cutoff, not_after)
+    progress = purge_expired_rows(
+        db,
+        model,
+        ts_column,
+        cutoff,
+        batch_size=get_retention_batch_size(db),
+        sleep_seconds=get_retention_batch_sleep_ms(db) / 1000,
+        deadline=deadline,
+    )
+
+    log.info(
+        f"Retention: deleted {progress.deleted} {label} older than {days} days "
+        f"in {progress.batches} batches"
+    )
+    if not progress.complete:
+        log.info(
+            f"Retention: {label} purge hit the runtime budget, "
+            f"resuming from id {progress.cursor} next run"
+        )
+    return progress
+
+
+def _cleanup_events(
+    db: Session, days: int | None = None, deadline: float | None = None
+) -> tuple[int, list[PurgeProgress]]:
     if days is None:
         days = get_retention_events_days(db)
 
     cutoff = datetime.now(timezone.utc) - timedelta(days=days)
 
+    if is_partitioned(db):
+        # Whole expired daily partitions are dropped instead of deleting
+        # their rows; see app/services/partitions.py. The legacy and
+        # DEFAULT partitions are purged in chunks, each under its own
+        # resume cursor.
+        dropped = drop_expired_event_partitions(db, cutoff)
+        progress = []
+        for name in dropped.partitions_to_purge:
+            table = partition_table(name)
+            progress.append(
+                purge_expired_rows(
+                    db,
+                    table,
+                    table.c.ts,
+                    cutoff,
+                    batch_size=get_retention_batch_size(db),
+                    sleep_seconds=get_retention_batch_sleep_ms(db) / 1000,
+                    deadline=deadline,
+                )
+            )
+        rows_deleted = sum(p.deleted for p in progress)
+        log.info(
+            f"Retention: dropped {dropped.partitions_dropped} event partitions "
+            f"(~{dropped.rows_dropped_estimate} rows) and deleted {rows_deleted} "
+            f"events older than {days} days"
+        )
+        for p in progress:
+            if not p.complete:
+                log.info(
+                    f"Retention: {p.table} purge hit the runtime budget, "
+                    f"resuming from id {p.cursor} next run"
+                )
+        return dropped.rows_dropped_estimate + rows_deleted, progress
+
     result = cast(CursorResult, db.execute(delete(DNSQueryEvent).where(DNSQueryEvent.ts < cutoff)))
     db.commit()
 
     deleted = result.rowcount or 0
     log.info(f"Retention: deleted {deleted} events older than {days} days")
-    return deleted
+    return deleted, []
+
+
+def cleanup_old_events(db: Session, days: int | None = None) -> int:
+    return _cleanup_events(db, days)[0]
 
 
 def cleanup_old_rollups(db: Session, days: int | None = None) -> int:
     if days is None:
         days = get_retention_rollups_days(db)
+    return _purge(db, QueryRollup, QueryRollup.bucket_start, days, "rollups").deleted
 
-    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-
-    result = cast(
-        CursorResult, db.execute(delete(QueryRollup).where(QueryRollup.bucket_start < cutoff))
-    )
-    db.commit()
 
-    deleted = result.rowcount or 0
-    log.info(f"Retention: deleted {deleted} rollups older than {days} days")
-    return deleted
+def cleanup_old_node_metrics(db: Session, days: int | None = None) -> int:
+    if days is not None:
+        return _purge(db, NodeMetrics, NodeMetrics.ts, days, "node_metrics").deleted
+    return _purge_raw_node_metrics(db).deleted
 
 
-def cleanup_old_node_metrics(db: Session, days: int | None = None) -> int:
-    if days is None:
-        days = get_retention_node_metrics_days(db)
+def _purge_raw_node_metrics(db: Session, deadline: float | None = None) -> PurgeProgress:
+    """Purge raw samples the downsampled tiers already cover.
 
-    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    Keeps NODE_METRICS_RAW_RETENTION_DAYS, and anything the tiers have
+    not caught up with; until the tiers exist, retention_node_metrics_days.
+    """
+    keep_days = get_retention_node_metrics_days(db)
+    cutoff = raw_node_metrics_cutoff(
+        db,
+        keep=timedelta(days=NODE_METRICS_RAW_RETENTION_DAYS),
+        fallback=timedelta(days=keep_days),
+    )
+    return _purge(
+        db,
+        NodeMetrics,
+        NodeMetrics.ts,
+        NODE_METRICS_RAW_RETENTION_DAYS,
+        "node_metrics",
+        deadline,
+        not_after=cutoff,
+    )
 
-    result = cast(CursorResult, db.execute(delete(NodeMetrics).where(NodeMetrics.ts < cutoff)))
-    db.commit()
 
-    deleted = result.rowcount or 0
-    log.info(f"Retention: deleted {deleted} node_metrics older than {days} days")
-    return deleted
+def cleanup_old_config_changes(db: Session, days: int | None = None) -> int:
+    if days is None:
+        days = get_retention_config_changes_days(db)
+    return _purge(db, ConfigChange, ConfigChange.created_at, days, "config_changes").deleted
 
 
 def run_retention_job(db: Session) -> dict:
-    events_deleted = cleanup_old_events(db)
-    rollups_deleted = cleanup_old_rollups(db)
-    node_metrics_deleted = cleanup_old_node_metrics(db)
+    deadline = time.monotonic() + get_retention_max_runtime_seconds(db)
+
+    events_deleted, events_progress = _cleanup_events(db, deadline=deadline)
+    filter_options = refresh_filter_options(db)
+    progress = events_progress + [
+        _purge_raw_node_metrics(db, deadline),
+        _purge(
+            db,
+            NodeMetrics5m,
+            NodeMetrics5m.bucket_start,
+            NODE_METRICS_5M_RETENTION_DAYS,
+            "5m node metrics",
+            deadline,
+        ),
+        _purge(
+            db,
+            NodeMetrics1h,
+            NodeMetrics1h.bucket_start,
+            get_retention_node_metrics_days(db),
+            "hourly node metrics",
+            deadline,
+        ),
+        _purge(
+            db,
+            QueryRollup,
+            QueryRollup.bucket_start,
+            get_retention_rollups_days(db),
+            "rollups",
+            deadline,
+        ),
+        _purge(
+            db,
+            QueryRollupMinute,
+            QueryRollupMinute.bucket_start,
+            MINUTE_ROLLUP_RETENTION_DAYS,
+            "minute rollups",
+            deadline,
+        ),
+        _purge(
+            db,
+            QueryTopK,
+            QueryTopK.bucket_start,
+            TOPK_RETENTION_DAYS,
+            "top-K rollups",
+            deadline,
+        ),
+        _purge(
+            db,
+            ConfigChange,
+            ConfigChange.created_at,
+            get_retention_config_changes_days(db),
+            "config_changes",
+            deadline,
+        ),
+    ]
+    by_table = {p.table: p for p in progress}
 
     return {
         "events_deleted": events_deleted,
-        "rollups_deleted": rollups_deleted,
-        "node_metrics_deleted": node_metrics_deleted,
+        "filter_options": filter_options,
+        "rollups_deleted": by_table["query_rollups"].deleted,
+        "node_metrics_deleted": by_table["node_metrics"].deleted,
+        "node_metrics_rollups_deleted": by_table["node_metrics_5m"].deleted
+        + by_table["node_metrics_1h"].deleted,
+        "minute_rollups_deleted": by_table["query_rollups_minute"].deleted,
+        "topk_deleted": by_table["query_topk_hourly"].deleted,
+        "config_changes_deleted": by_table["config_changes"].deleted,
+        "complete": all(p.complete for p in progress),
+        "progress": {p.table: asdict(p) for p in progress},
     }
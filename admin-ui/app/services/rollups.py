@@ -1,26 +1,47 @@
 from __future__ import annotations
 
 import logging
-import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, cast
 
 import sqlalchemy as sa
 from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import CursorResult
 from sqlalchemy.orm import Session
 
 from app.models.dns_query_event import DNSQueryEvent
 from app.models.query_rollup import QueryRollup
+from app.models.query_rollup_minute import QueryRollupMinute
+from app.models.rollup_watermark import RollupWatermark
+from app.services.hll import (
+    estimate_agg,
+    register_index,
+    register_rank,
+    sketch_agg,
+    sketch_entries,
+)
+from app.services.latency_histogram import (
+    LATENCY_BUCKETS,
+    LATENCY_PERCENTILES,
+    bucket_counts,
+    histogram_array,
+    latency_percentile,
+    merge_histograms,
+    merged_counts,
+)
+from app.services.stats_cache import StatsCache
 
 log = logging.getLogger(__name__)
 
 CACHE_HIT_LATENCY_THRESHOLD_MS = 5
 
 # ---------------------------------------------------------------------------
-# In-process TTL cache for get_dashboard_stats edge-query results
+# Bounded, single-flight cache for get_dashboard_stats results
 # ---------------------------------------------------------------------------
-_stats_cache: dict[str, tuple[float, dict[str, Any]]] = {}
-_STATS_CACHE_TTL = 60.0  # seconds
+_stats_cache = StatsCache()
 
 
 def reset_stats_cache() -> None:
@@ -28,13 +49,71 @@ def reset_stats_cache() -> None:
     _stats_cache.clear()
 
 
+# Value columns written by the rollup upserts, in INSERT ... SELECT order
+# after the (bucket_start, granularity, client_id, node_id) key.
+_ROLLUP_VALUE_COLUMNS = (
+    "total_queries",
+    "blocked_queries",
+    "nxdomain_count",
+    "servfail_count",
+    "cache_hits",
+    "avg_latency_ms",
+    "unique_domains",
+    "domains_sketch",
+    "latency_histogram",
+)
+
+
+def _upsert_rollups(db: Session, select_stmt: sa.Select) -> int:
+    """INSERT the rows of ``select_stmt`` into query_rollups, replacing the
+    values of any bucket that already exists.
+
+    The whole bucket is written by one statement, however many
+    (client, node) groups it has. uq_rollup_bucket is NULLS NOT DISTINCT
+    (migration 0021), so groups without a client or node conflict too.
+    """
+    stmt = pg_insert(QueryRollup.__table__).from_select(
+        ["bucket_start", "granularity", "client_id", "node_id", *_ROLLUP_VALUE_COLUMNS],
+        select_stmt,
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_rollup_bucket",
+        set_={
+            **{col: stmt.excluded[col] for col in _ROLLUP_VALUE_COLUMNS},
+            "updated_at": func.now(),
+        },
+    )
+    # rowcount of a plain INSERT is only kept when asked for explicitly.
+    result = cast(CursorResult, db.execute(stmt.execution_options(preserve_rowcount=True)))
+    db.commit()
+    return result.rowcount or 0
+
+
+def _weighted_avg(column: Any, weight: Any) -> Any:
+    """Average of per-bucket averages, weighted by each bucket's count.
+
+    Buckets without an average (no latencies recorded) carry no weight.
+    """
+    total = func.sum(weight).filter(column.is_not(None))
+    return sa.cast(
+        func.trunc(func.sum(sa.cast(column, sa.Numeric()) * weight) / func.nullif(total, 0)),
+        sa.Integer(),
+    )
+
+
 def compute_hourly_rollup(db: Session, hour_start: datetime) -> int:
     hour_end = hour_start + timedelta(hours=1)
 
-    results = (
-        db.query(
+    # One pass over the hour's events, grouped down to (client, node, HLL
+    # register); the outer query folds the registers into each group's
+    # domain sketch. A qname always hashes to the same register, so the
+    # per-register distinct counts add up to the exact distinct count.
+    register = register_index(DNSQueryEvent.qname)
+    per_register = (
+        sa.select(
             DNSQueryEvent.client_id,
             DNSQueryEvent.node_id,
+            register.label("idx"),
             func.count().label("total"),
             func.sum(func.cast(DNSQueryEvent.blocked, sa.Integer())).label("blocked"),
             func.sum(case((DNSQueryEvent.rcode == 3, 1), else_=0)).label("nxdomain"),
@@ -45,144 +124,670 @@ def compute_hourly_rollup(db: Session, hour_start: datetime) -> int:
                     else_=0,
                 )
             ).label("cache_hits"),
-            func.avg(DNSQueryEvent.latency_ms).label("avg_latency"),
-            func.count(func.distinct(DNSQueryEvent.qname)).label("unique_domains"),
+            func.sum(DNSQueryEvent.latency_ms).label("latency_sum"),
+            func.count(DNSQueryEvent.latency_ms).label("latency_count"),
+            func.count(func.distinct(DNSQueryEvent.qname)).label("domains"),
+            func.max(register_rank(DNSQueryEvent.qname)).label("rank"),
+            *[c.label(f"lat{i}") for i, c in enumerate(bucket_counts(DNSQueryEvent.latency_ms))],
         )
-        .filter(
+        .where(
             DNSQueryEvent.ts >= hour_start,
             DNSQueryEvent.ts < hour_end,
             # User-facing dashboard stats exclude container-internal traffic
             # (precache warming etc.) so the numbers reflect real clients.
             DNSQueryEvent.is_internal.is_(False),
         )
-        .group_by(DNSQueryEvent.client_id, DNSQueryEvent.node_id)
-        .all()
+        .group_by(DNSQueryEvent.client_id, DNSQueryEvent.node_id, register)
+        .subquery()
     )
+    r = per_register.c
 
-    count = 0
-    for row in results:
-        existing = (
-            db.query(QueryRollup)
-            .filter(
-                QueryRollup.bucket_start == hour_start,
-                QueryRollup.granularity == "hourly",
-                QueryRollup.client_id == row.client_id,
-                QueryRollup.node_id == row.node_id,
-            )
-            .one_or_none()
-        )
+    select_stmt = sa.select(
+        sa.literal(hour_start, sa.DateTime(timezone=True)),
+        sa.literal("hourly"),
+        r.client_id,
+        r.node_id,
+        func.sum(r.total),
+        func.sum(r.blocked),
+        func.sum(r.nxdomain),
+        func.sum(r.servfail),
+        func.sum(r.cache_hits),
+        sa.cast(
+            func.trunc(func.sum(r.latency_sum) / func.nullif(func.sum(r.latency_count), 0)),
+            sa.Integer(),
+        ),
+        func.sum(r.domains),
+        sketch_agg(r.idx, r.rank),
+        histogram_array([func.sum(r[f"lat{i}"]) for i in range(LATENCY_BUCKETS)]),
+    ).group_by(r.client_id, r.node_id)
 
-        if existing:
-            existing.total_queries = row.total or 0
-            existing.blocked_queries = int(row.blocked or 0)
-            existing.nxdomain_count = row.nxdomain or 0
-            existing.servfail_count = row.servfail or 0
-            existing.cache_hits = row.cache_hits or 0
-            existing.avg_latency_ms = int(row.avg_latency) if row.avg_latency else None
-            existing.unique_domains = row.unique_domains or 0
-        else:
-            rollup = QueryRollup(
-                bucket_start=hour_start,
-                granularity="hourly",
-                client_id=row.client_id,
-                node_id=row.node_id,
-                total_queries=row.total or 0,
-                blocked_queries=int(row.blocked or 0),
-                nxdomain_count=row.nxdomain or 0,
-                servfail_count=row.servfail or 0,
-                cache_hits=row.cache_hits or 0,
-                avg_latency_ms=int(row.avg_latency) if row.avg_latency else None,
-                unique_domains=row.unique_domains or 0,
-            )
-            db.add(rollup)
-        count += 1
+    return _upsert_rollups(db, select_stmt)
 
-    db.commit()
-    return count
+
+def _merged_hourly_sketches(day_start: datetime, day_end: datetime) -> sa.Subquery:
+    """Per (client, node): the day's hourly domain sketches merged into one."""
+    hourly = (
+        sa.select(
+            QueryRollup.client_id,
+            QueryRollup.node_id,
+            QueryRollup.domains_sketch.label("sketch"),
+        )
+        .where(
+            QueryRollup.bucket_start >= day_start,
+            QueryRollup.bucket_start < day_end,
+            QueryRollup.granularity == "hourly",
+            QueryRollup.domains_sketch.is_not(None),
+        )
+        .subquery()
+    )
+    entries = sketch_entries(hourly, "client_id", "node_id")
+    registers = (
+        sa.select(
+            entries.c.client_id,
+            entries.c.node_id,
+            entries.c.idx,
+            func.max(entries.c.rank).label("rank"),
+        )
+        .group_by(entries.c.client_id, entries.c.node_id, entries.c.idx)
+        .subquery()
+    )
+    return (
+        sa.select(
+            registers.c.client_id,
+            registers.c.node_id,
+            estimate_agg(registers.c.rank).label("unique_domains"),
+            sketch_agg(registers.c.idx, registers.c.rank).label("sketch"),
+        )
+        .group_by(registers.c.client_id, registers.c.node_id)
+        .subquery()
+    )
 
 
 def compute_daily_rollup(db: Session, day_start: datetime) -> int:
     day_end = day_start + timedelta(days=1)
+    merged = _merged_hourly_sketches(day_start, day_end)
 
-    results = (
-        db.query(
+    select_stmt = (
+        sa.select(
+            sa.literal(day_start, sa.DateTime(timezone=True)),
+            sa.literal("daily"),
             QueryRollup.client_id,
             QueryRollup.node_id,
-            func.sum(QueryRollup.total_queries).label("total"),
-            func.sum(QueryRollup.blocked_queries).label("blocked"),
-            func.sum(QueryRollup.nxdomain_count).label("nxdomain"),
-            func.sum(QueryRollup.servfail_count).label("servfail"),
-            func.sum(QueryRollup.cache_hits).label("cache_hits"),
-            func.avg(QueryRollup.avg_latency_ms).label("avg_latency"),
-            func.sum(QueryRollup.unique_domains).label("unique_domains"),
+            func.sum(QueryRollup.total_queries),
+            func.sum(QueryRollup.blocked_queries),
+            func.sum(QueryRollup.nxdomain_count),
+            func.sum(QueryRollup.servfail_count),
+            func.sum(QueryRollup.cache_hits),
+            # A busy hour's latency outweighs a quiet one's.
+            _weighted_avg(QueryRollup.avg_latency_ms, QueryRollup.total_queries),
+            # A domain seen every hour counts once for the day. Hourly rows
+            # written before sketches existed can only be summed.
+            func.coalesce(merged.c.unique_domains, func.sum(QueryRollup.unique_domains)),
+            merged.c.sketch,
+            histogram_array(merged_counts(QueryRollup.latency_histogram)),
         )
-        .filter(
+        .select_from(QueryRollup)
+        .outerjoin(
+            merged,
+            sa.and_(
+                merged.c.client_id.is_not_distinct_from(QueryRollup.client_id),
+                merged.c.node_id.is_not_distinct_from(QueryRollup.node_id),
+            ),
+        )
+        .where(
             QueryRollup.bucket_start >= day_start,
             QueryRollup.bucket_start < day_end,
             QueryRollup.granularity == "hourly",
         )
-        .group_by(QueryRollup.client_id, QueryRollup.node_id)
+        .group_by(
+            QueryRollup.client_id,
+            QueryRollup.node_id,
+            merged.c.unique_domains,
+            merged.c.sketch,
+        )
+    )
+
+    return _upsert_rollups(db, select_stmt)
+
+
+# ---------------------------------------------------------------------------
+# Hourly/daily scheduling
+# ---------------------------------------------------------------------------
+# run_rollup_job is driven by two watermarks in rollup_watermarks: every
+# hourly bucket before the "hourly" watermark and every daily bucket before
+# the "daily" one has been computed. Each run computes everything from the
+# watermark up to the last completed hour/day, so an admin-ui outage leaves
+# no permanent gap. The hourly row also remembers the highest event id seen
+# by the previous run; events with a higher id but a timestamp before the
+# watermark (a buffered secondary catching up) mark their hours -- and then
+# their days -- for recomputation.
+#
+# Event ids come from a sequence, so an ingest transaction that commits
+# after a run took its snapshot with a lower id than the snapshot is not
+# seen as late. Batches commit within seconds, far inside the hourly run
+# interval, so in practice this only matters for events that were already
+# racing the run.
+
+HOURLY_WATERMARK = "hourly"
+DAILY_WATERMARK = "daily"
+# How far back the first run (or a run after a long outage) starts; the
+# manual backfill's limit.
+ROLLUP_BACKFILL = timedelta(days=30)
+# Backfilled buckets are computed in parallel, each worker with its own
+# session.
+ROLLUP_WORKERS = 4
+
+
+def _compute_buckets(
+    db: Session,
+    compute: Callable[[Session, datetime], int],
+    buckets: list[datetime],
+    workers: int = ROLLUP_WORKERS,
+) -> tuple[int, list[datetime]]:
+    """Run ``compute`` for every bucket; returns (rows written, failed buckets).
+
+    A single bucket runs on ``db``; more fan out across a pool of at most
+    ``workers`` threads. A failed bucket is logged and reported rather than
+    aborting the others.
+    """
+    rows = 0
+    failed: list[datetime] = []
+    if len(buckets) <= 1 or workers <= 1:
+        for bucket in buckets:
+            try:
+                rows += compute(db, bucket)
+            except Exception as e:
+                db.rollback()
+                log.error(f"Rollup of {bucket.isoformat()} failed: {e}")
+                failed.append(bucket)
+        return rows, failed
+
+    bind = db.get_bind()
+
+    def work(bucket: datetime) -> int:
+        with Session(bind) as session:
+            return compute(session, bucket)
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(buckets))) as pool:
+        futures = {pool.submit(work, bucket): bucket for bucket in buckets}
+        for future in as_completed(futures):
+            try:
+                rows += future.result()
+            except Exception as e:
+                log.error(f"Rollup of {futures[future].isoformat()} failed: {e}")
+                failed.append(futures[future])
+    return rows, sorted(failed)
+
+
+def _initial_hourly_start(db: Session, current_hour: datetime) -> datetime:
+    """Where the hourly watermark starts on an installation without one."""
+    floor = current_hour - ROLLUP_BACKFILL
+    latest = (
+        db.query(func.max(QueryRollup.bucket_start))
+        .filter(QueryRollup.granularity == "hourly")
+        .scalar()
+    )
+    if latest is not None:
+        return max(_as_utc(latest) + timedelta(hours=1), floor)
+    earliest = db.query(func.min(DNSQueryEvent.ts)).scalar()
+    if earliest is not None:
+        return min(max(_floor_hour(_as_utc(earliest)), floor), current_hour)
+    return current_hour
+
+
+def _late_event_hours(
+    db: Session, after_id: int, upto_id: int, since: datetime, before: datetime
+) -> set[datetime]:
+    """Hours in [since, before) that received events with ids in (after_id, upto_id]."""
+    hour = func.date_trunc("hour", DNSQueryEvent.ts, "UTC")
+    rows = (
+        db.query(hour)
+        .filter(
+            DNSQueryEvent.id > after_id,
+            DNSQueryEvent.id <= upto_id,
+            DNSQueryEvent.ts >= since,
+            DNSQueryEvent.ts < before,
+            DNSQueryEvent.is_internal.is_(False),
+        )
+        .distinct()
         .all()
     )
+    return {_as_utc(r[0]) for r in rows}
 
-    count = 0
-    for row in results:
-        existing = (
-            db.query(QueryRollup)
-            .filter(
-                QueryRollup.bucket_start == day_start,
-                QueryRollup.granularity == "daily",
-                QueryRollup.client_id == row.client_id,
-                QueryRollup.node_id == row.node_id,
-            )
-            .one_or_none()
+
+def run_rollup_job(db: Session, now: datetime | None = None) -> dict:
+    """Compute every hourly and daily bucket that is missing or stale."""
+    now = now or datetime.now(timezone.utc)
+    current_hour = _floor_hour(now)
+    current_day = current_hour.replace(hour=0)
+
+    # Snapshot first: events ingested while this run works are late events
+    # for the next one.
+    max_event_id = int(db.query(func.max(DNSQueryEvent.id)).scalar() or 0)
+
+    hourly_mark = db.get(RollupWatermark, HOURLY_WATERMARK)
+    if hourly_mark is None:
+        start = _initial_hourly_start(db, current_hour)
+    else:
+        start = min(_as_utc(hourly_mark.watermark), current_hour)
+    gap_hours = _hour_range(start, current_hour)
+
+    late_hours: set[datetime] = set()
+    last_event_id = hourly_mark.last_event_id if hourly_mark is not None else None
+    if last_event_id is not None and max_event_id > last_event_id:
+        late_hours = _late_event_hours(
+            db, last_event_id, max_event_id, current_hour - ROLLUP_BACKFILL, start
+        )
+
+    hours = sorted(set(gap_hours) | late_hours)
+    hourly_count, failed_hours = _compute_buckets(db, compute_hourly_rollup, hours)
+
+    daily_mark = db.get(RollupWatermark, DAILY_WATERMARK)
+    day_start = _as_utc(daily_mark.watermark) if daily_mark else start.replace(hour=0)
+    days = {day_start + timedelta(days=i) for i in range((current_day - day_start).days)}
+    days |= {h.replace(hour=0) for h in hours if h not in failed_hours}
+    days_to_compute = sorted(d for d in days if d < current_day)
+    daily_count, failed_days = _compute_buckets(db, compute_daily_rollup, days_to_compute)
+
+    # Watermarks only move past buckets that were computed.
+    failed_gap = [h for h in failed_hours if h >= start]
+    new_hourly = min(failed_gap) if failed_gap else current_hour
+    new_daily = min([current_day, *failed_days, *[h.replace(hour=0) for h in failed_hours]])
+    if hourly_mark is None:
+        hourly_mark = RollupWatermark(name=HOURLY_WATERMARK, watermark=new_hourly)
+        db.add(hourly_mark)
+    hourly_mark.watermark = new_hourly
+    if not (late_hours & set(failed_hours)):
+        hourly_mark.last_event_id = max_event_id
+    set_rollup_watermark(db, DAILY_WATERMARK, new_daily)
+    db.commit()
+
+    result = {
+        "hourly": hourly_count,
+        "daily": daily_count,
+        "hours": len(hours),
+        "late_hours": len(late_hours),
+        "days": len(days_to_compute),
+        "failed": len(failed_hours) + len(failed_days),
+    }
+    log.info(f"Rollup job: {result}")
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Minute tier
+# ---------------------------------------------------------------------------
+# query_rollups_minute holds one row per (minute, is_internal). The minute
+# rollup job only aggregates events from its watermark onward, minus a
+# lateness margin re-read every run so events a node delivers shortly
+# after the fact still land in their minute. Events arriving later than
+# that (a secondary flushing its buffer, ingest lag) are found the same
+# way as for the hourly tier: by event ids above the watermark's
+# last_event_id, whose minutes are then re-aggregated. History charts and the
+# partial-hour edges of get_dashboard_stats read minutes before the
+# watermark from this tier and only touch raw events after it.
+
+MINUTE_WATERMARK = "minute"
+MINUTE_ROLLUP_LATENESS = timedelta(minutes=5)
+# How far back the first run (or a run after a long outage) starts; the
+# longest history chart window.
+MINUTE_ROLLUP_BACKFILL = timedelta(days=7)
+# Events are aggregated at most this much time per statement.
+_MINUTE_ROLLUP_CHUNK = timedelta(hours=1)
+
+_MINUTE_VALUE_COLUMNS = (
+    "total_queries",
+    "blocked_queries",
+    "nxdomain_count",
+    "servfail_count",
+    "cache_hits",
+    "allowed_cache_hits",
+    "latency_sum_ms",
+    "unique_domains",
+    "domains_sketch",
+    "latency_histogram",
+)
+
+
+def _as_utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+def _floor_hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _hour_range(start: datetime, end: datetime) -> list[datetime]:
+    return [start + timedelta(hours=i) for i in range(int((end - start) / timedelta(hours=1)))]
+
+
+def _floor_minute(ts: datetime) -> datetime:
+    return ts.replace(second=0, microsecond=0)
+
+
+def _ceil_minute(ts: datetime) -> datetime:
+    floored = _floor_minute(ts)
+    return floored if floored == ts else floored + timedelta(minutes=1)
+
+
+def get_rollup_watermark(db: Session, name: str) -> datetime | None:
+    row = db.get(RollupWatermark, name)
+    if row is None:
+        return None
+    return _as_utc(row.watermark)
+
+
+def set_rollup_watermark(db: Session, name: str, watermark: datetime) -> None:
+    row = db.get(RollupWatermark, name)
+    if row is None:
+        db.add(RollupWatermark(name=name, watermark=watermark))
+    else:
+        row.watermark = watermark
+
+
+def _upsert_minute_rollups(db: Session, start: datetime, end: datetime) -> int:
+    # Same two-level shape as compute_hourly_rollup: per-register groups
+    # first, folded into one row and domain sketch per minute.
+    bucket = func.date_trunc("minute", DNSQueryEvent.ts)
+    register = register_index(DNSQueryEvent.qname)
+    per_register = (
+        sa.select(
+            bucket.label("bucket"),
+            DNSQueryEvent.is_internal,
+            register.label("idx"),
+            func.count().label("total"),
+            func.sum(func.cast(DNSQueryEvent.blocked, sa.Integer())).label("blocked"),
+            func.sum(case((DNSQueryEvent.rcode == 3, 1), else_=0)).label("nxdomain"),
+            func.sum(case((DNSQueryEvent.rcode == 2, 1), else_=0)).label("servfail"),
+            func.sum(
+                case((DNSQueryEvent.latency_ms < CACHE_HIT_LATENCY_THRESHOLD_MS, 1), else_=0)
+            ).label("cache_hits"),
+            func.sum(
+                case(
+                    (
+                        sa.and_(
+                            DNSQueryEvent.blocked.is_(False),
+                            DNSQueryEvent.latency_ms < CACHE_HIT_LATENCY_THRESHOLD_MS,
+                        ),
+                        1,
+                    ),
+                    else_=0,
+                )
+            ).label("allowed_cache_hits"),
+            func.sum(DNSQueryEvent.latency_ms).label("latency_sum"),
+            func.count(func.distinct(DNSQueryEvent.qname)).label("domains"),
+            func.max(register_rank(DNSQueryEvent.qname)).label("rank"),
+            *[c.label(f"lat{i}") for i, c in enumerate(bucket_counts(DNSQueryEvent.latency_ms))],
+        )
+        .where(DNSQueryEvent.ts >= start, DNSQueryEvent.ts < end)
+        .group_by(bucket, DNSQueryEvent.is_internal, register)
+        .subquery()
+    )
+    r = per_register.c
+    select_stmt = sa.select(
+        r.bucket,
+        r.is_internal,
+        func.sum(r.total),
+        func.sum(r.blocked),
+        func.sum(r.nxdomain),
+        func.sum(r.servfail),
+        func.sum(r.cache_hits),
+        func.sum(r.allowed_cache_hits),
+        func.coalesce(func.sum(r.latency_sum), 0),
+        func.sum(r.domains),
+        sketch_agg(r.idx, r.rank),
+        histogram_array([func.sum(r[f"lat{i}"]) for i in range(LATENCY_BUCKETS)]),
+    ).group_by(r.bucket, r.is_internal)
+
+    stmt = pg_insert(QueryRollupMinute.__table__).from_select(
+        ["bucket_start", "is_internal", *_MINUTE_VALUE_COLUMNS], select_stmt
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_rollup_minute_bucket",
+        set_={col: stmt.excluded[col] for col in _MINUTE_VALUE_COLUMNS},
+    )
+    result = cast(CursorResult, db.execute(stmt.execution_options(preserve_rowcount=True)))
+    return result.rowcount or 0
+
+
+def _late_event_minutes(
+    db: Session, after_id: int, upto_id: int, since: datetime, before: datetime
+) -> list[datetime]:
+    """Minutes in [since, before) that received events with ids in (after_id, upto_id]."""
+    minute = func.date_trunc("minute", DNSQueryEvent.ts)
+    rows = (
+        db.query(minute)
+        .filter(
+            DNSQueryEvent.id > after_id,
+            DNSQueryEvent.id <= upto_id,
+            DNSQueryEvent.ts >= since,
+            DNSQueryEvent.ts < before,
         )
+        .distinct()
+        .all()
+    )
+    return sorted(_as_utc(r[0]) for r in rows)
 
-        if existing:
-            existing.total_queries = row.total or 0
-            existing.blocked_queries = row.blocked or 0
-            existing.nxdomain_count = row.nxdomain or 0
-            existing.servfail_count = row.servfail or 0
-            existing.cache_hits = row.cache_hits or 0
-            existing.avg_latency_ms = int(row.avg_latency) if row.avg_latency else None
-            existing.unique_domains = row.unique_domains or 0
+
+def _minute_spans(minutes: list[datetime]) -> list[tuple[datetime, datetime]]:
+    """Sorted minutes as [start, end) runs of consecutive minutes, at most an hour each."""
+    spans: list[tuple[datetime, datetime]] = []
+    for minute in minutes:
+        if spans and spans[-1][1] == minute and minute - spans[-1][0] < _MINUTE_ROLLUP_CHUNK:
+            spans[-1] = (spans[-1][0], minute + timedelta(minutes=1))
         else:
-            rollup = QueryRollup(
-                bucket_start=day_start,
-                granularity="daily",
-                client_id=row.client_id,
-                node_id=row.node_id,
-                total_queries=row.total or 0,
-                blocked_queries=row.blocked or 0,
-                nxdomain_count=row.nxdomain or 0,
-                servfail_count=row.servfail or 0,
-                cache_hits=row.cache_hits or 0,
-                avg_latency_ms=int(row.avg_latency) if row.avg_latency else None,
-                unique_domains=row.unique_domains or 0,
+            spans.append((minute, minute + timedelta(minutes=1)))
+    return spans
+
+
+def compute_minute_rollups(db: Session, now: datetime | None = None) -> int:
+    """Bring the minute tier up to the last completed minute.
+
+    Re-aggregates from ``MINUTE_ROLLUP_LATENESS`` before the watermark (or
+    ``MINUTE_ROLLUP_BACKFILL`` ago on the first run) in chunks of at most
+    an hour, advancing the watermark after each chunk so an interrupted
+    catch-up resumes where it stopped. Older minutes that received events
+    since the previous run are re-aggregated too. Returns the minute rows
+    written.
+    """
+    end = _floor_minute(now or datetime.now(timezone.utc))
+    floor = end - MINUTE_ROLLUP_BACKFILL
+    # Snapshot first: events ingested while this run works are late events
+    # for the next one.
+    max_event_id = int(db.query(func.max(DNSQueryEvent.id)).scalar() or 0)
+    mark = db.get(RollupWatermark, MINUTE_WATERMARK)
+    watermark = _as_utc(mark.watermark) if mark is not None else None
+    start = max(watermark - MINUTE_ROLLUP_LATENESS, floor) if watermark else floor
+
+    written = 0
+    last_event_id = mark.last_event_id if mark is not None else None
+    if last_event_id is not None and max_event_id > last_event_id:
+        late_minutes = _late_event_minutes(db, last_event_id, max_event_id, floor, start)
+        for span_start, span_end in _minute_spans(late_minutes):
+            written += _upsert_minute_rollups(db, span_start, span_end)
+            db.commit()
+        if late_minutes:
+            log.info(f"Minute rollups: re-aggregated {len(late_minutes)} minutes with late events")
+
+    while start < end:
+        chunk_end = min(start + _MINUTE_ROLLUP_CHUNK, end)
+        written += _upsert_minute_rollups(db, start, chunk_end)
+        if watermark is None or chunk_end > watermark:
+            watermark = chunk_end
+            set_rollup_watermark(db, MINUTE_WATERMARK, watermark)
+        db.commit()
+        start = chunk_end
+
+    mark = db.get(RollupWatermark, MINUTE_WATERMARK)
+    if mark is not None:
+        mark.last_event_id = max_event_id
+        db.commit()
+    return written
+
+
+def _minute_tier_aggregate(db: Session, start: datetime, end: datetime) -> dict[str, Any]:
+    """Aggregate client (non-internal) minute rows in [start, end)."""
+    row = (
+        db.query(
+            func.sum(QueryRollupMinute.total_queries).label("total"),
+            func.sum(QueryRollupMinute.blocked_queries).label("blocked"),
+            func.sum(QueryRollupMinute.nxdomain_count).label("nxdomain"),
+            func.sum(QueryRollupMinute.servfail_count).label("servfail"),
+            func.sum(QueryRollupMinute.cache_hits).label("cache_hits"),
+            func.sum(QueryRollupMinute.latency_sum_ms).label("latency_sum"),
+            *merged_counts(QueryRollupMinute.latency_histogram),
+        )
+        .filter(
+            QueryRollupMinute.bucket_start >= start,
+            QueryRollupMinute.bucket_start < end,
+            QueryRollupMinute.is_internal.is_(False),
+        )
+        .one()
+    )
+    return {
+        "total_queries": int(row.total or 0),
+        "blocked_queries": int(row.blocked or 0),
+        "nxdomain_count": int(row.nxdomain or 0),
+        "servfail_count": int(row.servfail or 0),
+        "cache_hits": int(row.cache_hits or 0),
+        "latency_weighted_sum": int(row.latency_sum or 0),
+        "latency_histogram": merge_histograms(row[-LATENCY_BUCKETS:]),
+    }
+
+
+def _split_edge(
+    start: datetime, end: datetime, watermark: datetime | None
+) -> tuple[tuple[datetime, datetime] | None, list[tuple[datetime, datetime]]]:
+    """Split [start, end) into a minute-tier range and raw-event ranges.
+
+    Whole minutes before ``watermark`` are served by query_rollups_minute;
+    the sub-minute head and anything at or after the watermark are read
+    from raw events.
+    """
+    first = _ceil_minute(start)
+    last = min(_floor_minute(end), watermark) if watermark else first
+    if last <= first:
+        return None, [(start, end)]
+
+    raw: list[tuple[datetime, datetime]] = []
+    if start < first:
+        raw.append((start, first))
+    if last < end:
+        raw.append((last, end))
+    return (first, last), raw
+
+
+def _edge_aggregate(
+    db: Session, start: datetime, end: datetime, watermark: datetime | None
+) -> dict[str, Any]:
+    """Aggregate [start, end) from the minute tier where it is complete."""
+    tier, raw = _split_edge(start, end, watermark)
+    accum = _minute_tier_aggregate(db, *tier) if tier else _raw_edge_aggregate(db, *raw.pop(0))
+    for raw_start, raw_end in raw:
+        accum = _add_dicts(accum, _raw_edge_aggregate(db, raw_start, raw_end))
+    return accum
+
+
+def _edge_registers(start: datetime, end: datetime, watermark: datetime | None) -> list[sa.Select]:
+    """(idx, rank) sources covering client traffic in [start, end)."""
+    tier, raw = _split_edge(start, end, watermark)
+    sources: list[sa.Select] = []
+    if tier:
+        minutes = (
+            sa.select(QueryRollupMinute.domains_sketch.label("sketch"))
+            .where(
+                QueryRollupMinute.bucket_start >= tier[0],
+                QueryRollupMinute.bucket_start < tier[1],
+                QueryRollupMinute.is_internal.is_(False),
+            )
+            .subquery()
+        )
+        entries = sketch_entries(minutes)
+        sources.append(sa.select(entries.c.idx, entries.c.rank))
+    for raw_start, raw_end in raw:
+        sources.append(
+            sa.select(
+                register_index(DNSQueryEvent.qname).label("idx"),
+                register_rank(DNSQueryEvent.qname).label("rank"),
+            ).where(
+                DNSQueryEvent.ts >= raw_start,
+                DNSQueryEvent.ts < raw_end,
+                DNSQueryEvent.is_internal.is_(False),
             )
-            db.add(rollup)
-        count += 1
+        )
+    return sources
 
-    db.commit()
-    return count
 
+def _estimate_distinct(db: Session, sources: list[sa.Select]) -> int:
+    """Merge (idx, rank) sources into one sketch and estimate its size."""
+    if not sources:
+        return 0
+    merged = sa.union_all(*sources).subquery()
+    registers = (
+        sa.select(merged.c.idx, func.max(merged.c.rank).label("rank"))
+        .group_by(merged.c.idx)
+        .subquery()
+    )
+    return int(db.execute(sa.select(estimate_agg(registers.c.rank))).scalar() or 0)
 
-def run_rollup_job(db: Session) -> dict:
-    now = datetime.now(timezone.utc)
-    current_hour = now.replace(minute=0, second=0, microsecond=0)
-    previous_hour = current_hour - timedelta(hours=1)
 
-    current_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    previous_day = current_day - timedelta(days=1)
+def get_history_buckets(
+    db: Session,
+    origin: datetime,
+    bucket_minutes: int,
+    include_internal: bool = False,
+) -> dict[datetime, dict[str, int]]:
+    """Total/blocked/cached counts per ``bucket_minutes`` bucket from ``origin``.
 
-    hourly_count = compute_hourly_rollup(db, previous_hour)
-    daily_count = 0
+    Buckets are aligned to ``origin``. Minutes before the minute tier's
+    watermark are summed from query_rollups_minute; only events at or
+    after it are grouped from dns_query_events.
+    """
+    stride = sa.literal(timedelta(minutes=bucket_minutes), sa.Interval())
+    watermark = get_rollup_watermark(db, MINUTE_WATERMARK)
+    buckets: dict[datetime, dict[str, int]] = {}
 
-    if now.hour < 2:
-        daily_count = compute_daily_rollup(db, previous_day)
+    def merge(rows: Any) -> None:
+        for bucket_ts, total, blocked, cached in rows:
+            if bucket_ts.tzinfo is None:
+                bucket_ts = bucket_ts.replace(tzinfo=timezone.utc)
+            stats = buckets.setdefault(bucket_ts, {"total": 0, "blocked": 0, "cached": 0})
+            stats["total"] += int(total or 0)
+            stats["blocked"] += int(blocked or 0)
+            stats["cached"] += int(cached or 0)
 
-    log.info(f"Rollup job: {hourly_count} hourly, {daily_count} daily")
-    return {"hourly": hourly_count, "daily": daily_count}
+    raw_since = origin
+    if watermark is not None and watermark > origin:
+        bucket = func.date_bin(stride, QueryRollupMinute.bucket_start, origin)
+        query = db.query(
+            bucket,
+            func.sum(QueryRollupMinute.total_queries),
+            func.sum(QueryRollupMinute.blocked_queries),
+            func.sum(QueryRollupMinute.allowed_cache_hits),
+        ).filter(
+            QueryRollupMinute.bucket_start >= origin,
+            QueryRollupMinute.bucket_start < watermark,
+        )
+        if not include_internal:
+            query = query.filter(QueryRollupMinute.is_internal.is_(False))
+        merge(query.group_by(bucket).all())
+        raw_since = watermark
+
+    bucket = func.date_bin(stride, DNSQueryEvent.ts, origin)
+    query = db.query(
+        bucket,
+        func.count(),
+        func.count().filter(DNSQueryEvent.blocked.is_(True)),
+        func.count().filter(
+            DNSQueryEvent.blocked.is_(False),
+            DNSQueryEvent.latency_ms < CACHE_HIT_LATENCY_THRESHOLD_MS,
+        ),
+    ).filter(DNSQueryEvent.ts >= raw_since)
+    if not include_internal:
+        query = query.filter(DNSQueryEvent.is_internal.is_(False))
+    merge(query.group_by(bucket).all())
+
+    return buckets
 
 
 def _raw_edge_aggregate(db: Session, start: datetime, end: datetime) -> dict[str, Any]:
@@ -200,7 +805,7 @@ def _raw_edge_aggregate(db: Session, start: datetime, end: datetime) -> dict[str
                 )
             ).label("cache_hits"),
             func.sum(DNSQueryEvent.latency_ms).label("latency_sum"),
-            func.count(func.distinct(DNSQueryEvent.qname)).label("unique_domains"),
+            *bucket_counts(DNSQueryEvent.latency_ms),
         )
         .filter(
             DNSQueryEvent.ts >= start,
@@ -220,12 +825,18 @@ def _raw_edge_aggregate(db: Session, start: datetime, end: datetime) -> dict[str
         "servfail_count": int(row.servfail or 0),
         "cache_hits": int(row.cache_hits or 0),
         "latency_weighted_sum": int(row.latency_sum or 0),
-        "unique_domains": int(row.unique_domains or 0),
+        "latency_histogram": merge_histograms(row[-LATENCY_BUCKETS:]),
     }
 
 
 def _add_dicts(a: dict[str, Any], b: dict[str, Any]) -> dict[str, Any]:
-    return {k: a.get(k, 0) + b.get(k, 0) for k in a}
+    out: dict[str, Any] = {}
+    for k, v in a.items():
+        if isinstance(v, list):
+            out[k] = merge_histograms(v, b.get(k))
+        else:
+            out[k] = v + b.get(k, 0)
+    return out
 
 
 def _build_result(
@@ -242,6 +853,7 @@ def _build_result(
     latency_ws = accum.get("latency_weighted_sum", 0)
     unique_domains = accum.get("unique_domains", 0)
     avg_latency = int(latency_ws / total) if total > 0 else 0
+    histogram = accum.get("latency_histogram") or []
 
     time_saved_ms = cache_hits * CACHE_HIT_LATENCY_THRESHOLD_MS
     qps = round(total / window_seconds, 2) if window_seconds > 0 else 0.0
@@ -253,6 +865,7 @@ def _build_result(
         "servfail_count": accum.get("servfail_count", 0),
         "cache_hits": cache_hits,
         "avg_latency_ms": avg_latency,
+        **{f"latency_p{pct}_ms": latency_percentile(histogram, pct) for pct in LATENCY_PERCENTILES},
         "blocked_pct": round(blocked / max(total, 1) * 100, 1),
         "cache_hit_pct": round(cache_hits / max(total, 1) * 100, 1),
         "unique_domains": unique_domains,
@@ -270,7 +883,12 @@ def _cache_key(hours: int, start_bucket: datetime, current_bucket: datetime) ->
     return f"{hours}:{start_bucket.isoformat()}:{current_bucket.isoformat()}"
 
 
-def get_dashboard_stats(db: Session, hours: int = 24) -> dict:
+def get_dashboard_stats(db: Session, hours: int = 24, *, refresh: bool = False) -> dict:
+    """Dashboard totals for the last ``hours`` hours.
+
+    Windows over an hour are cached (see app/services/stats_cache.py);
+    ``refresh`` recomputes and re-caches instead of reading the cache.
+    """
     now = datetime.now(timezone.utc)
     window_start = now - timedelta(hours=hours)
     window_seconds = hours * 3600.0
@@ -278,7 +896,11 @@ def get_dashboard_stats(db: Session, hours: int = 24) -> dict:
     start_hour = window_start.replace(minute=0, second=0, microsecond=0)
 
     if hours <= 1:
-        raw = _raw_edge_aggregate(db, window_start, now)
+        watermark = get_rollup_watermark(db, MINUTE_WATERMARK)
+        raw = _edge_aggregate(db, window_start, now, watermark)
+        raw["unique_domains"] = _estimate_distinct(
+            db, _edge_registers(window_start, now, watermark)
+        )
         return _build_result(
             raw,
             window_seconds,
@@ -287,17 +909,21 @@ def get_dashboard_stats(db: Session, hours: int = 24) -> dict:
             edge_delta_total=raw.get("total_queries", 0),
         )
 
-    full_start = start_hour + timedelta(hours=1) if window_start > start_hour else start_hour
-
     ck = _cache_key(hours, start_hour, current_hour)
-    cached = _stats_cache.get(ck)
-    if cached is not None:
-        ts, data = cached
-        age = time.monotonic() - ts
-        if age < _STATS_CACHE_TTL:
-            out = dict(data)
-            out["cache_age_seconds"] = round(age, 1)
-            return out
+    entry = _stats_cache.get_or_compute(
+        db, ck, lambda: _window_stats(db, hours, now), refresh=refresh
+    )
+    out = dict(entry.value)
+    out["cache_age_seconds"] = round(entry.age(), 1)
+    return out
+
+
+def _window_stats(db: Session, hours: int, now: datetime) -> dict[str, Any]:
+    window_start = now - timedelta(hours=hours)
+    window_seconds = hours * 3600.0
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    start_hour = window_start.replace(minute=0, second=0, microsecond=0)
+    full_start = start_hour + timedelta(hours=1) if window_start > start_hour else start_hour
 
     latest_rollup_bucket = (
         db.query(func.max(QueryRollup.bucket_start))
@@ -320,7 +946,12 @@ def get_dashboard_stats(db: Session, hours: int = 24) -> dict:
             func.sum(
                 QueryRollup.avg_latency_ms * QueryRollup.total_queries
             ).label("latency_weighted_sum"),
-            func.sum(QueryRollup.unique_domains).label("unique_domains"),
+            # Hourly rows written before domain sketches existed can only
+            # be summed into the distinct-domain estimate.
+            func.sum(QueryRollup.unique_domains)
+            .filter(QueryRollup.domains_sketch.is_(None))
+            .label("unsketched_domains"),
+            *merged_counts(QueryRollup.latency_histogram),
         )
         .filter(
             QueryRollup.bucket_start >= full_start,
@@ -337,38 +968,125 @@ def get_dashboard_stats(db: Session, hours: int = 24) -> dict:
         "servfail_count": int(rollup_row.servfail or 0),
         "cache_hits": int(rollup_row.cache_hits or 0),
         "latency_weighted_sum": int(rollup_row.latency_weighted_sum or 0),
-        "unique_domains": int(rollup_row.unique_domains or 0),
+        "latency_histogram": merge_histograms(rollup_row[-LATENCY_BUCKETS:]),
     }
 
     edge_delta_total = 0
+    watermark = get_rollup_watermark(db, MINUTE_WATERMARK)
+
+    hourly = (
+        sa.select(QueryRollup.domains_sketch.label("sketch"))
+        .where(
+            QueryRollup.bucket_start >= full_start,
+            QueryRollup.bucket_start < current_hour,
+            QueryRollup.granularity == "hourly",
+        )
+        .subquery()
+    )
+    entries = sketch_entries(hourly)
+    registers: list[sa.Select] = [sa.select(entries.c.idx, entries.c.rank)]
 
     if window_start < full_start:
-        start_edge = _raw_edge_aggregate(db, window_start, full_start)
+        start_edge = _edge_aggregate(db, window_start, full_start, watermark)
         edge_delta_total += start_edge.get("total_queries", 0)
         accum = _add_dicts(accum, start_edge)
+        registers += _edge_registers(window_start, full_start, watermark)
 
     if now > current_hour:
-        current_edge = _raw_edge_aggregate(db, current_hour, now)
+        current_edge = _edge_aggregate(db, current_hour, now, watermark)
         edge_delta_total += current_edge.get("total_queries", 0)
         accum = _add_dicts(accum, current_edge)
+        registers += _edge_registers(current_hour, now, watermark)
+
+    # Distinct domains over the whole window: every hourly, minute and raw
+    # source merged into one sketch rather than summed per bucket.
+    accum["unique_domains"] = _estimate_distinct(db, registers) + int(
+        rollup_row.unsketched_domains or 0
+    )
 
-    result = _build_result(
+    return _build_result(
         accum,
         window_seconds,
         cache_age_seconds=0.0,
         rollup_lag_seconds=rollup_lag,
         edge_delta_total=edge_delta_total,
     )
-    _stats_cache[ck] = (time.monotonic(), result)
-    return result
 
 
 def backfill_hourly_rollups(db: Session, hours: int = 24) -> int:
-    hours = max(1, min(hours, 720))
-    now = datetime.now(timezone.utc)
-    current_hour = now.replace(minute=0, second=0, microsecond=0)
-    total = 0
-    for i in range(1, hours + 1):
-        bucket = current_hour - timedelta(hours=i)
-        total += compute_hourly_rollup(db, bucket)
+    hours = max(1, min(hours, int(ROLLUP_BACKFILL / timedelta(hours=1))))
+    current_hour = _floor_hour(datetime.now(timezone.utc))
+    total, _failed = _compute_buckets(
+        db, compute_hourly_rollup, _hour_range(current_hour - timedelta(hours=hours), current_hour)
+    )
     return total
+
+
+# ---------------------------------------------------------------------------
+# Per-node totals
+# ---------------------------------------------------------------------------
+
+
+def get_node_query_totals(
+    db: Session, since: datetime, now: datetime | None = None
+) -> dict[int, tuple[int, int]]:
+    """Non-internal (total, blocked) queries per node from ``since``'s hour.
+
+    Whole days come from daily rollups, remaining whole hours from hourly
+    rollups, and only events after the hourly watermark from
+    dns_query_events, so the cost does not grow with retention.
+    """
+    now = now or datetime.now(timezone.utc)
+    since_hour = _floor_hour(_as_utc(since))
+    tier_end = get_rollup_watermark(db, HOURLY_WATERMARK)
+    if tier_end is None or tier_end <= since_hour:
+        tier_end = since_hour
+
+    first_day = since_hour.replace(hour=0)
+    if first_day < since_hour:
+        first_day += timedelta(days=1)
+    daily_end = min(get_rollup_watermark(db, DAILY_WATERMARK) or first_day, tier_end)
+    daily_end = max(first_day, daily_end.replace(hour=0, minute=0, second=0, microsecond=0))
+
+    def tier(granularity: str, start: datetime, end: datetime) -> sa.Select:
+        return (
+            sa.select(
+                QueryRollup.node_id,
+                func.sum(QueryRollup.total_queries).label("total"),
+                func.sum(QueryRollup.blocked_queries).label("blocked"),
+            )
+            .where(
+                QueryRollup.granularity == granularity,
+                QueryRollup.bucket_start >= start,
+                QueryRollup.bucket_start < end,
+                QueryRollup.node_id.is_not(None),
+            )
+            .group_by(QueryRollup.node_id)
+        )
+
+    sources = [
+        tier("daily", first_day, daily_end),
+        tier("hourly", since_hour, min(first_day, tier_end)),
+        tier("hourly", daily_end, tier_end),
+        sa.select(
+            DNSQueryEvent.node_id,
+            func.count().label("total"),
+            func.count().filter(DNSQueryEvent.blocked.is_(True)).label("blocked"),
+        )
+        .where(
+            DNSQueryEvent.ts >= tier_end,
+            DNSQueryEvent.ts < now,
+            DNSQueryEvent.node_id.is_not(None),
+            DNSQueryEvent.is_internal.is_(False),
+        )
+        .group_by(DNSQueryEvent.node_id),
+    ]
+    merged = sa.union_all(*sources).subquery()
+    rows = db.execute(
+        sa.select(
+            merged.c.node_id,
+            func.sum(merged.c.total).label("total"),
+            func.sum(merged.c.blocked).label("blocked"),
+        ).group_by(merged.c.node_id)
+    ).all()
+    return {row.node_id: (int(row.total or 0), int(row.blocked or 0)) for row in rows}
@@ -5,6 +5,21 @@ import time
 from collections.abc import Iterable
 from dataclasses import dataclass
 
+from app.services.prometheus import Gauge, Histogram
+
+RPZ_RENDER_SECONDS = Histogram(
+    "powerblockade_rpz_render_seconds",
+    "Time to render an RPZ zone file, by zone",
+    ["zone"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RPZ_ZONE_BYTES = Gauge(
+    "powerblockade_rpz_zone_bytes", "Size of the last rendered RPZ zone file", ["zone"]
+)
+RPZ_ZONE_RECORDS = Gauge(
+    "powerblockade_rpz_zone_records", "Domains in the last rendered RPZ zone", ["zone"]
+)
+
 _comment_re = re.compile(r"\s*(#|;).*$")
 
 
@@ -61,7 +76,15 @@ def parse_blocklist_text(text: str, fmt: str) -> set[str]:
     return parse_blocklist_lines(text.splitlines(), fmt)
 
 
+def _observe_render(zone: str, start: float, text: str, records: int) -> None:
+    RPZ_RENDER_SECONDS.observe(time.perf_counter() - start, zone=zone)
+    # Zone files are ASCII (IDNs arrive punycoded), so characters are bytes.
+    RPZ_ZONE_BYTES.set(len(text), zone=zone)
+    RPZ_ZONE_RECORDS.set(records, zone=zone)
+
+
 def render_rpz_zone(domains: set[str], *, policy_name: str) -> str:
+    start = time.perf_counter()
     now = int(time.time())
     header = (
         f"$TTL 300\n"
@@ -72,10 +95,13 @@ def render_rpz_zone(domains: set[str], *, policy_name: str) -> str:
     lines = [header]
     for d in sorted(domains):
         lines.append(f"{d}. CNAME .\n")
-    return "".join(lines)
+    text = "".join(lines)
+    _observe_render(policy_name, start, text, len(domains))
+    return text
 
 
 def render_rpz_whitelist(domains: set[str]) -> str:
+    start = time.perf_counter()
     now = int(time.time())
     header = (
         f"$TTL 300\n"
@@ -86,7 +112,9 @@ def render_rpz_whitelist(domains: set[str]) -> str:
     lines = [header]
     for d in sorted(domains):
         lines.append(f"{d}. CNAME rpz-passthru.\n")
-    return "".join(lines)
+    text = "".join(lines)
+    _observe_render("whitelist", start, text, len(domains))
+    return text
 
 
 @dataclass(frozen=True)
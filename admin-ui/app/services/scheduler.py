@@ -18,20 +18,36 @@ from app.models.blocklist import Blocklist
 from app.models.blocklist_entry import BlocklistEntry
 from app.models.manual_entry import ManualEntry
 from app.models.node import Node
-from app.models.node_metrics import NodeMetrics
 from app.models.settings import get_health_offline_minutes, get_health_stale_minutes
 from app.services.atomic_write import atomic_write
 from app.services.blocklist_manager import fetch_and_parse_blocklist
 from app.services.blocklist_scheduler import run_schedule_check
+from app.services.metrics_collectors import refresh_metrics
+from app.services.node_metrics import compute_node_metrics_rollups, record_node_metrics
+from app.services.partitions import ensure_event_partitions
+from app.services.prometheus import METRICS_REFRESH_SECONDS, Histogram
 from app.services.retention import run_retention_job
-from app.services.rollups import run_rollup_job
+from app.services.rollups import compute_minute_rollups, get_dashboard_stats, run_rollup_job
 from app.services.rpz import render_rpz_whitelist, render_rpz_zone
+from app.services.stats_cache import (
+    STATS_CACHE_TTL,
+    STATS_PREWARM_HOURS,
+    purge_shared_stats_cache,
+)
+from app.services.top_domains import compute_topk_rollups
 from app.settings import get_settings
 
 log = logging.getLogger(__name__)
 
 _scheduler: BackgroundScheduler | None = None
 
+JOB_DURATION = Histogram(
+    "powerblockade_job_duration_seconds",
+    "Scheduler job run time, by job (runs skipped for the lock are not observed)",
+    ["job"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+
 
 from typing import Any
 
@@ -58,7 +74,8 @@ def run_with_advisory_lock(job_name: str) -> Callable[[Callable[..., Any]], Call
                     return None
 
                 try:
-                    return func(*args, **kwargs)
+                    with JOB_DURATION.time(job=job_name):
+                        return func(*args, **kwargs)
                 finally:
                     # Always release lock
                     db.execute(sa.text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
@@ -179,6 +196,79 @@ def rollup_job() -> None:
         db.close()
 
 
+@run_with_advisory_lock("topk_rollup")
+def topk_rollup_job() -> None:
+    """Advance the hourly top-K domain tier, independently of the rollup tiers."""
+    db = SessionLocal()
+    try:
+        written = compute_topk_rollups(db)
+        log.info(f"Top-K rollup job completed: {written} rows")
+    except Exception as e:
+        log.error(f"Top-K rollup job failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+@run_with_advisory_lock("stats_prewarm")
+def stats_prewarm_job() -> None:
+    """Recompute the standard dashboard stats windows before they expire."""
+    db = SessionLocal()
+    try:
+        for hours in STATS_PREWARM_HOURS:
+            get_dashboard_stats(db, hours=hours, refresh=True)
+        # Old window keys are never read again; keep the shared table small.
+        purge_shared_stats_cache(db, older_than_seconds=3600)
+    except Exception as e:
+        log.error(f"Stats pre-warm job failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def metrics_refresh_job() -> None:
+    """Recompute the cached /metrics collectors between scrapes.
+
+    Not advisory-locked: the cache is per process, so every instance
+    refreshes its own.
+    """
+    db = SessionLocal()
+    try:
+        with JOB_DURATION.time(job="metrics_refresh"):
+            refresh_metrics(db)
+    except Exception as e:
+        log.error(f"Metrics refresh job failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+@run_with_advisory_lock("minute_rollup")
+def minute_rollup_job() -> None:
+    """Advance the per-minute rollup tier to the last completed minute."""
+    db = SessionLocal()
+    try:
+        compute_minute_rollups(db)
+    except Exception as e:
+        log.error(f"Minute rollup job failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+@run_with_advisory_lock("node_metrics_rollup")
+def node_metrics_rollup_job() -> None:
+    """Downsample raw node_metrics samples into the 5m and 1h tiers."""
+    db = SessionLocal()
+    try:
+        compute_node_metrics_rollups(db)
+    except Exception as e:
+        log.error(f"Node metrics rollup job failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
 @run_with_advisory_lock("retention")
 def retention_job() -> None:
     db = SessionLocal()
@@ -191,6 +281,19 @@ def retention_job() -> None:
         db.close()
 
 
+@run_with_advisory_lock("event_partitions")
+def event_partitions_job() -> None:
+    """Keep daily dns_query_events partitions created ahead of time."""
+    db = SessionLocal()
+    try:
+        ensure_event_partitions(db)
+    except Exception as e:
+        log.error(f"Event partitions job failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
 @run_with_advisory_lock("node_state_transitions")
 def node_state_transitions_job() -> None:
     """Transition nodes to STALE/OFFLINE based on last_seen timestamp."""
@@ -286,28 +389,30 @@ def scrape_local_recursor_metrics() -> None:
         if not metrics:
             return
 
-        nm = NodeMetrics(
-            node_id=local_node.id,
-            cache_hits=metrics.get("cache_hits", 0),
-            cache_misses=metrics.get("cache_misses", 0),
-            cache_entries=metrics.get("cache_entries", 0),
-            packetcache_hits=metrics.get("packetcache_hits", 0),
-            packetcache_misses=metrics.get("packetcache_misses", 0),
-            answers_0_1=metrics.get("answers0_1", 0),
-            answers_1_10=metrics.get("answers1_10", 0),
-            answers_10_100=metrics.get("answers10_100", 0),
-            answers_100_1000=metrics.get("answers100_1000", 0),
-            answers_slow=metrics.get("answers_slow", 0),
-            concurrent_queries=metrics.get("concurrent_queries", 0),
-            outgoing_timeouts=metrics.get("outgoing_timeouts", 0),
-            servfail_answers=metrics.get("servfail_answers", 0),
-            nxdomain_answers=metrics.get("nxdomain_answers", 0),
-            questions=metrics.get("questions", 0),
-            all_outqueries=metrics.get("all_outqueries", 0),
-            uptime_seconds=metrics.get("uptime", 0),
+        record_node_metrics(
+            db,
+            local_node.id,
+            {
+                "cache_hits": metrics.get("cache_hits", 0),
+                "cache_misses": metrics.get("cache_misses", 0),
+                "cache_entries": metrics.get("cache_entries", 0),
+                "packetcache_hits": metrics.get("packetcache_hits", 0),
+                "packetcache_misses": metrics.get("packetcache_misses", 0),
+                "answers_0_1": metrics.get("answers0_1", 0),
+                "answers_1_10": metrics.get("answers1_10", 0),
+                "answers_10_100": metrics.get("answers10_100", 0),
+                "answers_100_1000": metrics.get("answers100_1000", 0),
+                "answers_slow": metrics.get("answers_slow", 0),
+                "concurrent_queries": metrics.get("concurrent_queries", 0),
+                "outgoing_timeouts": metrics.get("outgoing_timeouts", 0),
+                "servfail_answers": metrics.get("servfail_answers", 0),
+                "nxdomain_answers": metrics.get("nxdomain_answers", 0),
+                "questions": metrics.get("questions", 0),
+                "all_outqueries": metrics.get("all_outqueries", 0),
+                "uptime_seconds": metrics.get("uptime", 0),
+            },
         )
         local_node.last_seen = datetime.now(timezone.utc)
-        db.add(nm)
         db.commit()
     except Exception as e:
         log.error(f"Local metrics collection failed: {e}")
@@ -340,6 +445,60 @@ def start_scheduler() -> None:
         replace_existing=True,
     )
 
+    _scheduler.add_job(
+        topk_rollup_job,
+        CronTrigger(minute="5"),
+        id="topk_rollup",
+        name="Compute hourly top-K domains",
+        replace_existing=True,
+    )
+
+    _scheduler.add_job(
+        stats_prewarm_job,
+        # Inside the cache TTL so the standard windows never expire.
+        IntervalTrigger(seconds=int(STATS_CACHE_TTL * 0.75)),
+        id="stats_prewarm",
+        name="Pre-warm dashboard stats cache",
+        replace_existing=True,
+        next_run_time=datetime.now(timezone.utc),
+    )
+
+    _scheduler.add_job(
+        metrics_refresh_job,
+        IntervalTrigger(seconds=METRICS_REFRESH_SECONDS),
+        id="metrics_refresh",
+        name="Refresh cached Prometheus metrics",
+        replace_existing=True,
+        next_run_time=datetime.now(timezone.utc),
+    )
+
+    _scheduler.add_job(
+        minute_rollup_job,
+        IntervalTrigger(minutes=1),
+        id="minute_rollup",
+        name="Compute minute query rollups",
+        replace_existing=True,
+        next_run_time=datetime.now(timezone.utc),
+    )
+
+    _scheduler.add_job(
+        node_metrics_rollup_job,
+        IntervalTrigger(minutes=5),
+        id="node_metrics_rollup",
+        name="Downsample node metrics",
+        replace_existing=True,
+        next_run_time=datetime.now(timezone.utc),
+    )
+
+    _scheduler.add_job(
+        event_partitions_job,
+        IntervalTrigger(hours=1),
+        id="event_partitions",
+        name="Create upcoming event partitions",
+        replace_existing=True,
+        next_run_time=datetime.now(timezone.utc),  # Run immediately on boot
+    )
+
     _scheduler.add_job(
         retention_job,
         CronTrigger(hour="3", minute="0"),
@@ -349,7 +508,11 @@ def start_scheduler() -> None:
     )
 
     # Lazy import to avoid circular dependency with app.services.precache
-    from app.services.precache import precache_warming_job
+    from app.services.precache import (
+        PAIR_STATE_CHECKPOINT_SECONDS,
+        precache_state_checkpoint_job,
+        precache_warming_job,
+    )
 
     _scheduler.add_job(
         precache_warming_job,
@@ -360,6 +523,14 @@ def start_scheduler() -> None:
         next_run_time=datetime.now(timezone.utc),  # Run immediately on boot
     )
 
+    _scheduler.add_job(
+        precache_state_checkpoint_job,
+        IntervalTrigger(seconds=PAIR_STATE_CHECKPOINT_SECONDS),
+        id="precache_state_checkpoint",
+        name="Checkpoint precache pair TTL state",
+        replace_existing=True,
+    )
+
     _scheduler.add_job(
         scrape_local_recursor_metrics,
         IntervalTrigger(seconds=60),
@@ -0,0 +1,206 @@
+"""Bounded, single-flight cache for dashboard stats.
+
+get_dashboard_stats results are cached per window key for
+``STATS_CACHE_TTL`` seconds in a per-process LRU of at most
+``STATS_CACHE_MAX_ENTRIES`` keys, so arbitrary ``/api/stats?hours=N``
+values cannot grow it without bound. Concurrent misses for one key
+compute once; the other callers wait for that result.
+
+With the ``postgres`` backend (the default; set STATS_CACHE_BACKEND=memory
+to disable) results are also shared through the unlogged ``stats_cache``
+table. A miss first looks there, and computation is serialised across
+processes with an advisory lock, so one uvicorn worker computes and the
+others read its row. The scheduler's pre-warm job refreshes the standard
+windows before they expire, keeping requests off the compute path.
+
+The shared table is a cache: rows are lost on a PostgreSQL crash, and any
+error talking to it falls back to computing locally.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models.stats_cache_entry import StatsCacheEntry
+from app.settings import get_settings
+
+log = logging.getLogger(__name__)
+
+STATS_CACHE_TTL = 60.0  # seconds
+STATS_CACHE_MAX_ENTRIES = 64
+# Windows the scheduler keeps warm: the dashboard, /metrics and the
+# /api/stats default.
+STATS_PREWARM_HOURS = (24,)
+
+_LOCK_STRIPES = 16
+# First key of the two-key advisory lock, keeping shared-cache locks out of
+# the single-key space the scheduler's job locks use.
+_SHARED_LOCK_NAMESPACE = 0x73746174  # "stat"
+
+
+@dataclass
+class CachedStats:
+    value: dict[str, Any]
+    computed_at: float  # epoch seconds, comparable across processes
+
+    def age(self) -> float:
+        return max(time.time() - self.computed_at, 0.0)
+
+
+class StatsCache:
+    """Per-process LRU with single-flight misses and an optional shared tier."""
+
+    def __init__(
+        self, ttl: float = STATS_CACHE_TTL, max_entries: int = STATS_CACHE_MAX_ENTRIES
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedStats] = OrderedDict()
+        self._lock = threading.Lock()
+        # Striped per-key locks: bounded however many keys are requested.
+        self._stripes = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key: str) -> CachedStats | None:
+        """Fresh local entry for ``key``, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.age() >= self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedStats) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(
+        self,
+        db: Session,
+        key: str,
+        compute: Callable[[], dict[str, Any]],
+        *,
+        refresh: bool = False,
+    ) -> CachedStats:
+        """Return a fresh entry for ``key``, computing it at most once.
+
+        ``refresh`` recomputes even when a fresh entry exists (pre-warm).
+        """
+        if not refresh and (entry := self.get(key)) is not None:
+            return entry
+
+        with self._stripes[hash(key) % _LOCK_STRIPES]:
+            # Another thread may have filled it while this one waited.
+            if not refresh and (entry := self.get(key)) is not None:
+                return entry
+            entry = None
+            if _shared_enabled(db):
+                entry = _shared_get_or_compute(db, key, compute, self.ttl, refresh)
+            if entry is None:
+                entry = CachedStats(value=compute(), computed_at=time.time())
+            self.put(key, entry)
+            return entry
+
+
+def _shared_enabled(db: Session) -> bool:
+    return (
+        get_settings().stats_cache_backend == "postgres"
+        and db.get_bind().dialect.name == "postgresql"
+    )
+
+
+def _read_shared(conn: Connection, key: str, ttl: float) -> CachedStats | None:
+    row = conn.execute(
+        sa.select(StatsCacheEntry.computed_at, StatsCacheEntry.payload).where(
+            StatsCacheEntry.key == key
+        )
+    ).first()
+    if row is None:
+        return None
+    entry = CachedStats(value=row.payload, computed_at=row.computed_at.timestamp())
+    return entry if entry.age() < ttl else None
+
+
+def _write_shared(conn: Connection, key: str, entry: CachedStats) -> None:
+    computed_at = datetime.fromtimestamp(entry.computed_at, tz=timezone.utc)
+    stmt = pg_insert(StatsCacheEntry).values(key=key, computed_at=computed_at, payload=entry.value)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={"computed_at": stmt.excluded.computed_at, "payload": stmt.excluded.payload},
+        )
+    )
+
+
+def _shared_get_or_compute(
+    db: Session,
+    key: str,
+    compute: Callable[[], dict[str, Any]],
+    ttl: float,
+    refresh: bool,
+) -> CachedStats | None:
+    """Read or fill the shared row; None if the shared tier is unusable.
+
+    The advisory lock is transaction-scoped and taken on the caller's own
+    connection, so computing holds no second pooled connection; it is
+    released when the caller's transaction ends. The row is written on a
+    short-lived connection so waiters see it as soon as it is committed.
+    Errors from ``compute`` propagate.
+    """
+    try:
+        # A savepoint keeps a failed read or lock from aborting the caller.
+        with db.begin_nested():
+            conn = db.connection()
+            if not refresh and (entry := _read_shared(conn, key, ttl)) is not None:
+                return entry
+            conn.execute(
+                sa.select(
+                    sa.func.pg_advisory_xact_lock(_SHARED_LOCK_NAMESPACE, sa.func.hashtext(key))
+                )
+            )
+            if not refresh and (entry := _read_shared(conn, key, ttl)) is not None:
+                return entry
+    except SQLAlchemyError as e:
+        log.warning(f"Shared stats cache unavailable, computing locally: {e}")
+        return None
+
+    entry = CachedStats(value=compute(), computed_at=time.time())
+    try:
+        with db.get_bind().connect() as conn:
+            _write_shared(conn, key, entry)
+            conn.commit()
+    except SQLAlchemyError as e:
+        log.warning(f"Could not write shared stats cache entry: {e}")
+    return entry
+
+
+def purge_shared_stats_cache(db: Session, older_than_seconds: float) -> int:
+    """Delete shared rows older than ``older_than_seconds``; returns the count."""
+    if not _shared_enabled(db):
+        return 0
+    cutoff = datetime.fromtimestamp(time.time() - older_than_seconds, tz=timezone.utc)
+    result = db.execute(sa.delete(StatsCacheEntry).where(StatsCacheEntry.computed_at < cutoff))
+    db.commit()
+    return int(getattr(result, "rowcount", 0) or 0)
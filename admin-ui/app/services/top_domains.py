@@ -0,0 +1,308 @@
+"""Top-domain lists served from the hourly top-K tier.
+
+query_topk_hourly keeps an exact per-hour top-N: for every hour and every
+(blocked, is_internal) combination, the TOPK_PER_HOUR busiest
+(qname, qtype) pairs with their total, NOERROR and cache-hit counts.
+get_top_domains() merges the hours of its window from the tier and only
+groups raw events for the partial hour at the start of the window and
+for everything after the tier's watermark, so the cost no longer grows
+with a full day of traffic.
+
+Pairs that never make an hour's top-N are missing from that hour, so
+window counts are lower bounds and the tail of a long list is
+approximate; the head of the list, which is what the views show, is
+exact unless traffic is spread over more than TOPK_PER_HOUR pairs per
+hour. Hours are ranked by total count only, so NOERROR and cache-hit
+rankings read from the tier are approximate as well.
+
+Filters the tier does not carry (client, blocklist) fall back to raw
+events for the whole window.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Literal, cast
+
+import sqlalchemy as sa
+from sqlalchemy import func
+from sqlalchemy.engine import CursorResult, Row
+from sqlalchemy.orm import Session
+
+from app.models.dns_query_event import DNSQueryEvent
+from app.models.query_topk import QueryTopK
+from app.services.query_log import SearchMode, qname_search
+from app.services.rollups import (
+    CACHE_HIT_LATENCY_THRESHOLD_MS,
+    get_rollup_watermark,
+    set_rollup_watermark,
+)
+
+log = logging.getLogger(__name__)
+
+TOPK_WATERMARK = "topk"
+# Pairs kept per hour and (blocked, is_internal). Bounds a 24h read to
+# about 24 * 4 * TOPK_PER_HOUR rows; precache's warm list (up to
+# precache_domain_count pairs) is drawn from the union of the hours.
+TOPK_PER_HOUR = 1000
+# Hours before the watermark recomputed every run for late events.
+TOPK_LATENESS = timedelta(hours=1)
+# How far back the first run starts; the longest top-list window.
+TOPK_BACKFILL = timedelta(days=7)
+
+TopMetric = Literal["total", "noerror", "cache_hits"]
+
+_TIER_COLUMNS = {
+    "total": QueryTopK.query_count,
+    "noerror": QueryTopK.noerror_count,
+    "cache_hits": QueryTopK.cache_hits,
+}
+
+
+def _floor_hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil_hour(ts: datetime) -> datetime:
+    floored = _floor_hour(ts)
+    return floored if floored == ts else floored + timedelta(hours=1)
+
+
+def compute_hourly_topk(db: Session, hour_start: datetime) -> int:
+    """Rewrite one hour of the top-K tier. Returns the rows written."""
+    hour_end = hour_start + timedelta(hours=1)
+    ranked = (
+        sa.select(
+            DNSQueryEvent.qname,
+            DNSQueryEvent.qtype,
+            DNSQueryEvent.blocked,
+            DNSQueryEvent.is_internal,
+            func.count().label("query_count"),
+            func.count().filter(DNSQueryEvent.rcode == 0).label("noerror_count"),
+            func.count()
+            .filter(DNSQueryEvent.latency_ms < CACHE_HIT_LATENCY_THRESHOLD_MS)
+            .label("cache_hits"),
+            func.row_number()
+            .over(
+                partition_by=(DNSQueryEvent.blocked, DNSQueryEvent.is_internal),
+                order_by=func.count().desc(),
+            )
+            .label("rank"),
+        )
+        .where(DNSQueryEvent.ts >= hour_start, DNSQueryEvent.ts < hour_end)
+        .group_by(
+            DNSQueryEvent.qname,
+            DNSQueryEvent.qtype,
+            DNSQueryEvent.blocked,
+            DNSQueryEvent.is_internal,
+        )
+        .subquery()
+    )
+    columns = ["qname", "qtype", "blocked", "is_internal", "query_count", "noerror_count"]
+    select_stmt = sa.select(
+        sa.literal(hour_start, sa.DateTime(timezone=True)),
+        *[ranked.c[c] for c in columns],
+        ranked.c.cache_hits,
+    ).where(ranked.c.rank <= TOPK_PER_HOUR)
+
+    db.execute(sa.delete(QueryTopK).where(QueryTopK.bucket_start == hour_start))
+    result = cast(
+        CursorResult,
+        db.execute(
+            sa.insert(QueryTopK)
+            .from_select(["bucket_start", *columns, "cache_hits"], select_stmt)
+            .execution_options(preserve_rowcount=True)
+        ),
+    )
+    return result.rowcount or 0
+
+
+def compute_topk_rollups(db: Session, now: datetime | None = None) -> int:
+    """Bring the top-K tier up to the last completed hour.
+
+    Recomputes from ``TOPK_LATENESS`` before the watermark (or
+    ``TOPK_BACKFILL`` ago on the first run), committing and advancing the
+    watermark after every hour. Returns the rows written.
+    """
+    end = _floor_hour(now or datetime.now(timezone.utc))
+    floor = end - TOPK_BACKFILL
+    watermark = get_rollup_watermark(db, TOPK_WATERMARK)
+    hour = max(watermark - TOPK_LATENESS, floor) if watermark else floor
+
+    written = 0
+    while hour < end:
+        written += compute_hourly_topk(db, hour)
+        hour += timedelta(hours=1)
+        if watermark is None or hour > watermark:
+            watermark = hour
+            set_rollup_watermark(db, TOPK_WATERMARK, watermark)
+        db.commit()
+
+    return written
+
+
+def _top_domains_query(
+    db: Session,
+    since: datetime,
+    *,
+    by_qtype: bool,
+    metric: TopMetric,
+    blocked: bool | None,
+    include_internal: bool,
+    search: str | None,
+    search_mode: SearchMode,
+    client_ip: str | None,
+    blocklist: str | None,
+    cache_hit_threshold_ms: int,
+) -> sa.Select:
+    watermark = None
+    if not client_ip and not blocklist and cache_hit_threshold_ms == CACHE_HIT_LATENCY_THRESHOLD_MS:
+        watermark = get_rollup_watermark(db, TOPK_WATERMARK)
+    tier_start = _ceil_hour(since)
+
+    sources: list[sa.Select] = []
+    raw_ranges: list[tuple[datetime, datetime | None]] = [(since, None)]
+    if watermark is not None and watermark > tier_start:
+        raw_ranges = [(since, tier_start), (watermark, None)]
+
+        # The tier keeps each hour's pairs ranked by total count, so a pair
+        # with many NOERROR answers or cache hits but a low total may have
+        # been cut: "noerror" and "cache_hits" rankings from the tier are
+        # approximate, only "total" is exact for the head of the list.
+        n = _TIER_COLUMNS[metric]
+        keys: list[Any] = [QueryTopK.qname]
+        if by_qtype:
+            keys.append(QueryTopK.qtype)
+        tier = (
+            sa.select(
+                *keys,
+                func.sum(n).label("n"),
+                func.coalesce(func.sum(n).filter(QueryTopK.blocked.is_(True)), 0).label(
+                    "blocked_n"
+                ),
+            )
+            .where(
+                QueryTopK.bucket_start >= tier_start,
+                QueryTopK.bucket_start < watermark,
+                n > 0,
+            )
+            .group_by(*keys)
+        )
+        if blocked is not None:
+            tier = tier.where(QueryTopK.blocked.is_(blocked))
+        if not include_internal:
+            tier = tier.where(QueryTopK.is_internal.is_(False))
+        if search:
+            tier = tier.where(qname_search(QueryTopK.qname, search, search_mode))
+        sources.append(tier)
+
+    keys = [DNSQueryEvent.qname]
+    if by_qtype:
+        keys.append(DNSQueryEvent.qtype)
+    for start, end in raw_ranges:
+        if end is not None and end <= start:
+            continue
+        raw = (
+            sa.select(
+                *keys,
+                func.count().label("n"),
+                func.count().filter(DNSQueryEvent.blocked.is_(True)).label("blocked_n"),
+            )
+            .where(DNSQueryEvent.ts >= start)
+            .group_by(*keys)
+        )
+        if end is not None:
+            raw = raw.where(DNSQueryEvent.ts < end)
+        if metric == "noerror":
+            raw = raw.where(DNSQueryEvent.rcode == 0)
+        elif metric == "cache_hits":
+            raw = raw.where(DNSQueryEvent.latency_ms < cache_hit_threshold_ms)
+        if blocked is not None:
+            raw = raw.where(DNSQueryEvent.blocked.is_(blocked))
+        if not include_internal:
+            raw = raw.where(DNSQueryEvent.is_internal.is_(False))
+        if search:
+            raw = raw.where(qname_search(DNSQueryEvent.qname, search, search_mode))
+        if client_ip:
+            raw = raw.where(DNSQueryEvent.client_ip == client_ip)
+        if blocklist:
+            raw = raw.where(DNSQueryEvent.blocklist_name == blocklist)
+        sources.append(raw)
+
+    merged = (sa.union_all(*sources) if len(sources) > 1 else sources[0]).subquery()
+    merged_keys = [merged.c.qname, merged.c.qtype] if by_qtype else [merged.c.qname]
+    return sa.select(
+        *merged_keys,
+        func.sum(merged.c.n).label("count"),
+        func.sum(merged.c.blocked_n).label("blocked_count"),
+    ).group_by(*merged_keys)
+
+
+def get_top_domains(
+    db: Session,
+    since: datetime,
+    *,
+    by_qtype: bool = False,
+    metric: TopMetric = "total",
+    blocked: bool | None = None,
+    include_internal: bool = False,
+    search: str | None = None,
+    search_mode: SearchMode = "contains",
+    client_ip: str | None = None,
+    blocklist: str | None = None,
+    cache_hit_threshold_ms: int = CACHE_HIT_LATENCY_THRESHOLD_MS,
+    limit: int | None = None,
+    offset: int = 0,
+) -> list[Row]:
+    """Busiest qnames (or (qname, qtype) pairs with ``by_qtype``) since ``since``.
+
+    Rows have ``qname`` (and ``qtype``), ``count`` -- the number of
+    queries counted by ``metric`` -- and ``blocked_count``, ordered by
+    count descending.
+    """
+    stmt = _top_domains_query(
+        db,
+        since,
+        by_qtype=by_qtype,
+        metric=metric,
+        blocked=blocked,
+        include_internal=include_internal,
+        search=search,
+        search_mode=search_mode,
+        client_ip=client_ip,
+        blocklist=blocklist,
+        cache_hit_threshold_ms=cache_hit_threshold_ms,
+    )
+    stmt = stmt.order_by(sa.desc("count"), sa.asc("qname")).offset(offset)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return list(db.execute(stmt).all())
+
+
+def count_top_domains(
+    db: Session,
+    since: datetime,
+    *,
+    blocked: bool | None = None,
+    include_internal: bool = False,
+    search: str | None = None,
+    search_mode: SearchMode = "contains",
+    client_ip: str | None = None,
+    blocklist: str | None = None,
+) -> int:
+    """Number of distinct qnames get_top_domains() would list."""
+    stmt = _top_domains_query(
+        db,
+        since,
+        by_qtype=False,
+        metric="total",
+        blocked=blocked,
+        include_internal=include_internal,
+        search=search,
+        search_mode=search_mode,
+        client_ip=client_ip,
+        blocklist=blocklist,
+        cache_hit_threshold_ms=CACHE_HIT_LATENCY_THRESHOLD_MS,
+    ).subquery()
+    return int(db.execute(sa.select(func.count()).select_from(stmt)).scalar() or 0)
@@ -28,6 +28,25 @@ class Settings(BaseSettings):
     # Default 5ms based on typical local cache latency; adjust based on your hardware
     cache_hit_threshold_ms: int = 5
 
+    # Dashboard stats cache shared between processes: "postgres" (an
+    # unlogged table, see app/services/stats_cache.py) or "memory"
+    # (per-process only)
+    stats_cache_backend: str = "postgres"
+
+    # Opt-in per-request SQL profiling (app/sql_profiler.py): logs requests
+    # over the time or statement-count thresholds with their slowest
+    # statements, and keeps recent slow queries for the /system page
+    sql_profiling_enabled: bool = False
+    sql_profiling_request_ms: float = 500.0
+    sql_profiling_statement_count: int = 50
+    sql_profiling_slow_query_ms: float = 100.0
+    sql_profiling_explain: bool = False
+    sql_profiling_buffer_size: int = 100
+
+    # Recently ingested events kept in memory per process for the live
+    # stream and setup checks (app/services/recent_events.py)
+    recent_events_buffer_size: int = 10000
+
     # Version info (injected at build time)
     pb_version: str = "v0.10.0"
     pb_git_sha: str = "unknown"
@@ -0,0 +1,288 @@
+"""Opt-in per-request SQL profiling (SQL_PROFILING_ENABLED=true).
+
+SqlProfilerMiddleware attaches before/after_cursor_execute hooks to every
+SQLAlchemy engine and records each statement a request executes with its
+duration. When the request finishes:
+
+- a request slower than ``sql_profiling_request_ms``, or running at least
+  ``sql_profiling_statement_count`` statements (the usual N+1 signature),
+  is logged with its statement count, total DB time and slowest
+  statements;
+- every statement slower than ``sql_profiling_slow_query_ms`` goes into a
+  bounded ring buffer of recent slow queries with its normalized SQL
+  (literals and parameters replaced by ``?``), shown on the /system page.
+  With ``sql_profiling_explain`` a PostgreSQL SELECT also gets its
+  EXPLAIN plan, run once per distinct normalized statement on a separate
+  connection.
+
+The hooks are only installed when profiling is enabled, so it costs
+nothing otherwise. The buffer is per process.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.request_metrics import UNMATCHED_ROUTE
+from app.settings import Settings
+
+log = logging.getLogger(__name__)
+
+# Statements listed in a slow-request log line.
+LOGGED_STATEMENTS = 3
+# Normalized SQL longer than this is truncated in the buffer and logs.
+MAX_SQL_LENGTH = 2000
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"%\([^)]+\)s|%s")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Collapse a statement to its shape: literals and parameters become ``?``.
+
+    ``IN`` lists of any length collapse to ``(...)`` so one query
+    pattern with different batch sizes normalizes to the same text.
+    """
+    sql = _STRING_RE.sub("?", statement)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _LIST_RE.sub("(...)", sql)
+    sql = _WS_RE.sub(" ", sql).strip()
+    if len(sql) > MAX_SQL_LENGTH:
+        sql = sql[:MAX_SQL_LENGTH] + "..."
+    return sql
+
+
+@dataclass
+class StatementTiming:
+    statement: str
+    parameters: Any
+    duration_ms: float
+    engine: Engine
+    executemany: bool = False
+
+
+@dataclass
+class RequestProfile:
+    statements: list[StatementTiming] = field(default_factory=list)
+
+    @property
+    def db_ms(self) -> float:
+        return sum(s.duration_ms for s in self.statements)
+
+    def slowest(self, n: int) -> list[StatementTiming]:
+        return sorted(self.statements, key=lambda s: s.duration_ms, reverse=True)[:n]
+
+
+@dataclass
+class SlowQuery:
+    at: datetime
+    method: str
+    route: str
+    duration_ms: float
+    sql: str
+    explain: str | None = None
+
+
+_profile: ContextVar[RequestProfile | None] = ContextVar("sql_profile", default=None)
+# Set on the statement's execution context, which is discarded with the
+# statement: one that raises never reaches after_cursor_execute, and its
+# start must not outlive it on the pooled connection.
+_START_ATTR = "_sql_profiler_start"
+
+
+class SqlProfiler:
+    def __init__(
+        self,
+        *,
+        request_ms: float = 500.0,
+        statement_count: int = 50,
+        slow_query_ms: float = 100.0,
+        explain: bool = False,
+        buffer_size: int = 100,
+    ) -> None:
+        self.request_ms = request_ms
+        self.statement_count = statement_count
+        self.slow_query_ms = slow_query_ms
+        self.explain = explain
+        self._slow_queries: deque[SlowQuery] = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> SqlProfiler:
+        return cls(
+            request_ms=settings.sql_profiling_request_ms,
+            statement_count=settings.sql_profiling_statement_count,
+            slow_query_ms=settings.sql_profiling_slow_query_ms,
+            explain=settings.sql_profiling_explain,
+            buffer_size=settings.sql_profiling_buffer_size,
+        )
+
+    # -- hooks --------------------------------------------------------------
+
+    def install(self) -> None:
+        for name, hook in (
+            ("before_cursor_execute", _before_cursor_execute),
+            ("after_cursor_execute", _after_cursor_execute),
+        ):
+            if not event.contains(Engine, name, hook):
+                event.listen(Engine, name, hook)
+
+    def uninstall(self) -> None:
+        for name, hook in (
+            ("before_cursor_execute", _before_cursor_execute),
+            ("after_cursor_execute", _after_cursor_execute),
+        ):
+            if event.contains(Engine, name, hook):
+                event.remove(Engine, name, hook)
+
+    @contextmanager
+    def capture(self) -> Iterator[RequestProfile]:
+        """Record the statements executed inside the block."""
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        try:
+            yield profile
+        finally:
+            _profile.reset(token)
+
+    # -- reporting ----------------------------------------------------------
+
+    def recent_slow_queries(self) -> list[SlowQuery]:
+        """Newest first."""
+        with self._lock:
+            return list(reversed(self._slow_queries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slow_queries.clear()
+
+    def finish(self, profile: RequestProfile, method: str, route: str, elapsed_ms: float) -> None:
+        """Log a slow request and buffer its slow statements."""
+        now = datetime.now(timezone.utc)
+        for s in profile.statements:
+            if s.duration_ms >= self.slow_query_ms:
+                sql = normalize_sql(s.statement)
+                self._record(
+                    SlowQuery(
+                        at=now,
+                        method=method,
+                        route=route,
+                        duration_ms=round(s.duration_ms, 1),
+                        sql=sql,
+                        explain=self._explain(s, sql) if self.explain else None,
+                    )
+                )
+
+        count = len(profile.statements)
+        if elapsed_ms >= self.request_ms or count >= self.statement_count:
+            slowest = "; ".join(
+                f"{s.duration_ms:.1f} ms {normalize_sql(s.statement)[:200]}"
+                for s in profile.slowest(LOGGED_STATEMENTS)
+            )
+            log.warning(
+                f"Slow request {method} {route}: {elapsed_ms:.0f} ms, {count} statements, "
+                f"{profile.db_ms:.0f} ms in SQL; slowest: {slowest or 'none'}"
+            )
+
+    def _record(self, query: SlowQuery) -> None:
+        with self._lock:
+            self._slow_queries.append(query)
+
+    def _explain(self, s: StatementTiming, sql: str) -> str | None:
+        if s.executemany or s.engine.dialect.name != "postgresql":
+            return None
+        if not s.statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+        with self._lock:
+            for known in self._slow_queries:
+                if known.sql == sql and known.explain:
+                    return known.explain
+        try:
+            with s.engine.connect() as conn:
+                rows = conn.exec_driver_sql(f"EXPLAIN {s.statement}", s.parameters).all()
+                conn.rollback()
+            return "\n".join(row[0] for row in rows)
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _profile.get() is not None and context is not None:
+        setattr(context, _START_ATTR, time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    profile = _profile.get()
+    start = getattr(context, _START_ATTR, None)
+    if profile is None or start is None:
+        return
+    profile.statements.append(
+        StatementTiming(
+            statement=statement,
+            parameters=parameters,
+            duration_ms=(time.perf_counter() - start) * 1000,
+            engine=conn.engine,
+            executemany=executemany,
+        )
+    )
+
+
+class SqlProfilerMiddleware:
+    """Pure ASGI middleware profiling each HTTP request's SQL."""
+
+    def __init__(self, app: ASGIApp, profiler: SqlProfiler) -> None:
+        self.app = app
+        self.profiler = profiler
+        profiler.install()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            with self.profiler.capture() as profile:
+                await self.app(scope, receive, send)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            method = scope.get("method", "GET")
+            if self.profiler.explain:
+                # EXPLAIN does blocking I/O; keep it off the event loop.
+                await run_in_threadpool(self.profiler.finish, profile, method, route, elapsed_ms)
+            else:
+                self.profiler.finish(profile, method, route, elapsed_ms)
+
+
+_profiler: SqlProfiler | None = None
+
+
+def configure_sql_profiler(settings: Settings) -> SqlProfiler | None:
+    """Create the process's profiler if profiling is enabled."""
+    global _profiler
+    _profiler = SqlProfiler.from_settings(settings) if settings.sql_profiling_enabled else None
+    return _profiler
+
+
+def get_sql_profiler() -> SqlProfiler | None:
+    return _profiler
@@ -28,6 +28,7 @@ from app.db.base import Base
 from app.db.session import get_db
 from app.main import app
 from app.models.user import User
+from app.services.recent_events import recent_events
 
 
 def _sqlite_now():
@@ -73,6 +74,8 @@ def _reset_postgres_tables(session: Session) -> None:
     for table in reversed(Base.metadata.sorted_tables):
         session.execute(text(f'TRUNCATE TABLE "{table.name}" RESTART IDENTITY CASCADE'))
     session.commit()
+    # Ingested events are mirrored in memory; drop them with the table.
+    recent_events.clear()
 
 
 @pytest.fixture(scope="session")
@@ -3,8 +3,11 @@
 import inspect
 from datetime import datetime, timedelta, timezone
 
+from sqlalchemy import text
+
 from app.models.query_rollup import QueryRollup
 from app.routers.analytics import index_page
+from app.services.query_log import reset_log_count_cache
 from app.services.rollups import reset_stats_cache
 
 
@@ -80,6 +83,33 @@ class TestAnalyticsRoutes:
         response = authenticated_client.get("/precache")
         assert response.status_code == 200
 
+    def test_system_page_lists_slow_queries(
+        self, authenticated_client, sync_db_session, monkeypatch
+    ):
+        import app.sql_profiler as sql_profiler
+
+        response = authenticated_client.get("/system")
+        assert response.status_code == 200
+        assert "SQL profiling is off" in response.text
+
+        profiler = sql_profiler.SqlProfiler(slow_query_ms=0, explain=True)
+        monkeypatch.setattr(sql_profiler, "_profiler", profiler)
+        profiler.install()
+        try:
+            with profiler.capture() as profile:
+                sync_db_session.execute(text("SELECT name FROM nodes WHERE id = :id"), {"id": 4})
+            profiler.finish(profile, "GET", "/nodes", elapsed_ms=1)
+        finally:
+            profiler.uninstall()
+
+        (query,) = profiler.recent_slow_queries()
+        assert query.sql == "SELECT name FROM nodes WHERE id = ?"
+        assert query.explain and "nodes" in query.explain
+
+        response = authenticated_client.get("/system")
+        assert "SELECT name FROM nodes WHERE id = ?" in response.text
+        assert "EXPLAIN" in response.text
+
     def test_metrics_endpoint_returns_prometheus_format(self, authenticated_client):
         response = authenticated_client.get("/metrics")
         assert response.status_code == 200
@@ -89,7 +119,8 @@ class TestAnalyticsRoutes:
         response = authenticated_client.get("/metrics")
         text = response.text
         assert "powerblockade_queries_total" in text
-        assert "powerblockade_blocked_total" in text
+        assert "# TYPE powerblockade_queries_total counter" in text
+        assert "powerblockade_queries_blocked_total" in text
         assert "powerblockade_cache_hits_total" in text
         assert "powerblockade_block_rate" in text
         assert "powerblockade_cache_hit_rate" in text
@@ -98,6 +129,28 @@ class TestAnalyticsRoutes:
         assert "powerblockade_stats_cache_age_seconds" in text
         assert "powerblockade_rollup_lag_seconds" in text
         assert "powerblockade_stats_edge_delta_total" in text
+        assert 'powerblockade_query_latency_ms{quantile="0.95"}' in text
+
+    def test_metrics_endpoint_gzips_when_accepted(self, authenticated_client):
+        response = authenticated_client.get("/metrics", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        # httpx decodes the body transparently.
+        assert "powerblockade_block_rate" in response.text
+
+    def test_metrics_endpoint_reports_route_latency_and_sql(self, authenticated_client):
+        authenticated_client.get("/nodes")
+        text = authenticated_client.get("/metrics").text
+
+        route = 'method="GET",route="/nodes"'
+        assert f"powerblockade_http_request_duration_seconds_count{{{route}}}" in text
+        statements = next(
+            line
+            for line in text.splitlines()
+            if line.startswith(f"powerblockade_http_request_sql_statements_sum{{{route}}}")
+        )
+        assert float(statements.split()[-1]) > 0
+        assert "powerblockade_job_duration_seconds" in text
+        assert "powerblockade_rpz_render_seconds" in text
 
     def test_metrics_endpoint_no_raw_dns_query_event_import(self):
         import pathlib
@@ -189,3 +242,180 @@ class TestInternalTrafficFiltering:
         assert response.status_code == 200
         data = response.json()
         assert sum(data["series"]["total"]) == 2
+
+
+class TestLogKeysetPagination:
+    @staticmethod
+    def _seed_events(sync_db_session, count: int) -> None:
+        from app.models.dns_query_event import DNSQueryEvent
+
+        reset_log_count_cache()
+        now = datetime.now(timezone.utc)
+        # Pairs share a timestamp so the id tie-breaker is exercised.
+        sync_db_session.add_all(
+            DNSQueryEvent(
+                event_id=f"page-{i}",
+                ts=now - timedelta(seconds=i // 2),
+                client_ip="10.5.5.50",
+                qname=f"q{i:03d}.example.com",
+                qtype=1,
+                rcode=0,
+                blocked=False,
+                is_internal=False,
+            )
+            # Oldest first, so q000 gets the highest id of its pair.
+            for i in reversed(range(count))
+        )
+        sync_db_session.commit()
+
+    @staticmethod
+    def _page(sync_db_session, **cursors):
+        from app.routers.analytics import _log_events_query
+        from app.services.query_log import fetch_log_page
+
+        query = _log_events_query(
+            sync_db_session,
+            datetime.now(timezone.utc) - timedelta(hours=24),
+            view="all",
+            q=None,
+            qmode="contains",
+            client=None,
+            rcode=None,
+            qtype=None,
+            blocked=None,
+            blocklist=None,
+            include_internal=False,
+        )
+        return fetch_log_page(query, page_size=25, **cursors)
+
+    def test_older_and_newer_pages_partition_the_log(self, sync_db_session):
+        self._seed_events(sync_db_session, 60)
+
+        first = self._page(sync_db_session)
+        assert first.newer is None and first.older is not None
+        second = self._page(sync_db_session, before=first.older)
+        third = self._page(sync_db_session, before=second.older)
+        assert third.older is None
+
+        names = [e.qname for p in (first, second, third) for e in p.events]
+        assert names == [f"q{i:03d}.example.com" for i in range(60)]
+
+        back = self._page(sync_db_session, after=second.newer)
+        assert [e.qname for e in back.events] == [e.qname for e in first.events]
+        assert back.newer is None
+        assert back.older == first.older
+
+    def test_cursor_round_trips_through_links(self, authenticated_client, sync_db_session):
+        self._seed_events(sync_db_session, 30)
+
+        response = authenticated_client.get("/logs?view=all&window=24h")
+        assert response.status_code == 200
+        assert "q000.example.com" in response.text
+        assert "q025.example.com" not in response.text
+        # Estimated total, refined by the page from /api/logs/count.
+        assert 'id="logs-total">~' in response.text
+        assert "/api/logs/count" in response.text
+        older = response.text.split("/logs?before=", 1)[1].split("&", 1)[0]
+
+        response = authenticated_client.get(f"/logs?view=all&window=24h&before={older}")
+        assert "q025.example.com" in response.text
+        assert "q000.example.com" not in response.text
+        assert "after=" in response.text
+        assert "before=" not in response.text
+        # Later pages count only on request.
+        assert 'id="logs-count-btn"' in response.text
+        assert "loadLogsCount();" not in response.text
+
+    def test_malformed_cursor_shows_first_page(self, authenticated_client, sync_db_session):
+        self._seed_events(sync_db_session, 3)
+
+        response = authenticated_client.get("/logs?before=not-a-cursor")
+        assert response.status_code == 200
+        assert "q000.example.com" in response.text
+
+    def test_count_endpoint_is_exact(self, authenticated_client, sync_db_session):
+        self._seed_events(sync_db_session, 30)
+
+        response = authenticated_client.get("/api/logs/count?view=all&window=24h&q=q00")
+        assert response.json() == {"total": 10, "exact": True}
+
+    def test_count_is_cached_per_filter_set(self, authenticated_client, sync_db_session):
+        self._seed_events(sync_db_session, 30)
+        authenticated_client.get("/api/logs/count?view=all&window=24h&q=q00")
+        sync_db_session.execute(text("DELETE FROM dns_query_events"))
+        sync_db_session.commit()
+
+        # Same filters, spelled differently: served from the cache.
+        response = authenticated_client.get("/api/logs/count?window=24h&q=+q00+&qmode=contains")
+        assert response.json() == {"total": 10, "exact": True}
+        response = authenticated_client.get("/api/logs/count?view=all&window=24h&q=q01")
+        assert response.json() == {"total": 0, "exact": True}
+
+        # Pages of the same filter set show the cached exact total.
+        response = authenticated_client.get("/logs?view=all&window=24h&q=q00")
+        assert 'id="logs-total">10<' in response.text
+        assert "/api/logs/count" not in response.text
+
+
+class TestQnameSearchModes:
+    @staticmethod
+    def _seed(sync_db_session) -> None:
+        from app.models.dns_query_event import DNSQueryEvent
+
+        now = datetime.now(timezone.utc)
+        sync_db_session.add_all(
+            DNSQueryEvent(
+                event_id=f"search-{i}",
+                ts=now,
+                client_ip="10.5.5.50",
+                qname=qname,
+                qtype=1,
+                rcode=0,
+                blocked=False,
+                is_internal=False,
+            )
+            for i, qname in enumerate(
+                ["example.com", "cdn.example.com", "badexample.com", "example.com.evil.net"]
+            )
+        )
+        sync_db_session.commit()
+
+    def _search(self, authenticated_client, q: str, qmode: str) -> set[str]:
+        names = ["example.com", "cdn.example.com", "badexample.com", "example.com.evil.net"]
+        text = authenticated_client.get(f"/logs?view=all&q={q}&qmode={qmode}").text
+        return {n for n in names if f">{n}<" in text}
+
+    def test_modes(self, authenticated_client, sync_db_session):
+        self._seed(sync_db_session)
+
+        assert self._search(authenticated_client, "Example.com.", "exact") == {"example.com"}
+        assert self._search(authenticated_client, "example.com", "suffix") == {
+            "example.com",
+            "cdn.example.com",
+        }
+        assert self._search(authenticated_client, "example.com", "contains") == {
+            "example.com",
+            "cdn.example.com",
+            "badexample.com",
+            "example.com.evil.net",
+        }
+
+    def test_suffix_search_uses_reversed_index(self, sync_db_session):
+        import sqlalchemy as sa
+
+        from app.models.dns_query_event import DNSQueryEvent
+        from app.services.query_log import qname_search
+
+        stmt = sa.select(DNSQueryEvent.id).where(
+            qname_search(DNSQueryEvent.qname, "example.com", "suffix")
+        )
+        compiled = stmt.compile(dialect=sync_db_session.get_bind().dialect)
+        sync_db_session.execute(sa.text("SET LOCAL enable_seqscan = off"))
+        plan = "\n".join(
+            row[0]
+            for row in sync_db_session.connection().exec_driver_sql(
+                f"EXPLAIN {compiled}", compiled.params
+            )
+        )
+        # A prefix range on reverse(qname), on each partition's copy of the index.
+        assert "Index Cond: ((reverse(qname) ~>=~ 'moc.elpmaxe.'::text)" in plan
@@ -0,0 +1,157 @@
+"""Integration tests for the downsampled node_metrics tiers."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.node import Node
+from app.models.node_metrics import NodeMetrics
+from app.models.node_metrics_rollup import NodeMetrics1h, NodeMetrics5m
+from app.services.node_metrics import (
+    NODE_METRICS_WATERMARK,
+    compute_node_metrics_rollups,
+    get_node_metrics_series,
+    get_recent_node_deltas,
+)
+from app.services.retention import cleanup_old_node_metrics
+from app.services.rollups import get_rollup_watermark, set_rollup_watermark
+
+BASE = datetime(2025, 1, 15, 10, 0, tzinfo=timezone.utc)
+
+
+def _node(session) -> Node:
+    node = Node(id=1, name="primary", api_key="k1", status="active")
+    session.add(node)
+    session.commit()
+    return node
+
+
+def _samples(session, rows):
+    """rows: (minutes after BASE, questions, uptime_seconds, cache_hits)."""
+    session.add_all(
+        [
+            NodeMetrics(
+                node_id=1,
+                ts=BASE + timedelta(minutes=minutes),
+                questions=questions,
+                uptime_seconds=uptime,
+                cache_hits=cache_hits,
+                cache_entries=500 + minutes,
+            )
+            for minutes, questions, uptime, cache_hits in rows
+        ]
+    )
+    session.commit()
+
+
+@pytest.mark.integration
+class TestComputeNodeMetricsRollups:
+    def test_stores_deltas_and_detects_resets(self, pg_session):
+        _node(pg_session)
+        _samples(
+            pg_session,
+            [
+                (0, 100, 1000, 50),
+                (1, 160, 1060, 80),
+                (2, 220, 1120, 110),
+                # Recursor restarted: uptime and counters start over.
+                (3, 30, 10, 5),
+                (4, 90, 70, 35),
+                (6, 150, 130, 65),
+            ],
+        )
+
+        written = compute_node_metrics_rollups(pg_session, now=BASE + timedelta(minutes=10))
+
+        assert written == {"5m": 2, "1h": 1}
+        first, second = pg_session.query(NodeMetrics5m).order_by(NodeMetrics5m.bucket_start)
+        assert (first.bucket_start, first.samples, first.resets) == (BASE, 4, 1)
+        assert (first.questions, first.cache_hits, first.seconds) == (210, 95, 240.0)
+        assert first.cache_entries == 504
+        assert first.rate("questions") == pytest.approx(210 / 240)
+        assert (second.questions, second.seconds) == (60, 120.0)
+
+        hour = pg_session.query(NodeMetrics1h).one()
+        assert (hour.bucket_start, hour.samples, hour.resets) == (BASE, 5, 1)
+        assert (hour.questions, hour.seconds) == (270, 360.0)
+        assert get_rollup_watermark(pg_session, NODE_METRICS_WATERMARK) == BASE + timedelta(
+            minutes=10
+        )
+
+    def test_rerun_adds_new_samples_without_double_counting(self, pg_session):
+        _node(pg_session)
+        _samples(pg_session, [(0, 100, 1000, 0), (1, 160, 1060, 0), (6, 220, 1420, 0)])
+        compute_node_metrics_rollups(pg_session, now=BASE + timedelta(minutes=10))
+
+        _samples(pg_session, [(11, 300, 1720, 0)])
+        compute_node_metrics_rollups(pg_session, now=BASE + timedelta(minutes=15))
+
+        buckets = {r.bucket_start: r.questions for r in pg_session.query(NodeMetrics5m).all()}
+        assert buckets == {
+            BASE: 60,
+            BASE + timedelta(minutes=5): 60,
+            BASE + timedelta(minutes=10): 80,
+        }
+        assert pg_session.query(NodeMetrics1h).one().questions == 200
+
+    def test_sample_after_long_gap_has_no_baseline(self, pg_session):
+        _node(pg_session)
+        _samples(pg_session, [(0, 100, 1000, 0), (1, 160, 1060, 0), (40, 900, 3460, 0)])
+
+        compute_node_metrics_rollups(pg_session, now=BASE + timedelta(minutes=45))
+
+        assert pg_session.query(NodeMetrics1h).one().questions == 60
+
+
+@pytest.mark.integration
+class TestNodeMetricsReads:
+    def test_recent_deltas_sum_the_window(self, pg_session):
+        _node(pg_session)
+        _samples(pg_session, [(0, 100, 1000, 10), (1, 160, 1060, 40), (2, 250, 1120, 100)])
+
+        recent = get_recent_node_deltas(
+            pg_session, window=timedelta(minutes=5), now=BASE + timedelta(minutes=3)
+        )
+
+        assert (recent[1].questions, recent[1].cache_hits, recent[1].seconds) == (150, 90, 120)
+
+    def test_series_picks_tier_by_range(self, pg_session):
+        _node(pg_session)
+        _samples(pg_session, [(0, 100, 1000, 0), (1, 160, 1060, 0), (6, 220, 1360, 0)])
+        compute_node_metrics_rollups(pg_session, now=BASE + timedelta(minutes=10))
+        until = BASE + timedelta(minutes=10)
+
+        tier, points = get_node_metrics_series(pg_session, 1, BASE, until)
+        assert tier == "raw"
+        assert [p["rates"]["questions"] for p in points] == [1.0, pytest.approx(0.2)]
+
+        tier, points = get_node_metrics_series(pg_session, 1, until - timedelta(days=2), until)
+        assert tier == "5m"
+        assert [p["ts"] for p in points] == [
+            BASE.isoformat(),
+            (BASE + timedelta(minutes=5)).isoformat(),
+        ]
+
+        tier, points = get_node_metrics_series(pg_session, 1, until - timedelta(days=30), until)
+        assert tier == "1h"
+        assert points[0]["rates"]["questions"] == pytest.approx(120 / 360)
+
+
+@pytest.mark.integration
+class TestRawNodeMetricsRetention:
+    def _aged(self, session, days_old):
+        now = datetime.now(timezone.utc)
+        session.add(NodeMetrics(node_id=1, ts=now - timedelta(days=days_old), questions=1))
+        session.commit()
+
+    def test_keeps_raw_samples_until_downsampled(self, pg_session):
+        _node(pg_session)
+        self._aged(pg_session, 3)
+        self._aged(pg_session, 1)
+
+        assert cleanup_old_node_metrics(pg_session) == 0
+
+        set_rollup_watermark(pg_session, NODE_METRICS_WATERMARK, datetime.now(timezone.utc))
+        pg_session.commit()
+        assert cleanup_old_node_metrics(pg_session) == 1
+        assert pg_session.query(NodeMetrics).count() == 1
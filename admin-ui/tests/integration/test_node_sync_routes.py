@@ -3,6 +3,11 @@
 from datetime import datetime, timezone
 
 from app.models.node import Node
+from app.models.node_metrics import NodeMetrics
+from app.models.node_metrics_latest import NodeMetricsLatest
+from app.routers.node_sync import INGEST_DURATION
+from app.services.event_stream import fetch_events_after, get_max_event_id
+from app.services.recent_events import recent_events
 
 
 class TestNodeSyncRoutes:
@@ -124,6 +129,153 @@ class TestNodeSyncRoutes:
         assert by_event_id["uuid-internal"].is_internal is True
         assert by_event_id["uuid-external"].is_internal is False
 
+    def test_ingest_maintains_filter_options(self, sync_client, sync_db_session):
+        from app.services.filter_options import get_blocklist_options, get_client_options
+
+        node = Node(name="test_node", api_key="test_key", status="active")
+        sync_db_session.add(node)
+        sync_db_session.commit()
+
+        def event(event_id: str, client_ip: str, blocklist: str, is_internal: bool) -> dict:
+            return {
+                "event_id": event_id,
+                "ts": datetime.now(timezone.utc).isoformat(),
+                "client_ip": client_ip,
+                "qname": "ads.example.com",
+                "qtype": 1,
+                "rcode": 0,
+                "blocked": True,
+                "blocklist_name": blocklist,
+                "is_internal": is_internal,
+            }
+
+        events = [
+            event("opt-1", "172.30.0.3", "internal-only", True),
+            event("opt-2", "10.5.5.50", "ads", False),
+        ]
+        response = sync_client.post(
+            "/api/node-sync/ingest", json={"events": events}, headers=self._headers("test_key")
+        )
+        assert response.status_code == 200
+        sync_db_session.expire_all()
+
+        assert [c.ip for c in get_client_options(sync_db_session)] == ["10.5.5.50"]
+        assert {c.ip for c in get_client_options(sync_db_session, include_internal=True)} == {
+            "10.5.5.50",
+            "172.30.0.3",
+        }
+        assert get_blocklist_options(sync_db_session) == ["ads"]
+        assert get_blocklist_options(sync_db_session, include_internal=True) == [
+            "ads",
+            "internal-only",
+        ]
+
+        # A later external hit flips an internal-only blocklist.
+        response = sync_client.post(
+            "/api/node-sync/ingest",
+            json={"events": [event("opt-3", "10.5.5.50", "internal-only", False)]},
+            headers=self._headers("test_key"),
+        )
+        assert response.status_code == 200
+        sync_db_session.expire_all()
+        assert get_blocklist_options(sync_db_session) == ["ads", "internal-only"]
+
+    def test_ingest_bumps_metrics_counters(self, sync_client, sync_db_session):
+        node = Node(name="test_node", api_key="test_key", status="active")
+        sync_db_session.add(node)
+        sync_db_session.commit()
+
+        def event(event_id: str, blocked: bool, latency_ms: int, is_internal: bool = False):
+            return {
+                "event_id": event_id,
+                "ts": datetime.now(timezone.utc).isoformat(),
+                "client_ip": "10.5.5.50",
+                "qname": "example.com",
+                "qtype": 1,
+                "rcode": 0,
+                "blocked": blocked,
+                "latency_ms": latency_ms,
+                "is_internal": is_internal,
+            }
+
+        batch = [
+            event("c-1", True, 0),
+            event("c-2", False, 2),
+            event("c-3", False, 40),
+            event("c-internal", False, 1, is_internal=True),
+        ]
+        for _ in range(2):  # the retried batch inserts nothing new
+            response = sync_client.post(
+                "/api/node-sync/ingest", json={"events": batch}, headers=self._headers("test_key")
+            )
+            assert response.status_code == 200
+
+        text = sync_client.get("/metrics").text
+        assert 'powerblockade_queries_total{node="test_node"} 3' in text
+        assert 'powerblockade_queries_blocked_total{node="test_node"} 1' in text
+        assert 'powerblockade_cache_hits_total{node="test_node"} 2' in text
+        assert 'powerblockade_query_latency_seconds_bucket{node="test_node",le="0.002"} 2' in text
+        assert 'powerblockade_query_latency_seconds_bucket{node="test_node",le="0.03"} 2' in text
+        assert 'powerblockade_query_latency_seconds_bucket{node="test_node",le="0.04"} 3' in text
+        assert 'powerblockade_query_latency_seconds_sum{node="test_node"} 0.042' in text
+        assert 'powerblockade_query_latency_seconds_count{node="test_node"} 3' in text
+        assert 'powerblockade_ingest_events_total{result="duplicate"}' in text
+        assert "powerblockade_ingest_batch_events_bucket" in text
+
+    def test_ingest_duration_observes_batches_with_no_valid_events(
+        self, sync_client, sync_db_session
+    ):
+        sync_db_session.add(Node(name="test_node", api_key="test_key", status="active"))
+        sync_db_session.commit()
+
+        def observed() -> int:
+            return sum(sum(counts) for counts, _ in INGEST_DURATION._values.values())
+
+        before = observed()
+        response = sync_client.post(
+            "/api/node-sync/ingest",
+            json={"events": [{"event_id": "bad"}]},
+            headers=self._headers("test_key"),
+        )
+
+        assert response.json()["received"] == 0
+        assert observed() == before + 1
+
+    def test_ingest_feeds_recent_events(self, sync_client, sync_db_session):
+        node = Node(name="test_node", api_key="test_key", status="active")
+        sync_db_session.add(node)
+        sync_db_session.commit()
+
+        now = datetime.now(timezone.utc).isoformat()
+
+        def post(*ids: int):
+            events = [
+                {
+                    "event_id": f"r-{i}",
+                    "ts": now,
+                    "client_ip": "10.5.5.50",
+                    "qname": f"q{i}.example.com",
+                    "qtype": 1,
+                    "rcode": 0,
+                    "is_internal": i == 2,
+                }
+                for i in ids
+            ]
+            response = sync_client.post(
+                "/api/node-sync/ingest", json={"events": events}, headers=self._headers("test_key")
+            )
+            assert response.status_code == 200
+
+        post(0)
+        cursor = get_max_event_id()
+        post(1, 2, 3)
+        post(1, 2, 3)  # the retried batch adds nothing
+
+        assert len(recent_events) == 4
+        streamed = fetch_events_after(cursor)
+        assert [e["qname"] for e in streamed] == ["q1.example.com", "q3.example.com"]
+        assert get_max_event_id() == streamed[-1]["id"]
+
     def test_ingest_returns_401_for_invalid_key(self, sync_client):
         events = [{"event_id": "uuid-1", "qname": "example.com"}]
 
@@ -222,6 +374,27 @@ class TestNodeSyncRoutes:
         )
         assert response.status_code == 401
 
+    def test_metrics_updates_latest_snapshot(self, sync_client, sync_db_session):
+        node = Node(name="test_node", api_key="test_key", status="active")
+        sync_db_session.add(node)
+        sync_db_session.commit()
+
+        for cache_hits in (100, 250):
+            response = sync_client.post(
+                "/api/node-sync/metrics",
+                json={"cache_hits": cache_hits, "cache_misses": 10},
+                headers=self._headers("test_key"),
+            )
+            assert response.status_code == 200
+
+        sync_db_session.expire_all()
+        assert sync_db_session.query(NodeMetrics).count() == 2
+        latest = sync_db_session.query(NodeMetricsLatest).one()
+        assert (latest.node_id, latest.cache_hits, latest.cache_misses) == (node.id, 250, 10)
+
+        text = sync_client.get("/metrics").text
+        assert 'powerblockade_recursor_cache_hits{node="test_node"} 250' in text
+
     def test_full_node_registration_flow(self, sync_client, sync_db_session):
         node = Node(name="bootstrap", api_key="sec_key_123", status="pending")
         sync_db_session.add(node)
@@ -0,0 +1,181 @@
+"""Integration tests for dns_query_events daily partitioning.
+
+Partitioning is PostgreSQL-only; on SQLite every helper is a no-op.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+
+from app.models.dns_query_event import DNSQueryEvent
+from app.models.settings import get_setting, set_setting
+from app.services.partitions import (
+    DEFAULT_PARTITION,
+    day_floor,
+    drop_expired_event_partitions,
+    ensure_event_partitions,
+    is_partitioned,
+    list_event_partitions,
+    partition_table,
+)
+from app.services.retention import (
+    RETENTION_CURSOR_PREFIX,
+    purge_expired_rows,
+    run_retention_job,
+)
+
+BASE_DAY = datetime(2025, 3, 10, tzinfo=timezone.utc)
+LEGACY_PARTITION = "dns_query_events_legacy"
+
+
+def _event(event_id: int, ts: datetime) -> DNSQueryEvent:
+    return DNSQueryEvent(
+        event_id=f"evt-{event_id}",
+        ts=ts,
+        client_ip="192.168.1.100",
+        qname="example.com",
+        qtype=1,
+        rcode=0,
+        blocked=False,
+    )
+
+
+@pytest.fixture
+def partitioned_session(pg_session):
+    yield pg_session
+    pg_session.rollback()
+    for p in list_event_partitions(pg_session):
+        if not p.is_default:
+            pg_session.execute(sa.text(f'DROP TABLE "{p.name}"'))
+    pg_session.commit()
+
+
+@pytest.mark.integration
+class TestEnsureEventPartitions:
+    def test_table_is_partitioned(self, partitioned_session):
+        assert is_partitioned(partitioned_session) is True
+
+    def test_creates_today_through_days_ahead(self, partitioned_session):
+        created = ensure_event_partitions(partitioned_session, days_ahead=2, now=BASE_DAY)
+
+        assert created == [
+            "dns_query_events_p20250310",
+            "dns_query_events_p20250311",
+            "dns_query_events_p20250312",
+        ]
+        assert ensure_event_partitions(partitioned_session, days_ahead=2, now=BASE_DAY) == []
+
+    def test_moves_rows_out_of_default_partition(self, partitioned_session):
+        partitioned_session.add_all(
+            [_event(1, BASE_DAY + timedelta(hours=3)), _event(2, BASE_DAY + timedelta(days=5))]
+        )
+        partitioned_session.commit()
+
+        ensure_event_partitions(partitioned_session, days_ahead=0, now=BASE_DAY)
+
+        in_day = partitioned_session.execute(
+            sa.text('SELECT count(*) FROM "dns_query_events_p20250310"')
+        ).scalar()
+        in_default = partitioned_session.execute(
+            sa.text(f"SELECT count(*) FROM {DEFAULT_PARTITION}")
+        ).scalar()
+        assert in_day == 1
+        assert in_default == 1
+        assert partitioned_session.query(DNSQueryEvent).count() == 2
+
+
+@pytest.mark.integration
+class TestDropExpiredEventPartitions:
+    def test_drops_whole_expired_days_only(self, partitioned_session):
+        ensure_event_partitions(partitioned_session, days_ahead=2, now=BASE_DAY)
+        partitioned_session.add_all(
+            [
+                _event(1, BASE_DAY + timedelta(hours=1)),
+                _event(2, BASE_DAY + timedelta(days=1, hours=1)),
+                _event(3, BASE_DAY + timedelta(days=1, hours=20)),
+            ]
+        )
+        partitioned_session.commit()
+
+        result = drop_expired_event_partitions(
+            partitioned_session, BASE_DAY + timedelta(days=1, hours=12)
+        )
+
+        names = {p.name for p in list_event_partitions(partitioned_session)}
+        assert result.partitions_dropped == 1
+        assert "dns_query_events_p20250310" not in names
+        assert "dns_query_events_p20250311" in names
+        # The straddling day is kept whole until it fully expires.
+        assert partitioned_session.query(DNSQueryEvent).count() == 2
+
+    def test_leaves_default_partition_to_the_chunked_purge(self, partitioned_session):
+        partitioned_session.add_all(
+            [_event(1, BASE_DAY - timedelta(days=30)), _event(2, BASE_DAY + timedelta(days=1))]
+        )
+        partitioned_session.commit()
+
+        result = drop_expired_event_partitions(partitioned_session, BASE_DAY)
+
+        assert result.partitions_dropped == 0
+        assert result.partitions_to_purge == [DEFAULT_PARTITION]
+        assert partitioned_session.query(DNSQueryEvent).count() == 2
+
+
+@pytest.mark.integration
+class TestPurgeUnalignedPartitions:
+    def test_purges_large_legacy_partition_in_batches(self, partitioned_session):
+        now = datetime.now(timezone.utc)
+        legacy_end = day_floor(now - timedelta(days=5))
+        partitioned_session.execute(
+            sa.text(
+                f"CREATE TABLE {LEGACY_PARTITION} PARTITION OF dns_query_events "
+                f"FOR VALUES FROM (MINVALUE) TO ('{legacy_end.isoformat()}')"
+            )
+        )
+        partitioned_session.add_all(
+            [_event(i, now - timedelta(days=60, minutes=i)) for i in range(250)]
+            + [_event(250, now - timedelta(days=10))]
+        )
+        set_setting(partitioned_session, "retention_batch_size", "100")
+        partitioned_session.commit()
+
+        result = run_retention_job(partitioned_session)
+
+        progress = result["progress"][LEGACY_PARTITION]
+        assert (progress["deleted"], progress["batches"]) == (250, 3)
+        assert progress["complete"] is True
+        assert result["events_deleted"] == 250
+        remaining = partitioned_session.execute(
+            sa.text(f"SELECT count(*) FROM {LEGACY_PARTITION}")
+        ).scalar()
+        assert remaining == 1
+
+    def test_default_partition_purge_resumes_under_its_own_cursor(self, partitioned_session):
+        partitioned_session.add_all(
+            [_event(i, BASE_DAY - timedelta(days=30, minutes=i)) for i in range(3)]
+        )
+        partitioned_session.commit()
+        ids = [e.id for e in partitioned_session.query(DNSQueryEvent).order_by(DNSQueryEvent.id)]
+        table = partition_table(DEFAULT_PARTITION)
+
+        stopped = purge_expired_rows(
+            partitioned_session,
+            table,
+            table.c.ts,
+            BASE_DAY,
+            batch_size=100,
+            deadline=time.monotonic() - 1,
+        )
+
+        key = f"{RETENTION_CURSOR_PREFIX}{DEFAULT_PARTITION}"
+        assert (stopped.complete, stopped.cursor) == (False, ids[0])
+        assert get_setting(partitioned_session, key) == str(ids[0])
+
+        resumed = purge_expired_rows(
+            partitioned_session, table, table.c.ts, BASE_DAY, batch_size=100
+        )
+
+        assert (resumed.complete, resumed.deleted) == (True, 3)
+        assert get_setting(partitioned_session, key) == ""
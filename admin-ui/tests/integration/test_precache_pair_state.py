@@ -0,0 +1,103 @@
+"""Integration tests for the persisted, shared precache pair TTL state."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.precache_pair_state import PrecachePairState
+from app.services import precache
+from app.services.precache import (
+    checkpoint_pair_ttl_state,
+    get_pairs_needing_refresh,
+    get_precache_stats,
+    load_pair_ttl_state,
+    prune_pair_ttl_state,
+    record_warmed_pair,
+)
+
+QTYPE_A = 1
+QTYPE_AAAA = 28
+
+
+def _restart() -> None:
+    """Forget this process's view, as a restart or another worker would."""
+    precache.reset_pair_ttl_state()
+
+
+@pytest.fixture(autouse=True)
+def clear_pair_state():
+    _restart()
+    yield
+    _restart()
+
+
+class TestPairStatePersistence:
+    def test_restart_keeps_warmed_pairs_fresh(self, sync_db_session):
+        pairs = [("example.com", QTYPE_A), ("example.com", QTYPE_AAAA)]
+        record_warmed_pair("example.com", QTYPE_A, 300)
+        record_warmed_pair("example.com", QTYPE_AAAA, 60)
+
+        assert checkpoint_pair_ttl_state(sync_db_session) == 2
+        assert checkpoint_pair_ttl_state(sync_db_session) == 0  # nothing new
+
+        _restart()
+        assert get_pairs_needing_refresh(pairs) == pairs
+        assert load_pair_ttl_state(sync_db_session) == 2
+        assert get_pairs_needing_refresh(pairs) == []
+        assert precache._pair_ttl_cache[("example.com", QTYPE_AAAA)].ttl == 60
+
+    def test_checkpoints_merge_shortest_ttl_and_latest_warm(self, sync_db_session):
+        earlier = datetime.now(timezone.utc) - timedelta(hours=1)
+        sync_db_session.add(
+            PrecachePairState(qname="example.com", qtype=QTYPE_A, ttl=60, last_warmed=earlier)
+        )
+        sync_db_session.commit()
+
+        record_warmed_pair("example.com", QTYPE_A, 300)
+        checkpoint_pair_ttl_state(sync_db_session)
+
+        row = sync_db_session.get(PrecachePairState, ("example.com", QTYPE_A))
+        sync_db_session.refresh(row)
+        assert row.ttl == 60
+        assert row.last_warmed > earlier
+
+        load_pair_ttl_state(sync_db_session)
+        assert precache._pair_ttl_cache[("example.com", QTYPE_A)].ttl == 60
+
+    def test_stats_come_from_the_shared_table(self, sync_db_session):
+        now = datetime.now(timezone.utc)
+        sync_db_session.add_all(
+            [
+                PrecachePairState(qname="a.com", qtype=QTYPE_A, ttl=300, last_warmed=now),
+                PrecachePairState(qname="a.com", qtype=QTYPE_AAAA, ttl=300, last_warmed=now),
+                PrecachePairState(
+                    qname="b.com", qtype=QTYPE_A, ttl=60, last_warmed=now - timedelta(minutes=5)
+                ),
+            ]
+        )
+        sync_db_session.commit()
+
+        # Nothing in this process's view; the table is the source of truth.
+        assert get_precache_stats(sync_db_session) == {
+            "cached_pairs": 3,
+            "fresh": 2,
+            "expired": 1,
+            "by_qtype": {QTYPE_A: 2, QTYPE_AAAA: 1},
+        }
+
+    def test_prune_drops_long_unwarmed_pairs(self, sync_db_session):
+        now = datetime.now(timezone.utc)
+        sync_db_session.add_all(
+            [
+                PrecachePairState(qname="new.com", qtype=QTYPE_A, ttl=300, last_warmed=now),
+                PrecachePairState(
+                    qname="old.com", qtype=QTYPE_A, ttl=300, last_warmed=now - timedelta(days=8)
+                ),
+            ]
+        )
+        sync_db_session.commit()
+        load_pair_ttl_state(sync_db_session)
+
+        assert prune_pair_ttl_state(sync_db_session) == 1
+        assert ("old.com", QTYPE_A) not in precache._pair_ttl_cache
+        assert [r.qname for r in sync_db_session.query(PrecachePairState).all()] == ["new.com"]
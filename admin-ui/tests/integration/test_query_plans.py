@@ -0,0 +1,216 @@
+"""EXPLAIN regression tests for the dns_query_events index set.
+
+Loads FIXTURE_DAYS whole days of synthetic events into daily partitions,
+ANALYZEs them and asserts that the queries behind the core views plan
+without a sequential scan of a populated partition. The log views are
+checked through fetch_log_page, so the statement planned is the one the
+page runs.
+
+The fixture holds PLAN_FIXTURE_ROWS rows. The reference size is 10M
+(PLAN_FIXTURE_ROWS=10000000), where partition sizes and plan choices
+match a busy install. Loading that takes several minutes, so the default
+is 200k: about 25k rows per partition, large enough that an index scan
+wins wherever it should. Run the full size after changing indexes or
+these queries.
+"""
+
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+import sqlalchemy as sa
+
+from app.routers.analytics import DEFAULT_PAGE_SIZE, _log_events_query
+from app.services.partitions import ensure_event_partitions, list_event_partitions
+from app.services.query_log import LogCursor, fetch_log_page
+from app.services.rollups import CACHE_HIT_LATENCY_THRESHOLD_MS, set_rollup_watermark
+from app.services.top_domains import TOPK_WATERMARK, _top_domains_query
+
+# Reference size 10_000_000; see the module docstring.
+PLAN_FIXTURE_ROWS = int(os.environ.get("PLAN_FIXTURE_ROWS", "200000"))
+FIXTURE_DAYS = 8
+
+# One row per generate_series value: 1 in 20 internal, 1 in 10 blocked
+# (with a blocklist), a few percent NXDOMAIN/SERVFAIL, 10k clients and
+# 5k domains spread evenly over the FIXTURE_DAYS whole days before today.
+# Every populated partition holds a full day, whatever the time of day the
+# suite runs; today's partition stays empty.
+_FIXTURE_SQL = f"""
+INSERT INTO dns_query_events
+    (id, event_id, ts, client_ip, qname, qtype, rcode, blocked, blocklist_name,
+     latency_ms, is_internal)
+SELECT
+    nextval('dns_query_events_id_seq'),
+    'plan-' || g,
+    :midnight - (g::float8 / :rows) * interval '{FIXTURE_DAYS} days',
+    '10.' || (g % 40) || '.' || (g % 250) || '.1',
+    'd' || (g % 5000) || '.example.com',
+    CASE WHEN g % 10 = 0 THEN 28 ELSE 1 END,
+    CASE WHEN g % 37 = 0 THEN 3 WHEN g % 101 = 0 THEN 2 ELSE 0 END,
+    g % 10 = 1,
+    CASE WHEN g % 10 = 1 THEN 'list-' || (g % 5) END,
+    g % 200,
+    g % 20 = 0
+FROM generate_series(1, :rows) AS g
+"""
+
+
+@pytest.fixture(scope="module")
+def plan_db(pg_engine):
+    with sa.orm.Session(pg_engine) as db:
+        db.execute(sa.text("TRUNCATE TABLE dns_query_events"))
+        now = datetime.now(timezone.utc)
+        ensure_event_partitions(
+            db, days_ahead=FIXTURE_DAYS + 1, now=now - timedelta(days=FIXTURE_DAYS)
+        )
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        db.execute(sa.text(_FIXTURE_SQL), {"rows": PLAN_FIXTURE_ROWS, "midnight": midnight})
+        db.commit()
+    with pg_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(sa.text("VACUUM ANALYZE dns_query_events"))
+
+    with sa.orm.Session(pg_engine) as db:
+        yield db
+        db.rollback()
+        db.execute(sa.text("TRUNCATE TABLE dns_query_events, rollup_watermarks"))
+        for p in list_event_partitions(db):
+            if not p.is_default:
+                db.execute(sa.text(f'DROP TABLE "{p.name}"'))
+        db.commit()
+
+
+def _plan(db, stmt) -> dict[str, Any]:
+    compiled = stmt.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True}
+    )
+    return (
+        db.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+        .scalar()[0]["Plan"]
+    )
+
+
+def _seq_scans(db, plan: dict[str, Any]) -> list[str]:
+    """Event partitions holding rows that ``plan`` reads sequentially.
+
+    Empty partitions (DEFAULT, today, future days) and lookup tables such as
+    nodes are legitimately seq-scanned and ignored.
+    """
+    populated = set(
+        db.execute(
+            sa.text(
+                "SELECT relname FROM pg_class "
+                "WHERE relname LIKE 'dns_query_events%' AND reltuples > 0"
+            )
+        ).scalars()
+    )
+
+    def walk(node: dict[str, Any]) -> list[str]:
+        found = []
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] in populated:
+            found.append(node["Relation Name"])
+        for child in node.get("Plans", []):
+            found += walk(child)
+        return found
+
+    return walk(plan)
+
+
+def _log_page_plan(
+    db, before: LogCursor | None = None, after: LogCursor | None = None, **filters
+) -> dict[str, Any]:
+    """Plan of the statement fetch_log_page runs for one log view."""
+    args: dict[str, Any] = {
+        "view": "all",
+        "q": None,
+        "qmode": "contains",
+        "client": None,
+        "rcode": None,
+        "qtype": None,
+        "blocked": None,
+        "blocklist": None,
+        "include_internal": False,
+    }
+    args.update(filters)
+    query = _log_events_query(db, datetime.now(timezone.utc) - timedelta(hours=24), **args)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db.get_bind()
+    sa.event.listen(engine, "before_cursor_execute", capture)
+    try:
+        fetch_log_page(query, before=before, after=after, page_size=DEFAULT_PAGE_SIZE)
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", capture)
+
+    [(statement, parameters)] = statements
+    return (
+        db.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        .scalar()[0]["Plan"]
+    )
+
+
+@pytest.mark.integration
+class TestCoreViewPlans:
+    @pytest.mark.parametrize(
+        "filters",
+        [
+            {},
+            {"view": "blocked"},
+            {"view": "failures"},
+            {"client": "10.1.1.1"},
+            {"blocklist": "list-1"},
+            {"blocklist": "unused-list"},
+            {"q": "d42.example.com", "qmode": "exact"},
+            {"q": "example.com", "qmode": "suffix"},
+        ],
+        ids=[
+            "all",
+            "blocked",
+            "failures",
+            "client",
+            "blocklist",
+            "rare-blocklist",
+            "exact",
+            "suffix",
+        ],
+    )
+    def test_log_views_avoid_seq_scans(self, plan_db, filters):
+        assert _seq_scans(plan_db, _log_page_plan(plan_db, **filters)) == []
+
+    def test_older_page_avoids_seq_scans(self, plan_db):
+        cursor = LogCursor(ts=datetime.now(timezone.utc) - timedelta(hours=12), id=1)
+        assert _seq_scans(plan_db, _log_page_plan(plan_db, before=cursor)) == []
+
+    def test_newer_page_avoids_seq_scans(self, plan_db):
+        cursor = LogCursor(ts=datetime.now(timezone.utc) - timedelta(hours=12), id=1)
+        assert _seq_scans(plan_db, _log_page_plan(plan_db, after=cursor)) == []
+
+    def test_top_domains_raw_edges_avoid_seq_scans(self, plan_db):
+        now = datetime.now(timezone.utc)
+        set_rollup_watermark(
+            plan_db, TOPK_WATERMARK, now.replace(minute=0, second=0, microsecond=0)
+        )
+        plan_db.commit()
+
+        stmt = _top_domains_query(
+            plan_db,
+            now - timedelta(hours=24),
+            by_qtype=False,
+            metric="total",
+            blocked=None,
+            include_internal=False,
+            search=None,
+            search_mode="contains",
+            client_ip=None,
+            blocklist=None,
+            cache_hit_threshold_ms=CACHE_HIT_LATENCY_THRESHOLD_MS,
+        )
+        assert _seq_scans(plan_db, _plan(plan_db, stmt)) == []
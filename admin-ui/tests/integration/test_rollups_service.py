@@ -9,19 +9,31 @@ from datetime import datetime, timedelta, timezone
 from time import sleep
 
 import pytest
+from sqlalchemy.exc import SQLAlchemyError
 
 from app.models.client import Client
 from app.models.dns_query_event import DNSQueryEvent
 from app.models.node import Node
 from app.models.query_rollup import QueryRollup
+from app.models.query_rollup_minute import QueryRollupMinute
+from app.services.latency_histogram import LATENCY_BUCKET_BOUNDS_MS, LATENCY_BUCKETS
 from app.services.rollups import (
+    DAILY_WATERMARK,
+    HOURLY_WATERMARK,
+    MINUTE_WATERMARK,
     backfill_hourly_rollups,
     compute_daily_rollup,
     compute_hourly_rollup,
+    compute_minute_rollups,
     get_dashboard_stats,
+    get_history_buckets,
+    get_node_query_totals,
+    get_rollup_watermark,
     reset_stats_cache,
     run_rollup_job,
+    set_rollup_watermark,
 )
+from app.services.stats_cache import StatsCache, purge_shared_stats_cache
 
 
 @pytest.mark.integration
@@ -153,6 +165,27 @@ class TestComputeHourlyRollup:
         rollup = pg_session.query(QueryRollup).first()
         assert rollup.unique_domains == 3
 
+    def test_builds_latency_histogram(self, pg_session):
+        hour_start = datetime(2025, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
+        latencies = [0, 1, 1, 12, 250, None]
+        pg_session.add_all(
+            [
+                _minute_event(i + 1, hour_start + timedelta(minutes=i), latency_ms=latency)
+                for i, latency in enumerate(latencies)
+            ]
+        )
+        pg_session.commit()
+
+        compute_hourly_rollup(pg_session, hour_start)
+
+        histogram = pg_session.query(QueryRollup).one().latency_histogram
+        assert len(histogram) == LATENCY_BUCKETS
+        assert sum(histogram) == 5
+        assert histogram[0] == 1
+        assert histogram[1] == 2
+        assert histogram[LATENCY_BUCKET_BOUNDS_MS.index(15)] == 1
+        assert histogram[LATENCY_BUCKET_BOUNDS_MS.index(300)] == 1
+
     def test_returns_zero_for_no_events(self, pg_session):
         hour_start = datetime(2025, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
         count = compute_hourly_rollup(pg_session, hour_start)
@@ -196,6 +229,37 @@ class TestComputeHourlyRollup:
         rollup = pg_session.query(QueryRollup).first()
         assert rollup.total_queries == 1
 
+    def test_recompute_updates_bucket_in_place(self, pg_session):
+        hour_start = datetime(2025, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
+
+        def add_event(event_id: int) -> None:
+            pg_session.add(
+                DNSQueryEvent(
+                    id=event_id,
+                    ts=hour_start + timedelta(minutes=event_id),
+                    client_ip="192.168.1.100",
+                    qname=f"late{event_id}.example.com",
+                    qtype=1,
+                    rcode=0,
+                    blocked=False,
+                )
+            )
+            pg_session.commit()
+
+        add_event(1)
+        compute_hourly_rollup(pg_session, hour_start)
+        add_event(2)
+        count = compute_hourly_rollup(pg_session, hour_start)
+
+        # No client/node: the NULL-keyed bucket must be updated, not duplicated.
+        assert count == 1
+        rollups = pg_session.query(QueryRollup).all()
+        assert len(rollups) == 1
+        pg_session.refresh(rollups[0])
+        assert rollups[0].total_queries == 2
+        assert rollups[0].unique_domains == 2
+        assert rollups[0].updated_at is not None
+
 
 @pytest.mark.integration
 class TestComputeDailyRollup:
@@ -228,6 +292,224 @@ class TestComputeDailyRollup:
         assert daily.servfail_count == 48
         assert daily.cache_hits == 1200
 
+    def test_weights_average_latency_by_hourly_volume(self, pg_session):
+        day_start = datetime(2025, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
+        # A busy fast hour, a quiet slow hour and an hour without latencies.
+        for hour, total, avg in [(0, 1000, 10), (1, 10, 500), (2, 50, None)]:
+            pg_session.add(
+                QueryRollup(
+                    bucket_start=day_start + timedelta(hours=hour),
+                    granularity="hourly",
+                    total_queries=total,
+                    avg_latency_ms=avg,
+                )
+            )
+        pg_session.commit()
+
+        compute_daily_rollup(pg_session, day_start)
+
+        daily = pg_session.query(QueryRollup).filter_by(granularity="daily").one()
+        # (1000 * 10 + 10 * 500) / 1010; the unweighted mean would be 255.
+        assert daily.avg_latency_ms == 14
+
+    def test_merges_domain_sketches_instead_of_summing(self, pg_session):
+        day_start = datetime(2025, 1, 15, 0, 0, 0, tzinfo=timezone.utc)
+        # The same 40 domains every hour for three hours.
+        events = [
+            _minute_event(
+                hour * 100 + i + 1,
+                day_start + timedelta(hours=hour, minutes=i),
+                qname=f"d{i}.example.com",
+            )
+            for hour in range(3)
+            for i in range(40)
+        ]
+        pg_session.add_all(events)
+        pg_session.commit()
+        for hour in range(3):
+            compute_hourly_rollup(pg_session, day_start + timedelta(hours=hour))
+
+        compute_daily_rollup(pg_session, day_start)
+
+        hourly = pg_session.query(QueryRollup).filter(QueryRollup.granularity == "hourly").all()
+        daily = pg_session.query(QueryRollup).filter(QueryRollup.granularity == "daily").one()
+        assert [h.unique_domains for h in hourly] == [40, 40, 40]
+        assert daily.total_queries == 120
+        assert daily.unique_domains == pytest.approx(40, abs=2)
+        assert daily.domains_sketch is not None
+        assert sum(daily.latency_histogram) == 120
+
+
+def _minute_event(event_id: int, ts: datetime, **kwargs) -> DNSQueryEvent:
+    fields = {
+        "client_ip": "192.168.1.100",
+        "qname": f"m{event_id}.example.com",
+        "qtype": 1,
+        "rcode": 0,
+        "blocked": False,
+        "latency_ms": 20,
+    }
+    fields.update(kwargs)
+    return DNSQueryEvent(id=event_id, ts=ts, **fields)
+
+
+@pytest.mark.integration
+class TestComputeMinuteRollups:
+    def test_aggregates_per_minute_and_advances_watermark(self, pg_session):
+        now = datetime(2025, 1, 15, 10, 30, 20, tzinfo=timezone.utc)
+        minute = datetime(2025, 1, 15, 10, 28, tzinfo=timezone.utc)
+        pg_session.add_all(
+            [
+                _minute_event(1, minute + timedelta(seconds=5), blocked=True, latency_ms=1),
+                _minute_event(2, minute + timedelta(seconds=50), latency_ms=2),
+                _minute_event(3, minute + timedelta(seconds=55), is_internal=True),
+                # Current, incomplete minute: not rolled up yet.
+                _minute_event(4, now - timedelta(seconds=5)),
+            ]
+        )
+        pg_session.commit()
+
+        compute_minute_rollups(pg_session, now=now)
+
+        rows = {
+            r.is_internal: r
+            for r in pg_session.query(QueryRollupMinute).filter(
+                QueryRollupMinute.bucket_start == minute
+            )
+        }
+        assert rows[False].total_queries == 2
+        assert rows[False].blocked_queries == 1
+        assert rows[False].cache_hits == 2
+        assert rows[False].allowed_cache_hits == 1
+        assert rows[False].latency_sum_ms == 3
+        assert rows[True].total_queries == 1
+        assert pg_session.query(QueryRollupMinute).count() == 2
+        assert get_rollup_watermark(pg_session, MINUTE_WATERMARK) == now.replace(second=0)
+
+    def test_rerun_picks_up_late_events_without_double_counting(self, pg_session):
+        now = datetime(2025, 1, 15, 10, 30, 20, tzinfo=timezone.utc)
+        minute = datetime(2025, 1, 15, 10, 27, tzinfo=timezone.utc)
+        pg_session.add(_minute_event(1, minute + timedelta(seconds=1)))
+        pg_session.commit()
+        compute_minute_rollups(pg_session, now=now)
+
+        # Delivered late, still inside the lateness margin.
+        pg_session.add(_minute_event(2, minute + timedelta(seconds=2)))
+        pg_session.commit()
+        compute_minute_rollups(pg_session, now=now + timedelta(minutes=1))
+
+        row = pg_session.query(QueryRollupMinute).filter_by(is_internal=False).one()
+        assert row.total_queries == 2
+
+    def test_rerun_picks_up_events_delivered_after_the_lateness_margin(self, pg_session):
+        now = datetime(2025, 1, 15, 10, 30, 20, tzinfo=timezone.utc)
+        old = datetime(2025, 1, 15, 8, 10, tzinfo=timezone.utc)
+        pg_session.add(_minute_event(1, old + timedelta(seconds=1)))
+        pg_session.commit()
+        compute_minute_rollups(pg_session, now=now)
+
+        # A secondary flushes a backlog from two hours ago, plus one event
+        # in a minute that had none.
+        pg_session.add_all(
+            [
+                _minute_event(2, old + timedelta(seconds=2)),
+                _minute_event(3, old + timedelta(seconds=3), is_internal=True),
+                _minute_event(4, old + timedelta(minutes=1, seconds=1)),
+            ]
+        )
+        pg_session.commit()
+        compute_minute_rollups(pg_session, now=now + timedelta(minutes=1))
+
+        rows = {
+            (r.bucket_start, r.is_internal): r.total_queries
+            for r in pg_session.query(QueryRollupMinute)
+        }
+        assert rows == {
+            (old, False): 2,
+            (old, True): 1,
+            (old + timedelta(minutes=1), False): 1,
+        }
+
+
+@pytest.mark.integration
+class TestMinuteTierReads:
+    def setup_method(self):
+        reset_stats_cache()
+
+    def test_history_reads_rolled_up_minutes_from_tier(self, pg_session):
+        now = datetime.now(timezone.utc)
+        rolled = (now - timedelta(minutes=20)).replace(second=0, microsecond=0)
+        pg_session.add(_minute_event(1, rolled + timedelta(seconds=3), blocked=True))
+        pg_session.commit()
+        compute_minute_rollups(pg_session, now=now)
+
+        # Raw rows are gone, yet the history still has them: the tier is read.
+        pg_session.query(DNSQueryEvent).delete()
+        pg_session.add(_minute_event(2, now - timedelta(seconds=1)))
+        pg_session.commit()
+
+        origin = (now - timedelta(hours=1)).replace(second=0, microsecond=0)
+        buckets = get_history_buckets(pg_session, origin, 1)
+
+        assert buckets[rolled] == {"total": 1, "blocked": 1, "cached": 0}
+        assert sum(b["total"] for b in buckets.values()) == 2
+
+    def test_dashboard_edges_read_from_tier(self, pg_session):
+        now = datetime.now(timezone.utc)
+        pg_session.add_all(
+            [_minute_event(i + 1, now - timedelta(minutes=10 + i)) for i in range(3)]
+        )
+        pg_session.commit()
+        compute_minute_rollups(pg_session, now=now)
+        pg_session.query(DNSQueryEvent).delete()
+        pg_session.commit()
+
+        stats = get_dashboard_stats(pg_session, hours=1)
+
+        assert stats["total_queries"] == 3
+        assert stats["avg_latency_ms"] == 20
+
+    def test_latency_percentiles_merge_tier_and_raw_events(self, pg_session):
+        now = datetime.now(timezone.utc)
+        pg_session.add_all(
+            [_minute_event(i + 1, now - timedelta(minutes=30), latency_ms=2) for i in range(90)]
+        )
+        pg_session.commit()
+        compute_minute_rollups(pg_session, now=now - timedelta(minutes=10))
+        pg_session.add_all(
+            [_minute_event(100 + i, now - timedelta(seconds=30), latency_ms=400) for i in range(10)]
+        )
+        pg_session.commit()
+
+        stats = get_dashboard_stats(pg_session, hours=1)
+
+        assert 2 <= stats["latency_p50_ms"] < 3
+        assert 400 <= stats["latency_p95_ms"] < 500
+        assert 400 <= stats["latency_p99_ms"] < 500
+
+    def test_unique_domains_merged_across_tier_and_raw_events(self, pg_session):
+        now = datetime.now(timezone.utc)
+        rolled = [
+            _minute_event(i + 1, now - timedelta(minutes=30), qname=f"d{i}.example.com")
+            for i in range(20)
+        ]
+        pg_session.add_all(rolled)
+        pg_session.commit()
+        compute_minute_rollups(pg_session, now=now - timedelta(minutes=10))
+        # Ten of the same domains again after the watermark, plus five new.
+        pg_session.add_all(
+            [
+                _minute_event(100 + i, now - timedelta(seconds=30), qname=f"d{i}.example.com")
+                for i in range(15)
+            ]
+        )
+        pg_session.commit()
+
+        stats = get_dashboard_stats(pg_session, hours=1)
+
+        assert stats["total_queries"] == 35
+        assert stats["unique_domains"] == pytest.approx(20, abs=1)
+
 
 @pytest.mark.integration
 class TestGetDashboardStats:
@@ -495,6 +777,9 @@ class TestGetDashboardStats:
             "cache_age_seconds",
             "rollup_lag_seconds",
             "edge_delta_total",
+            "latency_p50_ms",
+            "latency_p95_ms",
+            "latency_p99_ms",
         ]:
             assert key in stats, f"missing key: {key}"
 
@@ -531,6 +816,78 @@ class TestRunRollupJob:
         assert isinstance(result["hourly"], int)
         assert isinstance(result["daily"], int)
 
+    def test_backfills_every_hour_since_watermark(self, pg_session):
+        now = datetime(2025, 1, 15, 12, 30, tzinfo=timezone.utc)
+        set_rollup_watermark(pg_session, HOURLY_WATERMARK, now.replace(hour=8, minute=0))
+        pg_session.commit()
+        pg_session.add_all(
+            [
+                _minute_event(1, now.replace(hour=8, minute=10)),
+                _minute_event(2, now.replace(hour=10, minute=10)),
+                _minute_event(3, now.replace(hour=12, minute=10)),
+            ]
+        )
+        pg_session.commit()
+
+        result = run_rollup_job(pg_session, now=now)
+
+        buckets = [
+            r.bucket_start.hour
+            for r in pg_session.query(QueryRollup)
+            .filter(QueryRollup.granularity == "hourly")
+            .order_by(QueryRollup.bucket_start)
+        ]
+        assert result["hours"] == 4
+        assert buckets == [8, 10]
+        assert get_rollup_watermark(pg_session, HOURLY_WATERMARK) == now.replace(minute=0)
+
+    def test_recomputes_hours_that_received_late_events(self, pg_session):
+        now = datetime(2025, 1, 15, 12, 30, tzinfo=timezone.utc)
+        pg_session.add(_minute_event(1, now.replace(hour=9, minute=10)))
+        pg_session.commit()
+        run_rollup_job(pg_session, now=now)
+
+        # A buffered secondary delivers another 09:xx event an hour later.
+        pg_session.add(_minute_event(2, now.replace(hour=9, minute=20)))
+        pg_session.commit()
+        result = run_rollup_job(pg_session, now=now + timedelta(hours=1))
+
+        rollup = (
+            pg_session.query(QueryRollup)
+            .filter(QueryRollup.granularity == "hourly")
+            .filter(QueryRollup.bucket_start == now.replace(hour=9, minute=0))
+            .one()
+        )
+        pg_session.refresh(rollup)
+        assert result["late_hours"] == 1
+        assert rollup.total_queries == 2
+
+    def test_rolls_up_days_missed_during_outage(self, pg_session):
+        now = datetime(2025, 1, 15, 12, 30, tzinfo=timezone.utc)
+        set_rollup_watermark(pg_session, HOURLY_WATERMARK, now.replace(day=12, minute=0))
+        set_rollup_watermark(pg_session, DAILY_WATERMARK, now.replace(day=12, hour=0, minute=0))
+        pg_session.commit()
+        pg_session.add_all(
+            [
+                _minute_event(1, datetime(2025, 1, 12, 18, 0, tzinfo=timezone.utc)),
+                _minute_event(2, datetime(2025, 1, 13, 6, 0, tzinfo=timezone.utc)),
+                _minute_event(3, datetime(2025, 1, 14, 23, 0, tzinfo=timezone.utc)),
+            ]
+        )
+        pg_session.commit()
+
+        result = run_rollup_job(pg_session, now=now)
+
+        daily = [
+            r.bucket_start.day
+            for r in pg_session.query(QueryRollup)
+            .filter(QueryRollup.granularity == "daily")
+            .order_by(QueryRollup.bucket_start)
+        ]
+        assert daily == [12, 13, 14]
+        assert result["days"] == 3
+        assert get_rollup_watermark(pg_session, DAILY_WATERMARK) == now.replace(hour=0, minute=0)
+
 
 @pytest.mark.integration
 class TestBackfillHourlyRollups:
@@ -557,9 +914,7 @@ class TestBackfillHourlyRollups:
 
         assert count1 == count2
 
-        rollups = pg_session.query(QueryRollup).filter(
-            QueryRollup.granularity == "hourly"
-        ).all()
+        rollups = pg_session.query(QueryRollup).filter(QueryRollup.granularity == "hourly").all()
         by_bucket = {}
         for r in rollups:
             key = r.bucket_start.isoformat()
@@ -576,3 +931,125 @@ class TestBackfillHourlyRollups:
 
         count3 = backfill_hourly_rollups(pg_session, hours=-5)
         assert isinstance(count3, int)
+
+
+@pytest.mark.integration
+class TestSharedStatsCache:
+    def test_second_process_reads_shared_result(self, pg_session):
+        # Two caches stand in for two uvicorn workers.
+        worker_a, worker_b = StatsCache(), StatsCache()
+
+        first = worker_a.get_or_compute(pg_session, "24:test", lambda: {"total_queries": 7})
+        second = worker_b.get_or_compute(
+            pg_session, "24:test", lambda: pytest.fail("computed twice")
+        )
+
+        assert second.value == first.value == {"total_queries": 7}
+        assert second.computed_at == pytest.approx(first.computed_at, abs=0.001)
+
+    def test_compute_errors_propagate(self, pg_session):
+        calls: list[int] = []
+
+        def compute() -> dict:
+            calls.append(1)
+            raise SQLAlchemyError("stats query failed")
+
+        with pytest.raises(SQLAlchemyError):
+            StatsCache().get_or_compute(pg_session, "24:error", compute)
+        assert len(calls) == 1
+
+    def test_purge_drops_old_rows(self, pg_session):
+        StatsCache().get_or_compute(pg_session, "24:old", lambda: {"total_queries": 1})
+
+        assert purge_shared_stats_cache(pg_session, older_than_seconds=3600) == 0
+        assert purge_shared_stats_cache(pg_session, older_than_seconds=-1) == 1
+
+
+@pytest.mark.integration
+class TestGetNodeQueryTotals:
+    def _rollup(self, granularity, bucket, node_id, total, blocked):
+        return QueryRollup(
+            bucket_start=bucket,
+            granularity=granularity,
+            node_id=node_id,
+            total_queries=total,
+            blocked_queries=blocked,
+            nxdomain_count=0,
+            servfail_count=0,
+            cache_hits=0,
+            avg_latency_ms=0,
+            unique_domains=0,
+        )
+
+    def _event(self, event_id, ts, node_id, *, blocked=False, is_internal=False):
+        return DNSQueryEvent(
+            id=event_id,
+            ts=ts,
+            client_ip="192.168.1.10",
+            node_id=node_id,
+            qname="example.com",
+            qtype=1,
+            rcode=0,
+            blocked=blocked,
+            is_internal=is_internal,
+        )
+
+    def test_sums_daily_hourly_and_raw_edge_per_node(self, pg_session):
+        pg_session.add_all(
+            [
+                Node(id=1, name="primary", api_key="k1", status="active"),
+                Node(id=2, name="secondary", api_key="k2", status="active"),
+            ]
+        )
+        now = datetime(2025, 1, 15, 10, 30, tzinfo=timezone.utc)
+        since = datetime(2025, 1, 13, 20, 15, tzinfo=timezone.utc)
+        hourly_wm = datetime(2025, 1, 15, 10, tzinfo=timezone.utc)
+        set_rollup_watermark(pg_session, HOURLY_WATERMARK, hourly_wm)
+        set_rollup_watermark(
+            pg_session, DAILY_WATERMARK, datetime(2025, 1, 15, tzinfo=timezone.utc)
+        )
+
+        pg_session.add_all(
+            [
+                # Before the window's hour: ignored.
+                self._rollup("hourly", datetime(2025, 1, 13, 19, tzinfo=timezone.utc), 1, 1000, 0),
+                # Leading partial day from hourly rollups.
+                self._rollup("hourly", datetime(2025, 1, 13, 20, tzinfo=timezone.utc), 1, 10, 1),
+                self._rollup("hourly", datetime(2025, 1, 13, 23, tzinfo=timezone.utc), 2, 5, 0),
+                # Whole day from the daily rollup; its hourly rows are not re-counted.
+                self._rollup("daily", datetime(2025, 1, 14, tzinfo=timezone.utc), 1, 100, 10),
+                self._rollup("hourly", datetime(2025, 1, 14, 12, tzinfo=timezone.utc), 1, 100, 10),
+                # Hours of today before the watermark.
+                self._rollup("hourly", datetime(2025, 1, 15, 9, tzinfo=timezone.utc), 2, 20, 2),
+                self._rollup("hourly", datetime(2025, 1, 15, 9, tzinfo=timezone.utc), None, 50, 5),
+            ]
+        )
+        pg_session.add_all(
+            [
+                # Already rolled up: counted through the rollups only.
+                self._event(1, hourly_wm - timedelta(minutes=5), 1),
+                self._event(2, hourly_wm + timedelta(minutes=1), 1, blocked=True),
+                self._event(3, hourly_wm + timedelta(minutes=2), 2),
+                self._event(4, hourly_wm + timedelta(minutes=3), 2, is_internal=True),
+                self._event(5, hourly_wm + timedelta(minutes=4), None),
+            ]
+        )
+        pg_session.commit()
+
+        totals = get_node_query_totals(pg_session, since, now=now)
+
+        assert totals == {1: (111, 12), 2: (26, 2)}
+
+    def test_reads_raw_events_without_watermark(self, pg_session):
+        pg_session.add(Node(id=1, name="primary", api_key="k1", status="active"))
+        now = datetime(2025, 1, 15, 10, 30, tzinfo=timezone.utc)
+        pg_session.add_all(
+            [
+                self._event(1, now - timedelta(hours=3), 1, blocked=True),
+                self._event(2, now - timedelta(hours=1), 1),
+                self._event(3, now - timedelta(days=2), 1),
+            ]
+        )
+        pg_session.commit()
+
+        assert get_node_query_totals(pg_session, now - timedelta(days=1), now=now) == {1: (2, 1)}
@@ -0,0 +1,136 @@
+"""Integration tests for the hourly top-K tier behind the top-domain lists."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.dns_query_event import DNSQueryEvent
+from app.models.query_topk import QueryTopK
+from app.services import top_domains
+from app.services.rollups import get_rollup_watermark
+from app.services.top_domains import (
+    TOPK_WATERMARK,
+    compute_hourly_topk,
+    compute_topk_rollups,
+    count_top_domains,
+    get_top_domains,
+)
+
+HOUR = datetime(2025, 1, 15, 10, 0, 0, tzinfo=timezone.utc)
+
+
+def _event(event_id: int, ts: datetime, qname: str, **kwargs) -> DNSQueryEvent:
+    fields = {
+        "client_ip": "192.168.1.100",
+        "qname": qname,
+        "qtype": 1,
+        "rcode": 0,
+        "blocked": False,
+        "latency_ms": 20,
+    }
+    fields.update(kwargs)
+    return DNSQueryEvent(id=event_id, ts=ts, **fields)
+
+
+def _events(ts: datetime, counts: dict[str, int], start_id: int = 1, **kwargs):
+    events = []
+    for qname, n in counts.items():
+        for _ in range(n):
+            events.append(_event(start_id + len(events), ts, qname, **kwargs))
+    return events
+
+
+@pytest.mark.integration
+class TestComputeHourlyTopK:
+    def test_keeps_top_n_per_blocked_split(self, pg_session, monkeypatch):
+        monkeypatch.setattr(top_domains, "TOPK_PER_HOUR", 2)
+        ts = HOUR + timedelta(minutes=5)
+        pg_session.add_all(_events(ts, {"a.com": 3, "b.com": 2, "c.com": 1}))
+        pg_session.add_all(_events(ts, {"ads.com": 4}, start_id=100, blocked=True))
+        pg_session.commit()
+
+        written = compute_hourly_topk(pg_session, HOUR)
+        pg_session.commit()
+
+        rows = {(r.qname, r.blocked): r.query_count for r in pg_session.query(QueryTopK).all()}
+        assert written == 3
+        assert rows == {("a.com", False): 3, ("b.com", False): 2, ("ads.com", True): 4}
+
+    def test_recompute_replaces_hour(self, pg_session):
+        ts = HOUR + timedelta(minutes=5)
+        pg_session.add_all(_events(ts, {"a.com": 1}))
+        pg_session.commit()
+        compute_hourly_topk(pg_session, HOUR)
+        pg_session.add_all(_events(ts, {"a.com": 2}, start_id=10))
+        pg_session.commit()
+
+        compute_hourly_topk(pg_session, HOUR)
+        pg_session.commit()
+
+        row = pg_session.query(QueryTopK).one()
+        assert row.query_count == 3
+        assert row.noerror_count == 3
+
+
+@pytest.mark.integration
+class TestGetTopDomains:
+    def test_without_tier_groups_raw_events(self, pg_session):
+        since = datetime.now(timezone.utc) - timedelta(hours=1)
+        pg_session.add_all(_events(since + timedelta(minutes=5), {"a.com": 1, "b.com": 2}))
+        pg_session.commit()
+
+        rows = get_top_domains(pg_session, since)
+
+        assert [(r.qname, r.count) for r in rows] == [("b.com", 2), ("a.com", 1)]
+
+    def test_merges_tier_hours_with_raw_tail(self, pg_session):
+        now = datetime.now(timezone.utc)
+        rolled = (now - timedelta(hours=3)).replace(minute=10, second=0, microsecond=0)
+        pg_session.add_all(_events(rolled, {"a.com": 3, "b.com": 1}))
+        pg_session.commit()
+        compute_topk_rollups(pg_session, now=now)
+        assert get_rollup_watermark(pg_session, TOPK_WATERMARK) == now.replace(
+            minute=0, second=0, microsecond=0
+        )
+
+        # Raw rows of rolled-up hours are no longer read.
+        pg_session.query(DNSQueryEvent).delete()
+        pg_session.add_all(_events(now - timedelta(seconds=5), {"b.com": 4}, start_id=50))
+        pg_session.commit()
+
+        since = now - timedelta(hours=24)
+        rows = get_top_domains(pg_session, since)
+
+        assert [(r.qname, r.count) for r in rows] == [("b.com", 5), ("a.com", 3)]
+        assert count_top_domains(pg_session, since) == 2
+
+    def test_pairs_ranked_by_noerror_answers(self, pg_session):
+        now = datetime.now(timezone.utc)
+        rolled = (now - timedelta(hours=2)).replace(minute=10, second=0, microsecond=0)
+        pg_session.add_all(_events(rolled, {"a.com": 2}))
+        pg_session.add_all(_events(rolled, {"a.com": 5}, start_id=10, qtype=28, rcode=3))
+        pg_session.add_all(_events(rolled, {"x.com": 9}, start_id=20, blocked=True))
+        pg_session.commit()
+        compute_topk_rollups(pg_session, now=now)
+
+        rows = get_top_domains(
+            pg_session,
+            now - timedelta(hours=24),
+            by_qtype=True,
+            metric="noerror",
+            blocked=False,
+        )
+
+        assert [(r.qname, r.qtype, r.count) for r in rows] == [("a.com", 1, 2)]
+
+    def test_client_filter_reads_raw_events(self, pg_session):
+        now = datetime.now(timezone.utc)
+        rolled = (now - timedelta(hours=2)).replace(minute=10, second=0, microsecond=0)
+        pg_session.add_all(_events(rolled, {"a.com": 2}))
+        pg_session.add_all(_events(rolled, {"b.com": 1}, start_id=10, client_ip="10.0.0.9"))
+        pg_session.commit()
+        compute_topk_rollups(pg_session, now=now)
+
+        rows = get_top_domains(pg_session, now - timedelta(hours=24), client_ip="10.0.0.9")
+
+        assert [(r.qname, r.count) for r in rows] == [("b.com", 1)]
@@ -152,11 +152,11 @@ def add_pair_events(session: Session, rows: list[tuple[str, int, int]]) -> None:
 
 @pytest.fixture(autouse=True)
 def reset_burst_state():
-    precache._pair_ttl_cache.clear()
+    precache.reset_pair_ttl_state()
     with boot_burst._state_lock:
         boot_burst._last_result = None
     yield
-    precache._pair_ttl_cache.clear()
+    precache.reset_pair_ttl_state()
     with boot_burst._state_lock:
         boot_burst._last_result = None
 
@@ -201,6 +201,15 @@ class TestQPSPacer:
         assert all(gap >= 0.1 - 1e-9 for gap in gaps)
         assert all(gap <= 0.1 * 1.2 + 1e-9 for gap in gaps)
 
+    def test_reserve_spaces_slots_without_sleeping(self):
+        timeline = FakeTimeline()
+        pacer = QPSPacer(qps=10.0, jitter_ratio=0.0, clock=timeline.clock, sleep=timeline.sleep)
+
+        slots = [pacer.reserve() for _ in range(3)]
+
+        assert slots == pytest.approx([1_000.0, 1_000.1, 1_000.2])
+        assert timeline.waits == []
+
     def test_zero_qps_rejected(self):
         with pytest.raises(ValueError):
             QPSPacer(qps=0.0)
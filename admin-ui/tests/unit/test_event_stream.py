@@ -0,0 +1,205 @@
+"""Unit tests for the live-stream event broadcaster."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.routers import streaming
+from app.services import event_stream
+from app.services.event_stream import EventBroadcaster, StreamFilter, Subscription, broadcaster
+
+
+def _events(*ids: int) -> list[dict]:
+    return [{"id": i, "qname": f"q{i}.example.com"} for i in ids]
+
+
+class _FakeTable:
+    """Stands in for dns_query_events; counts the polls made against it."""
+
+    def __init__(self, *ids: int) -> None:
+        self.ids = list(ids)
+        self.polls = 0
+
+    def fetch(self, last_id: int, limit: int) -> list[dict]:
+        self.polls += 1
+        return _events(*[i for i in self.ids if i > last_id][:limit])
+
+    def max_id(self) -> int:
+        return max(self.ids, default=0)
+
+
+class TestStreamFilter:
+    def test_parses_and_matches(self):
+        spec = StreamFilter.from_message({"qname": "Ads.Example.", "blocked": True, "rcode": 0})
+        event = {"id": 1, "client_ip": "10.0.0.5", "qname": "x.ads.example", "blocked": True}
+
+        assert spec.as_dict() == {"qname": "ads.example", "blocked": True, "rcode": 0}
+        assert spec.matches({**event, "rcode": 0})
+        assert not spec.matches({**event, "rcode": 3})
+        assert not spec.matches({**event, "rcode": 0, "blocked": False})
+        assert StreamFilter.from_message({"client_ip": "10.0.0.5"}).matches(event)
+        assert StreamFilter.from_message(None).matches(event)
+
+    @pytest.mark.parametrize(
+        "spec", [[], {"rcode": "3"}, {"blocked": "yes"}, {"qname": 1}, {"domain": "x"}]
+    )
+    def test_rejects_malformed_specs(self, spec):
+        with pytest.raises(ValueError):
+            StreamFilter.from_message(spec)
+
+
+class TestSubscription:
+    @pytest.mark.asyncio
+    async def test_drops_oldest_when_full(self):
+        sub = Subscription(start_id=0, maxsize=3)
+        sub.offer(_events(1, 2, 3, 4, 5))
+
+        assert sub.dropped == 2
+        assert [e["id"] for e in await sub.next_batch()] == [3, 4, 5]
+        assert sub.cursor == 5
+
+    @pytest.mark.asyncio
+    async def test_filter_applies_before_queueing(self):
+        sub = Subscription(start_id=0)
+        sub.offer(_events(1, 2))
+        sub.configure(StreamFilter(qname="q3"), max_rate=None)
+        sub.offer(_events(3, 4))
+
+        assert [e["id"] for e in await sub.next_batch()] == [3]
+        assert sub.dropped == 0
+
+    @pytest.mark.asyncio
+    async def test_max_rate_drops_and_reports_excess(self):
+        sub = Subscription(start_id=0)
+        sub.configure(StreamFilter(), max_rate=2)
+        sub.offer(_events(1, 2, 3, 4, 5))
+
+        assert [e["id"] for e in await sub.next_batch()] == [1, 2]
+        assert sub.take_dropped() == 3
+        assert sub.take_dropped() == 0
+
+        # Drops alone still wake the viewer so it can report them.
+        sub.offer(_events(6))
+        assert await asyncio.wait_for(sub.next_batch(), 1) == []
+        assert sub.take_dropped() == 1
+
+    def test_fractional_max_rate_lets_events_through(self, monkeypatch):
+        clock = [1000.0]
+        sub = Subscription(start_id=0)
+        with monkeypatch.context() as m:
+            m.setattr(event_stream.time, "monotonic", lambda: clock[0])
+            sub.configure(StreamFilter(), max_rate=0.5)
+            for i in range(1, 6):  # one event a second at 0.5/s
+                sub.offer(_events(i))
+                clock[0] += 1
+
+        assert [e["id"] for e in asyncio.run(sub.next_batch())] == [1, 3, 5]
+        assert sub.take_dropped() == 2
+
+    @pytest.mark.asyncio
+    async def test_coalesces_events_within_batch_interval(self):
+        sub = Subscription(start_id=0, batch_interval=0.2)
+        sub.offer(_events(1))
+        assert [e["id"] for e in await sub.next_batch()] == [1]
+
+        sub.offer(_events(2))
+        pending = asyncio.create_task(sub.next_batch())
+        await asyncio.sleep(0.05)
+        sub.offer(_events(3))
+
+        assert [e["id"] for e in await asyncio.wait_for(pending, 1)] == [2, 3]
+
+    @pytest.mark.asyncio
+    async def test_skips_events_at_or_before_cursor(self):
+        sub = Subscription(start_id=10)
+        sub.offer(_events(9, 10, 11))
+
+        assert [e["id"] for e in await sub.next_batch(max_events=5)] == [11]
+
+
+class TestEventBroadcaster:
+    @pytest.mark.asyncio
+    async def test_one_poller_feeds_every_subscriber(self):
+        table = _FakeTable(1, 2)
+        hub = EventBroadcaster(fetch=table.fetch, max_id=table.max_id, poll_interval=0.01)
+        subs = [await hub.subscribe() for _ in range(10)]
+        assert all(sub.cursor == 2 for sub in subs)
+
+        table.ids += [3, 4]
+        batches = await asyncio.wait_for(asyncio.gather(*(s.next_batch() for s in subs)), 1)
+
+        assert all([e["id"] for e in batch] == [3, 4] for batch in batches)
+        # Polls depend on elapsed time, not on the number of viewers.
+        assert table.polls < 10
+
+        for sub in subs:
+            hub.unsubscribe(sub)
+        assert len(hub) == 0 and hub.last_id is None
+
+    @pytest.mark.asyncio
+    async def test_notify_wakes_producer_before_next_poll(self):
+        table = _FakeTable(1)
+        hub = EventBroadcaster(fetch=table.fetch, max_id=table.max_id, poll_interval=60)
+        sub = await hub.subscribe()
+        await asyncio.sleep(0.05)
+
+        table.ids.append(2)
+        await asyncio.to_thread(hub.notify)  # as ingest does, from a worker thread
+
+        assert [e["id"] for e in await asyncio.wait_for(sub.next_batch(), 1)] == [2]
+        hub.unsubscribe(sub)
+
+    @pytest.mark.asyncio
+    async def test_slow_subscriber_does_not_block_others(self):
+        table = _FakeTable()
+        hub = EventBroadcaster(fetch=table.fetch, max_id=table.max_id, queue_size=2)
+        slow, fast = await hub.subscribe(), await hub.subscribe()
+
+        hub.publish(_events(1, 2, 3))
+        assert [e["id"] for e in await fast.next_batch()] == [2, 3]
+        assert slow.dropped == 1
+
+        hub.unsubscribe(slow)
+        hub.unsubscribe(fast)
+
+
+class TestStreamRoute:
+    def test_streams_events_and_replays_on_rewind(self, monkeypatch):
+        from app.main import app
+
+        table = _FakeTable(1, 2, 3)
+        monkeypatch.setattr(streaming, "_validate_session", lambda token: 1)
+        monkeypatch.setattr(streaming, "fetch_events_after", table.fetch)
+        monkeypatch.setattr(broadcaster, "_fetch", table.fetch)
+        monkeypatch.setattr(broadcaster, "_max_id", table.max_id)
+        monkeypatch.setattr(broadcaster, "poll_interval", 0.01)
+
+        with TestClient(app) as client, client.websocket_connect("/ws/stream?user_id=1") as ws:
+            assert ws.receive_json()["last_id"] == 3
+
+            table.ids.append(4)
+            assert ws.receive_json() == {"type": "events", "data": _events(4), "count": 1}
+
+            ws.send_json({"type": "set_last_id", "last_id": 2})
+            assert ws.receive_json()["data"] == _events(3, 4)
+            assert ws.receive_json() == {"type": "last_id_updated", "last_id": 2}
+
+            ws.send_json({"type": "set_filter", "filter": {"qname": "q6"}, "max_rate": 10})
+            assert ws.receive_json() == {
+                "type": "filter_updated",
+                "filter": {"qname": "q6"},
+                "max_rate": 10,
+            }
+            table.ids += [5, 6]
+            assert ws.receive_json()["data"] == _events(6)
+
+            ws.send_json({"type": "set_filter", "filter": {"rcode": "x"}})
+            assert ws.receive_json() == {"type": "error", "message": "rcode must be an integer"}
+
+            ws.send_json({"type": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+
+        assert len(broadcaster) == 0
@@ -0,0 +1,75 @@
+"""Unit tests for the analytics filter option tables."""
+
+from datetime import datetime, timezone
+
+from app.models.client import Client
+from app.models.dns_query_event import DNSQueryEvent
+from app.models.event_blocklist_name import EventBlocklistName
+from app.services.filter_options import (
+    get_blocklist_options,
+    get_client_options,
+    refresh_filter_options,
+)
+
+
+def _event(event_id: int, client_ip: str, blocklist: str | None, is_internal: bool):
+    return DNSQueryEvent(
+        id=event_id,
+        ts=datetime.now(timezone.utc),
+        client_ip=client_ip,
+        qname="ads.example.com",
+        qtype=1,
+        rcode=0,
+        blocked=blocklist is not None,
+        blocklist_name=blocklist,
+        is_internal=is_internal,
+    )
+
+
+class TestFilterOptions:
+    def test_options_follow_external_flags(self, sync_db_session):
+        sync_db_session.add_all(
+            [
+                Client(id=1, ip="10.0.0.2", display_name="laptop", has_external_traffic=True),
+                Client(id=2, ip="172.30.0.3"),
+                EventBlocklistName(name="ads", has_external_traffic=True),
+                EventBlocklistName(name="internal-only"),
+            ]
+        )
+        sync_db_session.commit()
+
+        assert [c.ip for c in get_client_options(sync_db_session)] == ["10.0.0.2"]
+        assert len(get_client_options(sync_db_session, include_internal=True)) == 2
+        assert get_blocklist_options(sync_db_session) == ["ads"]
+        assert get_blocklist_options(sync_db_session, include_internal=True) == [
+            "ads",
+            "internal-only",
+        ]
+
+    def test_refresh_drops_options_without_events(self, sync_db_session):
+        sync_db_session.add_all(
+            [
+                Client(id=3, ip="10.0.0.2", has_external_traffic=True),
+                Client(id=4, ip="10.0.0.3", has_external_traffic=True),
+                EventBlocklistName(name="ads", has_external_traffic=True),
+                EventBlocklistName(name="now-internal", has_external_traffic=True),
+                EventBlocklistName(name="expired", has_external_traffic=True),
+                _event(1, "10.0.0.2", "ads", False),
+                _event(2, "10.0.0.3", "now-internal", True),
+            ]
+        )
+        sync_db_session.commit()
+
+        result = refresh_filter_options(sync_db_session)
+
+        assert result == {
+            "clients_cleared": 1,
+            "blocklist_names_removed": 1,
+            "blocklist_names_cleared": 1,
+        }
+        assert [c.ip for c in get_client_options(sync_db_session)] == ["10.0.0.2"]
+        assert get_blocklist_options(sync_db_session) == ["ads"]
+        assert get_blocklist_options(sync_db_session, include_internal=True) == [
+            "ads",
+            "now-internal",
+        ]
@@ -0,0 +1,49 @@
+"""Unit tests for the /system health warnings."""
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from app.routers.system import compute_health_warnings
+
+
+def _metrics(**counters):
+    values = {
+        "ts": datetime.now(timezone.utc),
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "questions": 0,
+        "servfail_answers": 0,
+        "all_outqueries": 0,
+        "outgoing_timeouts": 0,
+        "answers_0_1": 0,
+        "answers_1_10": 0,
+        "answers_10_100": 0,
+        "answers_100_1000": 0,
+        "answers_slow": 0,
+    }
+    values.update(counters)
+    return SimpleNamespace(**values)
+
+
+def _node():
+    return SimpleNamespace(name="primary", last_seen=datetime.now(timezone.utc))
+
+
+class TestHealthWarningRatios:
+    def test_cumulative_counters_without_recent_deltas(self):
+        metrics = _metrics(cache_hits=10, cache_misses=990)
+
+        warnings = compute_health_warnings([{"node": _node(), "metrics": metrics}])
+
+        assert [w.title for w in warnings] == ["Very low cache hit rate"]
+
+    def test_recent_deltas_take_precedence(self):
+        # A poor hit rate since startup that has recovered in the last hour.
+        metrics = _metrics(cache_hits=10, cache_misses=990)
+        recent = _metrics(cache_hits=900, cache_misses=100)
+
+        warnings = compute_health_warnings(
+            [{"node": _node(), "metrics": metrics, "recent": recent}]
+        )
+
+        assert warnings == []
@@ -0,0 +1,57 @@
+"""Unit tests for rollup latency histograms and percentile estimates."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.services.latency_histogram import (
+    LATENCY_BUCKET_BOUNDS_MS,
+    LATENCY_BUCKETS,
+    latency_percentile,
+    merge_histograms,
+)
+
+
+def _histogram(**counts: int) -> list[int]:
+    """Histogram with ``counts`` keyed by bucket, e.g. b0=3 for bucket 0."""
+    hist = [0] * LATENCY_BUCKETS
+    for key, count in counts.items():
+        hist[int(key[1:])] = count
+    return hist
+
+
+class TestMergeHistograms:
+    def test_adds_element_wise(self):
+        merged = merge_histograms(_histogram(b0=1, b3=2), _histogram(b3=5, b9=1))
+
+        assert merged == _histogram(b0=1, b3=7, b9=1)
+
+    def test_none_counts_as_empty(self):
+        assert merge_histograms(None, _histogram(b2=4)) == _histogram(b2=4)
+        assert merge_histograms() == [0] * LATENCY_BUCKETS
+
+
+class TestLatencyPercentile:
+    def test_empty_histogram_has_no_percentile(self):
+        assert latency_percentile([0] * LATENCY_BUCKETS, 95) is None
+
+    def test_interpolates_within_bucket(self):
+        # 100 answers in [10, 15) ms.
+        bucket = LATENCY_BUCKET_BOUNDS_MS.index(15)
+        hist = _histogram(**{f"b{bucket}": 100})
+
+        assert latency_percentile(hist, 50) == 12.5
+        assert latency_percentile(hist, 100) == 15.0
+
+    def test_tail_percentiles_land_in_slow_buckets(self):
+        fast = LATENCY_BUCKET_BOUNDS_MS.index(2)
+        slow = LATENCY_BUCKET_BOUNDS_MS.index(300)
+        hist = _histogram(**{f"b{fast}": 96, f"b{slow}": 4})
+
+        assert latency_percentile(hist, 50) < 2
+        assert 200 <= latency_percentile(hist, 99) <= 300
+
+    def test_open_ended_bucket_reports_last_bound(self):
+        hist = _histogram(**{f"b{LATENCY_BUCKETS - 1}": 10})
+
+        assert latency_percentile(hist, 99) == pytest.approx(LATENCY_BUCKET_BOUNDS_MS[-1])
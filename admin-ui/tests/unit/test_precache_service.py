@@ -19,7 +19,9 @@ from app.services import precache
 from app.services.precache import (
     DEFAULT_FALLBACK_TTL,
     build_warm_query,
+    get_cache_effectiveness,
     get_pairs_needing_refresh,
+    get_precache_page_stats,
     get_precache_stats,
     get_top_domains_to_warm,
     get_top_pairs_to_warm,
@@ -63,9 +65,11 @@ def add_events(session, now, rows):
 
 @pytest.fixture(autouse=True)
 def clear_pair_ttl_cache():
-    precache._pair_ttl_cache.clear()
+    precache.reset_pair_ttl_state()
+    precache.reset_page_stats_cache()
     yield
-    precache._pair_ttl_cache.clear()
+    precache.reset_pair_ttl_state()
+    precache.reset_page_stats_cache()
 
 
 class TestPairSelection:
@@ -318,7 +322,7 @@ class TestTTLPerPairTracking:
 
         return FakeUDP(response_for)
 
-    def test_ttl_tracked_per_pair_not_per_qname(self, monkeypatch):
+    def test_ttl_tracked_per_pair_not_per_qname(self, monkeypatch, sync_db_session):
         monkeypatch.setattr(
             "dns.query.udp",
             self.udp_returning({("example.com.", QTYPE_A): 300, ("example.com.", QTYPE_AAAA): 60}),
@@ -334,7 +338,7 @@ class TestTTLPerPairTracking:
         assert precache._pair_ttl_cache[("example.com", QTYPE_A)].ttl == 300
         assert precache._pair_ttl_cache[("example.com", QTYPE_AAAA)].ttl == 60
 
-        stats = get_precache_stats()
+        stats = get_precache_stats(sync_db_session)
         assert stats["cached_pairs"] == 2
         assert stats["by_qtype"] == {QTYPE_A: 1, QTYPE_AAAA: 1}
 
@@ -388,6 +392,58 @@ class TestTTLPerPairTracking:
         assert due == pairs
 
 
+class TestPageStats:
+    def _event(self, event_id, now, *, latency_ms, blocked=False, is_internal=False):
+        return DNSQueryEvent(
+            id=event_id,
+            ts=now - timedelta(minutes=5),
+            client_ip="192.168.1.100",
+            qname="a.example.com",
+            qtype=QTYPE_A,
+            rcode=0,
+            blocked=blocked,
+            latency_ms=latency_ms,
+            is_internal=is_internal,
+        )
+
+    def test_effectiveness_splits_hits_and_misses(self, sync_db_session):
+        now = datetime.now(timezone.utc)
+        sync_db_session.add_all(
+            [
+                self._event(1, now, latency_ms=1),
+                self._event(2, now, latency_ms=3),
+                self._event(3, now, latency_ms=40),
+                self._event(4, now, latency_ms=1, blocked=True),
+                self._event(5, now, latency_ms=1, is_internal=True),
+                self._event(6, now - timedelta(days=2), latency_ms=1),
+            ]
+        )
+        sync_db_session.commit()
+
+        stats = get_cache_effectiveness(sync_db_session, now - timedelta(hours=24), 5)
+
+        assert stats == {
+            "total": 4,
+            "cache_hits": 2,
+            "avg_latency_hit": 2.0,
+            "avg_latency_miss": 40.0,
+        }
+
+    def test_page_stats_are_cached(self, sync_db_session):
+        now = datetime.now(timezone.utc)
+        sync_db_session.add(self._event(1, now, latency_ms=1))
+        sync_db_session.commit()
+
+        first = get_precache_page_stats(sync_db_session, 5, 1000)
+        sync_db_session.add(self._event(2, now, latency_ms=1))
+        sync_db_session.commit()
+        second = get_precache_page_stats(sync_db_session, 5, 1000)
+
+        assert first["total"] == second["total"] == 1
+        assert first["top_cached"] == [["a.example.com", 1]]
+        assert first["warmable_count"] == 1
+
+
 class TestSettingsDefaults:
     def test_defaults_point_warming_at_dnsdist_edge(self):
         assert DEFAULTS["precache_dns_server"] == "dnsdist"
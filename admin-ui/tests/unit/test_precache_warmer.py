@@ -0,0 +1,184 @@
+"""Unit tests for the concurrent precache warmer, against a local stub DNS server."""
+
+from __future__ import annotations
+
+import logging
+import socket
+import threading
+import time
+from collections.abc import Callable
+
+import dns.message
+import dns.rcode
+import dns.rrset
+import pytest
+
+from app.services import precache
+from app.services.precache_warmer import warm_cache_concurrent, warm_pairs_async
+
+QTYPE_A = 1
+QTYPE_AAAA = 28
+
+# (response or None to stay silent, delay in seconds) for a query.
+Handler = Callable[[dns.message.Message], tuple[dns.message.Message | None, float]]
+
+
+def answer(query: dns.message.Message, ttl: int = 300) -> dns.message.Message:
+    response = dns.message.make_response(query)
+    question = query.question[0]
+    if question.rdtype == QTYPE_AAAA:
+        rr = dns.rrset.from_text(question.name, ttl, "IN", "AAAA", "2001:db8::1")
+    else:
+        rr = dns.rrset.from_text(question.name, ttl, "IN", "A", "192.0.2.1")
+    response.answer.append(rr)
+    return response
+
+
+class StubDNSServer:
+    """UDP DNS responder on 127.0.0.1 with per-query delays, run in a thread.
+
+    Records the source ports queries came from and the most queries
+    outstanding (received but not yet answered) at once.
+    """
+
+    def __init__(self, handler: Handler) -> None:
+        self.handler = handler
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self.received = 0
+        self.source_ports: set[int] = set()
+        self.outstanding = 0
+        self.max_outstanding = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self) -> StubDNSServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+    def _serve(self) -> None:
+        while not self._stop.is_set():
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except TimeoutError:
+                continue
+            query = dns.message.from_wire(data)
+            response, delay = self.handler(query)
+            with self._lock:
+                self.received += 1
+                self.source_ports.add(addr[1])
+                self.outstanding += 1
+                self.max_outstanding = max(self.max_outstanding, self.outstanding)
+            if delay > 0:
+                threading.Timer(delay, self._reply, (response, addr)).start()
+            else:
+                self._reply(response, addr)
+
+    def _reply(self, response: dns.message.Message | None, addr) -> None:
+        with self._lock:
+            self.outstanding -= 1
+        if response is not None and not self._stop.is_set():
+            self.sock.sendto(response.to_wire(), addr)
+
+
+@pytest.fixture(autouse=True)
+def clear_pair_ttl_cache():
+    precache.reset_pair_ttl_state()
+    yield
+    precache.reset_pair_ttl_state()
+
+
+def pairs(n: int) -> list[tuple[str, int]]:
+    return [(f"d{i}.example.com", QTYPE_A if i % 2 else QTYPE_AAAA) for i in range(n)]
+
+
+class TestWarmPairsAsync:
+    @pytest.mark.asyncio
+    async def test_warms_every_pair_over_one_socket(self):
+        with StubDNSServer(lambda q: (answer(q, ttl=120), 0)) as server:
+            result = await warm_pairs_async(pairs(50), port=server.port, qps=10_000)
+
+        assert (result.success, result.failed, result.total) == (50, 0, 50)
+        assert len(server.source_ports) == 1
+        assert precache._pair_ttl_cache[("d1.example.com", QTYPE_A)].ttl == 120
+
+    @pytest.mark.asyncio
+    async def test_slow_name_only_costs_its_own_timeout(self):
+        def handler(q):
+            slow = str(q.question[0].name).startswith("d0.")
+            return answer(q), 2.0 if slow else 0.01
+
+        with StubDNSServer(handler) as server:
+            start = time.monotonic()
+            result = await warm_pairs_async(
+                pairs(40), port=server.port, concurrency=4, qps=10_000, timeout_s=0.3
+            )
+            elapsed = time.monotonic() - start
+
+        assert (result.success, result.failed) == (39, 1)
+        assert elapsed < 1.5
+
+    @pytest.mark.asyncio
+    async def test_in_flight_queries_bounded_by_concurrency(self):
+        with StubDNSServer(lambda q: (answer(q), 0.05)) as server:
+            result = await warm_pairs_async(pairs(40), port=server.port, concurrency=5, qps=10_000)
+
+        assert result.success == 40
+        assert 1 < server.max_outstanding <= 5
+
+    @pytest.mark.asyncio
+    async def test_qps_ceiling_is_never_exceeded(self):
+        with StubDNSServer(lambda q: (answer(q), 0)) as server:
+            result = await warm_pairs_async(pairs(21), port=server.port, concurrency=20, qps=100)
+
+        # 21 sends at <= 100 qps need at least 20 slot gaps of 10ms.
+        assert result.success == 21
+        assert result.duration_ms >= 200
+
+    @pytest.mark.asyncio
+    async def test_replies_are_matched_by_id_and_question(self):
+        def handler(q):
+            # A reply for another question under the right ID must not count.
+            wrong = answer(dns.message.make_query("other.example.com", "A"))
+            wrong.id = q.id
+            return wrong, 0
+
+        with StubDNSServer(handler) as server:
+            result = await warm_pairs_async(pairs(3), port=server.port, qps=10_000, timeout_s=0.2)
+
+        assert (result.success, result.failed) == (0, 3)
+        assert precache._pair_ttl_cache == {}
+
+    @pytest.mark.asyncio
+    async def test_error_rcodes_count_as_failures(self):
+        def handler(q):
+            response = dns.message.make_response(q)
+            response.set_rcode(dns.rcode.SERVFAIL)
+            return response, 0
+
+        with StubDNSServer(handler) as server:
+            result = await warm_pairs_async(pairs(4), port=server.port, qps=10_000)
+
+        assert (result.success, result.failed) == (0, 4)
+
+
+class TestThroughput:
+    def test_concurrent_pass_outruns_serial_latency(self, caplog):
+        """2000 pairs at 20ms each: ~40s one at a time, well under 5s here."""
+        with StubDNSServer(lambda q: (answer(q), 0.02)) as server:
+            with caplog.at_level(logging.INFO, logger="app.services.precache_warmer"):
+                result = warm_cache_concurrent(
+                    pairs(2000), port=server.port, concurrency=64, qps=50_000
+                )
+
+        assert result.success == 2000
+        assert result.duration_ms < 5000
+        assert "Cache warming: 2000/2000 pairs" in caplog.text
@@ -0,0 +1,121 @@
+"""Unit tests for the /metrics exposition registry."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.services.prometheus import CachedCollector, Counter, Histogram, MetricFamily, Registry
+
+
+class _Counting:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def collect(self, db):
+        self.calls += 1
+        yield MetricFamily("test_calls", "gauge", "Collect calls").add(self.calls)
+
+
+class _Broken:
+    def collect(self, db):
+        raise RuntimeError("boom")
+
+
+class _Session:
+    def rollback(self) -> None:
+        pass
+
+
+class TestMetricFamily:
+    def test_renders_header_labels_and_escaping(self):
+        family = MetricFamily("test_total", "counter", "Things")
+        family.add(3, {"node": 'a"b\\c'}).add(1.5)
+
+        assert family.render().splitlines() == [
+            "# HELP test_total Things",
+            "# TYPE test_total counter",
+            'test_total{node="a\\"b\\\\c"} 3',
+            "test_total 1.5",
+        ]
+
+    def test_histogram_buckets_are_cumulative(self):
+        family = MetricFamily("test_seconds", "histogram", "Latency")
+        family.add_histogram([0.001, 0.01], [2, 3, 1], 0.25, {"node": "n"})
+
+        assert family.render().splitlines()[2:] == [
+            'test_seconds_bucket{node="n",le="0.001"} 2',
+            'test_seconds_bucket{node="n",le="0.01"} 5',
+            'test_seconds_bucket{node="n",le="+Inf"} 6',
+            'test_seconds_sum{node="n"} 0.25',
+            'test_seconds_count{node="n"} 6',
+        ]
+
+
+class TestRegistry:
+    def test_cached_collector_serves_last_refresh(self):
+        inner = _Counting()
+        cached = CachedCollector(inner, max_age=60)
+        registry = Registry()
+        registry.register(cached)
+
+        assert b"test_calls 1" in registry.render(_Session())
+        assert b"test_calls 1" in registry.render(_Session())
+        cached.refresh(_Session())
+        assert b"test_calls 2" in registry.render(_Session())
+
+    def test_stale_cache_is_recomputed_by_the_scrape(self):
+        inner = _Counting()
+        cached = CachedCollector(inner, max_age=0)
+        cached.collect(_Session())
+        cached._refreshed_at -= 1
+
+        cached.collect(_Session())
+        assert inner.calls == 2
+
+    def test_failing_collector_is_skipped(self):
+        registry = Registry()
+        registry.register(_Broken())
+        registry.register(_Counting())
+
+        assert registry.render(_Session()) == (
+            b"# HELP test_calls Collect calls\n# TYPE test_calls gauge\ntest_calls 1\n"
+        )
+
+
+class TestInstruments:
+    def test_counter_accumulates_per_label_set(self):
+        counter = Counter("test_events_total", "Events", ["result"], registry=Registry())
+        counter.inc(result="ok")
+        counter.inc(2, result="ok")
+        counter.inc(result="bad")
+
+        (family,) = counter.collect(None)
+        assert family.render().splitlines()[2:] == [
+            'test_events_total{result="bad"} 1',
+            'test_events_total{result="ok"} 3',
+        ]
+
+    def test_rejects_wrong_labels(self):
+        counter = Counter("test_events_total", "Events", ["result"], registry=Registry())
+        with pytest.raises(ValueError):
+            counter.inc(status="ok")
+
+    def test_histogram_upper_bounds_are_inclusive(self):
+        registry = Registry()
+        histogram = Histogram("test_size", "Sizes", buckets=(1, 10), registry=registry)
+        for value in (1, 5, 10, 11):
+            histogram.observe(value)
+
+        text = registry.render(_Session()).decode()
+        assert 'test_size_bucket{le="1"} 1' in text
+        assert 'test_size_bucket{le="10"} 3' in text
+        assert 'test_size_bucket{le="+Inf"} 4' in text
+        assert "test_size_sum 27" in text
+
+    def test_histogram_times_a_block(self):
+        histogram = Histogram("test_seconds", "Durations", ["job"], registry=Registry())
+        with histogram.time(job="x"):
+            pass
+
+        (family,) = histogram.collect(None)
+        assert 'test_seconds_count{job="x"} 1' in family.render()
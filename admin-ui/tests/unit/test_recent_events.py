@@ -0,0 +1,88 @@
+"""Unit tests for the in-memory buffer of recently ingested events."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.services.recent_events import RecentEventBuffer
+
+NOW = datetime.now(timezone.utc)
+
+
+def _rows(*ids: int, internal: tuple[int, ...] = (), age: timedelta = timedelta(0)):
+    return [
+        SimpleNamespace(
+            id=i,
+            ts=NOW - age,
+            client_ip="10.0.0.1",
+            qname=f"q{i}.example.com",
+            qtype=1,
+            rcode=0,
+            blocked=False,
+            latency_ms=3,
+            is_internal=i in internal,
+        )
+        for i in ids
+    ]
+
+
+class TestRecentEventBuffer:
+    def test_empty_buffer_defers_to_database(self):
+        buffer = RecentEventBuffer(10)
+
+        assert buffer.events_after(0, 10) is None
+        assert buffer.count_since(NOW - timedelta(hours=1)) is None
+        assert buffer.last_id is None
+
+    def test_serves_events_ingested_since_startup(self):
+        buffer = RecentEventBuffer(10)
+        buffer.extend(_rows(5, 6, internal=(6,)))
+        buffer.extend(_rows(8, 7))
+
+        assert [e.id for e in buffer.events_after(4, 10)] == [5, 7, 8]
+        assert [e.id for e in buffer.events_after(5, 1)] == [7]
+        assert buffer.events_after(5, 10, include_internal=True)[0].id == 6
+        assert buffer.last_id == 8
+        # Anything before the first ingested batch predates the process.
+        assert buffer.events_after(3, 10) is None
+
+    def test_eviction_moves_the_floor(self):
+        buffer = RecentEventBuffer(3)
+        buffer.extend(_rows(1, 2, 3, 4, 5))
+
+        assert len(buffer) == 3
+        assert buffer.events_after(1, 10) is None
+        assert [e.id for e in buffer.events_after(2, 10)] == [3, 4, 5]
+
+    def test_count_since_only_when_window_is_covered(self):
+        buffer = RecentEventBuffer(2)
+        buffer.extend(_rows(1, 2))
+
+        # Events from before the first batch may be missing.
+        assert buffer.count_since(NOW - timedelta(hours=1)) is None
+        assert buffer.count_since(NOW + timedelta(minutes=1)) == 0
+
+        buffer.extend(_rows(3, 4, age=timedelta(minutes=-2)))
+        assert buffer.count_since(NOW + timedelta(minutes=1)) == 2
+
+        buffer.extend(_rows(5, 6, age=timedelta(minutes=-5)))
+        # Evicting 3 and 4 leaves the window before their ts uncovered.
+        assert buffer.count_since(NOW + timedelta(minutes=1)) is None
+        assert buffer.count_since(NOW + timedelta(minutes=3)) == 2
+
+    def test_as_dict_matches_stream_payload(self):
+        buffer = RecentEventBuffer(1)
+        buffer.extend(_rows(1))
+
+        (event,) = buffer.events_after(0, 1)
+        assert event.as_dict() == {
+            "id": 1,
+            "ts": NOW.isoformat(),
+            "client_ip": "10.0.0.1",
+            "qname": "q1.example.com",
+            "qtype": 1,
+            "rcode": 0,
+            "blocked": False,
+            "latency_ms": 3,
+        }
@@ -1,15 +1,21 @@
 """Unit tests for retention service."""
 
+import time
 from datetime import datetime, timedelta, timezone
 
+from app.models.config_change import ConfigChange
 from app.models.dns_query_event import DNSQueryEvent
 from app.models.node import Node
 from app.models.node_metrics import NodeMetrics
 from app.models.query_rollup import QueryRollup
+from app.models.settings import get_setting
 from app.services.retention import (
+    RETENTION_CURSOR_PREFIX,
+    cleanup_old_config_changes,
     cleanup_old_events,
     cleanup_old_node_metrics,
     cleanup_old_rollups,
+    purge_expired_rows,
     run_retention_job,
 )
 
@@ -249,3 +255,133 @@ class TestRunRetentionJob:
         assert isinstance(result["events_deleted"], int)
         assert isinstance(result["rollups_deleted"], int)
         assert isinstance(result["node_metrics_deleted"], int)
+
+
+def _old_metrics(session, count: int, days_old: int = 400) -> None:
+    node = Node(id=1, name="test_node", api_key="test_key", status="active")
+    session.add(node)
+    session.commit()
+    ts = datetime.now(timezone.utc) - timedelta(days=days_old)
+    session.add_all(
+        [NodeMetrics(id=i + 1, node_id=node.id, ts=ts, cache_hits=i) for i in range(count)]
+    )
+    session.commit()
+
+
+class TestPurgeExpiredRows:
+    def test_deletes_in_batches(self, sync_db_session):
+        """Expired rows are removed in primary-key chunks of batch_size."""
+        _old_metrics(sync_db_session, 25)
+        cutoff = datetime.now(timezone.utc) - timedelta(days=365)
+
+        progress = purge_expired_rows(
+            sync_db_session, NodeMetrics, NodeMetrics.ts, cutoff, batch_size=10
+        )
+
+        assert progress.deleted == 25
+        assert progress.batches == 3
+        assert progress.complete is True
+        assert progress.cursor is None
+        assert sync_db_session.query(NodeMetrics).count() == 0
+
+    def test_keeps_rows_inside_id_range_that_are_not_expired(self, sync_db_session):
+        """Only expired rows are deleted, even inside a swept id range."""
+        _old_metrics(sync_db_session, 5)
+        sync_db_session.add(
+            NodeMetrics(id=3_000, node_id=1, ts=datetime.now(timezone.utc), cache_hits=1)
+        )
+        sync_db_session.add(
+            NodeMetrics(
+                id=4_000,
+                node_id=1,
+                ts=datetime.now(timezone.utc) - timedelta(days=400),
+                cache_hits=1,
+            )
+        )
+        sync_db_session.commit()
+        cutoff = datetime.now(timezone.utc) - timedelta(days=365)
+
+        progress = purge_expired_rows(
+            sync_db_session, NodeMetrics, NodeMetrics.ts, cutoff, batch_size=2
+        )
+
+        assert progress.deleted == 6
+        remaining = sync_db_session.query(NodeMetrics).all()
+        assert [m.id for m in remaining] == [3_000]
+
+    def test_stops_at_deadline_and_resumes(self, sync_db_session):
+        """An exhausted budget saves the position; the next run picks it up."""
+        _old_metrics(sync_db_session, 10)
+        cutoff = datetime.now(timezone.utc) - timedelta(days=365)
+
+        stopped = purge_expired_rows(
+            sync_db_session,
+            NodeMetrics,
+            NodeMetrics.ts,
+            cutoff,
+            batch_size=5,
+            deadline=time.monotonic() - 1,
+        )
+
+        assert stopped.complete is False
+        assert stopped.deleted == 0
+        assert stopped.cursor == 1
+        assert get_setting(sync_db_session, f"{RETENTION_CURSOR_PREFIX}node_metrics") == "1"
+
+        resumed = purge_expired_rows(
+            sync_db_session, NodeMetrics, NodeMetrics.ts, cutoff, batch_size=5
+        )
+
+        assert resumed.complete is True
+        assert resumed.deleted == 10
+        assert get_setting(sync_db_session, f"{RETENTION_CURSOR_PREFIX}node_metrics") == ""
+
+
+class TestCleanupOldConfigChanges:
+    def test_deletes_config_changes_older_than_cutoff(self, sync_db_session):
+        """Audit log entries older than the retention period should be deleted."""
+        now = datetime.now(timezone.utc)
+        sync_db_session.add_all(
+            [
+                ConfigChange(
+                    id=1,
+                    entity_type="settings",
+                    action="update",
+                    created_at=now - timedelta(days=400),
+                ),
+                ConfigChange(
+                    id=2,
+                    entity_type="settings",
+                    action="update",
+                    created_at=now - timedelta(days=3),
+                ),
+            ]
+        )
+        sync_db_session.commit()
+
+        deleted = cleanup_old_config_changes(sync_db_session, days=365)
+
+        assert deleted == 1
+        assert [c.id for c in sync_db_session.query(ConfigChange).all()] == [2]
+
+
+class TestRunRetentionJobProgress:
+    def test_reports_per_table_progress(self, sync_db_session):
+        """The job result carries batch progress for every chunked table."""
+        _old_metrics(sync_db_session, 3, days_old=500)
+
+        result = run_retention_job(sync_db_session)
+
+        assert result["complete"] is True
+        assert result["node_metrics_deleted"] == 3
+        assert result["config_changes_deleted"] == 0
+        assert set(result["progress"]) == {
+            "node_metrics",
+            "node_metrics_5m",
+            "node_metrics_1h",
+            "query_rollups",
+            "query_rollups_minute",
+            "query_topk_hourly",
+            "config_changes",
+        }
+        assert result["progress"]["node_metrics"]["batches"] == 1
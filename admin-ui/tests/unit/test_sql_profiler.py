@@ -0,0 +1,121 @@
+"""Unit tests for the opt-in SQL profiler."""
+
+from __future__ import annotations
+
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import StaticPool
+
+from app.sql_profiler import SqlProfiler, SqlProfilerMiddleware, normalize_sql
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def profiler():
+    profiler = SqlProfiler(request_ms=10_000, statement_count=3, slow_query_ms=0)
+    profiler.install()
+    yield profiler
+    profiler.uninstall()
+
+
+class TestNormalizeSql:
+    def test_replaces_literals_and_parameters(self):
+        sql = "SELECT *  FROM nodes\n WHERE name = 'o''brien' AND id = %(id_1)s AND n > 10"
+
+        assert normalize_sql(sql) == "SELECT * FROM nodes WHERE name = ? AND id = ? AND n > ?"
+
+    def test_collapses_in_lists_and_keeps_identifiers(self):
+        sql = "SELECT anon_1.lat3 FROM t WHERE id IN (%(p_1)s, %(p_2)s, %(p_3)s)"
+
+        assert normalize_sql(sql) == "SELECT anon_1.lat3 FROM t WHERE id IN (...)"
+
+
+class TestSqlProfiler:
+    def test_captures_only_inside_the_block(self, engine, profiler):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            with profiler.capture() as profile:
+                conn.execute(text("SELECT 2"))
+                conn.execute(text("SELECT 3"))
+
+        assert [s.statement for s in profile.statements] == ["SELECT 2", "SELECT 3"]
+        assert all(s.duration_ms >= 0 for s in profile.statements)
+
+    def test_failed_statement_leaves_nothing_on_the_connection(self, engine, profiler):
+        with engine.connect() as conn, profiler.capture() as profile:
+            info_before = dict(conn.info)
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            conn.rollback()
+            conn.execute(text("SELECT 1"))
+
+            assert conn.info == info_before
+        assert [s.statement for s in profile.statements] == ["SELECT 1"]
+
+    def test_buffers_slow_queries_newest_first(self, engine, profiler):
+        with engine.connect() as conn, profiler.capture() as profile:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 'x'"))
+
+        profiler.finish(profile, "GET", "/nodes", elapsed_ms=5)
+
+        assert [q.sql for q in profiler.recent_slow_queries()] == ["SELECT ?", "SELECT ?"]
+        assert profiler.recent_slow_queries()[0].route == "/nodes"
+        # EXPLAIN is PostgreSQL only.
+        assert profiler.recent_slow_queries()[0].explain is None
+
+    def test_ring_buffer_is_bounded(self, engine):
+        profiler = SqlProfiler(slow_query_ms=0, buffer_size=2)
+        profiler.install()
+        try:
+            with engine.connect() as conn, profiler.capture() as profile:
+                for i in range(5):
+                    conn.execute(text(f"SELECT {i}"))
+            profiler.finish(profile, "GET", "/", elapsed_ms=1)
+        finally:
+            profiler.uninstall()
+
+        assert len(profiler.recent_slow_queries()) == 2
+
+    def test_logs_requests_over_statement_threshold(self, engine, profiler, caplog):
+        with engine.connect() as conn, profiler.capture() as profile:
+            for i in range(3):
+                conn.execute(text(f"SELECT {i}"))
+
+        with caplog.at_level(logging.WARNING, logger="app.sql_profiler"):
+            profiler.finish(profile, "GET", "/clients/groups", elapsed_ms=12)
+
+        assert "Slow request GET /clients/groups: 12 ms, 3 statements" in caplog.text
+
+
+class TestSqlProfilerMiddleware:
+    def test_profiles_requests_by_route(self, engine):
+        profiler = SqlProfiler(slow_query_ms=0)
+        app = FastAPI()
+        app.add_middleware(SqlProfilerMiddleware, profiler=profiler)
+
+        @app.get("/items/{item_id}")
+        def item(item_id: int):
+            with engine.connect() as conn:
+                return {"value": conn.execute(text("SELECT :v"), {"v": item_id}).scalar()}
+
+        try:
+            assert TestClient(app).get("/items/7").json() == {"value": 7}
+        finally:
+            profiler.uninstall()
+
+        (query,) = profiler.recent_slow_queries()
+        assert (query.method, query.route, query.sql) == ("GET", "/items/{item_id}", "SELECT ?")
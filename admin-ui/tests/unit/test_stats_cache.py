@@ -0,0 +1,79 @@
+"""Unit tests for the bounded, single-flight dashboard stats cache.
+
+SQLite sessions never use the shared PostgreSQL tier, so these cover the
+per-process behaviour only.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from app.services.stats_cache import CachedStats, StatsCache
+
+
+class TestStatsCache:
+    def test_computes_once_then_serves_cached(self, sync_db_session):
+        cache = StatsCache()
+        calls: list[int] = []
+
+        def compute() -> dict:
+            calls.append(1)
+            return {"total_queries": 5}
+
+        first = cache.get_or_compute(sync_db_session, "24", compute)
+        second = cache.get_or_compute(sync_db_session, "24", compute)
+
+        assert first.value == second.value == {"total_queries": 5}
+        assert len(calls) == 1
+
+    def test_expired_entries_are_recomputed(self, sync_db_session):
+        cache = StatsCache(ttl=60)
+        cache.put("24", CachedStats(value={"n": 1}, computed_at=time.time() - 61))
+
+        entry = cache.get_or_compute(sync_db_session, "24", lambda: {"n": 2})
+
+        assert entry.value == {"n": 2}
+
+    def test_refresh_recomputes_fresh_entry(self, sync_db_session):
+        cache = StatsCache()
+        cache.get_or_compute(sync_db_session, "24", lambda: {"n": 1})
+
+        entry = cache.get_or_compute(sync_db_session, "24", lambda: {"n": 2}, refresh=True)
+
+        assert entry.value == {"n": 2}
+        assert cache.get("24").value == {"n": 2}
+
+    def test_evicts_least_recently_used_key(self):
+        cache = StatsCache(max_entries=2)
+        now = time.time()
+        cache.put("1", CachedStats(value={}, computed_at=now))
+        cache.put("2", CachedStats(value={}, computed_at=now))
+        cache.get("1")
+        cache.put("3", CachedStats(value={}, computed_at=now))
+
+        assert len(cache) == 2
+        assert cache.get("1") is not None
+        assert cache.get("2") is None
+
+    def test_concurrent_misses_compute_once(self, sync_db_session):
+        cache = StatsCache()
+        calls: list[int] = []
+        started = threading.Barrier(4)
+
+        def compute() -> dict:
+            calls.append(1)
+            time.sleep(0.05)
+            return {"n": len(calls)}
+
+        def request() -> None:
+            started.wait()
+            cache.get_or_compute(sync_db_session, "24", compute)
+
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1